@@ -0,0 +1,200 @@
+"""Benchmark writing the programs of an XMLTV EPG to a provider database.
+
+The programs are written once through the ORM, adding each program to the
+session and flushing every 1000 programs the way the EPG parsers used to, and
+once through ProviderDatabaseAccess.insert_programs in batches of
+EPG_BULK_INSERT_BATCH_SIZE programs.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.epg_bulk_insert --programmes 200000
+    python -m benchmarks.epg_bulk_insert --xmltv-file-path xmltv.xml
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+
+from lxml import etree
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.generate_xmltv import generate_xmltv
+from iptv_proxy.constants import EPG_BULK_INSERT_BATCH_SIZE
+from iptv_proxy.constants import TRACE
+from iptv_proxy.logging import trace
+from iptv_proxy.providers import ProvidersController
+
+Channel = namedtuple('Channel', ['xmltv_id', 'number'])
+
+
+def _create_db_session(database_file_path, program_class):
+    engine = create_engine('sqlite:///{0}'.format(database_file_path))
+
+    program_class.metadata.create_all(engine)
+
+    return sessionmaker(bind=engine)()
+
+
+def _parse_xmltv(provider_map_class, xmltv_file_path):
+    parsed_channel_xmltv_id_to_channel = {}
+
+    with open(xmltv_file_path, 'rb') as xmltv_file:
+        for (_, element) in etree.iterparse(xmltv_file, tag='channel'):
+            channel_xmltv_id = element.get('id')
+
+            parsed_channel_xmltv_id_to_channel[channel_xmltv_id] = [
+                Channel(channel_xmltv_id, len(parsed_channel_xmltv_id_to_channel) + 1)
+            ]
+
+            element.clear()
+
+    program_rows = []
+
+    with open(xmltv_file_path, 'rb') as xmltv_file:
+        epg_class = provider_map_class.epg_class()
+
+        for parsed_programme in epg_class._parse_epg_xml_programmes(xmltv_file):
+            program_rows.extend(
+                epg_class._format_epg_xml_programme(
+                    provider_map_class,
+                    parsed_channel_xmltv_id_to_channel,
+                    parsed_programme,
+                )
+            )
+
+    return program_rows
+
+
+def _write_programs_bulk(provider_map_class, db_session, program_rows):
+    for index in range(0, len(program_rows), EPG_BULK_INSERT_BATCH_SIZE):
+        provider_map_class.database_access_class().insert_programs(
+            db_session, program_rows[index : index + EPG_BULK_INSERT_BATCH_SIZE]
+        )
+
+    db_session.commit()
+
+
+def _write_programs_orm(provider_map_class, db_session, program_rows):
+    for (number_of_objects_added_to_db_session, program_row) in enumerate(
+        program_rows, 1
+    ):
+        db_session.add(
+            provider_map_class.program_class()(
+                id_='{0}'.format(uuid.uuid4()), **program_row
+            )
+        )
+
+        if number_of_objects_added_to_db_session % 1000 == 0:
+            db_session.flush()
+
+    db_session.flush()
+    db_session.commit()
+
+
+def benchmark(provider_name, xmltv_file_path):
+    provider_map_class = ProvidersController.get_provider_map_class(provider_name)
+    program_class = provider_map_class.program_class()
+
+    start_time = time.perf_counter()
+    program_rows = _parse_xmltv(provider_map_class, xmltv_file_path)
+
+    print(
+        'Parsed and formatted {0} programs from {1:.1f} MB in {2:.2f}s'.format(
+            len(program_rows),
+            os.path.getsize(xmltv_file_path) / 1e6,
+            time.perf_counter() - start_time,
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as database_directory_path:
+        for (description, write_programs) in (
+            ('ORM add, flush every 1000', _write_programs_orm),
+            (
+                'insert_programs, {0} per batch'.format(EPG_BULK_INSERT_BATCH_SIZE),
+                _write_programs_bulk,
+            ),
+        ):
+            db_session = _create_db_session(
+                os.path.join(
+                    database_directory_path, '{0}.db'.format(write_programs.__name__)
+                ),
+                program_class,
+            )
+
+            try:
+                # insert_programs adds the id of each program to its row
+                copied_program_rows = [
+                    dict(program_row) for program_row in program_rows
+                ]
+
+                start_time = time.perf_counter()
+                write_programs(provider_map_class, db_session, copied_program_rows)
+                elapsed_time = time.perf_counter() - start_time
+
+                number_of_programs = db_session.query(program_class.id).count()
+            finally:
+                db_session.close()
+
+            print(
+                '{0:<40} {1:>7.2f}s {2:>9.0f} programs/s ({3} programs)'.format(
+                    description,
+                    elapsed_time,
+                    number_of_programs / elapsed_time,
+                    number_of_programs,
+                )
+            )
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(
+        description='Benchmark writing the programs of an XMLTV EPG to a provider '
+        'database'
+    )
+    argument_parser.add_argument(
+        '--channels',
+        default=500,
+        help='Number of channels of the generated XMLTV file',
+        type=int,
+    )
+    argument_parser.add_argument(
+        '--programmes',
+        default=200000,
+        help='Number of programmes of the generated XMLTV file',
+        type=int,
+    )
+    argument_parser.add_argument(
+        '--provider',
+        default='coolasice',
+        help='Name of an Xtream Codes provider whose database is written to',
+    )
+    argument_parser.add_argument(
+        '--xmltv-file-path',
+        help='Path of an XMLTV file to use instead of a generated one',
+    )
+
+    arguments = argument_parser.parse_args()
+
+    logging.addLevelName(TRACE, 'TRACE')
+    logging.TRACE = TRACE
+    logging.Logger.trace = trace
+
+    ProvidersController._initialize_providers_map_class()
+
+    if arguments.xmltv_file_path:
+        benchmark(arguments.provider, arguments.xmltv_file_path)
+    else:
+        with tempfile.TemporaryDirectory() as xmltv_directory_path:
+            xmltv_file_path = os.path.join(xmltv_directory_path, 'xmltv.xml')
+
+            generate_xmltv(xmltv_file_path, arguments.channels, arguments.programmes)
+
+            benchmark(arguments.provider, xmltv_file_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Generate a synthetic XMLTV file shaped like a large provider EPG.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.generate_xmltv xmltv.xml --programmes 200000
+"""
+
+import argparse
+from datetime import datetime
+from datetime import timedelta
+from xml.sax.saxutils import escape
+
+import pytz
+
+PROGRAMME_DURATION = timedelta(minutes=30)
+XMLTV_DATE_TIME_FORMAT = '%Y%m%d%H%M%S %z'
+
+
+def generate_xmltv(
+    xmltv_file_path, number_of_channels=500, number_of_programmes=200000
+):
+    # Programmes are spread evenly across the channels and follow each other
+    # back to back from midnight today, the way a provider EPG is laid out
+    start = datetime.now(pytz.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    with open(xmltv_file_path, 'w', encoding='utf-8') as xmltv_file:
+        xmltv_file.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<!DOCTYPE tv SYSTEM "xmltv.dtd">\n'
+            '<tv generator-info-name="IPTVProxy benchmark">\n'
+        )
+
+        for channel_index in range(number_of_channels):
+            xmltv_file.write(
+                '  <channel id="channel{0}.example">\n'
+                '    <display-name>{1}</display-name>\n'
+                '    <icon src="http://example.com/icons/channel{0}.png" />\n'
+                '  </channel>\n'.format(
+                    channel_index, escape('Channel {0} & Friends'.format(channel_index))
+                )
+            )
+
+        for programme_index in range(number_of_programmes):
+            (slot_index, channel_index) = divmod(programme_index, number_of_channels)
+
+            programme_start = start + slot_index * PROGRAMME_DURATION
+            programme_stop = programme_start + PROGRAMME_DURATION
+
+            xmltv_file.write(
+                '  <programme start="{0}" stop="{1}" channel="channel{2}.example">\n'
+                '    <title lang="en">{3}</title>\n'
+                '    <sub-title lang="en">Episode {4}</sub-title>\n'
+                '    <desc lang="en">{5}</desc>\n'
+                '    <credits>\n'
+                '      <director>Director {6}</director>\n'
+                '      <actor>Actor {7}</actor>\n'
+                '      <actor>Actor {8}</actor>\n'
+                '    </credits>\n'
+                '    <category lang="en">{9}</category>\n'
+                '    <category lang="en">Series</category>\n'
+                '    <episode-num system="xmltv_ns">{10}.{11}.</episode-num>\n'
+                '    <icon src="http://example.com/icons/programme{12}.jpg" />\n'
+                '    <rating system="VCHIP">\n'
+                '      <value>TV-PG</value>\n'
+                '    </rating>\n'
+                '  </programme>\n'.format(
+                    programme_start.strftime(XMLTV_DATE_TIME_FORMAT),
+                    programme_stop.strftime(XMLTV_DATE_TIME_FORMAT),
+                    channel_index,
+                    escape('Show {0} & Co'.format(programme_index % 5000)),
+                    programme_index,
+                    escape(
+                        'Description of episode {0} of show {1}. Something '
+                        'happens to somebody somewhere and nobody <expected> '
+                        'it.'.format(programme_index, programme_index % 5000)
+                    ),
+                    programme_index % 100,
+                    programme_index % 1000,
+                    (programme_index + 1) % 1000,
+                    ('Movies', 'News', 'Sports', 'Kids')[programme_index % 4],
+                    programme_index % 10,
+                    programme_index % 24,
+                    programme_index % 5000,
+                )
+            )
+
+        xmltv_file.write('</tv>\n')
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(
+        description='Generate a synthetic XMLTV file'
+    )
+    argument_parser.add_argument('xmltv_file_path', help='Path of the XMLTV file')
+    argument_parser.add_argument(
+        '--channels', default=500, help='Number of channels', type=int
+    )
+    argument_parser.add_argument(
+        '--programmes', default=200000, help='Number of programmes', type=int
+    )
+
+    arguments = argument_parser.parse_args()
+
+    generate_xmltv(arguments.xmltv_file_path, arguments.channels, arguments.programmes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,351 @@
+"""Benchmark HLSPlaylist against m3u8.loads/dumps on Xtream Codes playlists.
+
+Before timing, the chunks.m3u8 of every playlist and client state below is
+produced both ways and checked to be equivalent:
+
+- The m3u8 path is Provider._reduce_hls_stream_delay as it was before
+  HLSPlaylist, followed by re.sub over the whole playlist.
+- The HLSPlaylist path is Provider._calculate_number_of_segments_to_drop
+  followed by HLSPlaylist.dumps.
+
+This covers the number of segments dropped, the media sequence and the keys
+and media initialization sections carried over to the first segment kept.
+
+Usage (from the root of the repository):
+
+    python -m benchmarks.hls_playlist
+"""
+
+import argparse
+import functools
+import logging
+import re
+import timeit
+import uuid
+
+import m3u8
+
+from iptv_proxy.constants import TRACE
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.logging import trace
+from iptv_proxy.providers.iptv_provider.api import Provider
+from iptv_proxy.proxy import IPTVProxy
+
+CHANNEL_NUMBER = '7'
+NUMBER_OF_SEGMENTS_TO_KEEP = 2
+SEGMENT_URI_PATTERN = r'/hlsr/(.*)/(.*)/(.*)/(.*)/(.*)/(.*).ts'
+SEGMENT_URI_REPLACEMENT = (
+    r'\6.ts?'
+    r'authorization_token=\1&'
+    'channel_number={0}&'
+    'client_uuid={1}&'
+    'hostname=iptv.example.com&'
+    'http_token=&'
+    r'leaf_directory=\5&'
+    'port=9000&'
+    'scheme=http'.format(CHANNEL_NUMBER, '4fd2e61c-3b0e-4b5c-9a53-3f1c7cbf62a8')
+)
+
+
+def _generate_chunks_m3u8(
+    number_of_segments,
+    media_sequence=4000,
+    do_rotate_keys=False,
+    do_add_map=False,
+    do_add_discontinuity=False,
+):
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-TARGETDURATION:10',
+        '#EXT-X-MEDIA-SEQUENCE:{0}'.format(media_sequence),
+    ]
+
+    for segment_index in range(number_of_segments):
+        sequence_number = media_sequence + segment_index
+
+        if do_add_map and segment_index == 0:
+            lines.append('#EXT-X-MAP:URI="init.mp4"')
+
+        if do_rotate_keys and segment_index % 4 == 0:
+            lines.append(
+                '#EXT-X-KEY:METHOD=AES-128,URI="key{0}.bin"'.format(sequence_number)
+            )
+
+        if do_add_discontinuity and segment_index == number_of_segments // 2:
+            lines.append('#EXT-X-DISCONTINUITY')
+            lines.append('#EXT-X-PROGRAM-DATE-TIME:2020-01-01T00:00:00.000+00:00')
+
+        lines.append('#EXTINF:10.010,')
+        lines.append(
+            '/hlsr/0123456789abcdef/203.0.113.7/1576800000/'
+            '8f7a9c2d/{0}/{1}.ts'.format(CHANNEL_NUMBER, sequence_number)
+        )
+
+    return '{0}\n'.format('\n'.join(lines))
+
+
+def _create_client(last_requested_channel_number, last_requested_ts_file_path):
+    client_uuid = '{0}'.format(uuid.uuid4())
+
+    if last_requested_channel_number is not None:
+        IPTVProxy.refresh_serviceable_clients(client_uuid, '127.0.0.1')
+        IPTVProxy.set_serviceable_client_parameter(
+            client_uuid, 'last_requested_channel_number', last_requested_channel_number
+        )
+
+        if last_requested_ts_file_path is not None:
+            IPTVProxy.set_serviceable_client_parameter(
+                client_uuid, 'last_requested_ts_file_path', last_requested_ts_file_path
+            )
+
+    return client_uuid
+
+
+def _process_chunks_m3u8_hls_playlist(
+    chunks_m3u8, client_uuid, do_reduce_hls_stream_delay=True
+):
+    hls_playlist = HLSPlaylist(chunks_m3u8)
+
+    if do_reduce_hls_stream_delay:
+        number_of_segments_to_drop = Provider._calculate_number_of_segments_to_drop(
+            hls_playlist,
+            client_uuid,
+            CHANNEL_NUMBER,
+            number_of_segments_to_keep=NUMBER_OF_SEGMENTS_TO_KEEP,
+        )
+    else:
+        number_of_segments_to_drop = 0
+
+    return hls_playlist.dumps(
+        number_of_segments_to_drop=number_of_segments_to_drop,
+        segment_uri_function=functools.partial(
+            re.sub, SEGMENT_URI_PATTERN, SEGMENT_URI_REPLACEMENT
+        ),
+    )
+
+
+def _process_chunks_m3u8_m3u8(
+    chunks_m3u8, client_uuid, do_reduce_hls_stream_delay=True
+):
+    if do_reduce_hls_stream_delay:
+        chunks_m3u8 = _reduce_hls_stream_delay(
+            chunks_m3u8,
+            client_uuid,
+            CHANNEL_NUMBER,
+            number_of_segments_to_keep=NUMBER_OF_SEGMENTS_TO_KEEP,
+        )
+
+    return re.sub(SEGMENT_URI_PATTERN, SEGMENT_URI_REPLACEMENT, chunks_m3u8)
+
+
+def _reduce_hls_stream_delay(
+    chunks_m3u8, client_uuid, channel_number, number_of_segments_to_keep=3
+):
+    # Provider._reduce_hls_stream_delay before it was replaced by
+    # Provider._calculate_number_of_segments_to_drop
+    do_reduce_hls_stream_delay = False
+
+    try:
+        last_requested_channel_number = IPTVProxy.get_serviceable_client_parameter(
+            client_uuid, 'last_requested_channel_number'
+        )
+
+        if channel_number != last_requested_channel_number:
+            do_reduce_hls_stream_delay = True
+        else:
+            last_requested_ts_file_path = IPTVProxy.get_serviceable_client_parameter(
+                client_uuid, 'last_requested_ts_file_path'
+            )
+
+            m3u8_object = m3u8.loads(chunks_m3u8)
+
+            delete_segments_up_to_index = None
+
+            for (segment_index, segment) in enumerate(m3u8_object.segments):
+                if last_requested_ts_file_path in segment.uri:
+                    delete_segments_up_to_index = segment_index
+
+                    break
+
+            if delete_segments_up_to_index:
+                for _ in range(delete_segments_up_to_index + 1):
+                    m3u8_object.segments.pop(0)
+
+                    m3u8_object.media_sequence += 1
+
+                chunks_m3u8 = m3u8_object.dumps()
+    except KeyError:
+        do_reduce_hls_stream_delay = True
+
+    if do_reduce_hls_stream_delay:
+        m3u8_object = m3u8.loads(chunks_m3u8)
+
+        for _ in range(len(m3u8_object.segments) - number_of_segments_to_keep):
+            m3u8_object.segments.pop(0)
+
+            m3u8_object.media_sequence += 1
+
+        chunks_m3u8 = m3u8_object.dumps()
+
+    return chunks_m3u8
+
+
+def _summarize_chunks_m3u8(chunks_m3u8):
+    m3u8_object = m3u8.loads(chunks_m3u8)
+
+    return (
+        m3u8_object.media_sequence,
+        [
+            (
+                segment.uri,
+                segment.duration,
+                segment.discontinuity,
+                segment.program_date_time,
+                (segment.key.method, segment.key.uri) if segment.key else None,
+                segment.init_section.uri if segment.init_section else None,
+            )
+            for segment in m3u8_object.segments
+        ],
+    )
+
+
+def check_equivalence():
+    number_of_checks = 0
+
+    for number_of_segments in (1, 2, 3, 6, 60):
+        for playlist_options in (
+            {},
+            {'do_rotate_keys': True},
+            {'do_add_map': True},
+            {'do_add_discontinuity': True, 'do_rotate_keys': True},
+        ):
+            chunks_m3u8 = _generate_chunks_m3u8(number_of_segments, **playlist_options)
+
+            # A new client, a client switching channels, a client without a
+            # segment requested yet, and a client that last requested the
+            # first, a middle, the last or a vanished segment of the playlist
+            for (last_requested_channel_number, last_requested_ts_file_path) in (
+                (None, None),
+                ('8', '4000.ts'),
+                (CHANNEL_NUMBER, None),
+                (CHANNEL_NUMBER, '/4000.ts'),
+                (CHANNEL_NUMBER, '/{0}.ts'.format(4000 + number_of_segments // 2)),
+                (CHANNEL_NUMBER, '/{0}.ts'.format(4000 + number_of_segments - 1)),
+                (CHANNEL_NUMBER, '/3999.ts'),
+            ):
+                client_uuid = _create_client(
+                    last_requested_channel_number, last_requested_ts_file_path
+                )
+
+                for do_reduce_hls_stream_delay in (False, True):
+                    expected_summary = _summarize_chunks_m3u8(
+                        _process_chunks_m3u8_m3u8(
+                            chunks_m3u8, client_uuid, do_reduce_hls_stream_delay
+                        )
+                    )
+                    summary = _summarize_chunks_m3u8(
+                        _process_chunks_m3u8_hls_playlist(
+                            chunks_m3u8, client_uuid, do_reduce_hls_stream_delay
+                        )
+                    )
+
+                    if summary != expected_summary:
+                        raise AssertionError(
+                            'HLSPlaylist and m3u8 disagree\n'
+                            'Number of segments => {0}\n'
+                            'Playlist options   => {1}\n'
+                            'Client state       => {2}\n'
+                            'Reduce delay       => {3}\n'
+                            'm3u8               => {4}\n'
+                            'HLSPlaylist        => {5}'.format(
+                                number_of_segments,
+                                playlist_options,
+                                (
+                                    last_requested_channel_number,
+                                    last_requested_ts_file_path,
+                                ),
+                                do_reduce_hls_stream_delay,
+                                expected_summary,
+                                summary,
+                            )
+                        )
+
+                    number_of_checks += 1
+
+    print('HLSPlaylist matches m3u8 in {0} checks'.format(number_of_checks))
+
+
+def benchmark(number_of_repetitions):
+    print(
+        '{0:>8} {1:>7} {2:>16} {3:>16} {4:>8}'.format(
+            'Segments', 'Trimmed', 'm3u8 (us)', 'HLSPlaylist (us)', 'Speedup'
+        )
+    )
+
+    # A live playlist, a 10 minute window and a 2 hour DVR window. A new
+    # client has the playlist trimmed to its last segments
+    client_uuid = _create_client(None, None)
+
+    for number_of_segments in (6, 60, 720):
+        chunks_m3u8 = _generate_chunks_m3u8(number_of_segments, do_rotate_keys=True)
+
+        for do_reduce_hls_stream_delay in (False, True):
+            elapsed_times = []
+
+            for process_chunks_m3u8 in (
+                _process_chunks_m3u8_m3u8,
+                _process_chunks_m3u8_hls_playlist,
+            ):
+                elapsed_times.append(
+                    min(
+                        timeit.repeat(
+                            functools.partial(
+                                process_chunks_m3u8,
+                                chunks_m3u8,
+                                client_uuid,
+                                do_reduce_hls_stream_delay,
+                            ),
+                            number=number_of_repetitions,
+                            repeat=5,
+                        )
+                    )
+                    / number_of_repetitions
+                    * 1e6
+                )
+
+            print(
+                '{0:>8} {1:>7} {2:>16.1f} {3:>16.1f} {4:>7.1f}x'.format(
+                    number_of_segments,
+                    'yes' if do_reduce_hls_stream_delay else 'no',
+                    elapsed_times[0],
+                    elapsed_times[1],
+                    elapsed_times[0] / elapsed_times[1],
+                )
+            )
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(
+        description='Benchmark HLSPlaylist against m3u8.loads/dumps'
+    )
+    argument_parser.add_argument(
+        '--repetitions',
+        default=100,
+        help='Number of times each playlist is processed per measurement',
+        type=int,
+    )
+
+    arguments = argument_parser.parse_args()
+
+    logging.addLevelName(TRACE, 'TRACE')
+    logging.TRACE = TRACE
+    logging.Logger.trace = trace
+
+    check_equivalence()
+
+    benchmark(arguments.repetitions)
+
+
+if __name__ == '__main__':
+    main()
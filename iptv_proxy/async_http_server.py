@@ -0,0 +1,331 @@
+import asyncio
+import http.client
+import logging
+import shutil
+import socket
+import ssl
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Thread
+
+from iptv_proxy.constants import ASYNC_HTTP_SERVER_KEEP_ALIVE_TIMEOUT
+from iptv_proxy.constants import HTTP_CHUNK_SIZE
+from iptv_proxy.constants import HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS
+from iptv_proxy.enums import HTTPRequestPriority
+from iptv_proxy.http_request_dispatcher import HTTPRequestDispatcher
+from iptv_proxy.http_server import HTTPRequestHandler
+from iptv_proxy.http_server import HTTPServerThread
+from iptv_proxy.security import SecurityManager
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPRequestHandler(HTTPRequestHandler):
+    def _write_response_buffers(self, buffers):
+        self.wfile.writelines(buffers)
+
+    def _write_response_file(self):
+        shutil.copyfileobj(self._response_content_file, self.wfile, HTTP_CHUNK_SIZE)
+
+    def finish(self):
+        self.wfile.flush()
+
+    def handle(self):
+        # The request was read off the connection by AsyncHTTPServer which is
+        # also responsible for reading any subsequent kept-alive requests
+        self.close_connection = True
+
+        self.handle_one_request()
+
+    def setup(self):
+        (self.rfile, self.wfile) = self.request
+
+
+class AsyncHTTPResponseWriter(object):
+    __slots__ = ['_buffer', '_loop', '_stream_writer']
+
+    def __init__(self, loop, stream_writer):
+        self._buffer = bytearray()
+        self._loop = loop
+        self._stream_writer = stream_writer
+
+    async def _write(self, data):
+        self._stream_writer.write(data)
+
+        await self._stream_writer.drain()
+
+    def flush(self):
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+
+            # Blocks the worker thread, never the event loop, until the client
+            # has accepted the data
+            asyncio.run_coroutine_threadsafe(self._write(data), self._loop).result()
+
+    def write(self, data):
+        self._buffer.extend(data)
+
+        if len(self._buffer) >= HTTP_CHUNK_SIZE:
+            self.flush()
+
+        return len(data)
+
+    def writelines(self, buffers):
+        for buffer in buffers:
+            self._buffer.extend(buffer)
+
+        if len(self._buffer) >= HTTP_CHUNK_SIZE:
+            self.flush()
+
+
+class AsyncHTTPServer(object):
+    __slots__ = [
+        '_executor',
+        '_is_secure',
+        '_loop',
+        '_maximum_number_of_queued_requests',
+        '_maximum_number_of_workers',
+        '_number_of_rejected_requests',
+        '_number_of_requests',
+        '_number_of_streams',
+        '_server',
+        '_server_socket',
+        '_ssl_context',
+        '_stream_executor',
+    ]
+
+    def __init__(
+        self,
+        server_address,
+        is_secure,
+        maximum_number_of_workers,
+        maximum_number_of_queued_requests,
+    ):
+        self._executor = ThreadPoolExecutor(
+            max_workers=maximum_number_of_workers, thread_name_prefix='AsyncHTTPServer',
+        )
+        self._is_secure = is_secure
+        self._loop = asyncio.new_event_loop()
+        self._maximum_number_of_queued_requests = maximum_number_of_queued_requests
+        self._maximum_number_of_workers = maximum_number_of_workers
+        self._number_of_rejected_requests = {
+            http_request_priority: 0 for http_request_priority in HTTPRequestPriority
+        }
+        self._number_of_requests = 0
+        self._number_of_streams = 0
+        self._server = None
+        self._ssl_context = None
+        self._stream_executor = ThreadPoolExecutor(
+            max_workers=HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS,
+            thread_name_prefix='AsyncHTTPServerStream',
+        )
+
+        if is_secure:
+            self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self._ssl_context.load_cert_chain(
+                SecurityManager.get_certificate_file_path(),
+                keyfile=SecurityManager.get_key_file_path(),
+            )
+
+        # The listening socket is bound right away so that binding happens
+        # while the caller is running as the privileged user
+        self._server_socket = socket.create_server(server_address)
+
+    async def _handle_connection(self, stream_reader, stream_writer):
+        client_address = stream_writer.get_extra_info('peername')[:2]
+
+        try:
+            while True:
+                try:
+                    request_head = await asyncio.wait_for(
+                        stream_reader.readuntil(b'\r\n\r\n'),
+                        ASYNC_HTTP_SERVER_KEEP_ALIVE_TIMEOUT,
+                    )
+
+                    request_headers = http.client.parse_headers(
+                        BytesIO(request_head.split(b'\r\n', 1)[-1])
+                    )
+                    content_length = int(request_headers.get('Content-Length', 0))
+
+                    if content_length:
+                        request_body = await stream_reader.readexactly(content_length)
+                    else:
+                        request_body = b''
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError,
+                    http.client.HTTPException,
+                    ConnectionError,
+                    ValueError,
+                ):
+                    break
+
+                # Requests are serviced by a bounded pool of worker threads as
+                # the request handler and the provider APIs it relies on,
+                # upstream requests included, are blocking. Continuous streams,
+                # which last for as long as the client stays connected, are
+                # serviced by a pool of their own
+                http_request_priority = HTTPRequestDispatcher.determine_request_priority(
+                    request_head
+                )
+
+                if http_request_priority == HTTPRequestPriority.STREAM:
+                    is_rejected = (
+                        self._number_of_streams >= HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS
+                    )
+                else:
+                    is_rejected = (
+                        self._number_of_requests
+                        >= self._maximum_number_of_workers
+                        + self._maximum_number_of_queued_requests
+                    )
+
+                # Once every worker is busy and the queue is full, requests are
+                # rejected rather than queued without bound
+                if is_rejected:
+                    await self._reject_request(
+                        stream_writer, client_address, http_request_priority
+                    )
+
+                    break
+
+                if http_request_priority == HTTPRequestPriority.STREAM:
+                    executor = self._stream_executor
+
+                    self._number_of_streams += 1
+                else:
+                    executor = self._executor
+
+                    self._number_of_requests += 1
+
+                try:
+                    request_handler = await self._loop.run_in_executor(
+                        executor,
+                        AsyncHTTPRequestHandler,
+                        (
+                            BytesIO(request_head + request_body),
+                            AsyncHTTPResponseWriter(self._loop, stream_writer),
+                        ),
+                        client_address,
+                        self,
+                    )
+                finally:
+                    if executor is self._executor:
+                        self._number_of_requests -= 1
+                    else:
+                        self._number_of_streams -= 1
+
+                if request_handler.close_connection:
+                    break
+        except (ConnectionError, ssl.SSLError):
+            pass
+        except Exception:
+            (type_, value_, traceback_) = sys.exc_info()
+            logger.error(
+                '\n'.join(traceback.format_exception(type_, value_, traceback_))
+            )
+        finally:
+            stream_writer.close()
+
+    async def _reject_request(
+        self, stream_writer, client_address, http_request_priority
+    ):
+        self._number_of_rejected_requests[http_request_priority] += 1
+
+        logger.debug(
+            'Rejected request\n'
+            'Client IP address => %s\n'
+            'Lane              => %s\n'
+            'Reason            => Server is saturated',
+            client_address[0],
+            http_request_priority.value,
+        )
+
+        stream_writer.write(HTTPRequestDispatcher.format_service_unavailable_response())
+
+        await stream_writer.drain()
+
+    async def _start_server(self):
+        self._server = await asyncio.start_server(
+            self._handle_connection, sock=self._server_socket, ssl=self._ssl_context,
+        )
+
+    def get_statistics(self):
+        number_of_requests = self._number_of_requests
+
+        queue_depths = {
+            http_request_priority.value: 0
+            for http_request_priority in HTTPRequestPriority
+        }
+        # Requests that are not being serviced by a worker are queued by the
+        # executor in the order in which they were read
+        queue_depths[HTTPRequestPriority.STANDARD.value] = max(
+            number_of_requests - self._maximum_number_of_workers, 0
+        )
+
+        return {
+            'busy_workers': min(number_of_requests, self._maximum_number_of_workers),
+            'maximum_number_of_workers': self._maximum_number_of_workers,
+            'queue_depths': queue_depths,
+            'rejected_requests': {
+                http_request_priority.value: self._number_of_rejected_requests[
+                    http_request_priority
+                ]
+                for http_request_priority in HTTPRequestPriority
+            },
+        }
+
+    def serve_forever(self):
+        asyncio.set_event_loop(self._loop)
+
+        self._loop.run_until_complete(self._start_server())
+        self._loop.run_forever()
+
+        self._server.close()
+
+        connection_tasks = asyncio.all_tasks(self._loop)
+
+        for connection_task in connection_tasks:
+            connection_task.cancel()
+
+        self._loop.run_until_complete(
+            asyncio.gather(*connection_tasks, return_exceptions=True)
+        )
+
+    def server_close(self):
+        self._executor.shutdown(wait=False)
+        self._stream_executor.shutdown(wait=False)
+        self._loop.close()
+
+    def shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    @property
+    def is_secure(self):
+        return self._is_secure
+
+
+class AsyncHTTPServerThread(HTTPServerThread):
+    def __init__(
+        self,
+        server_address,
+        is_secure,
+        maximum_number_of_workers,
+        maximum_number_of_queued_requests,
+    ):
+        Thread.__init__(self)
+
+        self._is_secure = is_secure
+        self._server_address = server_address
+        self._iptv_proxy_http_server = AsyncHTTPServer(
+            self._server_address,
+            is_secure,
+            maximum_number_of_workers,
+            maximum_number_of_queued_requests,
+        )
+
+        self.daemon = True
@@ -1,7 +1,9 @@
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from datetime import timedelta
 from threading import Event
+from threading import Lock
 from threading import Timer
 
 import pytz
@@ -15,6 +17,31 @@ from iptv_proxy.enums import CacheResponseType
 logger = logging.getLogger(__name__)
 
 
+class CacheBucket(object):
+    __slots__ = ['_cache_entries', '_is_deleted', '_lock']
+
+    def __init__(self):
+        self._cache_entries = {}
+        self._is_deleted = False
+        self._lock = Lock()
+
+    @property
+    def cache_entries(self):
+        return self._cache_entries
+
+    @property
+    def is_deleted(self):
+        return self._is_deleted
+
+    @is_deleted.setter
+    def is_deleted(self, is_deleted):
+        self._is_deleted = is_deleted
+
+    @property
+    def lock(self):
+        return self._lock
+
+
 class CacheEntry(object):
     __slots__ = [
         '_creation_date_time_in_utc',
@@ -57,10 +84,61 @@ class CacheEntry(object):
 class CacheManager:
     __slots__ = []
 
-    _cache = {}
+    # Locking is striped to keep concurrent channels from contending with
+    # each other
+    #   _lock                => Settings
+    #   _cache_buckets_lock  => The map of cache buckets & the cleanup timer
+    #   CacheBucket.lock     => The entries of a single provider's channel
+    #   _accounting_lock     => LRU order, sizes & statistics
+    # No lock is ever held while waiting on a soft hit, and the accounting
+    # lock is never acquired while holding a cache bucket lock or vice versa
+    _accounting_lock = Lock()
+    _cache_buckets = {}
+    _cache_buckets_lock = Lock()
+    _cache_max_bytes = 268435456
+    _cache_max_bytes_per_channel = None
+    _cache_max_bytes_per_provider = None
     _cleanup_cache_timer = None
     _do_cache_downloaded_segments = True
     _lock = RWLock()
+    _lru_cache_entries = OrderedDict()
+    _number_of_evictions = 0
+    _number_of_expirations = 0
+    _number_of_hard_hits = 0
+    _number_of_misses = 0
+    _number_of_rejections = 0
+    _number_of_soft_hits = 0
+    _sizes_in_bytes = {}
+
+    @classmethod
+    def _acquire_cache_bucket(cls, provider, channel_number):
+        while True:
+            with cls._cache_buckets_lock:
+                try:
+                    cache_bucket = cls._cache_buckets[(provider, channel_number)]
+                except KeyError:
+                    cache_bucket = CacheBucket()
+
+                    cls._cache_buckets[(provider, channel_number)] = cache_bucket
+
+                    logger.trace(
+                        'Created cache bucket\n'
+                        'Provider       => %s\n'
+                        'Channel number => %s',
+                        provider,
+                        channel_number,
+                    )
+
+                cls._start_cleanup_cache_timer()
+
+            cache_bucket.lock.acquire()
+
+            # The cleanup timer may have deleted the cache bucket between
+            # retrieving it and acquiring its lock
+            if not cache_bucket.is_deleted:
+                return cache_bucket
+
+            cache_bucket.lock.release()
 
     @classmethod
     def _cleanup_cache(cls):
@@ -71,67 +149,182 @@ class CacheManager:
             current_date_time_in_utc,
         )
 
-        with cls._lock.writer_lock:
-            for provider in cls._cache:
-                for channel_number in list(cls._cache[provider].keys()):
-                    cache_bucket = cls._cache[provider][channel_number]
-
-                    for segment_file_name in list(cache_bucket.keys()):
-                        cache_entry = cache_bucket[segment_file_name]
-
-                        if (
-                            cache_entry.expiry_date_time_in_utc
-                            and current_date_time_in_utc
-                            > cache_entry.expiry_date_time_in_utc
-                        ) or (
-                            cache_entry.segment_file_content is None
-                            and current_date_time_in_utc
-                            > cache_entry.creation_date_time_in_utc
-                            + timedelta(seconds=CACHE_TIME_TO_LIVE)
-                        ):
-                            del cache_bucket[segment_file_name]
-
-                            logger.trace(
-                                'Deleted expired cache entry\n'
-                                'Provider             => %s\n'
-                                'Channel number       => %s\n'
-                                'Segment file name    => %s\n'
-                                'Creation date & time => %s\n'
-                                'Expiry date & time   => %s',
-                                provider,
-                                channel_number,
-                                segment_file_name,
-                                cache_entry.expiry_date_time_in_utc,
-                                cache_entry.creation_date_time_in_utc,
+        with cls._cache_buckets_lock:
+            cache_buckets = list(cls._cache_buckets.items())
+
+        expired_cache_entries = []
+
+        for ((provider, channel_number), cache_bucket) in cache_buckets:
+            with cache_bucket.lock:
+                for segment_file_name in list(cache_bucket.cache_entries):
+                    cache_entry = cache_bucket.cache_entries[segment_file_name]
+
+                    if (
+                        cache_entry.expiry_date_time_in_utc
+                        and current_date_time_in_utc
+                        > cache_entry.expiry_date_time_in_utc
+                    ) or (
+                        cache_entry.segment_file_content is None
+                        and current_date_time_in_utc
+                        > cache_entry.creation_date_time_in_utc
+                        + timedelta(seconds=CACHE_TIME_TO_LIVE)
+                    ):
+                        del cache_bucket.cache_entries[segment_file_name]
+
+                        if cache_entry.segment_file_content is not None:
+                            expired_cache_entries.append(
+                                (
+                                    (provider, channel_number, segment_file_name),
+                                    cache_entry,
+                                )
                             )
 
-                    if not cache_bucket:
-                        del cls._cache[provider][channel_number]
+                        logger.trace(
+                            'Deleted expired cache entry\n'
+                            'Provider             => %s\n'
+                            'Channel number       => %s\n'
+                            'Segment file name    => %s\n'
+                            'Creation date & time => %s\n'
+                            'Expiry date & time   => %s',
+                            provider,
+                            channel_number,
+                            segment_file_name,
+                            cache_entry.creation_date_time_in_utc,
+                            cache_entry.expiry_date_time_in_utc,
+                        )
+
+        with cls._accounting_lock:
+            for (cache_entry_key, cache_entry) in expired_cache_entries:
+                if cls._untrack_cache_entry(cache_entry_key, cache_entry):
+                    cls._number_of_expirations += 1
+
+        with cls._cache_buckets_lock:
+            for (cache_bucket_key, cache_bucket) in list(cls._cache_buckets.items()):
+                with cache_bucket.lock:
+                    if not cache_bucket.cache_entries:
+                        cache_bucket.is_deleted = True
+
+                        del cls._cache_buckets[cache_bucket_key]
 
                         logger.trace(
                             'Deleted expired cache bucket\n'
                             'Provider       => %s\n'
                             'Channel number => %s',
-                            provider,
-                            channel_number,
+                            cache_bucket_key[0],
+                            cache_bucket_key[1],
                         )
 
-            for provider in cls._cache:
-                if cls._cache[provider]:
-                    cls._cleanup_cache_timer = Timer(
-                        CACHE_TIME_TO_LIVE, cls._cleanup_cache
-                    )
-                    cls._cleanup_cache_timer.daemon = True
-                    cls._cleanup_cache_timer.start()
-
-                    break
+            if cls._cache_buckets:
+                cls._cleanup_cache_timer = Timer(CACHE_TIME_TO_LIVE, cls._cleanup_cache)
+                cls._cleanup_cache_timer.daemon = True
+                cls._cleanup_cache_timer.start()
             else:
                 cls._cleanup_cache_timer = None
 
                 logger.debug('Deleted all cache buckets')
 
+    @classmethod
+    def _delete_evicted_cache_entries(cls, evicted_cache_entries):
+        for (cache_entry_key, cache_entry) in evicted_cache_entries:
+            (provider, channel_number, segment_file_name) = cache_entry_key
+
+            with cls._cache_buckets_lock:
+                cache_bucket = cls._cache_buckets.get((provider, channel_number))
+
+            if cache_bucket is not None:
+                with cache_bucket.lock:
+                    if cache_bucket.cache_entries.get(segment_file_name) is cache_entry:
+                        del cache_bucket.cache_entries[segment_file_name]
+
+            logger.trace(
+                'Evicted cache entry\n'
+                'Provider          => %s\n'
+                'Channel number    => %s\n'
+                'Segment file name => %s\n'
+                'Size in bytes     => %s',
+                provider,
+                channel_number,
+                segment_file_name,
+                len(cache_entry.segment_file_content),
+            )
+
+    @classmethod
+    def _enforce_cache_quotas(cls):
+        maximum_sizes_in_bytes = cls._get_maximum_sizes_in_bytes()
+        evicted_cache_entries = []
+
+        with cls._accounting_lock:
+            for cache_entry_key_prefix in list(cls._sizes_in_bytes):
+                maximum_size_in_bytes = maximum_sizes_in_bytes[
+                    len(cache_entry_key_prefix)
+                ]
+
+                if maximum_size_in_bytes is not None:
+                    cls._evict_cache_entries(
+                        cache_entry_key_prefix,
+                        maximum_size_in_bytes,
+                        evicted_cache_entries,
+                    )
+
+        cls._delete_evicted_cache_entries(evicted_cache_entries)
+
+    @classmethod
+    def _evict_cache_entries(
+        cls, cache_entry_key_prefix, maximum_size_in_bytes, evicted_cache_entries
+    ):
+        # Entries are kept in least recently used order. Walk them from the
+        # oldest and evict those that fall within the prefix (Everything,
+        # a provider, or a provider's channel) until it is back within quota
+        for (cache_entry_key, cache_entry) in list(cls._lru_cache_entries.items()):
+            if (
+                cls._sizes_in_bytes.get(cache_entry_key_prefix, 0)
+                <= maximum_size_in_bytes
+            ):
+                break
+
+            if cache_entry_key[: len(cache_entry_key_prefix)] == cache_entry_key_prefix:
+                cls._untrack_cache_entry(cache_entry_key, cache_entry)
+
+                cls._number_of_evictions += 1
+
+                evicted_cache_entries.append((cache_entry_key, cache_entry))
+
+    @classmethod
+    def _get_maximum_sizes_in_bytes(cls):
+        with cls._lock.reader_lock:
+            return (
+                cls._cache_max_bytes,
+                cls._cache_max_bytes_per_provider,
+                cls._cache_max_bytes_per_channel,
+            )
+
     @classmethod
     def _initialize_class_variables(cls):
+        try:
+            cls.set_cache_max_bytes(
+                OptionalSettings.get_optional_settings_parameter('cache_max_bytes')
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_cache_max_bytes_per_channel(
+                OptionalSettings.get_optional_settings_parameter(
+                    'cache_max_bytes_per_channel'
+                )
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_cache_max_bytes_per_provider(
+                OptionalSettings.get_optional_settings_parameter(
+                    'cache_max_bytes_per_provider'
+                )
+            )
+        except KeyError:
+            pass
+
         try:
             cls.set_do_cache_downloaded_segments(
                 OptionalSettings.get_optional_settings_parameter(
@@ -143,11 +336,11 @@ class CacheManager:
 
     @classmethod
     def _query_cache(cls, provider, channel_number, segment_file_name):
-        if provider in cls._cache and channel_number in cls._cache[provider]:
-            cache_bucket = cls._cache[provider][channel_number]
+        cache_bucket = cls._acquire_cache_bucket(provider, channel_number)
 
-            if segment_file_name in cache_bucket:
-                cache_entry = cache_bucket[segment_file_name]
+        try:
+            if segment_file_name in cache_bucket.cache_entries:
+                cache_entry = cache_bucket.cache_entries[segment_file_name]
 
                 # Expiry date for a cache entry is set to
                 # CACHE_TIME_TO_LIVE seconds following the last time the
@@ -186,7 +379,7 @@ class CacheManager:
                 cache_entry = None
                 cache_response_type = CacheResponseType.MISS
 
-                cache_bucket[segment_file_name] = CacheEntry()
+                cache_bucket.cache_entries[segment_file_name] = CacheEntry()
 
                 logger.trace(
                     'Cache response\n'
@@ -208,39 +401,86 @@ class CacheManager:
                     channel_number,
                     segment_file_name,
                 )
-        else:
-            cache_entry = None
-            cache_response_type = CacheResponseType.MISS
+        finally:
+            cache_bucket.lock.release()
 
-            if provider not in cls._cache:
-                cls._cache[provider] = {}
+        if cache_response_type == CacheResponseType.HARD_HIT:
+            with cls._accounting_lock:
+                cache_entry_key = (provider, channel_number, segment_file_name)
 
-            cls._cache[provider][channel_number] = {}
-            cls._cache[provider][channel_number][segment_file_name] = CacheEntry()
+                if cls._lru_cache_entries.get(cache_entry_key) is cache_entry:
+                    cls._lru_cache_entries.move_to_end(cache_entry_key)
 
-            logger.trace(
-                'Created cache bucket & entry\n'
-                'Provider          => %s\n'
-                'Channel number    => %s\n'
-                'Segment file name => %s',
-                provider,
-                channel_number,
-                segment_file_name,
+        return CacheResponse(cache_entry, cache_response_type)
+
+    @classmethod
+    def _start_cleanup_cache_timer(cls):
+        if cls._cleanup_cache_timer is None:
+            cls._cleanup_cache_timer = Timer(CACHE_TIME_TO_LIVE, cls._cleanup_cache)
+            cls._cleanup_cache_timer.daemon = True
+            cls._cleanup_cache_timer.start()
+
+    @classmethod
+    def _untrack_cache_entry(cls, cache_entry_key, cache_entry):
+        if cls._lru_cache_entries.get(cache_entry_key) is not cache_entry:
+            return False
+
+        del cls._lru_cache_entries[cache_entry_key]
+
+        for cache_entry_key_prefix in (
+            (),
+            cache_entry_key[:1],
+            cache_entry_key[:2],
+        ):
+            cls._sizes_in_bytes[cache_entry_key_prefix] -= len(
+                cache_entry.segment_file_content
             )
 
-        if cache_response_type == CacheResponseType.MISS:
-            if cls._cleanup_cache_timer is None:
-                cls._cleanup_cache_timer = Timer(CACHE_TIME_TO_LIVE, cls._cleanup_cache)
-                cls._cleanup_cache_timer.daemon = True
-                cls._cleanup_cache_timer.start()
+            if not cls._sizes_in_bytes[cache_entry_key_prefix]:
+                del cls._sizes_in_bytes[cache_entry_key_prefix]
 
-        return CacheResponse(cache_entry, cache_response_type)
+        return True
 
     @classmethod
     def cancel_cleanup_cache_timer(cls):
         if cls._cleanup_cache_timer:
             cls._cleanup_cache_timer.cancel()
 
+    @classmethod
+    def get_do_cache_downloaded_segments(cls):
+        with cls._lock.reader_lock:
+            return cls._do_cache_downloaded_segments
+
+    @classmethod
+    def get_statistics(cls):
+        with cls._accounting_lock:
+            return {
+                'channel_sizes_in_bytes': {
+                    cache_entry_key_prefix: size_in_bytes
+                    for (
+                        cache_entry_key_prefix,
+                        size_in_bytes,
+                    ) in cls._sizes_in_bytes.items()
+                    if len(cache_entry_key_prefix) == 2
+                },
+                'number_of_entries': len(cls._lru_cache_entries),
+                'number_of_evictions': cls._number_of_evictions,
+                'number_of_expirations': cls._number_of_expirations,
+                'number_of_hard_hits': cls._number_of_hard_hits,
+                'number_of_misses': cls._number_of_misses,
+                'number_of_rejections': cls._number_of_rejections,
+                'number_of_soft_hits': cls._number_of_soft_hits,
+                'provider_sizes_in_bytes': {
+                    cache_entry_key_prefix[0]: size_in_bytes
+                    for (
+                        cache_entry_key_prefix,
+                        size_in_bytes,
+                    ) in cls._sizes_in_bytes.items()
+                    if len(cache_entry_key_prefix) == 1
+                },
+                'size_in_bytes': cls._sizes_in_bytes.get((), 0),
+            }
+
     @classmethod
     def initialize(cls):
         cls._initialize_class_variables()
@@ -250,16 +490,37 @@ class CacheManager:
         segment_file_content = None
 
         with cls._lock.reader_lock:
-            if cls._do_cache_downloaded_segments:
-                logger.trace(
-                    'Querying cache\n'
-                    'Provider          => %s\n'
-                    'Channel number    => %s\n'
-                    'Segment file name => %s',
-                    provider,
-                    channel_number,
-                    segment_file_name,
-                )
+            do_cache_downloaded_segments = cls._do_cache_downloaded_segments
+
+        if do_cache_downloaded_segments:
+            logger.trace(
+                'Querying cache\n'
+                'Provider          => %s\n'
+                'Channel number    => %s\n'
+                'Segment file name => %s',
+                provider,
+                channel_number,
+                segment_file_name,
+            )
+
+            cache_response = cls._query_cache(
+                provider, channel_number, segment_file_name
+            )
+
+            # A soft hit is counted once even though the cache is queried again
+            # once the entry is primed
+            with cls._accounting_lock:
+                if cache_response.response_type == CacheResponseType.HARD_HIT:
+                    cls._number_of_hard_hits += 1
+                elif cache_response.response_type == CacheResponseType.SOFT_HIT:
+                    cls._number_of_soft_hits += 1
+                else:
+                    cls._number_of_misses += 1
+
+            if cache_response.response_type == CacheResponseType.HARD_HIT:
+                segment_file_content = cache_response.entry.segment_file_content
+            elif cache_response.response_type == CacheResponseType.SOFT_HIT:
+                cache_response.entry.primed_event.wait(CACHE_WAIT_TIME)
 
                 cache_response = cls._query_cache(
                     provider, channel_number, segment_file_name
@@ -267,17 +528,29 @@ class CacheManager:
 
                 if cache_response.response_type == CacheResponseType.HARD_HIT:
                     segment_file_content = cache_response.entry.segment_file_content
-                elif cache_response.response_type == CacheResponseType.SOFT_HIT:
-                    cache_response.entry.primed_event.wait(CACHE_WAIT_TIME)
 
-                    cache_response = cls._query_cache(
-                        provider, channel_number, segment_file_name
-                    )
+        return segment_file_content
+
+    @classmethod
+    def set_cache_max_bytes(cls, cache_max_bytes):
+        with cls._lock.writer_lock:
+            cls._cache_max_bytes = cache_max_bytes
 
-                    if cache_response.response_type == CacheResponseType.HARD_HIT:
-                        segment_file_content = cache_response.entry.segment_file_content
+        cls._enforce_cache_quotas()
 
-        return segment_file_content
+    @classmethod
+    def set_cache_max_bytes_per_channel(cls, cache_max_bytes_per_channel):
+        with cls._lock.writer_lock:
+            cls._cache_max_bytes_per_channel = cache_max_bytes_per_channel
+
+        cls._enforce_cache_quotas()
+
+    @classmethod
+    def set_cache_max_bytes_per_provider(cls, cache_max_bytes_per_provider):
+        with cls._lock.writer_lock:
+            cls._cache_max_bytes_per_provider = cache_max_bytes_per_provider
+
+        cls._enforce_cache_quotas()
 
     @classmethod
     def set_do_cache_downloaded_segments(cls, do_cache_downloaded_segments):
@@ -288,50 +561,117 @@ class CacheManager:
     def update_cache(
         cls, provider, channel_number, segment_file_name, segment_file_content
     ):
-        with cls._lock.writer_lock:
-            if cls._do_cache_downloaded_segments:
-                try:
-                    cache_bucket = cls._cache[provider][channel_number]
+        with cls._lock.reader_lock:
+            do_cache_downloaded_segments = cls._do_cache_downloaded_segments
 
-                    try:
-                        cache_entry = cache_bucket[segment_file_name]
-                    except KeyError:
-                        cache_entry = CacheEntry()
+        if not do_cache_downloaded_segments:
+            return
 
-                        cache_bucket[segment_file_name] = cache_entry
-                except KeyError:
-                    cache_entry = CacheEntry()
+        cache_entry_key = (provider, channel_number, segment_file_name)
+        cache_entry_key_prefixes = (
+            (),
+            cache_entry_key[:1],
+            cache_entry_key[:2],
+        )
+        maximum_sizes_in_bytes = cls._get_maximum_sizes_in_bytes()
+        segment_file_size_in_bytes = len(segment_file_content)
 
-                    cls._cache[provider][channel_number] = {}
-                    cls._cache[provider][channel_number][
-                        segment_file_name
-                    ] = cache_entry
+        cache_bucket = cls._acquire_cache_bucket(provider, channel_number)
 
-                cache_entry.segment_file_content = segment_file_content
+        try:
+            try:
+                cache_entry = cache_bucket.cache_entries[segment_file_name]
+            except KeyError:
+                cache_entry = CacheEntry()
+
+                cache_bucket.cache_entries[segment_file_name] = cache_entry
+
+            if any(
+                maximum_size_in_bytes is not None
+                and segment_file_size_in_bytes > maximum_size_in_bytes
+                for maximum_size_in_bytes in maximum_sizes_in_bytes
+            ):
+                # The segment can never fit within its quotas. Drop the entry
+                # and wake up anyone waiting on it so they can download the
+                # segment themselves
+                if cache_entry.segment_file_content is None:
+                    del cache_bucket.cache_entries[segment_file_name]
+
+                    cache_entry.primed_event.set()
+
+                is_cache_entry_rejected = True
+            else:
+                is_cache_entry_rejected = False
 
                 cache_entry.expiry_date_time_in_utc = datetime.now(
                     pytz.utc
                 ) + timedelta(seconds=CACHE_TIME_TO_LIVE)
-                cache_entry.primed_event.set()
 
-                if cls._cleanup_cache_timer is None:
-                    cls._cleanup_cache_timer = Timer(
-                        CACHE_TIME_TO_LIVE, cls._cleanup_cache
+                if cache_entry.segment_file_content is None:
+                    cache_entry.segment_file_content = segment_file_content
+                    cache_entry.primed_event.set()
+                else:
+                    # Another download of the same segment primed the entry
+                    # first. Its content is already accounted for
+                    cache_entry = None
+        finally:
+            cache_bucket.lock.release()
+
+        if is_cache_entry_rejected:
+            with cls._accounting_lock:
+                cls._number_of_rejections += 1
+
+            logger.trace(
+                'Rejected cache entry\n'
+                'Provider          => %s\n'
+                'Channel number    => %s\n'
+                'Segment file name => %s\n'
+                'Size in bytes     => %s',
+                provider,
+                channel_number,
+                segment_file_name,
+                segment_file_size_in_bytes,
+            )
+
+            return
+
+        if cache_entry is not None:
+            evicted_cache_entries = []
+
+            with cls._accounting_lock:
+                cls._lru_cache_entries[cache_entry_key] = cache_entry
+
+                for cache_entry_key_prefix in cache_entry_key_prefixes:
+                    cls._sizes_in_bytes[cache_entry_key_prefix] = (
+                        cls._sizes_in_bytes.get(cache_entry_key_prefix, 0)
+                        + segment_file_size_in_bytes
                     )
-                    cls._cleanup_cache_timer.daemon = True
-                    cls._cleanup_cache_timer.start()
 
-                logger.trace(
-                    'Updated cache entry\n'
-                    'Provider           => %s\n'
-                    'Channel number     => %s\n'
-                    'Segment file name  => %s\n'
-                    'Expiry date & time => %s',
-                    provider,
-                    channel_number,
-                    segment_file_name,
-                    cache_entry.expiry_date_time_in_utc,
-                )
+                for cache_entry_key_prefix in reversed(cache_entry_key_prefixes):
+                    maximum_size_in_bytes = maximum_sizes_in_bytes[
+                        len(cache_entry_key_prefix)
+                    ]
+
+                    if maximum_size_in_bytes is not None:
+                        cls._evict_cache_entries(
+                            cache_entry_key_prefix,
+                            maximum_size_in_bytes,
+                            evicted_cache_entries,
+                        )
+
+            cls._delete_evicted_cache_entries(evicted_cache_entries)
+
+            logger.trace(
+                'Updated cache entry\n'
+                'Provider           => %s\n'
+                'Channel number     => %s\n'
+                'Segment file name  => %s\n'
+                'Expiry date & time => %s',
+                provider,
+                channel_number,
+                segment_file_name,
+                cache_entry.expiry_date_time_in_utc,
+            )
 
 
 class CacheResponse:
@@ -0,0 +1,86 @@
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedTransferEncoder(object):
+    __slots__ = [
+        '_chunk_size',
+        '_gzip_compressor',
+        '_pending_buffers',
+        '_pending_buffers_size',
+        '_pending_text',
+        '_pending_text_size',
+        '_write_buffers',
+    ]
+
+    def __init__(self, write_buffers, chunk_size, do_gzip=False):
+        self._chunk_size = chunk_size
+        self._gzip_compressor = None
+        self._pending_buffers = []
+        self._pending_buffers_size = 0
+        self._pending_text = []
+        self._pending_text_size = 0
+        self._write_buffers = write_buffers
+
+        if do_gzip:
+            self._gzip_compressor = zlib.compressobj(
+                9, zlib.DEFLATED, zlib.MAX_WBITS | 16, zlib.DEF_MEM_LEVEL, 0
+            )
+
+    def _append_buffer(self, buffer):
+        if buffer:
+            # Slicing a memoryview references the content rather than copying it
+            self._pending_buffers.append(memoryview(buffer))
+            self._pending_buffers_size += len(buffer)
+
+    def _encode_content(self, content):
+        if self._gzip_compressor:
+            content = self._gzip_compressor.compress(content)
+
+        self._append_buffer(content)
+
+    def _encode_pending_text(self):
+        if self._pending_text:
+            # Text pieces are encoded once per chunk rather than one at a time
+            self._encode_content(''.join(self._pending_text).encode())
+
+            self._pending_text = []
+            self._pending_text_size = 0
+
+    def _write_chunk(self):
+        if self._pending_buffers_size:
+            self._write_buffers(
+                [
+                    '{0:X}\r\n'.format(self._pending_buffers_size).encode(),
+                    *self._pending_buffers,
+                    b'\r\n',
+                ]
+            )
+
+            self._pending_buffers = []
+            self._pending_buffers_size = 0
+
+    def close(self):
+        self._encode_pending_text()
+
+        if self._gzip_compressor:
+            self._append_buffer(self._gzip_compressor.flush())
+
+        self._write_chunk()
+        self._write_buffers([b'0\r\n\r\n'])
+
+    def write(self, content):
+        if isinstance(content, str):
+            self._pending_text.append(content)
+            self._pending_text_size += len(content)
+
+            if self._pending_text_size >= self._chunk_size:
+                self._encode_pending_text()
+        else:
+            self._encode_pending_text()
+            self._encode_content(content)
+
+        if self._pending_buffers_size >= self._chunk_size:
+            self._write_chunk()
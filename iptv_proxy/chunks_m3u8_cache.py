@@ -0,0 +1,169 @@
+import logging
+import time
+from threading import Lock
+
+import requests
+from rwlock import RWLock
+
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import CHUNKS_M3U8_CACHE_TIME_TO_LIVE_RATIO
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.utilities import Utility
+
+logger = logging.getLogger(__name__)
+
+
+class ChunksM3U8CacheEntry(object):
+    __slots__ = ['_expiry_time', '_hls_playlist', '_response']
+
+    def __init__(self, response, hls_playlist, expiry_time):
+        self._expiry_time = expiry_time
+        self._hls_playlist = hls_playlist
+        self._response = response
+
+    @property
+    def expiry_time(self):
+        return self._expiry_time
+
+    @property
+    def hls_playlist(self):
+        return self._hls_playlist
+
+    @property
+    def response(self):
+        return self._response
+
+
+class ChunksM3U8Cache(object):
+    __slots__ = []
+
+    _chunks_m3u8_cache_entries = {}
+    _do_cache_chunks_m3u8 = True
+    _do_cache_chunks_m3u8_lock = RWLock()
+    _lock = Lock()
+
+    @classmethod
+    def _download_chunks_m3u8(
+        cls, key, requests_http_method, url, params=None, headers=None, cookies=None
+    ):
+        response = Utility.make_http_request(
+            requests_http_method, url, params=params, headers=headers, cookies=cookies
+        )
+
+        if response.status_code != requests.codes.OK:
+            return (response, None)
+
+        hls_playlist = HLSPlaylist(response.text)
+
+        # A live media playlist is refreshed by the provider every target
+        # duration. Caching it for a fraction of that guarantees that clients
+        # never lag more than that fraction behind the provider
+        if key is not None and hls_playlist.target_duration:
+            current_time = time.monotonic()
+
+            with cls._lock:
+                for expired_key in [
+                    chunks_m3u8_cache_key
+                    for (
+                        chunks_m3u8_cache_key,
+                        chunks_m3u8_cache_entry,
+                    ) in cls._chunks_m3u8_cache_entries.items()
+                    if chunks_m3u8_cache_entry.expiry_time <= current_time
+                ]:
+                    del cls._chunks_m3u8_cache_entries[expired_key]
+
+                cls._chunks_m3u8_cache_entries[key] = ChunksM3U8CacheEntry(
+                    response,
+                    hls_playlist,
+                    current_time
+                    + hls_playlist.target_duration
+                    * CHUNKS_M3U8_CACHE_TIME_TO_LIVE_RATIO,
+                )
+
+        return (response, hls_playlist)
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_do_cache_chunks_m3u8(
+                OptionalSettings.get_optional_settings_parameter('cache_chunks_m3u8')
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def download_chunks_m3u8(
+        cls,
+        provider_name,
+        requests_http_method,
+        url,
+        params=None,
+        headers=None,
+        cookies=None,
+    ):
+        with cls._do_cache_chunks_m3u8_lock.reader_lock:
+            do_cache_chunks_m3u8 = cls._do_cache_chunks_m3u8
+
+        if not do_cache_chunks_m3u8:
+            return cls._download_chunks_m3u8(
+                None,
+                requests_http_method,
+                url,
+                params=params,
+                headers=headers,
+                cookies=cookies,
+            )
+
+        # The URL names the provider's playlist of a channel while the query
+        # string parameters carry the upstream session (nimblesessionid,
+        # wmsAuthSign, tokens, ...) of the client requesting it. Entries are
+        # keyed by the URL alone so that the playlist of a channel is fetched
+        # through one upstream session for every client and recording of the
+        # channel. The segment URIs it lists carry that session, and callers
+        # only rewrite the parameters identifying the client
+        key = ('chunks_m3u8', provider_name, url)
+
+        with cls._lock:
+            try:
+                chunks_m3u8_cache_entry = cls._chunks_m3u8_cache_entries[key]
+
+                if chunks_m3u8_cache_entry.expiry_time > time.monotonic():
+                    logger.trace(
+                        'Served chunks.m3u8 from the cache\n'
+                        'Provider => %s\n'
+                        'URL      => %s',
+                        provider_name,
+                        url,
+                    )
+
+                    return (
+                        chunks_m3u8_cache_entry.response,
+                        chunks_m3u8_cache_entry.hls_playlist,
+                    )
+            except KeyError:
+                pass
+
+        return SingleFlightManager.do_call(
+            key,
+            cls._download_chunks_m3u8,
+            key,
+            requests_http_method,
+            url,
+            params=params,
+            headers=headers,
+            cookies=cookies,
+        )
+
+    @classmethod
+    def initialize(cls):
+        cls._initialize_class_variables()
+
+    @classmethod
+    def set_do_cache_chunks_m3u8(cls, do_cache_chunks_m3u8):
+        with cls._do_cache_chunks_m3u8_lock.writer_lock:
+            cls._do_cache_chunks_m3u8 = do_cache_chunks_m3u8
+
+        if not do_cache_chunks_m3u8:
+            with cls._lock:
+                cls._chunks_m3u8_cache_entries.clear()
@@ -14,6 +14,7 @@ from watchdog.observers import Observer
 
 from iptv_proxy.constants import DEFAULT_HOSTNAME_LOOPBACK
 from iptv_proxy.db import Database
+from iptv_proxy.playlist_template_cache import PlaylistTemplateCache
 from iptv_proxy.providers import ProvidersController
 from iptv_proxy.utilities import Utility
 from iptv_proxy.watchdog_events import FileSystemEventHandler
@@ -84,6 +85,7 @@ class Configuration(object):
         with cls._lock.writer_lock:
             message_to_log = []
 
+            invalidate_epg_artifacts = False
             purge_http_sessions = False
             restart_http_server = False
             restart_https_server = False
@@ -92,6 +94,7 @@ class Configuration(object):
                 cls._configuration['SERVER_PASSWORD']
                 != cls._previous_configuration['SERVER_PASSWORD']
             ):
+                invalidate_epg_artifacts = True
                 purge_http_sessions = True
 
                 message_to_log.append(
@@ -153,12 +156,14 @@ class Configuration(object):
                 or private_hostname_updated
                 or public_hostname_updated
             ):
+                invalidate_epg_artifacts = True
                 restart_https_server = True
 
             if (
                 cls._configuration['SERVER_HTTP_PORT']
                 != cls._previous_configuration['SERVER_HTTP_PORT']
             ):
+                invalidate_epg_artifacts = True
                 restart_http_server = True
 
                 message_to_log.append(
@@ -173,6 +178,7 @@ class Configuration(object):
                 cls._configuration['SERVER_HTTPS_PORT']
                 != cls._previous_configuration['SERVER_HTTPS_PORT']
             ):
+                invalidate_epg_artifacts = True
                 restart_https_server = True
 
                 message_to_log.append(
@@ -183,6 +189,14 @@ class Configuration(object):
                     cls._configuration['SERVER_HTTPS_PORT'],
                 )
 
+            if invalidate_epg_artifacts:
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.epg_artifact_cache import EPGArtifactCache
+
+                message_to_log.append('Action => Invalidate all EPG artifacts')
+
+                EPGArtifactCache.invalidate()
+
             if purge_http_sessions:
                 # pylint: disable=import-outside-toplevel
                 from iptv_proxy.http_server import HTTPRequestHandler
@@ -233,6 +247,9 @@ class Configuration(object):
             if message_to_log:
                 logger.debug('\n'.join(message_to_log))
 
+            # Static playlist templates embed the providers' configuration
+            PlaylistTemplateCache.invalidate()
+
             for provider_name in sorted(ProvidersController.get_providers_map_class()):
                 ProvidersController.get_provider_map_class(
                     provider_name
@@ -713,6 +730,36 @@ class OptionalSettings(object):
         with cls._lock.writer_lock:
             message_to_log = []
 
+            restart_http_servers = False
+
+            if 'cache_chunks_m3u8' not in cls._optional_settings:
+                cls._optional_settings['cache_chunks_m3u8'] = True
+
+            if 'cache_chunks_m3u8' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['cache_chunks_m3u8'] = True
+
+            if (
+                cls._optional_settings['cache_chunks_m3u8']
+                != cls._previous_optional_settings['cache_chunks_m3u8']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.chunks_m3u8_cache import ChunksM3U8Cache
+
+                message_to_log.append(
+                    'Detected a change in the cache_chunks_m3u8 setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings['cache_chunks_m3u8']
+                        ),
+                        json.dumps(cls._optional_settings['cache_chunks_m3u8']),
+                    )
+                )
+
+                ChunksM3U8Cache.set_do_cache_chunks_m3u8(
+                    cls._optional_settings['cache_chunks_m3u8']
+                )
+
             if 'cache_downloaded_segments' not in cls._optional_settings:
                 cls._optional_settings['cache_downloaded_segments'] = True
 
@@ -741,6 +788,133 @@ class OptionalSettings(object):
                     cls._optional_settings['cache_downloaded_segments']
                 )
 
+            if 'cache_max_bytes' not in cls._optional_settings:
+                cls._optional_settings['cache_max_bytes'] = 268435456
+
+            if 'cache_max_bytes' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['cache_max_bytes'] = 268435456
+
+            if (
+                cls._optional_settings['cache_max_bytes']
+                != cls._previous_optional_settings['cache_max_bytes']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.cache import CacheManager
+
+                message_to_log.append(
+                    'Detected a change in the cache_max_bytes setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(cls._previous_optional_settings['cache_max_bytes']),
+                        json.dumps(cls._optional_settings['cache_max_bytes']),
+                    )
+                )
+
+                CacheManager.set_cache_max_bytes(
+                    cls._optional_settings['cache_max_bytes']
+                )
+
+            if 'cache_max_bytes_per_channel' not in cls._optional_settings:
+                cls._optional_settings['cache_max_bytes_per_channel'] = None
+
+            if 'cache_max_bytes_per_channel' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['cache_max_bytes_per_channel'] = None
+
+            if (
+                cls._optional_settings['cache_max_bytes_per_channel']
+                != cls._previous_optional_settings['cache_max_bytes_per_channel']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.cache import CacheManager
+
+                message_to_log.append(
+                    'Detected a change in the cache_max_bytes_per_channel setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'cache_max_bytes_per_channel'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['cache_max_bytes_per_channel']
+                        ),
+                    )
+                )
+
+                CacheManager.set_cache_max_bytes_per_channel(
+                    cls._optional_settings['cache_max_bytes_per_channel']
+                )
+
+            if 'cache_max_bytes_per_provider' not in cls._optional_settings:
+                cls._optional_settings['cache_max_bytes_per_provider'] = None
+
+            if 'cache_max_bytes_per_provider' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['cache_max_bytes_per_provider'] = None
+
+            if (
+                cls._optional_settings['cache_max_bytes_per_provider']
+                != cls._previous_optional_settings['cache_max_bytes_per_provider']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.cache import CacheManager
+
+                message_to_log.append(
+                    'Detected a change in the cache_max_bytes_per_provider setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'cache_max_bytes_per_provider'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['cache_max_bytes_per_provider']
+                        ),
+                    )
+                )
+
+                CacheManager.set_cache_max_bytes_per_provider(
+                    cls._optional_settings['cache_max_bytes_per_provider']
+                )
+
+            if 'aggregate_providers_concurrently' not in cls._optional_settings:
+                cls._optional_settings['aggregate_providers_concurrently'] = True
+
+            if (
+                'aggregate_providers_concurrently'
+                not in cls._previous_optional_settings
+            ):
+                cls._previous_optional_settings[
+                    'aggregate_providers_concurrently'
+                ] = True
+
+            if (
+                cls._optional_settings['aggregate_providers_concurrently']
+                != cls._previous_optional_settings['aggregate_providers_concurrently']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.provider_aggregator import ProviderAggregator
+
+                message_to_log.append(
+                    'Detected a change in the aggregate_providers_concurrently setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'aggregate_providers_concurrently'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['aggregate_providers_concurrently']
+                        ),
+                    )
+                )
+
+                ProviderAggregator.set_do_aggregate_providers_concurrently(
+                    cls._optional_settings['aggregate_providers_concurrently']
+                )
+
             if 'allow_insecure_lan_connections' not in cls._optional_settings:
                 cls._optional_settings['allow_insecure_lan_connections'] = True
 
@@ -807,6 +981,157 @@ class OptionalSettings(object):
                     cls._optional_settings['allow_insecure_wan_connections']
                 )
 
+            if 'http_response_chunk_size' not in cls._optional_settings:
+                cls._optional_settings['http_response_chunk_size'] = 8192
+
+            if 'http_response_chunk_size' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['http_response_chunk_size'] = 8192
+
+            if (
+                cls._optional_settings['http_response_chunk_size']
+                != cls._previous_optional_settings['http_response_chunk_size']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.http_server import HTTPRequestHandler
+
+                message_to_log.append(
+                    'Detected a change in the http_response_chunk_size setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings['http_response_chunk_size']
+                        ),
+                        json.dumps(cls._optional_settings['http_response_chunk_size']),
+                    )
+                )
+
+                HTTPRequestHandler.set_http_response_chunk_size(
+                    cls._optional_settings['http_response_chunk_size']
+                )
+
+            if 'http_server_engine' not in cls._optional_settings:
+                cls._optional_settings['http_server_engine'] = 'threading'
+
+            if 'http_server_engine' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['http_server_engine'] = 'threading'
+
+            if (
+                cls._optional_settings['http_server_engine']
+                != cls._previous_optional_settings['http_server_engine']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.controller import Controller
+
+                message_to_log.append(
+                    'Detected a change in the http_server_engine setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings['http_server_engine']
+                        ),
+                        json.dumps(cls._optional_settings['http_server_engine']),
+                    )
+                )
+
+                Controller.set_http_server_engine(
+                    cls._optional_settings['http_server_engine']
+                )
+
+                restart_http_servers = True
+
+            if (
+                'http_server_maximum_number_of_queued_requests'
+                not in cls._optional_settings
+            ):
+                cls._optional_settings[
+                    'http_server_maximum_number_of_queued_requests'
+                ] = 128
+
+            if (
+                'http_server_maximum_number_of_queued_requests'
+                not in cls._previous_optional_settings
+            ):
+                cls._previous_optional_settings[
+                    'http_server_maximum_number_of_queued_requests'
+                ] = 128
+
+            if (
+                cls._optional_settings['http_server_maximum_number_of_queued_requests']
+                != cls._previous_optional_settings[
+                    'http_server_maximum_number_of_queued_requests'
+                ]
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.controller import Controller
+
+                message_to_log.append(
+                    'Detected a change in the http_server_maximum_number_of_queued_requests setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'http_server_maximum_number_of_queued_requests'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings[
+                                'http_server_maximum_number_of_queued_requests'
+                            ]
+                        ),
+                    )
+                )
+
+                Controller.set_http_server_maximum_number_of_queued_requests(
+                    cls._optional_settings[
+                        'http_server_maximum_number_of_queued_requests'
+                    ]
+                )
+
+                restart_http_servers = True
+
+            if 'http_server_maximum_number_of_workers' not in cls._optional_settings:
+                cls._optional_settings['http_server_maximum_number_of_workers'] = 64
+
+            if (
+                'http_server_maximum_number_of_workers'
+                not in cls._previous_optional_settings
+            ):
+                cls._previous_optional_settings[
+                    'http_server_maximum_number_of_workers'
+                ] = 64
+
+            if (
+                cls._optional_settings['http_server_maximum_number_of_workers']
+                != cls._previous_optional_settings[
+                    'http_server_maximum_number_of_workers'
+                ]
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.controller import Controller
+
+                message_to_log.append(
+                    'Detected a change in the http_server_maximum_number_of_workers setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'http_server_maximum_number_of_workers'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings[
+                                'http_server_maximum_number_of_workers'
+                            ]
+                        ),
+                    )
+                )
+
+                Controller.set_http_server_maximum_number_of_workers(
+                    cls._optional_settings['http_server_maximum_number_of_workers']
+                )
+
+                restart_http_servers = True
+
             if 'lan_connections_require_credentials' not in cls._optional_settings:
                 cls._optional_settings['lan_connections_require_credentials'] = False
 
@@ -848,6 +1173,303 @@ class OptionalSettings(object):
                     cls._optional_settings['lan_connections_require_credentials']
                 )
 
+            if 'number_of_segments_to_prefetch' not in cls._optional_settings:
+                cls._optional_settings['number_of_segments_to_prefetch'] = 3
+
+            if 'number_of_segments_to_prefetch' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['number_of_segments_to_prefetch'] = 3
+
+            if (
+                cls._optional_settings['number_of_segments_to_prefetch']
+                != cls._previous_optional_settings['number_of_segments_to_prefetch']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.prefetcher import SegmentPrefetcher
+
+                message_to_log.append(
+                    'Detected a change in the number_of_segments_to_prefetch setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'number_of_segments_to_prefetch'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['number_of_segments_to_prefetch']
+                        ),
+                    )
+                )
+
+                SegmentPrefetcher.set_number_of_segments_to_prefetch(
+                    cls._optional_settings['number_of_segments_to_prefetch']
+                )
+
+            if 'provider_aggregation_timeout' not in cls._optional_settings:
+                cls._optional_settings['provider_aggregation_timeout'] = 5
+
+            if 'provider_aggregation_timeout' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['provider_aggregation_timeout'] = 5
+
+            if (
+                cls._optional_settings['provider_aggregation_timeout']
+                != cls._previous_optional_settings['provider_aggregation_timeout']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.provider_aggregator import ProviderAggregator
+
+                message_to_log.append(
+                    'Detected a change in the provider_aggregation_timeout setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'provider_aggregation_timeout'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['provider_aggregation_timeout']
+                        ),
+                    )
+                )
+
+                ProviderAggregator.set_provider_aggregation_timeout(
+                    cls._optional_settings['provider_aggregation_timeout']
+                )
+
+            if 'refresh_epg_incrementally' not in cls._optional_settings:
+                cls._optional_settings['refresh_epg_incrementally'] = True
+
+            if 'refresh_epg_incrementally' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['refresh_epg_incrementally'] = True
+
+            if (
+                cls._optional_settings['refresh_epg_incrementally']
+                != cls._previous_optional_settings['refresh_epg_incrementally']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.providers.iptv_provider.db import ProviderDatabase
+
+                message_to_log.append(
+                    'Detected a change in the refresh_epg_incrementally setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings['refresh_epg_incrementally']
+                        ),
+                        json.dumps(cls._optional_settings['refresh_epg_incrementally']),
+                    )
+                )
+
+                ProviderDatabase.set_do_refresh_epg_incrementally(
+                    cls._optional_settings['refresh_epg_incrementally']
+                )
+
+            if 'stream_downloaded_segments' not in cls._optional_settings:
+                cls._optional_settings['stream_downloaded_segments'] = True
+
+            if 'stream_downloaded_segments' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['stream_downloaded_segments'] = True
+
+            if (
+                cls._optional_settings['stream_downloaded_segments']
+                != cls._previous_optional_settings['stream_downloaded_segments']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.http_server import HTTPRequestHandler
+
+                message_to_log.append(
+                    'Detected a change in the stream_downloaded_segments setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'stream_downloaded_segments'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['stream_downloaded_segments']
+                        ),
+                    )
+                )
+
+                HTTPRequestHandler.set_do_stream_downloaded_segments(
+                    cls._optional_settings['stream_downloaded_segments']
+                )
+
+            if 'timeshift_window' not in cls._optional_settings:
+                cls._optional_settings['timeshift_window'] = 3600
+
+            if 'timeshift_window' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['timeshift_window'] = 3600
+
+            if (
+                cls._optional_settings['timeshift_window']
+                != cls._previous_optional_settings['timeshift_window']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.timeshift import TimeshiftManager
+
+                message_to_log.append(
+                    'Detected a change in the timeshift_window setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(cls._previous_optional_settings['timeshift_window']),
+                        json.dumps(cls._optional_settings['timeshift_window']),
+                    )
+                )
+
+                TimeshiftManager.set_timeshift_window(
+                    cls._optional_settings['timeshift_window']
+                )
+
+            if 'tuner_idle_timeout' not in cls._optional_settings:
+                cls._optional_settings['tuner_idle_timeout'] = 30
+
+            if 'tuner_idle_timeout' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['tuner_idle_timeout'] = 30
+
+            if (
+                cls._optional_settings['tuner_idle_timeout']
+                != cls._previous_optional_settings['tuner_idle_timeout']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.tuner import TunerManager
+
+                message_to_log.append(
+                    'Detected a change in the tuner_idle_timeout setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings['tuner_idle_timeout']
+                        ),
+                        json.dumps(cls._optional_settings['tuner_idle_timeout']),
+                    )
+                )
+
+                TunerManager.set_tuner_idle_timeout(
+                    cls._optional_settings['tuner_idle_timeout']
+                )
+
+            if 'upstream_connection_idle_timeout' not in cls._optional_settings:
+                cls._optional_settings['upstream_connection_idle_timeout'] = 300
+
+            if (
+                'upstream_connection_idle_timeout'
+                not in cls._previous_optional_settings
+            ):
+                cls._previous_optional_settings[
+                    'upstream_connection_idle_timeout'
+                ] = 300
+
+            if (
+                cls._optional_settings['upstream_connection_idle_timeout']
+                != cls._previous_optional_settings['upstream_connection_idle_timeout']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.connection_pool import ConnectionPoolManager
+
+                message_to_log.append(
+                    'Detected a change in the upstream_connection_idle_timeout setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'upstream_connection_idle_timeout'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['upstream_connection_idle_timeout']
+                        ),
+                    )
+                )
+
+                ConnectionPoolManager.set_idle_timeout(
+                    cls._optional_settings['upstream_connection_idle_timeout']
+                )
+
+            if 'upstream_connection_pool_size' not in cls._optional_settings:
+                cls._optional_settings['upstream_connection_pool_size'] = 10
+
+            if 'upstream_connection_pool_size' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['upstream_connection_pool_size'] = 10
+
+            if (
+                cls._optional_settings['upstream_connection_pool_size']
+                != cls._previous_optional_settings['upstream_connection_pool_size']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.connection_pool import ConnectionPoolManager
+
+                message_to_log.append(
+                    'Detected a change in the upstream_connection_pool_size setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(
+                            cls._previous_optional_settings[
+                                'upstream_connection_pool_size'
+                            ]
+                        ),
+                        json.dumps(
+                            cls._optional_settings['upstream_connection_pool_size']
+                        ),
+                    )
+                )
+
+                ConnectionPoolManager.set_pool_size(
+                    cls._optional_settings['upstream_connection_pool_size']
+                )
+
+            if 'use_timeshift' not in cls._optional_settings:
+                cls._optional_settings['use_timeshift'] = False
+
+            if 'use_timeshift' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['use_timeshift'] = False
+
+            if (
+                cls._optional_settings['use_timeshift']
+                != cls._previous_optional_settings['use_timeshift']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.timeshift import TimeshiftManager
+
+                message_to_log.append(
+                    'Detected a change in the use_timeshift setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(cls._previous_optional_settings['use_timeshift']),
+                        json.dumps(cls._optional_settings['use_timeshift']),
+                    )
+                )
+
+                TimeshiftManager.set_do_use_timeshift(
+                    cls._optional_settings['use_timeshift']
+                )
+
+            if 'use_tuners' not in cls._optional_settings:
+                cls._optional_settings['use_tuners'] = True
+
+            if 'use_tuners' not in cls._previous_optional_settings:
+                cls._previous_optional_settings['use_tuners'] = True
+
+            if (
+                cls._optional_settings['use_tuners']
+                != cls._previous_optional_settings['use_tuners']
+            ):
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.tuner import TunerManager
+
+                message_to_log.append(
+                    'Detected a change in the use_tuners setting\n'
+                    'Old value => {0}\n'
+                    'New value => {1}\n'.format(
+                        json.dumps(cls._previous_optional_settings['use_tuners']),
+                        json.dumps(cls._optional_settings['use_tuners']),
+                    )
+                )
+
+                TunerManager.set_do_use_tuners(cls._optional_settings['use_tuners'])
+
             if 'wan_connections_require_credentials' not in cls._optional_settings:
                 cls._optional_settings['wan_connections_require_credentials'] = True
 
@@ -889,9 +1511,27 @@ class OptionalSettings(object):
                     cls._optional_settings['wan_connections_require_credentials']
                 )
 
-            if message_to_log:
+            if restart_http_servers:
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.controller import Controller
+
+                # pylint: disable=import-outside-toplevel
+                from iptv_proxy.security import SecurityManager
+
+                Controller.shutdown_http_server()
+                Controller.start_http_server()
+
+                if SecurityManager.get_auto_generate_self_signed_certificate():
+                    message_to_log.append('Action => Restart HTTP & HTTPS servers')
+
+                    Controller.shutdown_https_server()
+                    Controller.start_https_server()
+                else:
+                    message_to_log.append('Action => Restart HTTP server')
+            elif message_to_log:
                 message_to_log.append('Action => N/A')
 
+            if message_to_log:
                 logger.debug('\n'.join(message_to_log))
 
             for provider_name in sorted(ProvidersController.get_providers_map_class()):
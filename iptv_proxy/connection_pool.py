@@ -0,0 +1,349 @@
+import logging
+import time
+import urllib.parse
+from http.cookiejar import DefaultCookiePolicy
+from threading import RLock
+from threading import Timer
+
+import requests
+from requests.adapters import HTTPAdapter
+from rwlock import RWLock
+
+from iptv_proxy.configuration import OptionalSettings
+
+logger = logging.getLogger(__name__)
+
+
+class PooledSession(requests.Session):
+    __slots__ = [
+        '_adapters_last_used_time',
+        '_host_adapters',
+        '_host_adapters_lock',
+        '_pool_size',
+        '_provider_name',
+        '_retired_statistics',
+    ]
+
+    def __init__(self, provider_name, pool_size):
+        requests.Session.__init__(self)
+
+        self._adapters_last_used_time = {}
+        self._host_adapters = {}
+        self._host_adapters_lock = RLock()
+        self._pool_size = pool_size
+        self._provider_name = provider_name
+        self._retired_statistics = {'hits': 0, 'misses': 0}
+
+        # Callers pass their headers & cookies explicitly with every request.
+        # Rejecting cookies set by upstream servers keeps requests made through
+        # this shared session as isolated from each other as they were when
+        # every request was made through a brand new session
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    def _close_host_adapter(self, host):
+        host_adapter = self._host_adapters.pop(host)
+        del self._adapters_last_used_time[host]
+
+        host_adapter_statistics = self._compute_host_adapter_statistics(host_adapter)
+
+        self._retired_statistics['hits'] += host_adapter_statistics['hits']
+        self._retired_statistics['misses'] += host_adapter_statistics['misses']
+
+        host_adapter.close()
+
+        logger.trace(
+            'Closed upstream connection pool\n'
+            'Provider => %s\n'
+            'Host     => %s\n'
+            'Hits     => %s\n'
+            'Misses   => %s',
+            self._provider_name,
+            host,
+            host_adapter_statistics['hits'],
+            host_adapter_statistics['misses'],
+        )
+
+    @classmethod
+    def _compute_host_adapter_statistics(cls, host_adapter):
+        host_adapter_statistics = {'hits': 0, 'misses': 0}
+
+        connection_pools = host_adapter.poolmanager.pools
+
+        for connection_pool_key in connection_pools.keys():
+            try:
+                connection_pool = connection_pools[connection_pool_key]
+            except KeyError:
+                continue
+
+            # Every request made through a connection pool that did not result
+            # in a new connection being established reused a kept-alive one
+            host_adapter_statistics['hits'] += (
+                connection_pool.num_requests - connection_pool.num_connections
+            )
+            host_adapter_statistics['misses'] += connection_pool.num_connections
+
+        return host_adapter_statistics
+
+    @classmethod
+    def _is_host_adapter_in_use(cls, host_adapter):
+        connection_pools = host_adapter.poolmanager.pools
+
+        for connection_pool_key in connection_pools.keys():
+            try:
+                connection_pool = connection_pools[connection_pool_key]
+            except KeyError:
+                continue
+
+            # The queue of a connection pool holds a slot for every connection
+            # that is not checked out. A connection stays checked out until
+            # the response it carries, streamed or not, has been consumed or
+            # closed
+            if (
+                connection_pool.pool is not None
+                and connection_pool.pool.qsize() < connection_pool.pool.maxsize
+            ):
+                return True
+
+        return False
+
+    def close_host_adapters(self, idle_timeout=None):
+        with self._host_adapters_lock:
+            current_time = time.monotonic()
+
+            for host in list(self._host_adapters):
+                if idle_timeout is not None:
+                    if (
+                        current_time - self._adapters_last_used_time[host]
+                        <= idle_timeout
+                    ):
+                        continue
+
+                    # The last used time is only stamped when a request is
+                    # made. A pool still relaying a response that outlasted the
+                    # idle timeout is kept and becomes idle from now on
+                    if self._is_host_adapter_in_use(self._host_adapters[host]):
+                        self._adapters_last_used_time[host] = current_time
+
+                        continue
+
+                self._close_host_adapter(host)
+
+            return len(self._host_adapters)
+
+    def get_adapter(self, url):
+        url_components = urllib.parse.urlsplit(url)
+
+        if url_components.scheme.lower() not in ('http', 'https'):
+            return requests.Session.get_adapter(self, url)
+
+        host = '{0}://{1}'.format(
+            url_components.scheme.lower(), url_components.netloc.lower()
+        )
+
+        with self._host_adapters_lock:
+            try:
+                host_adapter = self._host_adapters[host]
+            except KeyError:
+                host_adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self._pool_size
+                )
+
+                self._host_adapters[host] = host_adapter
+
+                logger.trace(
+                    'Created upstream connection pool\n'
+                    'Provider  => %s\n'
+                    'Host      => %s\n'
+                    'Pool size => %s',
+                    self._provider_name,
+                    host,
+                    self._pool_size,
+                )
+
+            self._adapters_last_used_time[host] = time.monotonic()
+
+        return host_adapter
+
+    def get_statistics(self):
+        with self._host_adapters_lock:
+            statistics = dict(self._retired_statistics)
+
+            for host_adapter in self._host_adapters.values():
+                host_adapter_statistics = self._compute_host_adapter_statistics(
+                    host_adapter
+                )
+
+                statistics['hits'] += host_adapter_statistics['hits']
+                statistics['misses'] += host_adapter_statistics['misses']
+
+        return statistics
+
+
+class ConnectionPoolManager(object):
+    __slots__ = []
+
+    _cleanup_connection_pools_timer = None
+    _idle_timeout = 300
+    _lock = RWLock()
+    _pool_size = 10
+    _retired_statistics = {}
+    _sessions = {}
+
+    @classmethod
+    def _cleanup_connection_pools(cls):
+        logger.trace('Upstream connection pools cleanup started')
+
+        with cls._lock.writer_lock:
+            number_of_open_connection_pools = 0
+
+            for provider_name in cls._sessions:
+                number_of_open_connection_pools += cls._sessions[
+                    provider_name
+                ].close_host_adapters(cls._idle_timeout)
+
+            cls._log_statistics()
+
+            if number_of_open_connection_pools:
+                cls._start_cleanup_connection_pools_timer()
+            else:
+                cls._cleanup_connection_pools_timer = None
+
+                logger.debug('Closed all upstream connection pools')
+
+    @classmethod
+    def _close_sessions(cls):
+        for provider_name in list(cls._sessions):
+            session = cls._sessions.pop(provider_name)
+            session.close_host_adapters()
+
+            session_statistics = session.get_statistics()
+
+            try:
+                provider_statistics = cls._retired_statistics[provider_name]
+            except KeyError:
+                provider_statistics = {'hits': 0, 'misses': 0}
+
+                cls._retired_statistics[provider_name] = provider_statistics
+
+            provider_statistics['hits'] += session_statistics['hits']
+            provider_statistics['misses'] += session_statistics['misses']
+
+    @classmethod
+    def _get_statistics(cls):
+        statistics = {
+            provider_name: dict(provider_statistics)
+            for (provider_name, provider_statistics) in cls._retired_statistics.items()
+        }
+
+        for (provider_name, session) in cls._sessions.items():
+            session_statistics = session.get_statistics()
+
+            try:
+                provider_statistics = statistics[provider_name]
+            except KeyError:
+                provider_statistics = {'hits': 0, 'misses': 0}
+
+                statistics[provider_name] = provider_statistics
+
+            provider_statistics['hits'] += session_statistics['hits']
+            provider_statistics['misses'] += session_statistics['misses']
+
+        return statistics
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_idle_timeout(
+                OptionalSettings.get_optional_settings_parameter(
+                    'upstream_connection_idle_timeout'
+                )
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_pool_size(
+                OptionalSettings.get_optional_settings_parameter(
+                    'upstream_connection_pool_size'
+                )
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def _log_statistics(cls):
+        statistics = cls._get_statistics()
+
+        if statistics:
+            logger.debug(
+                'Upstream connection pools statistics\n%s',
+                '\n'.join(
+                    [
+                        '{0:16} => Hits {1}, Misses {2}'.format(
+                            provider_name,
+                            statistics[provider_name]['hits'],
+                            statistics[provider_name]['misses'],
+                        )
+                        for provider_name in sorted(statistics)
+                    ]
+                ),
+            )
+
+    @classmethod
+    def _start_cleanup_connection_pools_timer(cls):
+        cls._cleanup_connection_pools_timer = Timer(
+            cls._idle_timeout, cls._cleanup_connection_pools
+        )
+        cls._cleanup_connection_pools_timer.daemon = True
+        cls._cleanup_connection_pools_timer.start()
+
+    @classmethod
+    def cancel_cleanup_connection_pools_timer(cls):
+        if cls._cleanup_connection_pools_timer:
+            cls._cleanup_connection_pools_timer.cancel()
+
+    @classmethod
+    def get_session(cls, provider_name):
+        with cls._lock.reader_lock:
+            try:
+                return cls._sessions[provider_name]
+            except KeyError:
+                pass
+
+        with cls._lock.writer_lock:
+            try:
+                session = cls._sessions[provider_name]
+            except KeyError:
+                session = PooledSession(provider_name, cls._pool_size)
+
+                cls._sessions[provider_name] = session
+
+            if cls._cleanup_connection_pools_timer is None:
+                cls._start_cleanup_connection_pools_timer()
+
+        return session
+
+    @classmethod
+    def get_statistics(cls):
+        with cls._lock.reader_lock:
+            return cls._get_statistics()
+
+    @classmethod
+    def initialize(cls):
+        cls._initialize_class_variables()
+
+    @classmethod
+    def set_idle_timeout(cls, idle_timeout):
+        with cls._lock.writer_lock:
+            cls._idle_timeout = idle_timeout
+
+    @classmethod
+    def set_pool_size(cls, pool_size):
+        with cls._lock.writer_lock:
+            if cls._pool_size != pool_size:
+                cls._pool_size = pool_size
+
+                # Sessions are recreated on demand using the new pool size.
+                # Connections that are currently in use are closed once the
+                # request they are servicing completes
+                cls._close_sessions()
@@ -6,11 +6,14 @@ if getattr(sys, 'frozen', False):
 else:
     directory_containing_script = sys.path[0]
 
+ASYNC_HTTP_SERVER_KEEP_ALIVE_TIMEOUT = 60
 CACHE_TIME_TO_LIVE = 60
 CACHE_WAIT_TIME = 3
 CHANNEL_ICONS_DIRECTORY_PATH = os.path.join(
     directory_containing_script, 'resources', 'icons', 'channels'
 )
+CHUNKS_M3U8_CACHE_TIME_TO_LIVE_RATIO = 0.5
+CONTINUOUS_TS_STREAM_NUMBER_OF_INITIAL_SEGMENTS = 3
 DEFAULT_CHANNEL_ICON_FILE_PATH = os.path.join(CHANNEL_ICONS_DIRECTORY_PATH, '0.png')
 DEFAULT_CONFIGURATION_FILE_PATH = os.path.join(
     directory_containing_script, 'iptv_proxy.ini'
@@ -18,6 +21,7 @@ DEFAULT_CONFIGURATION_FILE_PATH = os.path.join(
 DEFAULT_DB_DIRECTORY_PATH = os.path.join(directory_containing_script, 'db')
 DEFAULT_DB_FILE_PATH = os.path.join(DEFAULT_DB_DIRECTORY_PATH, 'iptv_proxy.db')
 DEFAULT_HOSTNAME_LOOPBACK = 'localhost'
+DEFAULT_HTTP_SERVER_ENGINE = 'threading'
 DEFAULT_LOGGING_CONFIGURATION = {
     'version': 1,
     'disable_existing_loggers': True,
@@ -52,6 +56,8 @@ DEFAULT_LOGGING_CONFIGURATION = {
         }
     },
 }
+DEFAULT_LOGGING_QUEUE_DROP_POLICY = 'drop_newest'
+DEFAULT_LOGGING_QUEUE_MAXIMUM_SIZE = 10000
 DEFAULT_LOG_DIRECTORY_PATH = os.path.join(directory_containing_script, 'logs')
 DEFAULT_LOG_FILE_PATH = os.path.join(DEFAULT_LOG_DIRECTORY_PATH, 'iptv_proxy.log')
 DEFAULT_OPTIONAL_SETTINGS_FILE_PATH = os.path.join(
@@ -68,15 +74,63 @@ DEFAULT_SSL_KEY_FILE_PATH = os.path.join(
     DEFAULT_SSL_DIRECTORY_PATH, 'key', 'iptv_proxy.pem'
 )
 DEFAULT_STREAMING_PROTOCOL = 'hls'
+EPG_ARTIFACT_IDLE_TIMEOUT = 86400
+EPG_ARTIFACTS_DIRECTORY_PATH = os.path.join(directory_containing_script, 'epg')
+EPG_ARTIFACTS_MAXIMUM_NUMBER_OF_VARIANTS = 32
+EPG_BULK_INSERT_BATCH_SIZE = 5000
+EPG_INCREMENTAL_REFRESH_BATCH_SIZE = 500
+EPG_MAXIMUM_NUMBER_OF_DAYS = 14
+EPG_PIPELINE_BATCH_SIZE = 500
+EPG_PIPELINE_NUMBER_OF_FORMATTING_WORKERS = 1
+EPG_PIPELINE_QUEUE_SIZE = 8
+EPG_PIPELINE_QUEUE_TIMEOUT = 1
+EPG_PIPELINE_READ_SIZE = 65536
+HLS_DEFAULT_TARGET_DURATION = 10
+HLS_POLLING_INTERVAL_RATIO = 0.5
 HTTP_CHUNK_SIZE = 8192
+HTTP_REQUEST_CLASSIFICATION_RETRY_INTERVAL = 0.1
+HTTP_REQUEST_CLASSIFICATION_TIMEOUT = 30
+HTTP_REQUEST_HANDLER_TIMEOUT = 60
+HTTP_REQUEST_LINE_MAXIMUM_SIZE = 2048
+HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS = 32
+HTTP_SERVER_RETRY_AFTER = 5
+HTTP_SESSIONS_FLUSH_INTERVAL = 60
 ICONS_DIRECTORY_PATH = os.path.join(directory_containing_script, 'resources', 'icons')
 LOGGING_CONFIGURATION_FILE_PATH = os.path.join(
     directory_containing_script, 'iptv_proxy_logging_configuration.json'
 )
+METRICS_DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+METRICS_EPG_REFRESH_DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+PREFETCH_NUMBER_OF_WORKERS = 4
+PREFETCH_QUEUE_SIZE = 64
+PROVIDER_AGGREGATION_BUFFER_SIZE = 256
+PROVIDER_AGGREGATION_BUFFER_TIMEOUT = 1
+PROVIDER_AGGREGATION_NUMBER_OF_WORKERS = 4
 RESOURCES_DIRECTORY_PATH = os.path.join(directory_containing_script, 'resources')
+SENDMSG_MAXIMUM_NUMBER_OF_BUFFERS = 1024
+SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT = 10
 TEMPLATES_BYTECODE_CACHE_DIRECTORY_PATH = os.path.join(
     directory_containing_script, 'templates', 'byte_code_cache'
 )
 TEMPLATES_DIRECTORY_PATH = os.path.join(directory_containing_script, 'templates')
+TIMESHIFT_BUFFER_IDLE_TIMEOUT = 300
+TIMESHIFT_DIRECTORY_PATH = os.path.join(directory_containing_script, 'timeshift')
+TIMESHIFT_MAXIMUM_NUMBER_OF_LISTED_SEGMENTS = 100
+TIMESHIFT_MAXIMUM_NUMBER_OF_OUT_OF_ORDER_SEGMENTS = 3
+TIMESHIFT_NUMBER_OF_SEGMENTS_IN_MEMORY = 10
 TRACE = 5
+TUNER_RING_BUFFER_SIZE = 10
+TUNER_WAIT_TIMEOUT = 10
 VERSION = '7.7.4'
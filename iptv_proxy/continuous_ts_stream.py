@@ -0,0 +1,183 @@
+import logging
+import re
+import time
+import urllib.parse
+
+import requests
+
+from iptv_proxy.cache import CacheManager
+from iptv_proxy.constants import CONTINUOUS_TS_STREAM_NUMBER_OF_INITIAL_SEGMENTS
+from iptv_proxy.constants import HLS_DEFAULT_TARGET_DURATION
+from iptv_proxy.constants import HLS_POLLING_INTERVAL_RATIO
+from iptv_proxy.constants import SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
+from iptv_proxy.exceptions import HLSPlaylistDownloadError
+from iptv_proxy.hls import HLSClient
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.tuner import TunerManager
+
+logger = logging.getLogger(__name__)
+
+
+class ContinuousTSStream(object):
+    __slots__ = ['_channel_number', '_hls_client', '_provider_name']
+
+    def __init__(self, client_uuid, provider_name, channel_number):
+        self._channel_number = channel_number
+        self._hls_client = HLSClient(client_uuid, provider_name, channel_number)
+        self._provider_name = provider_name
+
+    def _download_ts_file(self, segment_url, segment_file_name):
+        ts_file_content = self._hls_client.download_ts_file(segment_url)
+
+        CacheManager.update_cache(
+            self._provider_name,
+            self._channel_number,
+            segment_file_name,
+            ts_file_content,
+        )
+
+        return ts_file_content
+
+    def _query_ts_file(self, segment_url, segment_file_name):
+        ts_file_content = TunerManager.query_segment(
+            self._provider_name, self._channel_number, segment_file_name
+        )
+
+        if ts_file_content is None:
+            ts_file_content = CacheManager.query_cache(
+                self._provider_name, self._channel_number, segment_file_name
+            )
+
+        if ts_file_content is None:
+            ts_file_content = SingleFlightManager.do_call(
+                (self._provider_name, self._channel_number, segment_file_name),
+                self._download_ts_file,
+                segment_url,
+                segment_file_name,
+                wait_timeout=SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT,
+            )
+
+        return ts_file_content
+
+    def _generate_tuned_ts_file_contents(self, tuner):
+        # The tuner alone polls the playlist of the channel. The segments it
+        # buffers are written back-to-back as they arrive, starting a few
+        # segments behind the live edge
+        is_first_wait = True
+        segment_sequence_number = 0
+
+        while True:
+            tuned_segments = tuner.wait_for_segments(
+                segment_sequence_number, HLS_DEFAULT_TARGET_DURATION
+            )
+
+            if tuned_segments is None:
+                logger.error(
+                    'Stopped continuous transport stream\n'
+                    'Provider       => %s\n'
+                    'Channel number => %s\n'
+                    'Reason         => The tuner of the channel was stopped',
+                    self._provider_name,
+                    self._channel_number,
+                )
+
+                break
+
+            (segment_sequence_number, ts_file_contents) = tuned_segments
+
+            if is_first_wait and ts_file_contents:
+                is_first_wait = False
+
+                ts_file_contents = ts_file_contents[
+                    -CONTINUOUS_TS_STREAM_NUMBER_OF_INITIAL_SEGMENTS:
+                ]
+
+            yield from ts_file_contents
+
+    def generate_ts_file_contents(self):
+        tuner = TunerManager.acquire_tuner(self._provider_name, self._channel_number)
+
+        try:
+            if tuner is not None:
+                yield from self._generate_tuned_ts_file_contents(tuner)
+
+                return
+
+            playlist_hls_playlist = HLSPlaylist(
+                self._hls_client.download_playlist_m3u8()
+            )
+
+            try:
+                chunks_url = '/live/{0}/{1}'.format(
+                    self._provider_name, playlist_hls_playlist.playlist_uris[0]
+                )
+            except IndexError:
+                chunks_url = None
+
+            chunks_hls_playlist = playlist_hls_playlist
+            sent_segment_file_names = set()
+
+            while True:
+                if chunks_url is not None:
+                    chunks_hls_playlist = HLSPlaylist(
+                        self._hls_client.download_chunks_m3u8(chunks_url)
+                    )
+                elif chunks_hls_playlist is None:
+                    chunks_hls_playlist = HLSPlaylist(
+                        self._hls_client.download_playlist_m3u8()
+                    )
+
+                # Only the segments that were not in the previous playlist are
+                # new. The segments are written back-to-back so that the client
+                # receives one continuous transport stream
+                playlist_segment_file_names = set()
+
+                for segment_uri in chunks_hls_playlist.segment_uris:
+                    segment_url = '/live/{0}/{1}'.format(
+                        self._provider_name, segment_uri
+                    )
+                    segment_url_components = urllib.parse.urlparse(segment_url)
+                    segment_file_name = re.sub(
+                        r'(/.*)?(/)(.*\.ts)', r'\3', segment_url_components.path
+                    ).lower()
+
+                    playlist_segment_file_names.add(segment_file_name)
+
+                    if segment_file_name in sent_segment_file_names:
+                        continue
+
+                    try:
+                        ts_file_content = self._query_ts_file(
+                            segment_url, segment_file_name
+                        )
+                    except requests.exceptions.HTTPError:
+                        logger.error(
+                            'Failed to download segment\nSegment => %s',
+                            segment_file_name,
+                        )
+
+                        continue
+
+                    yield ts_file_content
+
+                sent_segment_file_names = playlist_segment_file_names
+
+                time.sleep(
+                    (chunks_hls_playlist.target_duration or HLS_DEFAULT_TARGET_DURATION)
+                    * HLS_POLLING_INTERVAL_RATIO
+                )
+
+                chunks_hls_playlist = None
+        except HLSPlaylistDownloadError:
+            logger.error(
+                'Stopped continuous transport stream\n'
+                'Provider       => %s\n'
+                'Channel number => %s\n'
+                'Reason         => Failed to download playlist.m3u8',
+                self._provider_name,
+                self._channel_number,
+            )
+        finally:
+            if tuner is not None:
+                TunerManager.release_tuner(tuner)
@@ -5,18 +5,31 @@ import traceback
 from ssl import SSLError
 from threading import Event
 
+from rwlock import RWLock
+
+from iptv_proxy.async_http_server import AsyncHTTPServerThread
 from iptv_proxy.cache import CacheManager
+from iptv_proxy.chunks_m3u8_cache import ChunksM3U8Cache
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.connection_pool import ConnectionPoolManager
+from iptv_proxy.constants import DEFAULT_HTTP_SERVER_ENGINE
 from iptv_proxy.db import Database
+from iptv_proxy.enums import HTTPServerEngine
+from iptv_proxy.epg_artifact_cache import EPGArtifactCache
 from iptv_proxy.html_template_engine import HTMLTemplateEngine
 from iptv_proxy.http_server import HTTPRequestHandler
 from iptv_proxy.http_server import HTTPServerThread
+from iptv_proxy.http_session_cache import HTTPSessionCache
 from iptv_proxy.logging import Logging
+from iptv_proxy.prefetcher import SegmentPrefetcher
 from iptv_proxy.privilege import Privilege
+from iptv_proxy.provider_aggregator import ProviderAggregator
 from iptv_proxy.providers import ProvidersController
 from iptv_proxy.recorder import PVR
 from iptv_proxy.security import SecurityManager
+from iptv_proxy.timeshift import TimeshiftManager
+from iptv_proxy.tuner import TunerManager
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +37,41 @@ logger = logging.getLogger(__name__)
 class Controller(object):
     __slots__ = []
 
+    _http_server_engine = HTTPServerEngine(DEFAULT_HTTP_SERVER_ENGINE)
+    _http_server_maximum_number_of_queued_requests = 128
+    _http_server_maximum_number_of_workers = 64
     _http_server_thread = None
     _https_server_thread = None
+    _lock = RWLock()
     _shutdown_proxy_event = Event()
 
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_http_server_engine(
+                OptionalSettings.get_optional_settings_parameter('http_server_engine')
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_http_server_maximum_number_of_queued_requests(
+                OptionalSettings.get_optional_settings_parameter(
+                    'http_server_maximum_number_of_queued_requests'
+                )
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_http_server_maximum_number_of_workers(
+                OptionalSettings.get_optional_settings_parameter(
+                    'http_server_maximum_number_of_workers'
+                )
+            )
+        except KeyError:
+            pass
+
     @classmethod
     def _shutdown_server(cls, server_thread):
         if server_thread:
@@ -42,11 +86,79 @@ class Controller(object):
 
         server_address = ('', int(server_port))
 
-        server_thread = HTTPServerThread(server_address, is_secure=is_secure)
+        with cls._lock.reader_lock:
+            if cls._http_server_engine == HTTPServerEngine.ASYNCIO:
+                server_thread = AsyncHTTPServerThread(
+                    server_address,
+                    is_secure=is_secure,
+                    maximum_number_of_workers=cls._http_server_maximum_number_of_workers,
+                    maximum_number_of_queued_requests=(
+                        cls._http_server_maximum_number_of_queued_requests
+                    ),
+                )
+            else:
+                server_thread = HTTPServerThread(
+                    server_address,
+                    is_secure=is_secure,
+                    maximum_number_of_workers=cls._http_server_maximum_number_of_workers,
+                    maximum_number_of_queued_requests=(
+                        cls._http_server_maximum_number_of_queued_requests
+                    ),
+                )
+
         server_thread.start()
 
         return server_thread
 
+    @classmethod
+    def get_http_server_statistics(cls):
+        http_server_statistics = {}
+
+        for (protocol, server_thread) in (
+            ('HTTP', cls._http_server_thread),
+            ('HTTPS', cls._https_server_thread),
+        ):
+            if server_thread and server_thread.is_alive():
+                http_server_statistics[protocol] = server_thread.get_statistics()
+
+        return http_server_statistics
+
+    @classmethod
+    def set_http_server_engine(cls, http_server_engine):
+        try:
+            http_server_engine = HTTPServerEngine(http_server_engine)
+        except ValueError:
+            logger.error(
+                'Invalid HTTP server engine\n'
+                'HTTP server engine => %s\n'
+                'Defaulting to      => %s',
+                http_server_engine,
+                DEFAULT_HTTP_SERVER_ENGINE,
+            )
+
+            http_server_engine = HTTPServerEngine(DEFAULT_HTTP_SERVER_ENGINE)
+
+        with cls._lock.writer_lock:
+            cls._http_server_engine = http_server_engine
+
+    @classmethod
+    def set_http_server_maximum_number_of_queued_requests(
+        cls, http_server_maximum_number_of_queued_requests
+    ):
+        with cls._lock.writer_lock:
+            cls._http_server_maximum_number_of_queued_requests = (
+                http_server_maximum_number_of_queued_requests
+            )
+
+    @classmethod
+    def set_http_server_maximum_number_of_workers(
+        cls, http_server_maximum_number_of_workers
+    ):
+        with cls._lock.writer_lock:
+            cls._http_server_maximum_number_of_workers = (
+                http_server_maximum_number_of_workers
+            )
+
     @classmethod
     def shutdown_http_server(cls):
         cls._shutdown_server(cls._http_server_thread)
@@ -61,8 +173,10 @@ class Controller(object):
 
         ProvidersController.terminate()
         CacheManager.cancel_cleanup_cache_timer()
+        ConnectionPoolManager.cancel_cleanup_connection_pools_timer()
         PVR.cancel_start_recording_timer()
         PVR.stop()
+        HTTPSessionCache.stop()
 
         if cls._http_server_thread:
             cls._http_server_thread.stop()
@@ -166,10 +280,19 @@ class Controller(object):
 
         Configuration.read_configuration_file()
 
+        cls._initialize_class_variables()
+
         CacheManager.initialize()
+        ChunksM3U8Cache.initialize()
+        ConnectionPoolManager.initialize()
+        EPGArtifactCache.initialize()
         HTMLTemplateEngine.initialize()
         HTTPRequestHandler.initialize()
         PVR.initialize()
+        ProviderAggregator.initialize()
+        SegmentPrefetcher.initialize()
+        TimeshiftManager.initialize()
+        TunerManager.initialize()
 
         Configuration.start_configuration_file_watchdog_observer()
         OptionalSettings.start_optional_settings_file_watchdog_observer()
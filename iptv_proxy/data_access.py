@@ -119,3 +119,12 @@ class DatabaseAccess(object):
     @classmethod
     def query_settings(cls, db_session):
         return db_session.query(Setting).yield_per(1)
+
+    @classmethod
+    def update_http_session_last_access_date_time_in_utc(
+        cls, db_session, http_session_id, last_access_date_time_in_utc
+    ):
+        db_session.query(HTTPSession).filter(HTTPSession.id == http_session_id).update(
+            {HTTPSession.last_access_date_time_in_utc: last_access_date_time_in_utc},
+            synchronize_session=False,
+        )
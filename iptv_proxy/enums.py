@@ -12,12 +12,28 @@ class EPGStyle(Enum):
     MINIMAL = 'Minimal'
 
 
+class HTTPRequestPriority(Enum):
+    LIVE = 'live'
+    STANDARD = 'standard'
+    STREAM = 'stream'
+
+
+class HTTPServerEngine(Enum):
+    ASYNCIO = 'asyncio'
+    THREADING = 'threading'
+
+
 class IPAddressType(Enum):
     LOOPBACK = 'LOOPBACK'
     PRIVATE = 'PRIVATE'
     PUBLIC = 'PUBLIC'
 
 
+class LoggingQueueDropPolicy(Enum):
+    DROP_NEWEST = 'drop_newest'
+    DROP_OLDEST = 'drop_oldest'
+
+
 class PasswordState(Enum):
     DECRYPTED = 0
     ENCRYPTED = 1
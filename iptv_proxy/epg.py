@@ -8,6 +8,7 @@ import tzlocal
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.constants import VERSION
 from iptv_proxy.enums import EPGStyle
+from iptv_proxy.provider_aggregator import ProviderAggregator
 from iptv_proxy.utilities import Utility
 
 logger = logging.getLogger(__name__)
@@ -16,6 +17,54 @@ logger = logging.getLogger(__name__)
 class EPG(object):
     __slots__ = []
 
+    @classmethod
+    def _generate_provider_xmltv(
+        cls,
+        provider_name,
+        provider_map_class,
+        is_server_secure,
+        authorization_required,
+        server_password,
+        server_hostname,
+        server_port,
+        cutoff_date_time_in_utc,
+        style,
+    ):
+        db_session = provider_map_class.database_class().create_session()
+
+        try:
+            if style.capitalize() == EPGStyle.COMPLETE.value:
+                query_channels_xmltv = (
+                    provider_map_class.database_access_class().query_channels_complete_xmltv
+                )
+                query_programs_xmltv = (
+                    provider_map_class.database_access_class().query_programs_complete_xmltv
+                )
+            else:
+                query_channels_xmltv = (
+                    provider_map_class.database_access_class().query_channels_minimal_xmltv
+                )
+                query_programs_xmltv = (
+                    provider_map_class.database_access_class().query_programs_minimal_xmltv
+                )
+
+            for channel_row in query_channels_xmltv(db_session):
+                yield channel_row.xmltv.format(
+                    's' if is_server_secure else '',
+                    server_hostname,
+                    server_port,
+                    '?http_token={0}'.format(server_password)
+                    if authorization_required
+                    else '',
+                )
+
+            for program_row in query_programs_xmltv(
+                db_session, cutoff_date_time_in_utc
+            ):
+                yield program_row.xmltv
+        finally:
+            db_session.close()
+
     @classmethod
     def generate_xmltv(
         cls,
@@ -49,41 +98,16 @@ class EPG(object):
         ) + timedelta(days=int(number_of_days) + 1)
         cutoff_date_time_in_utc = cutoff_date_time_in_local.astimezone(pytz.utc)
 
-        for provider_map_class in providers_map_class.values():
-            with provider_map_class.database_class().get_access_lock().shared_lock:
-                db_session = provider_map_class.database_class().create_session()
-
-                try:
-                    if style.capitalize() == EPGStyle.COMPLETE.value:
-                        query_channels_xmltv = (
-                            provider_map_class.database_access_class().query_channels_complete_xmltv
-                        )
-                        query_programs_xmltv = (
-                            provider_map_class.database_access_class().query_programs_complete_xmltv
-                        )
-                    else:
-                        query_channels_xmltv = (
-                            provider_map_class.database_access_class().query_channels_minimal_xmltv
-                        )
-                        query_programs_xmltv = (
-                            provider_map_class.database_access_class().query_programs_minimal_xmltv
-                        )
-
-                    for channel_row in query_channels_xmltv(db_session):
-                        yield channel_row.xmltv.format(
-                            's' if is_server_secure else '',
-                            server_hostname,
-                            server_port,
-                            '?http_token={0}'.format(server_password)
-                            if authorization_required
-                            else '',
-                        )
-
-                    for program_row in query_programs_xmltv(
-                        db_session, cutoff_date_time_in_utc
-                    ):
-                        yield program_row.xmltv
-                finally:
-                    db_session.close()
+        yield from ProviderAggregator.aggregate(
+            providers_map_class.items(),
+            cls._generate_provider_xmltv,
+            is_server_secure,
+            authorization_required,
+            server_password,
+            server_hostname,
+            server_port,
+            cutoff_date_time_in_utc,
+            style,
+        )
 
         yield '</tv>\n'
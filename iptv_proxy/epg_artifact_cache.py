@@ -0,0 +1,347 @@
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sys
+import time
+import traceback
+import uuid
+from datetime import datetime
+from threading import Thread
+
+import tzlocal
+from rwlock import RWLock
+
+from iptv_proxy.constants import EPG_ARTIFACT_IDLE_TIMEOUT
+from iptv_proxy.constants import EPG_ARTIFACTS_DIRECTORY_PATH
+from iptv_proxy.constants import EPG_ARTIFACTS_MAXIMUM_NUMBER_OF_VARIANTS
+from iptv_proxy.epg import EPG
+from iptv_proxy.enums import EPGStyle
+from iptv_proxy.providers import ProvidersController
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.utilities import Utility
+
+logger = logging.getLogger(__name__)
+
+
+class EPGArtifact(object):
+    __slots__ = [
+        '_client_ip_address',
+        '_etag',
+        '_file_path',
+        '_generation',
+        '_rendered_date',
+    ]
+
+    def __init__(self, client_ip_address, etag, file_path, generation, rendered_date):
+        self._client_ip_address = client_ip_address
+        self._etag = etag
+        self._file_path = file_path
+        self._generation = generation
+        self._rendered_date = rendered_date
+
+    @property
+    def client_ip_address(self):
+        return self._client_ip_address
+
+    @property
+    def etag(self):
+        return self._etag
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def rendered_date(self):
+        return self._rendered_date
+
+
+class EPGArtifactCache(object):
+    __slots__ = []
+
+    _epg_artifact_access_times = {}
+    _epg_artifacts = {}
+    _generation = 0
+    _invalidation_generations = {}
+    _lock = RWLock()
+
+    @classmethod
+    def _delete_epg_artifact_file(cls, file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            # The file is still being sent to a client on a platform that does
+            # not allow open files to be deleted. It is deleted on the next
+            # start instead
+            pass
+
+    @classmethod
+    def _evict_epg_artifacts(cls):
+        # Must be called with the writer lock held
+        #
+        # Variants no client asked for in a while are evicted, as are the least
+        # recently requested ones beyond the maximum number of variants kept
+        current_time = time.monotonic()
+
+        epg_artifact_variants = sorted(
+            cls._epg_artifacts,
+            key=lambda epg_artifact_variant: cls._epg_artifact_access_times.get(
+                epg_artifact_variant, 0
+            ),
+            reverse=True,
+        )
+
+        for (epg_artifact_variant_index, epg_artifact_variant) in enumerate(
+            epg_artifact_variants
+        ):
+            if (
+                epg_artifact_variant_index < EPG_ARTIFACTS_MAXIMUM_NUMBER_OF_VARIANTS
+                and current_time
+                - cls._epg_artifact_access_times.get(epg_artifact_variant, 0)
+                <= EPG_ARTIFACT_IDLE_TIMEOUT
+            ):
+                continue
+
+            cls._delete_epg_artifact_file(
+                cls._epg_artifacts.pop(epg_artifact_variant).file_path
+            )
+            cls._epg_artifact_access_times.pop(epg_artifact_variant, None)
+
+            logger.debug(
+                'Evicted EPG artifact\n'
+                'Providers      => %s\n'
+                'Style          => %s\n'
+                'Number of days => %s',
+                ', '.join(epg_artifact_variant[0]),
+                epg_artifact_variant[1],
+                epg_artifact_variant[2],
+            )
+
+    @classmethod
+    def _get_current_date(cls):
+        # The programmes included in an EPG are cut off relative to the current
+        # local date so an artifact rendered on a previous day is stale
+        return datetime.now(tzlocal.get_localzone()).date()
+
+    @classmethod
+    def _is_epg_artifact_current(cls, epg_artifact_variant, epg_artifact):
+        # Artifacts are invalidated either for a single provider or, using the
+        # None key, for all providers
+        invalidation_generation = max(
+            cls._invalidation_generations.get(provider_name, 0)
+            for provider_name in (None, *epg_artifact_variant[0])
+        )
+
+        return (
+            epg_artifact.generation >= invalidation_generation
+            and epg_artifact.rendered_date == cls._get_current_date()
+        )
+
+    @classmethod
+    def _pre_render_epg_artifacts(cls, epg_artifact_variants, generation):
+        for epg_artifact_variant in epg_artifact_variants:
+            with cls._lock.reader_lock:
+                try:
+                    client_ip_address = cls._epg_artifacts[
+                        epg_artifact_variant
+                    ].client_ip_address
+                except KeyError:
+                    continue
+
+            try:
+                epg_artifact = None
+
+                # A render that was already in flight when the artifacts were
+                # invalidated may have read outdated data
+                while epg_artifact is None or epg_artifact.generation < generation:
+                    epg_artifact = SingleFlightManager.do_call(
+                        ('epg_artifact', epg_artifact_variant),
+                        cls._render_epg_artifact,
+                        epg_artifact_variant,
+                        client_ip_address,
+                    )
+            except Exception:
+                (type_, value_, traceback_) = sys.exc_info()
+                logger.error(
+                    '\n'.join(traceback.format_exception(type_, value_, traceback_))
+                )
+
+    @classmethod
+    def _render_epg_artifact(cls, epg_artifact_variant, client_ip_address):
+        (
+            provider_names,
+            style,
+            number_of_days,
+            _,
+            is_server_secure,
+            authorization_required,
+        ) = epg_artifact_variant
+
+        with cls._lock.reader_lock:
+            generation = cls._generation
+
+        rendered_date = cls._get_current_date()
+
+        providers_map_class = {
+            provider_name: ProvidersController.get_provider_map_class(provider_name)
+            for provider_name in provider_names
+        }
+
+        file_path = os.path.join(
+            EPG_ARTIFACTS_DIRECTORY_PATH,
+            '{0}_{1}.xml.gz'.format(
+                hashlib.md5(repr(epg_artifact_variant).encode()).hexdigest(),
+                uuid.uuid4().hex,
+            ),
+        )
+
+        try:
+            with gzip.open(
+                file_path, 'wt', compresslevel=9, encoding='utf-8'
+            ) as epg_artifact_file:
+                epg_artifact_file.writelines(
+                    EPG.generate_xmltv(
+                        is_server_secure,
+                        authorization_required,
+                        client_ip_address,
+                        providers_map_class,
+                        number_of_days,
+                        style,
+                    )
+                )
+        except Exception:
+            cls._delete_epg_artifact_file(file_path)
+
+            raise
+
+        epg_artifact = EPGArtifact(
+            client_ip_address,
+            '"{0}"'.format(uuid.uuid4().hex),
+            file_path,
+            generation,
+            rendered_date,
+        )
+
+        with cls._lock.writer_lock:
+            try:
+                cls._delete_epg_artifact_file(
+                    cls._epg_artifacts[epg_artifact_variant].file_path
+                )
+            except KeyError:
+                pass
+
+            cls._epg_artifacts[epg_artifact_variant] = epg_artifact
+
+            cls._evict_epg_artifacts()
+
+        logger.debug(
+            'Rendered EPG artifact\n'
+            'Providers      => %s\n'
+            'Style          => %s\n'
+            'Number of days => %s\n'
+            'File path      => %s',
+            ', '.join(provider_names),
+            style,
+            number_of_days,
+            file_path,
+        )
+
+        return epg_artifact
+
+    @classmethod
+    def initialize(cls):
+        # Artifacts left behind by a previous run may be outdated
+        shutil.rmtree(EPG_ARTIFACTS_DIRECTORY_PATH, ignore_errors=True)
+
+        os.makedirs(EPG_ARTIFACTS_DIRECTORY_PATH, exist_ok=True)
+
+    @classmethod
+    def invalidate(cls, provider_name=None):
+        with cls._lock.writer_lock:
+            cls._generation += 1
+
+            generation = cls._generation
+            cls._invalidation_generations[provider_name] = generation
+
+            cls._evict_epg_artifacts()
+
+            epg_artifact_variants = [
+                epg_artifact_variant
+                for epg_artifact_variant in cls._epg_artifacts
+                if provider_name is None or provider_name in epg_artifact_variant[0]
+            ]
+
+        logger.debug(
+            'Invalidated EPG artifacts\nProvider => %s',
+            provider_name if provider_name is not None else 'All',
+        )
+
+        # Variants requested by clients before the invalidation are rendered
+        # again right away so that the next request for them is served from
+        # disk
+        if epg_artifact_variants:
+            pre_render_epg_artifacts_thread = Thread(
+                target=cls._pre_render_epg_artifacts,
+                args=(epg_artifact_variants, generation),
+            )
+            pre_render_epg_artifacts_thread.daemon = True
+            pre_render_epg_artifacts_thread.start()
+
+    @classmethod
+    def open_epg_artifact(
+        cls,
+        is_server_secure,
+        authorization_required,
+        client_ip_address,
+        providers_map_class,
+        number_of_days,
+        style,
+    ):
+        epg_artifact_variant = (
+            tuple(sorted(providers_map_class)),
+            EPGStyle.COMPLETE.value
+            if style.capitalize() == EPGStyle.COMPLETE.value
+            else EPGStyle.MINIMAL.value,
+            int(number_of_days),
+            Utility.determine_ip_address_type(client_ip_address),
+            is_server_secure,
+            authorization_required,
+        )
+
+        with cls._lock.writer_lock:
+            cls._epg_artifact_access_times[epg_artifact_variant] = time.monotonic()
+
+        while True:
+            with cls._lock.reader_lock:
+                try:
+                    epg_artifact = cls._epg_artifacts[epg_artifact_variant]
+
+                    if cls._is_epg_artifact_current(epg_artifact_variant, epg_artifact):
+                        # The file is opened while the lock is held so that it
+                        # can't be replaced in between
+                        return (
+                            open(epg_artifact.file_path, 'rb'),
+                            epg_artifact.etag,
+                        )
+                except (KeyError, OSError):
+                    pass
+
+            epg_artifact = SingleFlightManager.do_call(
+                ('epg_artifact', epg_artifact_variant),
+                cls._render_epg_artifact,
+                epg_artifact_variant,
+                client_ip_address,
+            )
+
+            with cls._lock.reader_lock:
+                try:
+                    return (open(epg_artifact.file_path, 'rb'), epg_artifact.etag)
+                except OSError:
+                    # The artifact was replaced by a newer one in the meantime
+                    pass
@@ -0,0 +1,271 @@
+import logging
+import queue
+import sys
+import time
+from collections import OrderedDict
+from threading import Event
+from threading import Lock
+from threading import Thread
+
+from iptv_proxy.constants import EPG_PIPELINE_BATCH_SIZE
+from iptv_proxy.constants import EPG_PIPELINE_NUMBER_OF_FORMATTING_WORKERS
+from iptv_proxy.constants import EPG_PIPELINE_QUEUE_SIZE
+from iptv_proxy.constants import EPG_PIPELINE_QUEUE_TIMEOUT
+from iptv_proxy.constants import EPG_PIPELINE_READ_SIZE
+from iptv_proxy.exceptions import EPGPipelineAbortedError
+from iptv_proxy.metrics import MetricsManager
+
+logger = logging.getLogger(__name__)
+
+
+class EPGPipelineStream(object):
+    __slots__ = ['_buffer', '_epg_pipeline', '_is_exhausted']
+
+    def __init__(self, epg_pipeline):
+        self._buffer = b''
+        self._epg_pipeline = epg_pipeline
+        self._is_exhausted = False
+
+    def read(self, size=-1):
+        while not self._is_exhausted and (size < 0 or len(self._buffer) < size):
+            chunk = self._epg_pipeline.get_chunk()
+
+            if chunk is None:
+                self._is_exhausted = True
+            else:
+                self._buffer += chunk
+
+        if size < 0:
+            (data, self._buffer) = (self._buffer, b'')
+        else:
+            (data, self._buffer) = (self._buffer[:size], self._buffer[size:])
+
+        return data
+
+
+class EPGPipeline(object):
+    __slots__ = [
+        '_abort_event',
+        '_chunks_queue',
+        '_epg_xml_stream',
+        '_exception',
+        '_format_function',
+        '_formatted_batches_queue',
+        '_lock',
+        '_parse_function',
+        '_parsed_batches_queue',
+        '_provider_name',
+        '_stage_durations',
+        '_write_function',
+    ]
+
+    def __init__(
+        self,
+        provider_name,
+        epg_xml_stream,
+        parse_function,
+        format_function,
+        write_function,
+    ):
+        self._abort_event = Event()
+        self._chunks_queue = queue.Queue(maxsize=EPG_PIPELINE_QUEUE_SIZE)
+        self._epg_xml_stream = epg_xml_stream
+        self._exception = None
+        self._format_function = format_function
+        self._formatted_batches_queue = queue.Queue(maxsize=EPG_PIPELINE_QUEUE_SIZE)
+        self._lock = Lock()
+        self._parse_function = parse_function
+        self._parsed_batches_queue = queue.Queue(maxsize=EPG_PIPELINE_QUEUE_SIZE)
+        self._provider_name = provider_name
+        # Each stage is timed while it works. The time it spends waiting on the
+        # stages before or after it is left out
+        self._stage_durations = OrderedDict(
+            [('download', 0.0), ('parse', 0.0), ('format', 0.0), ('write', 0.0)]
+        )
+        self._write_function = write_function
+
+    def _abort(self):
+        with self._lock:
+            if self._exception is None:
+                self._exception = sys.exc_info()[1]
+
+        self._abort_event.set()
+
+    def _format(self):
+        try:
+            while True:
+                parsed_batch = self._get(self._parsed_batches_queue)
+
+                if parsed_batch is None:
+                    break
+
+                start_time = time.monotonic()
+
+                formatted_batch = []
+
+                for parsed_item in parsed_batch:
+                    formatted_batch.extend(self._format_function(parsed_item))
+
+                self._update_stage_duration('format', time.monotonic() - start_time)
+
+                self._put(self._formatted_batches_queue, formatted_batch)
+        except EPGPipelineAbortedError:
+            pass
+        except Exception:
+            self._abort()
+        finally:
+            try:
+                self._put(self._formatted_batches_queue, None)
+            except EPGPipelineAbortedError:
+                pass
+
+    def _get(self, queue_):
+        while True:
+            try:
+                return queue_.get(timeout=EPG_PIPELINE_QUEUE_TIMEOUT)
+            except queue.Empty:
+                if self._abort_event.is_set():
+                    raise EPGPipelineAbortedError
+
+    def _parse(self):
+        parsed_batch = []
+
+        try:
+            start_time = time.monotonic()
+
+            for parsed_item in self._parse_function(EPGPipelineStream(self)):
+                parsed_batch.append(parsed_item)
+
+                if len(parsed_batch) == EPG_PIPELINE_BATCH_SIZE:
+                    self._update_stage_duration('parse', time.monotonic() - start_time)
+
+                    self._put(self._parsed_batches_queue, parsed_batch)
+
+                    parsed_batch = []
+                    start_time = time.monotonic()
+
+            self._update_stage_duration('parse', time.monotonic() - start_time)
+
+            if parsed_batch:
+                self._put(self._parsed_batches_queue, parsed_batch)
+        except EPGPipelineAbortedError:
+            pass
+        except Exception:
+            self._abort()
+        finally:
+            try:
+                for _ in range(EPG_PIPELINE_NUMBER_OF_FORMATTING_WORKERS):
+                    self._put(self._parsed_batches_queue, None)
+            except EPGPipelineAbortedError:
+                pass
+
+    def _put(self, queue_, item):
+        while True:
+            try:
+                queue_.put(item, timeout=EPG_PIPELINE_QUEUE_TIMEOUT)
+
+                return
+            except queue.Full:
+                if self._abort_event.is_set():
+                    raise EPGPipelineAbortedError
+
+    def _read(self):
+        try:
+            while not self._abort_event.is_set():
+                start_time = time.monotonic()
+
+                chunk = self._epg_xml_stream.read(EPG_PIPELINE_READ_SIZE)
+
+                self._update_stage_duration('download', time.monotonic() - start_time)
+
+                if not chunk:
+                    break
+
+                self._put(self._chunks_queue, chunk)
+        except EPGPipelineAbortedError:
+            pass
+        except Exception:
+            self._abort()
+        finally:
+            try:
+                self._put(self._chunks_queue, None)
+            except EPGPipelineAbortedError:
+                pass
+
+    def _update_stage_duration(self, stage, duration):
+        with self._lock:
+            self._stage_durations[stage] += duration
+
+    def get_chunk(self):
+        start_time = time.monotonic()
+
+        try:
+            return self._get(self._chunks_queue)
+        finally:
+            # The parser is not charged for the time it waits on the download
+            self._update_stage_duration('parse', start_time - time.monotonic())
+
+    def run(self):
+        start_time = time.monotonic()
+
+        stage_threads = [Thread(target=self._read), Thread(target=self._parse)] + [
+            Thread(target=self._format)
+            for _ in range(EPG_PIPELINE_NUMBER_OF_FORMATTING_WORKERS)
+        ]
+
+        for stage_thread in stage_threads:
+            stage_thread.daemon = True
+            stage_thread.start()
+
+        # The batches are written by the calling thread which owns the
+        # database session
+        try:
+            number_of_formatting_workers_running = (
+                EPG_PIPELINE_NUMBER_OF_FORMATTING_WORKERS
+            )
+
+            while number_of_formatting_workers_running:
+                formatted_batch = self._get(self._formatted_batches_queue)
+
+                if formatted_batch is None:
+                    number_of_formatting_workers_running -= 1
+
+                    continue
+
+                write_start_time = time.monotonic()
+
+                self._write_function(formatted_batch)
+
+                self._update_stage_duration(
+                    'write', time.monotonic() - write_start_time
+                )
+        except EPGPipelineAbortedError:
+            pass
+        except Exception:
+            self._abort()
+        finally:
+            self._abort_event.set()
+
+            for stage_thread in stage_threads:
+                stage_thread.join()
+
+        if self._exception is not None:
+            raise self._exception
+
+        with self._lock:
+            stage_durations = list(self._stage_durations.items())
+
+        for (stage, stage_duration) in stage_durations:
+            MetricsManager.observe_epg_pipeline_stage(
+                self._provider_name, stage, stage_duration
+            )
+
+        logger.debug(
+            'Processed %s XML EPG through the pipeline\n' 'Total    => %.3fs\n' '%s',
+            self._provider_name,
+            time.monotonic() - start_time,
+            '\n'.join(
+                '{0:<8} => {1:.3f}s'.format(stage.capitalize(), stage_duration)
+                for (stage, stage_duration) in stage_durations
+            ),
+        )
@@ -2,6 +2,10 @@ class DuplicateRecordingError(Exception):
     pass
 
 
+class EPGPipelineAbortedError(Exception):
+    pass
+
+
 class HLSPlaylistDownloadError(Exception):
     pass
 
@@ -16,3 +20,7 @@ class RecordingNotFoundError(Exception):
 
 class SegmentNotFoundError(Exception):
     pass
+
+
+class SingleFlightCallTimeoutError(Exception):
+    pass
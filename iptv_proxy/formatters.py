@@ -1,6 +1,20 @@
 from logging import Formatter
 
 
+class LazyLogMessage(object):
+    __slots__ = ['_args', '_function', '_kwargs']
+
+    def __init__(self, function, *args, **kwargs):
+        self._args = args
+        self._function = function
+        self._kwargs = kwargs
+
+    def __str__(self):
+        # The message is only assembled when a handler formats the record,
+        # which never happens if the record's level is disabled
+        return self._function(*self._args, **self._kwargs)
+
+
 class MultiLineFormatter(Formatter):
     def format(self, record):
         formatted_string = Formatter.format(self, record)
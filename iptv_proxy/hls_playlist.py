@@ -0,0 +1,246 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HLSSegment(object):
+    __slots__ = ['_carried_over_tag_lines', '_duration', '_tag_lines', '_title', '_uri']
+
+    def __init__(self, uri, duration, title, tag_lines=(), carried_over_tag_lines=()):
+        self._carried_over_tag_lines = tuple(carried_over_tag_lines)
+        self._duration = duration
+        self._tag_lines = tuple(tag_lines)
+        self._title = title
+        self._uri = uri
+
+    @property
+    def carried_over_tag_lines(self):
+        return self._carried_over_tag_lines
+
+    @property
+    def duration(self):
+        return self._duration
+
+    @property
+    def tag_lines(self):
+        return self._tag_lines
+
+    @property
+    def title(self):
+        return self._title
+
+    @property
+    def uri(self):
+        return self._uri
+
+
+class HLSPlaylist(object):
+    __slots__ = [
+        '_lines',
+        '_media_sequence_line_index',
+        '_playlist_uri_line_indices',
+        '_segment_line_indices',
+        '_target_duration',
+    ]
+
+    _carried_over_segment_tags = ('#EXT-X-KEY', '#EXT-X-MAP')
+    _header_tags = frozenset(
+        [
+            '#EXTM3U',
+            '#EXT-X-ALLOW-CACHE',
+            '#EXT-X-DISCONTINUITY-SEQUENCE',
+            '#EXT-X-I-FRAME-STREAM-INF',
+            '#EXT-X-I-FRAMES-ONLY',
+            '#EXT-X-INDEPENDENT-SEGMENTS',
+            '#EXT-X-MEDIA',
+            '#EXT-X-MEDIA-SEQUENCE',
+            '#EXT-X-PLAYLIST-TYPE',
+            '#EXT-X-SESSION-DATA',
+            '#EXT-X-SESSION-KEY',
+            '#EXT-X-START',
+            '#EXT-X-TARGETDURATION',
+            '#EXT-X-VERSION',
+        ]
+    )
+
+    def __init__(self, playlist_m3u8):
+        self._lines = playlist_m3u8.splitlines()
+        self._media_sequence_line_index = None
+        self._playlist_uri_line_indices = []
+        # Each segment is indexed by the first line of its tags and the line of
+        # its URI. The tags of a segment start on the line following the URI of
+        # the previous segment
+        self._segment_line_indices = []
+        self._target_duration = None
+
+        self._parse()
+
+    def _find_tag_line(self, start_line_index, end_line_index, tag):
+        tag_line = None
+
+        for line in self._lines[start_line_index:end_line_index]:
+            if line.startswith(tag):
+                tag_line = line
+
+        return tag_line
+
+    def _parse(self):
+        block_start_line_index = None
+        is_playlist_block = False
+
+        for (line_index, line) in enumerate(self._lines):
+            if line.startswith('#'):
+                tag = line.split(':', 1)[0]
+
+                if block_start_line_index is None:
+                    if tag in self._header_tags or not line.startswith('#EXT'):
+                        if tag == '#EXT-X-MEDIA-SEQUENCE':
+                            self._media_sequence_line_index = line_index
+                        elif tag == '#EXT-X-TARGETDURATION':
+                            self._target_duration = float(line.split(':', 1)[1])
+
+                        continue
+
+                    block_start_line_index = line_index
+
+                if tag == '#EXT-X-STREAM-INF':
+                    is_playlist_block = True
+            elif line.strip():
+                if block_start_line_index is None:
+                    block_start_line_index = line_index
+
+                if is_playlist_block:
+                    self._playlist_uri_line_indices.append(line_index)
+                else:
+                    self._segment_line_indices.append(
+                        (block_start_line_index, line_index)
+                    )
+
+                block_start_line_index = line_index + 1
+                is_playlist_block = False
+
+    def dumps(self, number_of_segments_to_drop=0, segment_uri_function=None):
+        lines = self._lines
+        segment_line_indices = self._segment_line_indices
+
+        if not segment_line_indices:
+            return '{0}\n'.format('\n'.join(lines))
+
+        number_of_segments_to_drop = min(
+            max(number_of_segments_to_drop, 0), len(segment_line_indices)
+        )
+
+        playlist_lines = lines[: segment_line_indices[0][0]]
+        # The segments are contiguous so the segments kept start on the line
+        # following the URI of the last segment dropped
+        kept_segments_start_line_index = (
+            segment_line_indices[number_of_segments_to_drop - 1][1] + 1
+            if number_of_segments_to_drop
+            else segment_line_indices[0][0]
+        )
+
+        if number_of_segments_to_drop:
+            if self._media_sequence_line_index is None:
+                playlist_lines.insert(
+                    1, '#EXT-X-MEDIA-SEQUENCE:{0}'.format(number_of_segments_to_drop)
+                )
+            else:
+                playlist_lines[
+                    self._media_sequence_line_index
+                ] = '#EXT-X-MEDIA-SEQUENCE:{0}'.format(
+                    int(lines[self._media_sequence_line_index].split(':', 1)[1])
+                    + number_of_segments_to_drop
+                )
+
+            # The key and the media initialization section of a segment apply to
+            # the segments that follow it until they are replaced. Those of the
+            # dropped segments are carried over to the first segment kept
+            if number_of_segments_to_drop < len(segment_line_indices):
+                kept_segment_uri_line_index = segment_line_indices[
+                    number_of_segments_to_drop
+                ][1]
+            else:
+                kept_segment_uri_line_index = kept_segments_start_line_index
+
+            for tag in self._carried_over_segment_tags:
+                tag_line = self._find_tag_line(
+                    segment_line_indices[0][0], kept_segments_start_line_index, tag
+                )
+
+                if tag_line is not None and not self._find_tag_line(
+                    kept_segments_start_line_index, kept_segment_uri_line_index, tag
+                ):
+                    playlist_lines.append(tag_line)
+
+        if segment_uri_function is None:
+            playlist_lines.extend(lines[kept_segments_start_line_index:])
+        else:
+            for (start_line_index, uri_line_index) in segment_line_indices[
+                number_of_segments_to_drop:
+            ]:
+                playlist_lines.extend(lines[start_line_index:uri_line_index])
+                playlist_lines.append(
+                    segment_uri_function(lines[uri_line_index].strip())
+                )
+
+            playlist_lines.extend(lines[segment_line_indices[-1][1] + 1 :])
+
+        return '{0}\n'.format('\n'.join(playlist_lines))
+
+    @property
+    def playlist_uris(self):
+        return [
+            self._lines[line_index].strip()
+            for line_index in self._playlist_uri_line_indices
+        ]
+
+    @property
+    def segment_uris(self):
+        return [
+            self._lines[uri_line_index].strip()
+            for (_, uri_line_index) in self._segment_line_indices
+        ]
+
+    @property
+    def segments(self):
+        carried_over_tag_lines = {}
+        segments = []
+
+        for (start_line_index, uri_line_index) in self._segment_line_indices:
+            duration = 0.0
+            tag_lines = []
+            title = None
+
+            # Besides its duration and title, a segment keeps the rest of its
+            # tags (discontinuity, key, program date time, ...) as is
+            for line in self._lines[start_line_index:uri_line_index]:
+                if line.startswith('#EXTINF:'):
+                    (duration, _, title) = line[8:].partition(',')
+                    duration = float(duration)
+                elif line.startswith('#EXT'):
+                    tag_lines.append(line)
+
+                    tag = line.split(':', 1)[0]
+
+                    if tag in self._carried_over_segment_tags:
+                        carried_over_tag_lines[tag] = line
+
+            segments.append(
+                HLSSegment(
+                    self._lines[uri_line_index].strip(),
+                    duration,
+                    title,
+                    tag_lines=tag_lines,
+                    carried_over_tag_lines=[
+                        carried_over_tag_lines[tag]
+                        for tag in self._carried_over_segment_tags
+                        if tag in carried_over_tag_lines
+                    ],
+                )
+            )
+
+        return segments
+
+    @property
+    def target_duration(self):
+        return self._target_duration
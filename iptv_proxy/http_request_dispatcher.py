@@ -0,0 +1,439 @@
+import logging
+import re
+import selectors
+import socket
+import ssl
+import time
+from collections import deque
+from threading import Condition
+from threading import Lock
+from threading import Thread
+
+from iptv_proxy.constants import HTTP_REQUEST_CLASSIFICATION_RETRY_INTERVAL
+from iptv_proxy.constants import HTTP_REQUEST_CLASSIFICATION_TIMEOUT
+from iptv_proxy.constants import HTTP_REQUEST_LINE_MAXIMUM_SIZE
+from iptv_proxy.constants import HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS
+from iptv_proxy.constants import HTTP_SERVER_RETRY_AFTER
+from iptv_proxy.enums import HTTPRequestPriority
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPRequestDispatcher(object):
+    __slots__ = [
+        '_condition',
+        '_deferred_requests',
+        '_is_stopped',
+        '_maximum_number_of_queued_requests',
+        '_maximum_number_of_workers',
+        '_number_of_busy_workers',
+        '_number_of_rejected_requests',
+        '_number_of_streams',
+        '_pending_requests',
+        '_pending_requests_lock',
+        '_request_queues',
+        '_selector',
+        '_server',
+        '_threads',
+        '_wakeup_sockets',
+    ]
+
+    def __init__(
+        self, server, maximum_number_of_workers, maximum_number_of_queued_requests
+    ):
+        self._condition = Condition()
+        self._deferred_requests = []
+        self._is_stopped = False
+        self._maximum_number_of_queued_requests = maximum_number_of_queued_requests
+        self._maximum_number_of_workers = maximum_number_of_workers
+        self._number_of_busy_workers = 0
+        self._number_of_rejected_requests = {
+            http_request_priority: 0 for http_request_priority in HTTPRequestPriority
+        }
+        self._number_of_streams = 0
+        self._pending_requests = []
+        self._pending_requests_lock = Lock()
+        self._request_queues = {
+            http_request_priority: deque()
+            for http_request_priority in HTTPRequestPriority
+        }
+        self._selector = None
+        self._server = server
+        self._threads = []
+        self._wakeup_sockets = None
+
+    @classmethod
+    def _classify_request(cls, request):
+        # The request line of TLS connections can't be peeked at
+        if isinstance(request, ssl.SSLSocket):
+            return HTTPRequestPriority.STANDARD
+
+        request_head = request.recv(HTTP_REQUEST_LINE_MAXIMUM_SIZE, socket.MSG_PEEK)
+
+        if b'\r\n' not in request_head and (
+            request_head and len(request_head) < HTTP_REQUEST_LINE_MAXIMUM_SIZE
+        ):
+            return None
+
+        return cls.determine_request_priority(request_head)
+
+    def _classify_requests(self):
+        while True:
+            select_timeout = 1
+
+            if self._deferred_requests:
+                select_timeout = max(
+                    0,
+                    min(
+                        select_timeout,
+                        min(
+                            retry_time for (_, _, retry_time) in self._deferred_requests
+                        )
+                        - time.monotonic(),
+                    ),
+                )
+
+            events = self._selector.select(select_timeout)
+
+            with self._pending_requests_lock:
+                if self._is_stopped:
+                    break
+
+                for (request, client_address) in self._pending_requests:
+                    self._selector.register(
+                        request,
+                        selectors.EVENT_READ,
+                        (
+                            client_address,
+                            time.monotonic() + HTTP_REQUEST_CLASSIFICATION_TIMEOUT,
+                        ),
+                    )
+
+                self._pending_requests = []
+
+            for (selector_key, _) in events:
+                if selector_key.fileobj is self._wakeup_sockets[0]:
+                    self._wakeup_sockets[0].recv(HTTP_REQUEST_LINE_MAXIMUM_SIZE)
+
+                    continue
+
+                request = selector_key.fileobj
+
+                try:
+                    http_request_priority = self._classify_request(request)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    http_request_priority = HTTPRequestPriority.STANDARD
+
+                self._selector.unregister(request)
+
+                if http_request_priority is not None:
+                    request.setblocking(True)
+
+                    self._dispatch_request(
+                        request, selector_key.data[0], http_request_priority
+                    )
+                else:
+                    # Only part of the request line has arrived. The socket
+                    # remains readable until the rest of it arrives, so it is
+                    # set aside for a while rather than peeked at again and
+                    # again
+                    self._deferred_requests.append(
+                        (
+                            request,
+                            selector_key.data,
+                            time.monotonic()
+                            + HTTP_REQUEST_CLASSIFICATION_RETRY_INTERVAL,
+                        )
+                    )
+
+            current_time = time.monotonic()
+
+            deferred_requests = []
+
+            for (request, data, retry_time) in self._deferred_requests:
+                if current_time > data[1]:
+                    self._server.shutdown_request(request)
+                elif current_time >= retry_time:
+                    self._selector.register(request, selectors.EVENT_READ, data)
+                else:
+                    deferred_requests.append((request, data, retry_time))
+
+            self._deferred_requests = deferred_requests
+
+            # Clients that connect but never send a request are disconnected
+            for selector_key in list(self._selector.get_map().values()):
+                if selector_key.fileobj is self._wakeup_sockets[0]:
+                    continue
+
+                if current_time > selector_key.data[1]:
+                    self._selector.unregister(selector_key.fileobj)
+
+                    self._server.shutdown_request(selector_key.fileobj)
+
+        for selector_key in list(self._selector.get_map().values()):
+            if selector_key.fileobj is not self._wakeup_sockets[0]:
+                self._server.shutdown_request(selector_key.fileobj)
+
+        for (request, _, _) in self._deferred_requests:
+            self._server.shutdown_request(request)
+
+        self._deferred_requests = []
+
+        self._selector.close()
+
+        for wakeup_socket in self._wakeup_sockets:
+            wakeup_socket.close()
+
+    def _dispatch_request(self, request, client_address, http_request_priority):
+        # Continuous streams last for as long as the client stays connected.
+        # Each is serviced by a thread of its own rather than tie up a worker
+        if http_request_priority == HTTPRequestPriority.STREAM:
+            with self._condition:
+                if self._number_of_streams < HTTP_SERVER_MAXIMUM_NUMBER_OF_STREAMS:
+                    self._number_of_streams += 1
+
+                    stream_thread = Thread(
+                        target=self._process_stream, args=(request, client_address)
+                    )
+                    stream_thread.daemon = True
+                    stream_thread.start()
+
+                    return
+
+            self._reject_request(request, client_address, http_request_priority)
+
+            return
+
+        with self._condition:
+            request_queue = self._request_queues[http_request_priority]
+
+            if len(request_queue) < self._maximum_number_of_queued_requests:
+                request_queue.append((request, client_address))
+
+                self._condition.notify()
+
+                return
+
+        self._reject_request(request, client_address, http_request_priority)
+
+    def _process_requests(self):
+        while True:
+            with self._condition:
+                while not self._is_stopped and not any(self._request_queues.values()):
+                    self._condition.wait()
+
+                if self._is_stopped:
+                    break
+
+                # Lanes are serviced in the order in which they are declared
+                for http_request_priority in HTTPRequestPriority:
+                    if self._request_queues[http_request_priority]:
+                        (request, client_address) = self._request_queues[
+                            http_request_priority
+                        ].popleft()
+
+                        break
+
+                self._number_of_busy_workers += 1
+
+            try:
+                self._server.process_request_thread(request, client_address)
+            finally:
+                with self._condition:
+                    self._number_of_busy_workers -= 1
+
+    def _process_stream(self, request, client_address):
+        try:
+            self._server.process_request_thread(request, client_address)
+        finally:
+            with self._condition:
+                self._number_of_streams -= 1
+
+    def _reject_request(self, request, client_address, http_request_priority):
+        with self._condition:
+            self._number_of_rejected_requests[http_request_priority] += 1
+
+        logger.debug(
+            'Rejected request\n'
+            'Client IP address => %s\n'
+            'Lane              => %s\n'
+            'Reason            => Server is saturated',
+            client_address[0],
+            http_request_priority.value,
+        )
+
+        try:
+            request.setblocking(True)
+            request.sendall(self.format_service_unavailable_response())
+        except OSError:
+            pass
+
+        self._server.shutdown_request(request)
+
+    @classmethod
+    def determine_request_priority(cls, request_head):
+        match = re.match(rb'\A[A-Z]+ ([^ ?]*)', request_head)
+
+        if match:
+            requested_path = match.group(1).lower()
+
+            if requested_path.endswith(b'/stream.ts'):
+                return HTTPRequestPriority.STREAM
+
+            if requested_path.endswith((b'.ts', b'chunks.m3u8', b'timeshift.m3u8')):
+                return HTTPRequestPriority.LIVE
+
+        return HTTPRequestPriority.STANDARD
+
+    def dispatch(self, request, client_address, is_kept_alive=False):
+        # The request line of TLS connections can't be peeked at, so new ones
+        # are serviced through the standard lane right away. Kept-alive ones
+        # wait in the selector like any other idle connection
+        if isinstance(request, ssl.SSLSocket) and not is_kept_alive:
+            self._dispatch_request(
+                request, client_address, HTTPRequestPriority.STANDARD
+            )
+
+            return
+
+        with self._pending_requests_lock:
+            if self._is_stopped:
+                self._server.shutdown_request(request)
+
+                return
+
+            if not is_kept_alive and (
+                # The selector also holds the classifier's wakeup socket
+                len(self._pending_requests)
+                + len(self._selector.get_map())
+                - 1
+                + len(self._deferred_requests)
+                >= self._maximum_number_of_queued_requests
+            ):
+                is_rejected = True
+            else:
+                is_rejected = False
+
+                request.setblocking(False)
+
+                self._pending_requests.append((request, client_address))
+
+        if is_rejected:
+            self._reject_request(request, client_address, HTTPRequestPriority.STANDARD)
+        else:
+            self._wakeup_sockets[1].send(b'\0')
+
+    @classmethod
+    def format_service_unavailable_response(cls):
+        return (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            'Connection: close\r\n'
+            'Content-Length: 0\r\n'
+            'Retry-After: {0}\r\n\r\n'.format(HTTP_SERVER_RETRY_AFTER).encode()
+        )
+
+    def get_statistics(self):
+        with self._condition:
+            return {
+                'busy_workers': self._number_of_busy_workers,
+                'maximum_number_of_workers': self._maximum_number_of_workers,
+                'queue_depths': {
+                    http_request_priority.value: len(
+                        self._request_queues[http_request_priority]
+                    )
+                    for http_request_priority in HTTPRequestPriority
+                },
+                'rejected_requests': {
+                    http_request_priority.value: self._number_of_rejected_requests[
+                        http_request_priority
+                    ]
+                    for http_request_priority in HTTPRequestPriority
+                },
+            }
+
+    def start(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_sockets = socket.socketpair()
+        self._wakeup_sockets[0].setblocking(False)
+        self._selector.register(self._wakeup_sockets[0], selectors.EVENT_READ)
+
+        classifier_thread = Thread(target=self._classify_requests)
+        classifier_thread.daemon = True
+        classifier_thread.start()
+
+        self._threads.append(classifier_thread)
+
+        for _ in range(self._maximum_number_of_workers):
+            worker_thread = Thread(target=self._process_requests)
+            worker_thread.daemon = True
+            worker_thread.start()
+
+            self._threads.append(worker_thread)
+
+    def stop(self):
+        with self._pending_requests_lock:
+            self._is_stopped = True
+
+            for (request, _) in self._pending_requests:
+                self._server.shutdown_request(request)
+
+            self._pending_requests = []
+
+        if self._wakeup_sockets is not None:
+            self._wakeup_sockets[1].send(b'\0')
+
+        with self._condition:
+            self._is_stopped = True
+
+            for request_queue in self._request_queues.values():
+                while request_queue:
+                    self._server.shutdown_request(request_queue.popleft()[0])
+
+            self._condition.notify_all()
+
+
+class ThreadPoolMixIn(object):
+    def __init__(self, maximum_number_of_workers, maximum_number_of_queued_requests):
+        self._http_request_dispatcher = HTTPRequestDispatcher(
+            self, maximum_number_of_workers, maximum_number_of_queued_requests
+        )
+
+    def get_statistics(self):
+        return self._http_request_dispatcher.get_statistics()
+
+    def process_request(self, request, client_address):
+        self._http_request_dispatcher.dispatch(request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        is_kept_alive = False
+
+        try:
+            http_request_handler = self.RequestHandlerClass(
+                request, client_address, self
+            )
+
+            is_kept_alive = not http_request_handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            # A kept-alive connection is returned to the dispatcher which
+            # classifies its next request or disconnects it once it has been
+            # idle for too long
+            if is_kept_alive:
+                self._http_request_dispatcher.dispatch(
+                    request, client_address, is_kept_alive=True
+                )
+            else:
+                self.shutdown_request(request)
+
+    def serve_forever(self, poll_interval=0.5):
+        self._http_request_dispatcher.start()
+
+        super().serve_forever(poll_interval)
+
+    def server_close(self):
+        super().server_close()
+
+        self._http_request_dispatcher.stop()
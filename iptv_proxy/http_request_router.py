@@ -0,0 +1,185 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPRoute(object):
+    __slots__ = [
+        '_handler_method_name',
+        '_method',
+        '_name',
+        '_path',
+        '_query_string_parameter_suffixes',
+        '_query_string_parameters',
+    ]
+
+    def __init__(
+        self,
+        method,
+        path,
+        handler_method_name,
+        query_string_parameters=None,
+        query_string_parameter_suffixes=(),
+    ):
+        self._handler_method_name = handler_method_name
+        self._method = method
+        # The name of a route is its path stripped of the parameter patterns
+        self._name = re.sub(r'<(\w+):[^>]+>', r'<\1>', path)
+        self._path = path
+        self._query_string_parameter_suffixes = tuple(query_string_parameter_suffixes)
+
+        if query_string_parameters is None:
+            self._query_string_parameters = None
+        else:
+            self._query_string_parameters = frozenset(query_string_parameters)
+
+    def is_query_string_valid(self, query_string_parameters):
+        # Routes that declare no query string parameters validate the query
+        # string themselves
+        if self._query_string_parameters is None:
+            return True
+
+        for query_string_parameter in query_string_parameters:
+            if query_string_parameter not in self._query_string_parameters and not (
+                query_string_parameter.endswith(self._query_string_parameter_suffixes)
+            ):
+                return False
+
+        return True
+
+    @property
+    def handler_method_name(self):
+        return self._handler_method_name
+
+    @property
+    def method(self):
+        return self._method
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def path(self):
+        return self._path
+
+
+class HTTPRouteNode(object):
+    __slots__ = ['_literal_children', '_parameter_children', '_route']
+
+    def __init__(self):
+        self._literal_children = {}
+        self._parameter_children = []
+        self._route = None
+
+    def add_literal_child(self, path_token):
+        try:
+            return self._literal_children[path_token]
+        except KeyError:
+            child = HTTPRouteNode()
+
+            self._literal_children[path_token] = child
+
+            return child
+
+    def add_parameter_child(self, parameter_name, parameter_pattern):
+        for (name, pattern, child) in self._parameter_children:
+            if name == parameter_name and pattern == parameter_pattern:
+                return child
+
+        child = HTTPRouteNode()
+
+        self._parameter_children.append((parameter_name, parameter_pattern, child))
+
+        return child
+
+    def match(self, path_tokens, path_token_index, path_parameters):
+        if path_token_index == len(path_tokens):
+            return self._route
+
+        path_token = path_tokens[path_token_index]
+
+        # Literal path tokens take precedence over parameters. The search
+        # backtracks when a literal path token leads to a dead end
+        child = self._literal_children.get(path_token)
+
+        if child is not None:
+            route = child.match(path_tokens, path_token_index + 1, path_parameters)
+
+            if route is not None:
+                return route
+
+        for (parameter_name, parameter_pattern, child) in self._parameter_children:
+            if parameter_pattern is None or parameter_pattern.match(path_token):
+                route = child.match(path_tokens, path_token_index + 1, path_parameters)
+
+                if route is not None:
+                    path_parameters[parameter_name] = path_token
+
+                    return route
+
+        return None
+
+    @property
+    def route(self):
+        return self._route
+
+    @route.setter
+    def route(self, route):
+        self._route = route
+
+
+class HTTPRequestRouter(object):
+    __slots__ = ['_root_nodes']
+
+    _path_parameter_regular_expression = re.compile(r'\A<(\w+)(?::(.+))?>\Z')
+
+    def __init__(self, routes):
+        self._root_nodes = {}
+
+        for route in routes:
+            self._add_route(route)
+
+    def _add_route(self, route):
+        path_tokens = route.path[1:].split('/')
+
+        # Routes are first bucketed by method and number of path tokens so
+        # that only routes of the requested shape are ever searched
+        try:
+            node = self._root_nodes[(route.method, len(path_tokens))]
+        except KeyError:
+            node = HTTPRouteNode()
+
+            self._root_nodes[(route.method, len(path_tokens))] = node
+
+        for path_token in path_tokens:
+            match = self._path_parameter_regular_expression.match(path_token)
+
+            if match:
+                node = node.add_parameter_child(
+                    match.group(1),
+                    re.compile(r'\A(?:{0})\Z'.format(match.group(2)))
+                    if match.group(2)
+                    else None,
+                )
+            else:
+                node = node.add_literal_child(path_token)
+
+        if node.route is not None:
+            raise ValueError('Duplicate route {0} {1}'.format(route.method, route.path))
+
+        node.route = route
+
+    def match(self, method, path_tokens):
+        try:
+            node = self._root_nodes[(method, len(path_tokens))]
+        except KeyError:
+            return (None, None)
+
+        path_parameters = {}
+        route = node.match(
+            [path_token.lower() for path_token in path_tokens], 0, path_parameters
+        )
+
+        return (route, path_parameters)
@@ -5,23 +5,22 @@ import functools
 import http.client
 import json
 import logging
+import os
 import pprint
 import re
 import ssl
 import sys
+import time
 import traceback
 import urllib.parse
 import uuid
-import zlib
 from datetime import datetime
 from datetime import timedelta
 from http.cookies import CookieError
 from http.cookies import SimpleCookie
 from http.server import BaseHTTPRequestHandler
 from http.server import HTTPServer as HTTPServer_
-from io import BytesIO
 from json import JSONDecodeError
-from socketserver import ThreadingMixIn
 from threading import Thread
 
 import pytz
@@ -30,34 +29,60 @@ import tzlocal
 from rwlock import RWLock
 
 from iptv_proxy.cache import CacheManager
+from iptv_proxy.chunked_transfer_encoder import ChunkedTransferEncoder
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.configuration import OptionalSettings
 from iptv_proxy.constants import DEFAULT_STREAMING_PROTOCOL
+from iptv_proxy.constants import EPG_MAXIMUM_NUMBER_OF_DAYS
 from iptv_proxy.constants import HTTP_CHUNK_SIZE
+from iptv_proxy.constants import HTTP_REQUEST_HANDLER_TIMEOUT
+from iptv_proxy.constants import SENDMSG_MAXIMUM_NUMBER_OF_BUFFERS
+from iptv_proxy.constants import SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
+from iptv_proxy.continuous_ts_stream import ContinuousTSStream
 from iptv_proxy.data_access import DatabaseAccess
 from iptv_proxy.data_model import HTTPSession
 from iptv_proxy.db import Database
 from iptv_proxy.enums import EPGStyle
 from iptv_proxy.enums import IPAddressType
 from iptv_proxy.epg import EPG
+from iptv_proxy.epg_artifact_cache import EPGArtifactCache
 from iptv_proxy.exceptions import SegmentNotFoundError
+from iptv_proxy.exceptions import SingleFlightCallTimeoutError
+from iptv_proxy.formatters import LazyLogMessage
 from iptv_proxy.html_template_engine import HTMLTemplateEngine
+from iptv_proxy.http_request_dispatcher import ThreadPoolMixIn
+from iptv_proxy.http_request_router import HTTPRequestRouter
+from iptv_proxy.http_request_router import HTTPRoute
+from iptv_proxy.http_session_cache import HTTPSessionCache
 from iptv_proxy.json_api import ConfigurationJSONAPI
 from iptv_proxy.json_api import RecordingsJSONAPI
+from iptv_proxy.metrics import MetricsManager
+from iptv_proxy.prefetcher import SegmentPrefetcher
 from iptv_proxy.providers import ProvidersController
 from iptv_proxy.proxy import IPTVProxy
 from iptv_proxy.recorder import PVR
 from iptv_proxy.security import SecurityManager
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.timeshift import TimeshiftManager
+from iptv_proxy.tuner import TunerManager
 from iptv_proxy.utilities import Utility
 
 logger = logging.getLogger(__name__)
 
 
 class HTTPRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = HTTP_REQUEST_HANDLER_TIMEOUT
+
     _allow_insecure_lan_connections = True
     _allow_insecure_lan_connections_lock = RWLock()
     _allow_insecure_wan_connections = False
     _allow_insecure_wan_connections_lock = RWLock()
+    _do_stream_downloaded_segments = True
+    _do_stream_downloaded_segments_lock = RWLock()
+    _http_request_router = None
+    _http_response_chunk_size = HTTP_CHUNK_SIZE
+    _http_response_chunk_size_lock = RWLock()
     _lan_connections_require_credentials = False
     _lan_connections_require_credentials_lock = RWLock()
     _wan_connections_require_credentials = True
@@ -83,6 +108,24 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         except KeyError:
             pass
 
+        try:
+            cls.set_do_stream_downloaded_segments(
+                OptionalSettings.get_optional_settings_parameter(
+                    'stream_downloaded_segments'
+                )
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_http_response_chunk_size(
+                OptionalSettings.get_optional_settings_parameter(
+                    'http_response_chunk_size'
+                )
+            )
+        except KeyError:
+            pass
+
         try:
             cls.set_lan_connections_require_credentials(
                 OptionalSettings.get_optional_settings_parameter(
@@ -101,6 +144,139 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         except KeyError:
             pass
 
+    @classmethod
+    def _initialize_http_request_router(cls):
+        recording_id_path_token = r'<recording_id:[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}>'
+
+        cls._http_request_router = HTTPRequestRouter(
+            [
+                HTTPRoute(
+                    'DELETE',
+                    '/recordings/' + recording_id_path_token,
+                    '_process_delete_recording_request',
+                ),
+                HTTPRoute('GET', '/', '_process_get_index_htm_request'),
+                HTTPRoute(
+                    'GET', '/configuration', '_process_get_configuration_request'
+                ),
+                HTTPRoute('GET', '/index.htm', '_process_get_index_htm_request'),
+                HTTPRoute(
+                    'GET',
+                    '/index.html',
+                    '_process_get_index_html_request',
+                    query_string_parameters={'refresh_epg'},
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/epg.xml',
+                    '_process_get_epg_xml_request',
+                    query_string_parameters={'http_token', 'number_of_days', 'style'},
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/playlist.m3u8',
+                    '_process_get_playlist_m3u8_request',
+                    query_string_parameters={
+                        'client_uuid',
+                        'http_token',
+                        'protocol',
+                        'type',
+                    },
+                    query_string_parameter_suffixes=('_protocol', '_type'),
+                ),
+                HTTPRoute(
+                    'GET',
+                    r'/live/<provider_name>/<segment_file_name:.*\.ts>',
+                    '_process_get_provider_ts_request',
+                ),
+                HTTPRoute(
+                    'GET',
+                    r'/live/<provider_name>/timeshift/<segment_file_name:.*\.ts>',
+                    '_process_get_provider_timeshift_ts_request',
+                    query_string_parameters={
+                        'channel_number',
+                        'client_uuid',
+                        'http_token',
+                    },
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/<provider_name>/chunks.m3u8',
+                    '_process_get_provider_chunks_m3u8_request',
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/<provider_name>/epg.xml',
+                    '_process_get_provider_epg_xml_request',
+                    query_string_parameters={'http_token', 'number_of_days', 'style'},
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/<provider_name>/playlist.m3u8',
+                    '_process_get_provider_playlist_m3u8_request',
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/<provider_name>/stream.ts',
+                    '_process_get_provider_stream_ts_request',
+                    query_string_parameters={
+                        'channel_number',
+                        'client_uuid',
+                        'http_token',
+                    },
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/live/<provider_name>/timeshift.m3u8',
+                    '_process_get_provider_timeshift_m3u8_request',
+                    query_string_parameters={
+                        'channel_number',
+                        'client_uuid',
+                        'http_token',
+                        'type',
+                    },
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/metrics',
+                    '_process_get_metrics_request',
+                    query_string_parameters={'http_token'},
+                ),
+                HTTPRoute('GET', '/recordings', '_process_get_recordings_request'),
+                HTTPRoute(
+                    'GET',
+                    '/recordings/' + recording_id_path_token,
+                    '_process_get_recording_request',
+                ),
+                HTTPRoute(
+                    'GET',
+                    r'/vod/<segment_file_name:.*\.ts>',
+                    '_process_get_vod_ts_request',
+                    query_string_parameters={
+                        'client_uuid',
+                        'http_token',
+                        'recording_id',
+                    },
+                ),
+                HTTPRoute(
+                    'GET',
+                    '/vod/playlist.m3u8',
+                    '_process_get_vod_playlist_m3u8_request',
+                ),
+                HTTPRoute(
+                    'GET',
+                    r'/<directory_name>/<png_file_name:.+\.png>',
+                    '_process_get_png_request',
+                    query_string_parameters={'http_token'},
+                ),
+                HTTPRoute(
+                    'PATCH', '/configuration', '_process_patch_configuration_request'
+                ),
+                HTTPRoute('POST', '/index.html', '_process_post_index_html_request'),
+                HTTPRoute('POST', '/recordings', '_process_post_recordings_request'),
+            ]
+        )
+
     @classmethod
     def _initialize_http_sessions(cls, db_session):
         deleted_http_sessions_log_message = []
@@ -130,6 +306,8 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
 
                 deleted_http_sessions_log_message.append(formatted_message_to_log)
             else:
+                HTTPSessionCache.add_http_session(http_session_row)
+
                 loaded_http_sessions_log_message.append(formatted_message_to_log)
 
         if deleted_http_sessions_log_message:
@@ -155,6 +333,7 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
     @classmethod
     def initialize(cls):
         cls._initialize_class_variables()
+        cls._initialize_http_request_router()
 
         with Database.get_write_lock():
             db_session = Database.create_session()
@@ -176,6 +355,8 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
     def purge_http_sessions(cls, db_session):
         DatabaseAccess.delete_http_sessions(db_session)
 
+        HTTPSessionCache.purge()
+
     @classmethod
     def set_allow_insecure_lan_connections(cls, allow_insecure_lan_connections):
         with cls._allow_insecure_lan_connections_lock.writer_lock:
@@ -186,6 +367,16 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         with cls._allow_insecure_wan_connections_lock.writer_lock:
             cls._allow_insecure_wan_connections = allow_insecure_wan_connections
 
+    @classmethod
+    def set_do_stream_downloaded_segments(cls, do_stream_downloaded_segments):
+        with cls._do_stream_downloaded_segments_lock.writer_lock:
+            cls._do_stream_downloaded_segments = do_stream_downloaded_segments
+
+    @classmethod
+    def set_http_response_chunk_size(cls, http_response_chunk_size):
+        with cls._http_response_chunk_size_lock.writer_lock:
+            cls._http_response_chunk_size = http_response_chunk_size
+
     @classmethod
     def set_lan_connections_require_credentials(
         cls, lan_connections_require_credentials
@@ -204,6 +395,138 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 wan_connections_require_credentials
             )
 
+    def _assemble_request_to_log_message(self):
+        if self.headers:
+            request_headers_to_log = (
+                '[Header]\n'
+                '========\n'
+                '{0}\n\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(header, self.headers[header])
+                            for header in sorted(self.headers)
+                        ]
+                    )
+                )
+            )
+        else:
+            request_headers_to_log = ''
+
+        if self._requested_query_string_parameters:
+            request_query_parameters_to_log = (
+                '[Query Parameters]\n'
+                '==================\n'
+                '{0}\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(
+                                parameter,
+                                self._requested_query_string_parameters[parameter],
+                            )
+                            for parameter in sorted(
+                                self._requested_query_string_parameters
+                            )
+                        ]
+                    )
+                )
+            )
+        else:
+            request_query_parameters_to_log = ''
+
+        if self._request_body:
+            try:
+                request_content_to_log = '[Content]\n=========\n{0}'.format(
+                    pprint.pformat(json.loads(self._request_body))
+                )
+            except (JSONDecodeError, TypeError):
+                request_content_to_log = '[Content]\n=========\n{0}'.format(
+                    self._request_body
+                )
+        else:
+            request_content_to_log = ''
+
+        return (
+            'Request\n'
+            '[Source]\n'
+            '========\n%s\n\n'
+            '[Method]\n'
+            '[======]\n%s\n\n'
+            '[URL]\n'
+            '=====\n%s\n\n'
+            '%s%s%s'
+        ) % (
+            self._client_ip_address,
+            self.command,
+            'http{0}://{1}{2}'.format(
+                's' if self.server.is_secure else '',
+                self.headers.get('Host'),
+                self.path,
+            ),
+            request_headers_to_log,
+            request_query_parameters_to_log,
+            request_content_to_log,
+        )
+
+    def _assemble_response_to_log_message(self):
+        response_url_to_log = 'http{0}://{1}{2}'.format(
+            's' if self.server.is_secure else '',
+            self.headers.get('Host'),
+            self._requested_path_with_query_string,
+        )
+
+        if self._response_headers:
+            response_headers_to_log = (
+                '[Header]\n'
+                '========\n'
+                '{0}\n\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(
+                                header, self._response_headers[header]
+                            )
+                            for header in sorted(self._response_headers)
+                        ]
+                    )
+                )
+            )
+        else:
+            response_headers_to_log = ''
+
+        if self._do_log_response_content and self._response_content_to_log:
+            response_content_to_log = (
+                '[Content]\n'
+                '=========\n'
+                '{0}\n'.format(self._response_content_to_log)
+            )
+        else:
+            response_content_to_log = ''
+
+        return (
+            'Response\n'
+            '[Destination]\n'
+            '=============\n'
+            '%s%s\n\n'
+            '[Method]\n'
+            '[======]\n'
+            '%s\n\n'
+            '[URL]\n'
+            '=====\n'
+            '%s\n\n'
+            '[Status Code]\n'
+            '=============\n'
+            '%s\n\n'
+            '%s'
+            '%s'
+        ) % (
+            self._client_ip_address,
+            '/{0}'.format(self._client_uuid) if self._client_uuid else '',
+            self.command,
+            response_url_to_log,
+            self._response_status_code,
+            response_headers_to_log,
+            response_content_to_log,
+        )
+
     def _authenticate(self, password_to_authenticate):
         server_password = Configuration.get_configuration_parameter('SERVER_PASSWORD')
 
@@ -299,31 +622,162 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 ).value
                 self._cookies[cookie_name]['path'] = '/index.html'
 
-    def _generate_http_response_chunks(self, response_content):
-        start_index = 0
-        response_content_length = len(response_content)
+    def _dispatch_request(self):
+        start_time = time.monotonic()
 
-        while response_content_length:
-            number_of_bytes_written = self._response_content_buffer.write(
-                response_content[
-                    start_index : start_index
-                    + HTTP_CHUNK_SIZE
-                    - self._response_content_buffer_size
-                ]
+        self._initialize()
+        self._log_request()
+
+        try:
+            (
+                self._requested_route,
+                path_parameters,
+            ) = HTTPRequestHandler._http_request_router.match(
+                self.command, self._requested_path_tokens
+            )
+
+            if self._requested_route is None:
+                self._handle_not_found_error()
+            else:
+                getattr(self, self._requested_route.handler_method_name)(
+                    **path_parameters
+                )
+        except Exception:
+            self._handle_internal_server_error()
+
+        MetricsManager.observe_http_request(
+            self.command,
+            self._requested_route.name
+            if self._requested_route is not None
+            else 'unmatched',
+            self._response_status_code,
+            time.monotonic() - start_time,
+        )
+
+    def _download_ts_file(
+        self, provider_map_class, provider_name, channel_number, segment_file_name
+    ):
+        single_flight_key = (provider_name, channel_number, segment_file_name)
+
+        (single_flight_call, is_single_flight_leader,) = SingleFlightManager.begin_call(
+            single_flight_key
+        )
+
+        # Only one request per segment is ever sent to the provider. Everyone
+        # else requesting the same segment in the meantime is handed the
+        # outcome, be it the segment or the failure, of that single request
+        if not is_single_flight_leader:
+            try:
+                self._response_content = single_flight_call.wait(
+                    SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
+                )
+
+                return
+            except SingleFlightCallTimeoutError:
+                # The request relaying the segment may be held up by its
+                # client. The segment is downloaded independently instead
+                with MetricsManager.time_upstream_request(
+                    provider_name, 'download_ts_file'
+                ):
+                    self._response_content = provider_map_class.api_class().download_ts_file(
+                        self._client_ip_address,
+                        self._client_uuid,
+                        self._requested_url_components.path,
+                        self._requested_query_string_parameters,
+                    )
+
+                return
+
+        with HTTPRequestHandler._do_stream_downloaded_segments_lock.reader_lock:
+            do_stream_downloaded_segments = (
+                HTTPRequestHandler._do_stream_downloaded_segments
+            )
+
+        try:
+            with MetricsManager.time_upstream_request(
+                provider_name, 'download_ts_file'
+            ):
+                ts_file_content = provider_map_class.api_class().download_ts_file(
+                    self._client_ip_address,
+                    self._client_uuid,
+                    self._requested_url_components.path,
+                    self._requested_query_string_parameters,
+                    do_stream=do_stream_downloaded_segments,
+                )
+        except Exception as err:
+            SingleFlightManager.complete_call(single_flight_key, exception=err)
+
+            raise
+
+        if do_stream_downloaded_segments:
+            ts_file_chunks_generator = self._generate_streamed_ts_file_chunks(
+                single_flight_key, ts_file_content
+            )
+            next(ts_file_chunks_generator)
+
+            self._response_content_generator_method = functools.partial(
+                iter, ts_file_chunks_generator
+            )
+        else:
+            CacheManager.update_cache(
+                provider_name, channel_number, segment_file_name, ts_file_content
             )
+            TimeshiftManager.add_segment(
+                provider_name, channel_number, segment_file_name, ts_file_content
+            )
+            SingleFlightManager.complete_call(single_flight_key, result=ts_file_content)
+
+            self._response_content = ts_file_content
+
+    def _generate_streamed_ts_file_chunks(self, single_flight_key, ts_file_chunks):
+        is_client_connected = True
+
+        # The generator is primed as soon as it is created. Should the client
+        # disconnect before or while the segment is being relayed, the rest
+        # of the segment is still downloaded for the cache and for any
+        # request waiting on it
+        try:
+            yield
+        except GeneratorExit:
+            is_client_connected = False
+
+        # Chunks are forwarded to the client as they arrive from the
+        # provider and are assembled in parallel so that the cache only
+        # ever holds complete segments
+        ts_file_content = []
+
+        try:
+            for ts_file_chunk in ts_file_chunks:
+                ts_file_content.append(ts_file_chunk)
 
-            self._response_content_buffer_size += number_of_bytes_written
+                if is_client_connected:
+                    try:
+                        yield ts_file_chunk
+                    except GeneratorExit:
+                        is_client_connected = False
+        except Exception as err:
+            SingleFlightManager.complete_call(single_flight_key, exception=err)
+
+            raise
+
+        ts_file_content = b''.join(ts_file_content)
+
+        CacheManager.update_cache(*single_flight_key, ts_file_content)
+        TimeshiftManager.add_segment(*single_flight_key, ts_file_content)
+        SingleFlightManager.complete_call(single_flight_key, result=ts_file_content)
 
-            start_index += number_of_bytes_written
-            response_content_length -= number_of_bytes_written
+    def _get_active_provider_map_class(self, provider_name):
+        if provider_name in self._active_providers_map_class:
+            return ProvidersController.get_provider_map_class(provider_name)
 
-            if self._response_content_buffer_size == HTTP_CHUNK_SIZE:
-                self._response_content_buffer.seek(0)
-                yield True
+        if provider_name in ProvidersController.get_providers_map_class():
+            self._handle_service_unavailable_error(
+                ProvidersController.get_provider_map_class(provider_name).api_class()
+            )
+        else:
+            self._handle_not_found_error()
 
-                self._response_content_buffer.seek(0)
-                self._response_content_buffer.truncate()
-                self._response_content_buffer_size = 0
+        return None
 
     def _get_json_request_password(self):
         authorization = self.headers.get('Authorization')
@@ -347,6 +801,21 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
     def _handle_internal_server_error(self):
         (status, value_, traceback_) = sys.exc_info()
 
+        # The status line of a response can only be sent once. A response that
+        # failed part way through is cut short instead
+        if self._are_response_headers_sent:
+            logger.error(
+                'Response to %s for %s/%s was cut short\n%s',
+                self._requested_path_with_query_string,
+                self._client_ip_address,
+                self._client_uuid,
+                '\n'.join(traceback.format_exception_only(status, value_)),
+            )
+
+            self.close_connection = True
+
+            return
+
         logger.error(
             'HTTP error %s encountered requesting %s for %s/%s\n%s',
             requests.codes.INTERNAL_SERVER_ERROR,
@@ -409,8 +878,6 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         )
 
     def _initialize(self):
-        self.protocol_version = 'HTTP/1.1'
-
         self._client_ip_address = self.client_address[0]
         self._client_port_number = self.client_address[1]
         self._client_ip_address_type = Utility.determine_ip_address_type(
@@ -438,6 +905,7 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         )
         self._requested_path_tokens = self._requested_url_components.path[1:].split('/')
         self._requested_path_tokens_length = len(self._requested_path_tokens)
+        self._requested_route = None
 
         content_length = int(self.headers.get('Content-Length', 0))
         if content_length:
@@ -445,12 +913,12 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         else:
             self._request_body = None
 
+        self._are_response_headers_sent = False
         self._response_status_code = None
         self._response_headers = {}
         self._response_content = None
+        self._response_content_file = None
         self._response_content_generator_method = None
-        self._response_content_buffer = BytesIO()
-        self._response_content_buffer_size = 0
         self._response_content_to_log = None
         self._response_content_type = None
         self._response_content_encoding = None
@@ -469,6 +937,19 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
             self.command,
         )
 
+    def _is_channel_number_valid(
+        self, provider_map_class, channel_number_parameter_value
+    ):
+        # A channel number names a tuner and a timeshift directory. Only the
+        # channels in the EPG of the provider are accepted
+        return (
+            channel_number_parameter_value is not None
+            and re.match(r'\A[0-9]{1,9}\Z', channel_number_parameter_value) is not None
+            and provider_map_class.epg_class().is_channel_number_in_epg(
+                int(channel_number_parameter_value)
+            )
+        )
+
     def _is_logged_in(self):
         if self._authorization_required():
             http_session_id_cookie = self._cookies.get('http_session_id')
@@ -476,286 +957,904 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
             if http_session_id_cookie is None:
                 logged_in = False
             else:
-                http_session_id = http_session_id_cookie.value
-
-                with Database.get_write_lock():
-                    db_session = Database.create_session()
+                logged_in = HTTPSessionCache.is_http_session_valid(
+                    http_session_id_cookie.value,
+                    self._client_ip_address,
+                    self._user_agent,
+                )
+        else:
+            logged_in = True
 
-                    try:
-                        http_session = DatabaseAccess.query_http_session(
-                            db_session, http_session_id
-                        )
+        return logged_in
 
-                        if http_session is None:
-                            logged_in = False
-                        else:
-                            if (
-                                datetime.now(pytz.utc)
-                                > http_session.expiry_date_time_in_utc
-                                or self._client_ip_address
-                                != http_session.client_ip_address
-                                or self._user_agent != http_session.user_agent
-                            ):
-                                logged_in = False
-
-                                DatabaseAccess.delete_http_session(
-                                    db_session, http_session.id
-                                )
-                                db_session.commit()
-                            else:
-                                logged_in = True
+    def _is_number_of_days_valid(self, number_of_days_parameter_value):
+        # Every number of days is rendered into an EPG artifact of its own
+        return (
+            re.match(r'\A[0-9]{1,2}\Z', number_of_days_parameter_value) is not None
+            and 1 <= int(number_of_days_parameter_value) <= EPG_MAXIMUM_NUMBER_OF_DAYS
+        )
 
-                                http_session.last_access_date_time_in_utc = datetime.now(
-                                    pytz.utc
-                                )
-                    except Exception:
-                        (type_, value_, traceback_) = sys.exc_info()
-                        logger.error(
-                            '\n'.join(
-                                traceback.format_exception(type_, value_, traceback_)
-                            )
-                        )
+    def _is_request_pending(self):
+        if isinstance(self.connection, ssl.SSLSocket) and self.connection.pending():
+            return True
 
-                        db_session.rollback()
+        self.connection.setblocking(False)
 
-                        logged_in = False
-                    finally:
-                        db_session.close()
-        else:
-            logged_in = True
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
 
-        return logged_in
+    def _is_requested_query_string_valid(self):
+        return self._requested_route.is_query_string_valid(
+            self._requested_query_string_parameters
+        )
 
     def _log_request(self):
-        if logger.getEffectiveLevel() == logging.TRACE:
-            if self.headers:
-                request_headers_to_log = (
-                    '[Header]\n'
-                    '========\n'
-                    '{0}\n\n'.format(
-                        '\n'.join(
-                            [
-                                '{0:32} => {1!s}'.format(header, self.headers[header])
-                                for header in sorted(self.headers)
-                            ]
-                        )
-                    )
-                )
-            else:
-                request_headers_to_log = ''
-
-            if self._requested_query_string_parameters:
-                request_query_parameters_to_log = (
-                    '[Query Parameters]\n'
-                    '==================\n'
-                    '{0}\n'.format(
-                        '\n'.join(
-                            [
-                                '{0:32} => {1!s}'.format(
-                                    parameter,
-                                    self._requested_query_string_parameters[parameter],
-                                )
-                                for parameter in sorted(
-                                    self._requested_query_string_parameters
-                                )
-                            ]
-                        )
-                    )
+        logger.trace('%s', LazyLogMessage(self._assemble_request_to_log_message))
+
+    def _log_response(self):
+        logger.trace('%s', LazyLogMessage(self._assemble_response_to_log_message))
+
+    def _process_delete_recording_request(self, recording_id):
+        if self._screen_request(self._get_json_request_password()):
+            (self._response_content, self._response_status_code,) = RecordingsJSONAPI(
+                self
+            ).process_delete_request()
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _process_get_configuration_request(self):
+        if self._screen_request(self._get_json_request_password()):
+            (
+                self._response_content,
+                self._response_status_code,
+            ) = ConfigurationJSONAPI(self).process_get_request()
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _process_get_epg_xml_request(self):
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            number_of_days_parameter_value = self._requested_query_string_parameters.get(
+                'number_of_days', '1'
+            )
+
+            if self._is_requested_query_string_valid() and self._is_number_of_days_valid(
+                number_of_days_parameter_value
+            ):
+                style_parameter_value = self._requested_query_string_parameters.get(
+                    'style', EPGStyle.MINIMAL.value
                 )
-            else:
-                request_query_parameters_to_log = ''
 
-            if self._request_body:
                 try:
-                    request_content_to_log = '[Content]\n=========\n{0}'.format(
-                        pprint.pformat(json.loads(self._request_body))
-                    )
-                except (JSONDecodeError, TypeError):
-                    request_content_to_log = '[Content]\n=========\n{0}'.format(
-                        self._request_body
+                    self._send_epg_xml(
+                        self._active_providers_map_class,
+                        number_of_days_parameter_value,
+                        style_parameter_value,
                     )
+                except requests.exceptions.HTTPError as err:
+                    self._send_http_error(err.response.status_code, '')
             else:
-                request_content_to_log = ''
-
-            logger.trace(
-                'Request\n'
-                '[Source]\n'
-                '========\n%s\n\n'
-                '[Method]\n'
-                '[======]\n%s\n\n'
-                '[URL]\n'
-                '=====\n%s\n\n'
-                '%s%s%s',
-                self._client_ip_address,
-                self.command,
-                'http{0}://{1}{2}'.format(
-                    's' if self.server.is_secure else '',
-                    self.headers.get('Host'),
-                    self.path,
-                ),
-                request_headers_to_log,
-                request_query_parameters_to_log,
-                request_content_to_log,
-            )
+                self._handle_invalid_query_string()
 
-    def _log_response(self):
-        if logger.getEffectiveLevel() == logging.TRACE:
-            response_url_to_log = 'http{0}://{1}{2}'.format(
-                's' if self.server.is_secure else '',
-                self.headers.get('Host'),
-                self._requested_path_with_query_string,
-            )
+    def _process_get_index_htm_request(self):
+        self._response_status_code = requests.codes.FOUND
+        self._send_http_response()
 
-            if self._response_headers:
-                response_headers_to_log = (
-                    '[Header]\n'
-                    '========\n'
-                    '{0}\n\n'.format(
-                        '\n'.join(
-                            [
-                                '{0:32} => {1!s}'.format(
-                                    header, self._response_headers[header]
-                                )
-                                for header in sorted(self._response_headers)
+    def _process_get_index_html_request(self):
+        if self._transport_layer_requirements_satisfied():
+            if self._is_logged_in():
+                if self._is_requested_query_string_valid():
+                    refresh_epg_parameter_value = self._requested_query_string_parameters.get(
+                        'refresh_epg'
+                    )
+
+                    try:
+                        request_guide_provider_cookie_value = urllib.parse.unquote(
+                            self._cookies.get('guide_provider').value
+                        )
+                    except AttributeError:
+                        request_guide_provider_cookie_value = (
+                            self._active_providers_map_class[
+                                sorted(self._active_providers_map_class)[0]
                             ]
+                            .api_class()
+                            .__name__
                         )
+
+                    self._create_settings_cookies()
+
+                    guide_number_of_days_cookie_value = self._cookies.get(
+                        'guide_number_of_days'
+                    ).value
+                    guide_provider_cookie_value = urllib.parse.unquote(
+                        self._cookies.get('guide_provider').value
+                    )
+                    guide_group_cookie_value = urllib.parse.unquote(
+                        self._cookies.get('guide_group').value
                     )
-                )
-            else:
-                response_headers_to_log = ''
 
-            if self._do_log_response_content and self._response_content_to_log:
-                response_content_to_log = (
-                    '[Content]\n'
-                    '=========\n'
-                    '{0}\n'.format(self._response_content_to_log)
-                )
-            else:
-                response_content_to_log = ''
-
-            logger.trace(
-                'Response\n'
-                '[Destination]\n'
-                '=============\n'
-                '%s%s\n\n'
-                '[Method]\n'
-                '[======]\n'
-                '%s\n\n'
-                '[URL]\n'
-                '=====\n'
-                '%s\n\n'
-                '[Status Code]\n'
-                '=============\n'
-                '%s\n\n'
-                '%s'
-                '%s',
-                self._client_ip_address,
-                '/{0}'.format(self._client_uuid) if self._client_uuid else '',
-                self.command,
-                response_url_to_log,
-                self._response_status_code,
-                response_headers_to_log,
-                response_content_to_log,
-            )
+                    if (
+                        request_guide_provider_cookie_value is not None
+                        and request_guide_provider_cookie_value.lower()
+                        in self._active_providers_map_class
+                    ):
+                        if refresh_epg_parameter_value:
+                            self._response_content_generator_method = functools.partial(
+                                HTMLTemplateEngine().render_guide_div_template,
+                                self.server.is_secure,
+                                self._authorization_required(),
+                                self._client_ip_address,
+                                self._client_uuid,
+                                guide_number_of_days_cookie_value,
+                                guide_provider_cookie_value,
+                                guide_group_cookie_value,
+                                self._active_providers_map_class,
+                            )
+                        else:
+                            streaming_protocol_cookie_value = self._cookies.get(
+                                'streaming_protocol'
+                            ).value
 
-    def _screen_request(self, password_to_authenticate):
-        if self._transport_layer_requirements_satisfied():
-            if self._authorization_required():
-                return self._authenticate(password_to_authenticate)
+                            self._response_content_generator_method = functools.partial(
+                                HTMLTemplateEngine().render_index_template,
+                                self.server.is_secure,
+                                self._authorization_required(),
+                                self._client_ip_address,
+                                self._client_uuid,
+                                guide_number_of_days_cookie_value,
+                                guide_provider_cookie_value,
+                                guide_group_cookie_value,
+                                streaming_protocol_cookie_value,
+                                self._active_providers_map_class,
+                            )
 
-            return True
+                        self._response_status_code = requests.codes.OK
+                        self._response_content_type = 'text/html; charset=utf-8'
+                        self._do_log_response_content = False
+                        self._send_http_response()
+                    else:
+                        if (
+                            request_guide_provider_cookie_value.lower()
+                            in ProvidersController.get_providers_map_class()
+                        ):
+                            self._handle_service_unavailable_error(
+                                ProvidersController.get_provider_map_class(
+                                    request_guide_provider_cookie_value.lower()
+                                ).api_class()
+                            )
+                        else:
+                            self._handle_not_found_error()
+                else:
+                    self._handle_invalid_query_string()
+            else:
+                if self._is_requested_query_string_valid():
+                    self._response_content = HTMLTemplateEngine.render_login_template()
 
-        return False
+                    self._response_status_code = requests.codes.OK
+                    self._response_content_type = 'text/html; charset=utf-8'
+                    self._do_log_response_content = False
+                    self._send_http_response()
+                else:
+                    self._handle_invalid_query_string()
 
-    def _send_http_error(self, http_error_code, http_error_details):
-        self._response_content = HTMLTemplateEngine.render_errors_template(
-            http_error_code, http.client.responses[http_error_code], http_error_details
+    def _process_get_metrics_request(self):
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
         )
-        self._response_status_code = http_error_code
-        self._response_content_type = 'text/html; charset=utf-8'
-        self._do_log_response_content = False
-        self._send_http_response()
 
-    def _send_http_response(self):
-        self.send_response(self._response_status_code)
+        if self._screen_request(http_token_parameter_value):
+            if self._is_requested_query_string_valid():
+                self._response_content = MetricsManager.generate_metrics()
+                self._response_status_code = requests.codes.OK
+                self._response_content_type = 'text/plain; version=0.0.4; charset=utf-8'
+                self._do_log_response_content = False
+                self._send_http_response()
+            else:
+                self._handle_invalid_query_string()
 
-        if self._do_log_response_content:
-            self._response_content_to_log = self._response_content
+    def _process_get_playlist_m3u8_request(self):
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
 
-        if self._do_gzip_response_content:
-            self._response_content_encoding = 'gzip'
+        if self._screen_request(http_token_parameter_value):
+            if self._is_requested_query_string_valid():
+                try:
+                    self._response_content = IPTVProxy.generate_playlist_m3u8(
+                        self.server.is_secure,
+                        self._client_ip_address,
+                        self._client_uuid,
+                        self._requested_query_string_parameters,
+                        self._active_providers_map_class,
+                    )
+                    self._response_status_code = requests.codes.OK
+                    self._response_content_type = 'application/vnd.apple.mpegurl'
+                    self._send_http_response()
+                except requests.exceptions.HTTPError as err:
+                    self._send_http_error(err.response.status_code, '')
+            else:
+                self._handle_invalid_query_string()
 
-            if self._response_content:
-                self._response_content = Utility.gzip(self._response_content)
+    # pylint: disable=unused-argument
+    def _process_get_png_request(self, directory_name, png_file_name):
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
 
-        self._send_http_response_headers()
+        if self._screen_request(http_token_parameter_value):
+            if self._is_requested_query_string_valid():
+                self._do_gzip_response_content = False
 
-        self._log_response()
+                try:
+                    self._response_content = Utility.read_png_file(
+                        '/'.join(self._requested_path_tokens), in_base_64=False
+                    )
+                    self._response_status_code = requests.codes.OK
+                    self._response_content_type = 'image/png'
+                    self._do_log_response_content = False
+                    self._send_http_response()
+                except OSError:
+                    self._handle_not_found_error()
+            else:
+                self._handle_invalid_query_string()
 
-        if self._response_content:
-            if not isinstance(self._response_content, bytes):
-                self._response_content = self._response_content.encode()
-            self.wfile.write(self._response_content)
-        elif self._response_content_generator_method:
-            self._send_http_response_chunked()
+    def _process_get_provider_chunks_m3u8_request(self, provider_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
 
-    def _send_http_response_chunked(self):
-        if self._do_gzip_response_content:
-            gzip_compressor = zlib.compressobj(
-                9, zlib.DEFLATED, zlib.MAX_WBITS | 16, zlib.DEF_MEM_LEVEL, 0
-            )
+        if provider_map_class is None:
+            return
+
+        self._update_client_uuid()
 
-            for response_content in self._response_content_generator_method():
-                gzipped_response_content = gzip_compressor.compress(
-                    response_content.encode()
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            try:
+                channel_number_parameter_value = self._requested_query_string_parameters.get(
+                    'channel_number'
+                )
+
+                is_channel_number_valid = self._is_channel_number_valid(
+                    provider_map_class, channel_number_parameter_value
                 )
 
-                if gzipped_response_content:
-                    for _ in self._generate_http_response_chunks(
-                        gzipped_response_content
+                # Every client of a tuned channel is handed the chunks.m3u8 the
+                # tuner downloaded through its upstream session
+                if is_channel_number_valid:
+                    self._response_content = TunerManager.generate_chunks_m3u8(
+                        provider_name,
+                        channel_number_parameter_value,
+                        self._client_uuid,
+                        http_token_parameter_value,
+                    )
+
+                if self._response_content is None:
+                    with MetricsManager.time_upstream_request(
+                        provider_name, 'download_chunks_m3u8'
                     ):
-                        self.wfile.write('{0:X}\r\n'.format(HTTP_CHUNK_SIZE).encode())
-                        self.wfile.write(self._response_content_buffer.read())
-                        self.wfile.write('\r\n'.encode())
+                        self._response_content = provider_map_class.api_class().download_chunks_m3u8(
+                            self._client_ip_address,
+                            self._client_uuid,
+                            self._requested_url_components.path,
+                            self._requested_query_string_parameters,
+                        )
+
+                    SegmentPrefetcher.prefetch(
+                        self._client_uuid, provider_name, self._response_content
+                    )
 
-            gzipped_response_content = gzip_compressor.flush()
+                    # The segments the client downloads next are kept in the
+                    # timeshift buffer of the channel
+                    if is_channel_number_valid:
+                        TimeshiftManager.list_segments(
+                            provider_name,
+                            channel_number_parameter_value,
+                            self._response_content,
+                        )
+
+                self._response_status_code = requests.codes.OK
+                self._response_content_type = 'application/vnd.apple.mpegurl'
+                self._send_http_response()
+            except requests.exceptions.HTTPError as err:
+                self._send_http_error(err.response.status_code, '')
 
-            if gzipped_response_content:
-                for _ in self._generate_http_response_chunks(gzipped_response_content):
-                    self.wfile.write('{0:X}\r\n'.format(HTTP_CHUNK_SIZE).encode())
-                    self.wfile.write(self._response_content_buffer.read())
-                    self.wfile.write('\r\n'.encode())
+    def _process_get_provider_epg_xml_request(self, provider_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
 
-            if self._response_content_buffer_size:
-                self._response_content_buffer.seek(0)
+        if provider_map_class is None:
+            return
 
-                self.wfile.write(
-                    '{0:X}\r\n'.format(self._response_content_buffer_size).encode()
+        self._update_client_uuid()
+
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            number_of_days_parameter_value = self._requested_query_string_parameters.get(
+                'number_of_days', '1'
+            )
+
+            if self._is_requested_query_string_valid() and self._is_number_of_days_valid(
+                number_of_days_parameter_value
+            ):
+                style_parameter_value = self._requested_query_string_parameters.get(
+                    'style', EPGStyle.MINIMAL.value
                 )
-                self.wfile.write(self._response_content_buffer.read())
-                self.wfile.write('\r\n'.encode())
 
-            self.wfile.write('0\r\n\r\n'.encode())
-        else:
-            for response_content in self._response_content_generator_method():
-                if not isinstance(response_content, bytes):
-                    response_content = response_content.encode()
+                try:
+                    self._send_epg_xml(
+                        {provider_name: provider_map_class},
+                        number_of_days_parameter_value,
+                        style_parameter_value,
+                    )
+                except requests.exceptions.HTTPError as err:
+                    self._send_http_error(err.response.status_code, '')
+            else:
+                self._handle_invalid_query_string()
+
+    def _process_get_provider_playlist_m3u8_request(self, provider_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
+
+        if provider_map_class is None:
+            return
+
+        self._update_client_uuid()
+
+        channel_number_parameter_value = self._requested_query_string_parameters.get(
+            'channel_number'
+        )
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            # A channel's playlist and the provider's playlist accept different
+            # query string parameters
+            if channel_number_parameter_value:
+                if not set(self._requested_query_string_parameters) - {
+                    'channel_number',
+                    'client_uuid',
+                    'http_token',
+                    'protocol',
+                }:
+                    logger.info(
+                        '%s requested from %s/%s',
+                        provider_map_class.epg_class().get_channel_name(
+                            int(channel_number_parameter_value)
+                        ),
+                        self._client_ip_address,
+                        self._client_uuid,
+                    )
+
+                    try:
+                        if self._requested_query_string_parameters.get(
+                            'protocol'
+                        ) == 'hls' and self._is_channel_number_valid(
+                            provider_map_class, channel_number_parameter_value
+                        ):
+                            self._response_content = TunerManager.generate_playlist_m3u8(
+                                provider_name,
+                                channel_number_parameter_value,
+                                self._client_uuid,
+                                http_token_parameter_value,
+                            )
+
+                        if self._response_content is None:
+                            self._response_content = provider_map_class.api_class().download_playlist_m3u8(
+                                self._client_ip_address,
+                                self._client_uuid,
+                                self._requested_url_components.path,
+                                self._requested_query_string_parameters,
+                            )
+
+                        self._response_status_code = requests.codes.OK
+                        self._response_content_type = 'application/vnd.apple.mpegurl'
+                        self._send_http_response()
+                    except requests.exceptions.HTTPError as err:
+                        self._send_http_error(err.response.status_code, '')
+                else:
+                    self._handle_invalid_query_string()
+            elif not set(self._requested_query_string_parameters) - {
+                'client_uuid',
+                'http_token',
+                'protocol',
+                'type',
+            }:
+                try:
+                    self._response_content = provider_map_class.api_class().generate_playlist_m3u8(
+                        self.server.is_secure,
+                        self._client_ip_address,
+                        self._client_uuid,
+                        self._requested_query_string_parameters,
+                    )
+                    self._response_status_code = requests.codes.OK
+                    self._response_content_type = 'application/vnd.apple.mpegurl'
+                    self._send_http_response()
+                except requests.exceptions.HTTPError as err:
+                    self._send_http_error(err.response.status_code, '')
+            else:
+                self._handle_invalid_query_string()
+
+    def _process_get_provider_stream_ts_request(self, provider_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
+
+        if provider_map_class is None:
+            return
+
+        self._update_client_uuid()
+
+        channel_number_parameter_value = self._requested_query_string_parameters.get(
+            'channel_number'
+        )
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            if self._is_requested_query_string_valid() and self._is_channel_number_valid(
+                provider_map_class, channel_number_parameter_value
+            ):
+                logger.info(
+                    '%s requested as a continuous stream from %s/%s',
+                    provider_map_class.epg_class().get_channel_name(
+                        int(channel_number_parameter_value)
+                    ),
+                    self._client_ip_address,
+                    self._client_uuid,
+                )
+
+                # The segments of the channel are written back-to-back for as
+                # long as the client stays connected
+                self._do_gzip_response_content = False
+                self._do_log_response_content = False
+                self._response_content_generator_method = ContinuousTSStream(
+                    self._client_uuid, provider_name, channel_number_parameter_value
+                ).generate_ts_file_contents
+                self._response_status_code = requests.codes.OK
+                self._response_content_type = 'video/m2ts'
+                self._send_http_response()
+            else:
+                self._handle_invalid_query_string()
+
+    def _process_get_provider_timeshift_m3u8_request(self, provider_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
+
+        if provider_map_class is None:
+            return
+
+        self._update_client_uuid()
+
+        channel_number_parameter_value = self._requested_query_string_parameters.get(
+            'channel_number'
+        )
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+        type_parameter_value = self._requested_query_string_parameters.get(
+            'type', 'sliding'
+        ).lower()
+
+        if self._screen_request(http_token_parameter_value):
+            if (
+                not self._is_requested_query_string_valid()
+                or type_parameter_value not in ('event', 'sliding')
+                or not self._is_channel_number_valid(
+                    provider_map_class, channel_number_parameter_value
+                )
+            ):
+                self._handle_invalid_query_string()
+
+                return
+
+            # The timeshift buffer of a channel is filled with the segments
+            # downloaded for its clients. A tuned channel is kept tuned for as
+            # long as clients keep polling the playlist
+            TunerManager.touch_tuner(provider_name, channel_number_parameter_value)
+
+            self._response_content = TimeshiftManager.generate_timeshift_m3u8(
+                self._client_uuid,
+                provider_name,
+                channel_number_parameter_value,
+                http_token_parameter_value,
+                type_parameter_value,
+            )
+
+            if self._response_content is None:
+                self._handle_not_found_error()
+
+                return
+
+            self._response_status_code = requests.codes.OK
+            self._response_content_type = 'application/vnd.apple.mpegurl'
+            self._send_http_response()
+
+    def _process_get_provider_timeshift_ts_request(
+        self, provider_name, segment_file_name
+    ):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
+
+        if provider_map_class is None:
+            return
+
+        self._update_client_uuid()
+
+        channel_number_parameter_value = self._requested_query_string_parameters.get(
+            'channel_number'
+        )
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            if not self._is_requested_query_string_valid() or not (
+                self._is_channel_number_valid(
+                    provider_map_class, channel_number_parameter_value
+                )
+            ):
+                self._handle_invalid_query_string()
+
+                return
+
+            self._response_content = TimeshiftManager.query_segment(
+                provider_name, channel_number_parameter_value, segment_file_name
+            )
+
+            if self._response_content is None:
+                self._handle_not_found_error()
+
+                return
+
+            self._do_gzip_response_content = False
+            self._do_log_response_content = False
+            self._response_status_code = requests.codes.OK
+            self._response_content_type = 'video/m2ts'
+            self._send_http_response()
+
+    def _process_get_provider_ts_request(self, provider_name, segment_file_name):
+        provider_map_class = self._get_active_provider_map_class(provider_name)
 
-                for _ in self._generate_http_response_chunks(response_content):
-                    self.wfile.write('{0:X}\r\n'.format(HTTP_CHUNK_SIZE).encode())
-                    self.wfile.write(self._response_content_buffer.read())
-                    self.wfile.write('\r\n'.encode())
+        if provider_map_class is None:
+            return
 
-            if self._response_content_buffer_size:
-                self._response_content_buffer.seek(0)
+        self._update_client_uuid()
 
-                self.wfile.write(
-                    '{0:X}\r\n'.format(self._response_content_buffer_size).encode()
+        channel_number_parameter_value = self._requested_query_string_parameters.get(
+            'channel_number'
+        )
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+
+        if self._screen_request(http_token_parameter_value):
+            self._do_gzip_response_content = False
+
+            self._response_content = TunerManager.query_segment(
+                provider_name, channel_number_parameter_value, segment_file_name
+            )
+
+            if self._response_content is None:
+                self._response_content = CacheManager.query_cache(
+                    provider_name, channel_number_parameter_value, segment_file_name
                 )
-                self.wfile.write(self._response_content_buffer.read())
-                self.wfile.write('\r\n'.encode())
 
-            self.wfile.write('0\r\n\r\n'.encode())
+            if self._response_content is None:
+                try:
+                    self._download_ts_file(
+                        provider_map_class,
+                        provider_name,
+                        channel_number_parameter_value,
+                        segment_file_name,
+                    )
+                except requests.exceptions.HTTPError as err:
+                    self._send_http_error(err.response.status_code, '')
+
+            if (
+                self._response_content is not None
+                or self._response_content_generator_method is not None
+            ):
+                self._response_status_code = requests.codes.OK
+                self._response_content_type = 'video/m2ts'
+                self._do_log_response_content = False
+                self._send_http_response()
+
+    def _process_get_recording_request(self, recording_id):
+        if self._screen_request(self._get_json_request_password()):
+            (self._response_content, self._response_status_code,) = RecordingsJSONAPI(
+                self
+            ).process_get_request(recording_id)
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _process_get_recordings_request(self):
+        if self._screen_request(self._get_json_request_password()):
+            (self._response_content, self._response_status_code,) = RecordingsJSONAPI(
+                self
+            ).process_get_request()
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _process_get_vod_playlist_m3u8_request(self):
+        self._update_client_uuid()
+
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+        recording_id = self._requested_query_string_parameters.get('recording_id')
+
+        if self._screen_request(http_token_parameter_value):
+            # A recording's playlist and the index playlist accept different
+            # query string parameters
+            if recording_id:
+                if not set(self._requested_query_string_parameters) - {
+                    'client_uuid',
+                    'http_token',
+                    'recording_id',
+                }:
+                    logger.info(
+                        '%s requested from %s/%s',
+                        PVR.get_recording_program_title(recording_id),
+                        self._client_ip_address,
+                        self._client_uuid,
+                    )
+
+                    try:
+                        self._response_content = PVR.generate_vod_recording_playlist_m3u8(
+                            self._client_uuid, recording_id, http_token_parameter_value,
+                        )
+                        self._response_status_code = requests.codes.OK
+                        self._response_content_type = 'application/vnd.apple.mpegurl'
+                        self._send_http_response()
+                    except OSError:
+                        self._handle_not_found_error()
+                else:
+                    self._handle_invalid_query_string()
+            else:
+                if not set(self._requested_query_string_parameters) - {
+                    'client_uuid',
+                    'http_token',
+                }:
+                    self._response_content = PVR.generate_vod_index_playlist_m3u8(
+                        self.server.is_secure,
+                        self._client_ip_address,
+                        self._client_uuid,
+                        http_token_parameter_value,
+                    )
+                    if self._response_content:
+                        self._response_status_code = requests.codes.OK
+                        self._response_content_type = 'application/vnd.apple.mpegurl'
+                        self._send_http_response()
+                    else:
+                        self._handle_not_found_error()
+                else:
+                    self._handle_invalid_query_string()
+
+    # pylint: disable=unused-argument
+    def _process_get_vod_ts_request(self, segment_file_name):
+        self._update_client_uuid()
+
+        http_token_parameter_value = self._requested_query_string_parameters.get(
+            'http_token'
+        )
+        recording_id = self._requested_query_string_parameters.get('recording_id')
+
+        if self._screen_request(http_token_parameter_value):
+            if self._is_requested_query_string_valid():
+                self._do_gzip_response_content = False
+
+                try:
+                    self._response_content = PVR.load_ts_file(
+                        re.sub(
+                            r'/vod/(.*)\?.*',
+                            r'\1',
+                            self._requested_path_with_query_string,
+                        ),
+                        recording_id,
+                    )
+                    self._response_status_code = requests.codes.OK
+                    self._response_content_type = 'video/m2ts'
+                    self._do_log_response_content = False
+                    self._send_http_response()
+                except (OSError, SegmentNotFoundError):
+                    self._handle_not_found_error()
+            else:
+                self._handle_invalid_query_string()
+
+    def _process_patch_configuration_request(self):
+        if self._screen_request(self._get_json_request_password()):
+            (
+                self._response_content,
+                self._response_status_code,
+            ) = ConfigurationJSONAPI(self).process_patch_request()
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _process_post_index_html_request(self):
+        bad_post_index_html_request = False
+
+        if self._request_body:
+            match = re.match(r'\ApasswordInput=(.*)\Z', self._request_body)
+
+            if match:
+                password = urllib.parse.unquote(match.group(1))
+
+                if self._authenticate(password):
+                    http_session = HTTPSession(
+                        self._client_ip_address, self._user_agent
+                    )
+                    self._create_http_session_cookie(http_session)
+
+                    with Database.get_write_lock():
+                        db_session = Database.create_session()
+
+                        try:
+                            db_session.add(http_session)
+                            db_session.commit()
+
+                            HTTPSessionCache.add_http_session(http_session)
+                        except Exception:
+                            (type_, value_, traceback_) = sys.exc_info()
+                            logger.error(
+                                '\n'.join(
+                                    traceback.format_exception(
+                                        type_, value_, traceback_
+                                    )
+                                )
+                            )
+
+                            db_session.rollback()
+                        finally:
+                            db_session.close()
+
+                    self._response_status_code = requests.codes.FOUND
+                    self._send_http_response()
+            else:
+                bad_post_index_html_request = True
+        else:
+            bad_post_index_html_request = True
+
+        if bad_post_index_html_request:
+            self._send_http_error(
+                requests.codes.BAD_REQUEST,
+                'The server could not understand the request.',
+            )
+
+    def _process_post_recordings_request(self):
+        if self._screen_request(self._get_json_request_password()):
+            (self._response_content, self._response_status_code,) = RecordingsJSONAPI(
+                self
+            ).process_post_request()
+            self._response_content_type = 'application/vnd.api+json'
+            self._send_http_response()
+
+    def _screen_request(self, password_to_authenticate):
+        if self._transport_layer_requirements_satisfied():
+            if self._authorization_required():
+                return self._authenticate(password_to_authenticate)
+
+            return True
+
+        return False
+
+    def _send_epg_xml(self, providers_map_class, number_of_days, style):
+        self._response_content_type = 'application/xml; charset=utf-8'
+        self._do_log_response_content = False
+
+        # Clients accepting gzip are served a pre-rendered artifact from disk
+        if not self._do_gzip_response_content:
+            self._response_content_generator_method = functools.partial(
+                EPG.generate_xmltv,
+                self.server.is_secure,
+                self._authorization_required(),
+                self._client_ip_address,
+                providers_map_class,
+                number_of_days,
+                style,
+            )
+            self._response_status_code = requests.codes.OK
+            self._send_http_response()
+
+            return
+
+        (
+            self._response_content_file,
+            epg_artifact_etag,
+        ) = EPGArtifactCache.open_epg_artifact(
+            self.server.is_secure,
+            self._authorization_required(),
+            self._client_ip_address,
+            providers_map_class,
+            number_of_days,
+            style,
+        )
+
+        try:
+            self._response_headers['ETag'] = [epg_artifact_etag]
+
+            if epg_artifact_etag in [
+                etag.strip()
+                for etag in self.headers.get('If-None-Match', '').split(',')
+            ]:
+                self._response_content_file.close()
+                self._response_content_file = None
+
+                self._response_status_code = requests.codes.NOT_MODIFIED
+            else:
+                self._response_status_code = requests.codes.OK
+
+            self._send_http_response()
+        finally:
+            if self._response_content_file:
+                self._response_content_file.close()
+
+    def _send_http_error(self, http_error_code, http_error_details):
+        self._response_content = HTMLTemplateEngine.render_errors_template(
+            http_error_code, http.client.responses[http_error_code], http_error_details
+        )
+        self._response_status_code = http_error_code
+        self._response_content_type = 'text/html; charset=utf-8'
+        self._do_log_response_content = False
+        self._send_http_response()
+
+    def _send_http_response(self):
+        self._are_response_headers_sent = True
+
+        self.send_response(self._response_status_code)
+
+        if self._do_log_response_content:
+            self._response_content_to_log = self._response_content
+
+        if self._do_gzip_response_content:
+            self._response_content_encoding = 'gzip'
+
+            if self._response_content:
+                self._response_content = Utility.gzip(self._response_content)
+
+        self._send_http_response_headers()
+
+        self._log_response()
+
+        if self._response_content:
+            if not isinstance(self._response_content, bytes):
+                self._response_content = self._response_content.encode()
+            self.wfile.write(self._response_content)
+        elif self._response_content_file:
+            self._write_response_file()
+        elif self._response_content_generator_method:
+            self._send_http_response_chunked()
+
+    def _send_http_response_chunked(self):
+        with HTTPRequestHandler._http_response_chunk_size_lock.reader_lock:
+            http_response_chunk_size = HTTPRequestHandler._http_response_chunk_size
+
+        chunked_transfer_encoder = ChunkedTransferEncoder(
+            self._write_response_buffers,
+            http_response_chunk_size,
+            do_gzip=self._do_gzip_response_content,
+        )
+
+        response_content_generator = iter(self._response_content_generator_method())
+
+        try:
+            for response_content in response_content_generator:
+                chunked_transfer_encoder.write(response_content)
+
+            chunked_transfer_encoder.close()
+        finally:
+            # A generator abandoned because the client disconnected is closed
+            # right away rather than whenever it is garbage collected. This is
+            # what lets a relayed segment download run to completion
+            if hasattr(response_content_generator, 'close'):
+                response_content_generator.close()
 
     def _send_http_response_headers(self):
         if self.command == 'OPTIONS':
@@ -785,10 +1884,18 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                     '{0}'.format(len(self._response_content.encode()))
                 ]
 
+            self._response_headers['Content-Type'] = [self._response_content_type]
+        elif self._response_content_file:
+            self._response_headers['Content-Length'] = [
+                '{0}'.format(os.fstat(self._response_content_file.fileno()).st_size)
+            ]
             self._response_headers['Content-Type'] = [self._response_content_type]
         elif self._response_content_generator_method:
             self._response_headers['Content-Type'] = [self._response_content_type]
             self._response_headers['Transfer-Encoding'] = ['chunked']
+        else:
+            # Every response sent over a kept-alive connection must be delimited
+            self._response_headers['Content-Length'] = ['0']
 
         if self._response_status_code == requests.codes.FOUND:
             self._response_headers['Location'] = ['/index.html']
@@ -843,594 +1950,48 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
 
             return transport_layer_requirements_satisfied
 
-    # pylint: disable=invalid-name
-    def do_DELETE(self):
-        self._initialize()
-        self._log_request()
-
-        requested_path_not_found = False
-
-        try:
-            if (
-                self._requested_path_tokens_length == 2
-                and self._requested_path_tokens[0].lower() == 'recordings'
-                and re.match(
-                    r'\A[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}\Z',
-                    self._requested_path_tokens[1].lower(),
-                )
-            ):
-                if self._screen_request(self._get_json_request_password()):
-                    (
-                        self._response_content,
-                        self._response_status_code,
-                    ) = RecordingsJSONAPI(self).process_delete_request()
-                    self._response_content_type = 'application/vnd.api+json'
-                    self._send_http_response()
-            else:
-                requested_path_not_found = True
-
-            if requested_path_not_found:
-                self._handle_not_found_error()
-        except Exception:
-            self._handle_internal_server_error()
-
-    # pylint: disable=invalid-name
-    def do_GET(self):
-        self._initialize()
-        self._log_request()
-
-        invalid_query_string = False
-        requested_path_not_found = False
-
-        try:
-            if (
-                re.match(r'\A(index.htm)?\Z', self._requested_path_tokens[0].lower())
-                and self._requested_path_tokens_length == 1
-            ):
-                self._response_status_code = requests.codes.FOUND
-                self._send_http_response()
-            elif (
-                re.match(r'\A(index.html)\Z', self._requested_path_tokens[0].lower())
-                and self._requested_path_tokens_length == 1
-            ):
-                refresh_epg_parameter_value = self._requested_query_string_parameters.get(
-                    'refresh_epg'
-                )
-
-                if self._transport_layer_requirements_satisfied():
-                    if self._is_logged_in():
-                        if not set(self._requested_query_string_parameters) - {
-                            'refresh_epg'
-                        }:
-                            try:
-                                request_guide_provider_cookie_value = urllib.parse.unquote(
-                                    self._cookies.get('guide_provider').value
-                                )
-                            except AttributeError:
-                                request_guide_provider_cookie_value = (
-                                    self._active_providers_map_class[
-                                        sorted(self._active_providers_map_class)[0]
-                                    ]
-                                    .api_class()
-                                    .__name__
-                                )
-
-                            self._create_settings_cookies()
-
-                            guide_number_of_days_cookie_value = self._cookies.get(
-                                'guide_number_of_days'
-                            ).value
-                            guide_provider_cookie_value = urllib.parse.unquote(
-                                self._cookies.get('guide_provider').value
-                            )
-                            guide_group_cookie_value = urllib.parse.unquote(
-                                self._cookies.get('guide_group').value
-                            )
-
-                            if (
-                                request_guide_provider_cookie_value is not None
-                                and request_guide_provider_cookie_value.lower()
-                                in self._active_providers_map_class
-                            ):
-                                if refresh_epg_parameter_value:
-                                    self._response_content_generator_method = functools.partial(
-                                        HTMLTemplateEngine().render_guide_div_template,
-                                        self.server.is_secure,
-                                        self._authorization_required(),
-                                        self._client_ip_address,
-                                        self._client_uuid,
-                                        guide_number_of_days_cookie_value,
-                                        guide_provider_cookie_value,
-                                        guide_group_cookie_value,
-                                        self._active_providers_map_class,
-                                    )
-                                else:
-                                    streaming_protocol_cookie_value = self._cookies.get(
-                                        'streaming_protocol'
-                                    ).value
-
-                                    self._response_content_generator_method = functools.partial(
-                                        HTMLTemplateEngine().render_index_template,
-                                        self.server.is_secure,
-                                        self._authorization_required(),
-                                        self._client_ip_address,
-                                        self._client_uuid,
-                                        guide_number_of_days_cookie_value,
-                                        guide_provider_cookie_value,
-                                        guide_group_cookie_value,
-                                        streaming_protocol_cookie_value,
-                                        self._active_providers_map_class,
-                                    )
-
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = 'text/html; charset=utf-8'
-                                self._do_log_response_content = False
-                                self._send_http_response()
-                            else:
-                                if (
-                                    request_guide_provider_cookie_value.lower()
-                                    in ProvidersController.get_providers_map_class()
-                                ):
-                                    self._handle_service_unavailable_error(
-                                        ProvidersController.get_provider_map_class(
-                                            request_guide_provider_cookie_value.lower()
-                                        ).api_class()
-                                    )
-                                else:
-                                    requested_path_not_found = True
-                        else:
-                            invalid_query_string = True
-                    else:
-                        if not set(self._requested_query_string_parameters) - {
-                            'refresh_epg'
-                        }:
-                            self._response_content = (
-                                HTMLTemplateEngine.render_login_template()
-                            )
-
-                            self._response_status_code = requests.codes.OK
-                            self._response_content_type = 'text/html; charset=utf-8'
-                            self._do_log_response_content = False
-                            self._send_http_response()
-                        else:
-                            invalid_query_string = True
-            elif self._requested_path_tokens_length == 2 and re.match(
-                r'\A(.+)\.png\Z', self._requested_path_tokens[1].lower()
-            ):
-                http_token_parameter_value = self._requested_query_string_parameters.get(
-                    'http_token'
-                )
-
-                if self._screen_request(http_token_parameter_value):
-                    if not set(self._requested_query_string_parameters) - {
-                        'http_token'
-                    }:
-                        self._do_gzip_response_content = False
-
-                        try:
-                            self._response_content = Utility.read_png_file(
-                                '/'.join(self._requested_path_tokens), in_base_64=False
-                            )
-                            self._response_status_code = requests.codes.OK
-                            self._response_content_type = 'image/png'
-                            self._do_log_response_content = False
-                            self._send_http_response()
-                        except OSError:
-                            requested_path_not_found = True
-                    else:
-                        invalid_query_string = True
-            elif (
-                self._requested_path_tokens[0].lower() == 'configuration'
-                and self._requested_path_tokens_length == 1
-            ):
-                if self._screen_request(self._get_json_request_password()):
-                    (
-                        self._response_content,
-                        self._response_status_code,
-                    ) = ConfigurationJSONAPI(self).process_get_request()
-                    self._response_content_type = 'application/vnd.api+json'
-                    self._send_http_response()
-            elif (
-                self._requested_path_tokens[0].lower() == 'live'
-                and self._requested_path_tokens_length == 2
-            ):
-                http_token_parameter_value = self._requested_query_string_parameters.get(
-                    'http_token'
-                )
-
-                if self._requested_path_tokens[1].lower() == 'epg.xml':
-                    if self._screen_request(http_token_parameter_value):
-                        if not set(self._requested_query_string_parameters) - {
-                            'http_token',
-                            'number_of_days',
-                            'style',
-                        }:
-                            number_of_days_parameter_value = self._requested_query_string_parameters.get(
-                                'number_of_days', 1
-                            )
-
-                            style_parameter_value = self._requested_query_string_parameters.get(
-                                'style', EPGStyle.MINIMAL.value
-                            )
-
-                            try:
-                                self._response_content_generator_method = functools.partial(
-                                    EPG.generate_xmltv,
-                                    self.server.is_secure,
-                                    self._authorization_required(),
-                                    self._client_ip_address,
-                                    self._active_providers_map_class,
-                                    number_of_days_parameter_value,
-                                    style_parameter_value,
-                                )
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = (
-                                    'application/xml; charset=utf-8'
-                                )
-                                self._do_log_response_content = False
-                                self._send_http_response()
-                            except requests.exceptions.HTTPError as err:
-                                self._send_http_error(err.response.status_code, '')
-                        else:
-                            invalid_query_string = True
-                elif self._requested_path_tokens[1].lower() == 'playlist.m3u8':
-                    if self._screen_request(http_token_parameter_value):
-                        providers_query_string_parameters = set()
-
-                        for (
-                            query_string_parameter
-                        ) in self._requested_query_string_parameters:
-                            if query_string_parameter.endswith(
-                                '_protocol'
-                            ) or query_string_parameter.endswith('_type'):
-                                providers_query_string_parameters.add(
-                                    query_string_parameter
-                                )
-
-                        if not set(self._requested_query_string_parameters) - (
-                            {'client_uuid', 'http_token', 'protocol', 'type'}
-                            | providers_query_string_parameters
-                        ):
-                            try:
-                                self._response_content = IPTVProxy.generate_playlist_m3u8(
-                                    self.server.is_secure,
-                                    self._client_ip_address,
-                                    self._client_uuid,
-                                    self._requested_query_string_parameters,
-                                    self._active_providers_map_class,
-                                )
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = (
-                                    'application/vnd.apple.mpegurl'
-                                )
-                                self._send_http_response()
-                            except requests.exceptions.HTTPError as err:
-                                self._send_http_error(err.response.status_code, '')
-                        else:
-                            invalid_query_string = True
-                else:
-                    requested_path_not_found = True
-            elif (
-                self._requested_path_tokens[0].lower() == 'live'
-                and self._requested_path_tokens_length == 3
-            ):
-                if (
-                    self._requested_path_tokens[1].lower()
-                    in self._active_providers_map_class
-                ):
-                    provider_map_class = ProvidersController.get_provider_map_class(
-                        self._requested_path_tokens[1].lower()
-                    )
-
-                    channel_number_parameter_value = self._requested_query_string_parameters.get(
-                        'channel_number'
-                    )
-                    client_uuid_parameter_value = self._requested_query_string_parameters.get(
-                        'client_uuid'
-                    )
-                    http_token_parameter_value = self._requested_query_string_parameters.get(
-                        'http_token'
-                    )
+    def _update_client_uuid(self):
+        client_uuid_parameter_value = self._requested_query_string_parameters.get(
+            'client_uuid'
+        )
 
-                    if client_uuid_parameter_value:
-                        self._client_uuid = client_uuid_parameter_value
+        if client_uuid_parameter_value:
+            self._client_uuid = client_uuid_parameter_value
 
-                    if self._requested_path_tokens[2].lower().endswith('.ts'):
-                        if self._screen_request(http_token_parameter_value):
-                            self._do_gzip_response_content = False
+    def _write_response_buffers(self, buffers):
+        if isinstance(self.connection, ssl.SSLSocket):
+            self.wfile.write(b''.join(buffers))
 
-                            self._response_content = CacheManager.query_cache(
-                                self._requested_path_tokens[1].lower(),
-                                channel_number_parameter_value,
-                                self._requested_path_tokens[2].lower(),
-                            )
+            return
 
-                            if self._response_content is None:
-                                try:
-                                    self._response_content = provider_map_class.api_class().download_ts_file(
-                                        self._client_ip_address,
-                                        self._client_uuid,
-                                        self._requested_url_components.path,
-                                        self._requested_query_string_parameters,
-                                    )
-
-                                    CacheManager.update_cache(
-                                        self._requested_path_tokens[1].lower(),
-                                        channel_number_parameter_value,
-                                        self._requested_path_tokens[2].lower(),
-                                        self._response_content,
-                                    )
-                                except requests.exceptions.HTTPError as err:
-                                    self._send_http_error(err.response.status_code, '')
-
-                            if self._response_content is not None:
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = 'video/m2ts'
-                                self._do_log_response_content = False
-                                self._send_http_response()
-                    elif self._requested_path_tokens[2].lower() == 'chunks.m3u8':
-                        if self._screen_request(http_token_parameter_value):
-                            try:
-                                self._response_content = provider_map_class.api_class().download_chunks_m3u8(
-                                    self._client_ip_address,
-                                    self._client_uuid,
-                                    self._requested_url_components.path,
-                                    self._requested_query_string_parameters,
-                                )
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = (
-                                    'application/vnd.apple.mpegurl'
-                                )
-                                self._send_http_response()
-                            except requests.exceptions.HTTPError as err:
-                                self._send_http_error(err.response.status_code, '')
-                    elif self._requested_path_tokens[2].lower() == 'epg.xml':
-                        if self._screen_request(http_token_parameter_value):
-                            if not set(self._requested_query_string_parameters) - {
-                                'http_token',
-                                'number_of_days',
-                                'style',
-                            }:
-                                number_of_days_parameter_value = self._requested_query_string_parameters.get(
-                                    'number_of_days', 1
-                                )
+        # A gathered write hands all the buffers to the kernel in a single
+        # system call without first copying them into one contiguous buffer
+        while buffers:
+            number_of_bytes_sent = self.connection.sendmsg(
+                buffers[:SENDMSG_MAXIMUM_NUMBER_OF_BUFFERS]
+            )
 
-                                style_parameter_value = self._requested_query_string_parameters.get(
-                                    'style', EPGStyle.MINIMAL.value
-                                )
+            while number_of_bytes_sent:
+                if number_of_bytes_sent >= len(buffers[0]):
+                    number_of_bytes_sent -= len(buffers[0])
 
-                                try:
-                                    self._response_content_generator_method = functools.partial(
-                                        provider_map_class.epg_class().generate_xmltv,
-                                        self.server.is_secure,
-                                        self._authorization_required(),
-                                        self._client_ip_address,
-                                        number_of_days_parameter_value,
-                                        style_parameter_value,
-                                    )
-                                    self._response_status_code = requests.codes.OK
-                                    self._response_content_type = (
-                                        'application/xml; charset=utf-8'
-                                    )
-                                    self._do_log_response_content = False
-                                    self._send_http_response()
-                                except requests.exceptions.HTTPError as err:
-                                    self._send_http_error(err.response.status_code, '')
-                            else:
-                                invalid_query_string = True
-                    elif self._requested_path_tokens[2].lower() == 'playlist.m3u8':
-                        if self._screen_request(http_token_parameter_value):
-                            do_generate_playlist_m3u8 = False
-
-                            if self._requested_query_string_parameters:
-                                if channel_number_parameter_value:
-                                    if not set(
-                                        self._requested_query_string_parameters
-                                    ) - {
-                                        'channel_number',
-                                        'client_uuid',
-                                        'http_token',
-                                        'protocol',
-                                    }:
-                                        logger.info(
-                                            '%s requested from %s/%s',
-                                            provider_map_class.epg_class().get_channel_name(
-                                                int(channel_number_parameter_value)
-                                            ),
-                                            self._client_ip_address,
-                                            self._client_uuid,
-                                        )
-
-                                        try:
-                                            self._response_content = provider_map_class.api_class().download_playlist_m3u8(
-                                                self._client_ip_address,
-                                                self._client_uuid,
-                                                self._requested_url_components.path,
-                                                self._requested_query_string_parameters,
-                                            )
-                                            self._response_status_code = (
-                                                requests.codes.OK
-                                            )
-                                            self._response_content_type = (
-                                                'application/vnd.apple.mpegurl'
-                                            )
-                                            self._send_http_response()
-                                        except requests.exceptions.HTTPError as err:
-                                            self._send_http_error(
-                                                err.response.status_code, ''
-                                            )
-                                    else:
-                                        invalid_query_string = True
-                                elif not set(
-                                    self._requested_query_string_parameters
-                                ) - {'client_uuid', 'http_token', 'protocol', 'type'}:
-                                    do_generate_playlist_m3u8 = True
-                                else:
-                                    invalid_query_string = True
-                            else:
-                                do_generate_playlist_m3u8 = True
-
-                            if do_generate_playlist_m3u8:
-                                try:
-                                    self._response_content = provider_map_class.api_class().generate_playlist_m3u8(
-                                        self.server.is_secure,
-                                        self._client_ip_address,
-                                        self._client_uuid,
-                                        self._requested_query_string_parameters,
-                                    )
-                                    self._response_status_code = requests.codes.OK
-                                    self._response_content_type = (
-                                        'application/vnd.apple.mpegurl'
-                                    )
-                                    self._send_http_response()
-                                except requests.exceptions.HTTPError as err:
-                                    self._send_http_error(err.response.status_code, '')
-                    else:
-                        requested_path_not_found = True
-                else:
-                    if (
-                        self._requested_path_tokens[1].lower()
-                        in ProvidersController.get_providers_map_class()
-                    ):
-                        self._handle_service_unavailable_error(
-                            ProvidersController.get_provider_map_class(
-                                self._requested_path_tokens[1].lower()
-                            ).api_class()
-                        )
-                    else:
-                        requested_path_not_found = True
-            elif self._requested_path_tokens[0].lower() == 'recordings':
-                if self._requested_path_tokens_length == 1:
-                    if self._screen_request(self._get_json_request_password()):
-                        (
-                            self._response_content,
-                            self._response_status_code,
-                        ) = RecordingsJSONAPI(self).process_get_request()
-                elif (
-                    re.match(
-                        r'\A[0-9a-f]{8}-[0-9a-f]{4}-4[0-9a-f]{3}-[89ab][0-9a-f]{3}-[0-9a-f]{12}\Z',
-                        self._requested_path_tokens[1].lower(),
-                    )
-                    and self._requested_path_tokens_length == 2
-                ):
-                    if self._screen_request(self._get_json_request_password()):
-                        (
-                            self._response_content,
-                            self._response_status_code,
-                        ) = RecordingsJSONAPI(self).process_get_request(
-                            self._requested_path_tokens[1].lower()
-                        )
+                    del buffers[0]
                 else:
-                    requested_path_not_found = True
+                    buffers[0] = memoryview(buffers[0])[number_of_bytes_sent:]
 
-                if not requested_path_not_found:
-                    self._response_content_type = 'application/vnd.api+json'
-                    self._send_http_response()
-            elif (
-                self._requested_path_tokens[0].lower() == 'vod'
-                and self._requested_path_tokens_length == 2
-            ):
-                client_uuid_parameter_value = self._requested_query_string_parameters.get(
-                    'client_uuid'
-                )
-                http_token_parameter_value = self._requested_query_string_parameters.get(
-                    'http_token'
-                )
-                recording_id = self._requested_query_string_parameters.get(
-                    'recording_id'
-                )
+                    number_of_bytes_sent = 0
 
-                if client_uuid_parameter_value:
-                    self._client_uuid = client_uuid_parameter_value
-
-                if self._requested_path_tokens[1].lower().endswith('.ts'):
-                    if self._screen_request(http_token_parameter_value):
-                        if not set(self._requested_query_string_parameters) - {
-                            'client_uuid',
-                            'http_token',
-                            'recording_id',
-                        }:
-                            self._do_gzip_response_content = False
-
-                            try:
-                                self._response_content = PVR.load_ts_file(
-                                    re.sub(
-                                        r'/vod/(.*)\?.*',
-                                        r'\1',
-                                        self._requested_path_with_query_string,
-                                    ),
-                                    recording_id,
-                                )
-                                self._response_status_code = requests.codes.OK
-                                self._response_content_type = 'video/m2ts'
-                                self._do_log_response_content = False
-                                self._send_http_response()
-                            except (OSError, SegmentNotFoundError):
-                                requested_path_not_found = True
-                        else:
-                            invalid_query_string = True
-                elif self._requested_path_tokens[1].lower() == 'playlist.m3u8':
-                    if self._screen_request(http_token_parameter_value):
-                        if recording_id:
-                            if not set(self._requested_query_string_parameters) - {
-                                'client_uuid',
-                                'http_token',
-                                'recording_id',
-                            }:
-                                logger.info(
-                                    '%s requested from %s/%s',
-                                    PVR.get_recording_program_title(recording_id),
-                                    self._client_ip_address,
-                                    self._client_uuid,
-                                )
+    def _write_response_file(self):
+        # The kernel copies the file straight to the socket
+        self.connection.sendfile(self._response_content_file)
 
-                                try:
-                                    self._response_content = PVR.generate_vod_recording_playlist_m3u8(
-                                        self._client_uuid,
-                                        recording_id,
-                                        http_token_parameter_value,
-                                    )
-                                    self._response_status_code = requests.codes.OK
-                                    self._response_content_type = (
-                                        'application/vnd.apple.mpegurl'
-                                    )
-                                    self._send_http_response()
-                                except OSError:
-                                    requested_path_not_found = True
-                            else:
-                                invalid_query_string = True
-                        else:
-                            if not set(self._requested_query_string_parameters) - {
-                                'client_uuid',
-                                'http_token',
-                            }:
-                                self._response_content = PVR.generate_vod_index_playlist_m3u8(
-                                    self.server.is_secure,
-                                    self._client_ip_address,
-                                    self._client_uuid,
-                                    http_token_parameter_value,
-                                )
-                                if self._response_content:
-                                    self._response_status_code = requests.codes.OK
-                                    self._response_content_type = (
-                                        'application/vnd.apple.mpegurl'
-                                    )
-                                    self._send_http_response()
-                                else:
-                                    requested_path_not_found = True
-                            else:
-                                invalid_query_string = True
-                else:
-                    requested_path_not_found = True
-            else:
-                requested_path_not_found = True
+    # pylint: disable=invalid-name
+    def do_DELETE(self):
+        self._dispatch_request()
 
-            if invalid_query_string:
-                self._handle_invalid_query_string()
-            elif requested_path_not_found:
-                self._handle_not_found_error()
-        except Exception:
-            self._handle_internal_server_error()
+    # pylint: disable=invalid-name
+    def do_GET(self):
+        self._dispatch_request()
 
     # pylint: disable=invalid-name
     def do_OPTIONS(self):
@@ -1442,107 +2003,22 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
 
     # pylint: disable=invalid-name
     def do_PATCH(self):
-        self._initialize()
-        self._log_request()
-
-        requested_path_not_found = False
-
-        try:
-            if (
-                self._requested_path_tokens_length == 1
-                and self._requested_path_tokens[0].lower() == 'configuration'
-            ):
-                if self._screen_request(self._get_json_request_password()):
-                    (
-                        self._response_content,
-                        self._response_status_code,
-                    ) = ConfigurationJSONAPI(self).process_patch_request()
-                    self._response_content_type = 'application/vnd.api+json'
-                    self._send_http_response()
-            else:
-                requested_path_not_found = True
-
-            if requested_path_not_found:
-                self._handle_not_found_error()
-        except Exception:
-            self._handle_internal_server_error()
+        self._dispatch_request()
 
     # pylint: disable=invalid-name
     def do_POST(self):
-        self._initialize()
-        self._log_request()
-
-        requested_path_not_found = False
-
-        try:
-            if (
-                re.match(r'\A(index.html)\Z', self._requested_path_tokens[0].lower())
-                and self._requested_path_tokens_length == 1
-            ):
-                bad_post_index_html_request = False
-
-                if self._request_body:
-                    match = re.match(r'\ApasswordInput=(.*)\Z', self._request_body)
+        self._dispatch_request()
 
-                    if match:
-                        password = urllib.parse.unquote(match.group(1))
-
-                        if self._authenticate(password):
-                            http_session = HTTPSession(
-                                self._client_ip_address, self._user_agent
-                            )
-                            self._create_http_session_cookie(http_session)
-
-                            with Database.get_write_lock():
-                                db_session = Database.create_session()
-
-                                try:
-                                    db_session.add(http_session)
-                                    db_session.commit()
-                                except Exception:
-                                    (type_, value_, traceback_) = sys.exc_info()
-                                    logger.error(
-                                        '\n'.join(
-                                            traceback.format_exception(
-                                                type_, value_, traceback_
-                                            )
-                                        )
-                                    )
-
-                                    db_session.rollback()
-                                finally:
-                                    db_session.close()
-
-                            self._response_status_code = requests.codes.FOUND
-                            self._send_http_response()
-                    else:
-                        bad_post_index_html_request = True
-                else:
-                    bad_post_index_html_request = True
+    def handle(self):
+        # A worker only services the requests the client has already sent.
+        # The connection is then handed back to the dispatcher so that an idle
+        # kept-alive connection does not hold on to a worker
+        self.close_connection = True
 
-                if bad_post_index_html_request:
-                    self._send_http_error(
-                        requests.codes.BAD_REQUEST,
-                        'The server could not understand the request.',
-                    )
-            elif (
-                self._requested_path_tokens_length == 1
-                and self._requested_path_tokens[0].lower() == 'recordings'
-            ):
-                if self._screen_request(self._get_json_request_password()):
-                    (
-                        self._response_content,
-                        self._response_status_code,
-                    ) = RecordingsJSONAPI(self).process_post_request()
-                    self._response_content_type = 'application/vnd.api+json'
-                    self._send_http_response()
-            else:
-                requested_path_not_found = True
+        self.handle_one_request()
 
-            if requested_path_not_found:
-                self._handle_not_found_error()
-        except Exception:
-            self._handle_internal_server_error()
+        while not self.close_connection and self._is_request_pending():
+            self.handle_one_request()
 
     def log_message(self, _, *args):
         return
@@ -1572,9 +2048,18 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         return self._requested_url_components
 
 
-class HTTPServer(ThreadingMixIn, HTTPServer_):
-    def __init__(self, server_address, request_handler_class, is_secure):
-        ThreadingMixIn.__init__(self)
+class HTTPServer(ThreadPoolMixIn, HTTPServer_):
+    def __init__(
+        self,
+        server_address,
+        request_handler_class,
+        is_secure,
+        maximum_number_of_workers,
+        maximum_number_of_queued_requests,
+    ):
+        ThreadPoolMixIn.__init__(
+            self, maximum_number_of_workers, maximum_number_of_queued_requests
+        )
         HTTPServer_.__init__(self, server_address, request_handler_class)
 
         self._is_secure = is_secure
@@ -1585,13 +2070,23 @@ class HTTPServer(ThreadingMixIn, HTTPServer_):
 
 
 class HTTPServerThread(Thread):
-    def __init__(self, server_address, is_secure):
+    def __init__(
+        self,
+        server_address,
+        is_secure,
+        maximum_number_of_workers,
+        maximum_number_of_queued_requests,
+    ):
         Thread.__init__(self)
 
         self._is_secure = is_secure
         self._server_address = server_address
         self._iptv_proxy_http_server = HTTPServer(
-            self._server_address, HTTPRequestHandler, is_secure
+            self._server_address,
+            HTTPRequestHandler,
+            is_secure,
+            maximum_number_of_workers,
+            maximum_number_of_queued_requests,
         )
 
         if is_secure:
@@ -1690,5 +2185,8 @@ class HTTPServerThread(Thread):
             self._server_address[1],
         )
 
+    def get_statistics(self):
+        return self._iptv_proxy_http_server.get_statistics()
+
     def stop(self):
         self._iptv_proxy_http_server.shutdown()
@@ -0,0 +1,217 @@
+import logging
+import sys
+import traceback
+from datetime import datetime
+from threading import Lock
+from threading import Timer
+
+import pytz
+
+from iptv_proxy.constants import HTTP_SESSIONS_FLUSH_INTERVAL
+from iptv_proxy.data_access import DatabaseAccess
+from iptv_proxy.db import Database
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPSessionCacheEntry(object):
+    __slots__ = [
+        '_client_ip_address',
+        '_expiry_date_time_in_utc',
+        '_id',
+        '_last_access_date_time_in_utc',
+        '_user_agent',
+    ]
+
+    def __init__(self, http_session):
+        self._client_ip_address = http_session.client_ip_address
+        self._expiry_date_time_in_utc = http_session.expiry_date_time_in_utc
+        self._id = http_session.id
+        self._last_access_date_time_in_utc = http_session.last_access_date_time_in_utc
+        self._user_agent = http_session.user_agent
+
+    @property
+    def client_ip_address(self):
+        return self._client_ip_address
+
+    @property
+    def expiry_date_time_in_utc(self):
+        return self._expiry_date_time_in_utc
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def last_access_date_time_in_utc(self):
+        return self._last_access_date_time_in_utc
+
+    @last_access_date_time_in_utc.setter
+    def last_access_date_time_in_utc(self, last_access_date_time_in_utc):
+        self._last_access_date_time_in_utc = last_access_date_time_in_utc
+
+    @property
+    def user_agent(self):
+        return self._user_agent
+
+
+class HTTPSessionCache(object):
+    __slots__ = []
+
+    _accessed_http_session_ids = set()
+    _deleted_http_session_ids = set()
+    _flush_http_sessions_timer = None
+    _http_sessions = {}
+    _lock = Lock()
+
+    @classmethod
+    def _delete_http_session(cls, http_session_id):
+        cls._http_sessions.pop(http_session_id, None)
+
+        cls._accessed_http_session_ids.discard(http_session_id)
+        cls._deleted_http_session_ids.add(http_session_id)
+
+        cls._start_flush_http_sessions_timer()
+
+    @classmethod
+    def _flush_http_sessions(cls):
+        current_date_time_in_utc = datetime.now(pytz.utc)
+
+        with cls._lock:
+            cls._flush_http_sessions_timer = None
+
+            # Sessions that expired without being accessed again are deleted
+            # along with the ones that were found to be invalid
+            for http_session in list(cls._http_sessions.values()):
+                if current_date_time_in_utc > http_session.expiry_date_time_in_utc:
+                    cls._http_sessions.pop(http_session.id)
+
+                    cls._accessed_http_session_ids.discard(http_session.id)
+                    cls._deleted_http_session_ids.add(http_session.id)
+
+            accessed_http_sessions = [
+                (http_session_id, cls._http_sessions[http_session_id])
+                for http_session_id in cls._accessed_http_session_ids
+            ]
+            deleted_http_session_ids = list(cls._deleted_http_session_ids)
+
+            cls._accessed_http_session_ids = set()
+            cls._deleted_http_session_ids = set()
+
+        if not accessed_http_sessions and not deleted_http_session_ids:
+            return
+
+        with Database.get_write_lock():
+            db_session = Database.create_session()
+
+            try:
+                for (http_session_id, http_session) in accessed_http_sessions:
+                    DatabaseAccess.update_http_session_last_access_date_time_in_utc(
+                        db_session,
+                        http_session_id,
+                        http_session.last_access_date_time_in_utc,
+                    )
+
+                for http_session_id in deleted_http_session_ids:
+                    DatabaseAccess.delete_http_session(db_session, http_session_id)
+
+                db_session.commit()
+            except Exception:
+                (type_, value_, traceback_) = sys.exc_info()
+                logger.error(
+                    '\n'.join(traceback.format_exception(type_, value_, traceback_))
+                )
+
+                db_session.rollback()
+
+                is_flushed = False
+            else:
+                is_flushed = True
+            finally:
+                db_session.close()
+
+        # The sessions that failed to be flushed are flushed again on the next
+        # run, unless they were deleted in the meantime
+        if not is_flushed:
+            with cls._lock:
+                cls._deleted_http_session_ids.update(deleted_http_session_ids)
+
+                for (http_session_id, _) in accessed_http_sessions:
+                    if (
+                        http_session_id in cls._http_sessions
+                        and http_session_id not in cls._deleted_http_session_ids
+                    ):
+                        cls._accessed_http_session_ids.add(http_session_id)
+
+                cls._start_flush_http_sessions_timer()
+
+            return
+
+        logger.trace(
+            'Flushed HTTP server sessions\n'
+            'Accessed sessions => %s\n'
+            'Deleted sessions  => %s',
+            len(accessed_http_sessions),
+            len(deleted_http_session_ids),
+        )
+
+    @classmethod
+    def _start_flush_http_sessions_timer(cls):
+        if cls._flush_http_sessions_timer is None:
+            cls._flush_http_sessions_timer = Timer(
+                HTTP_SESSIONS_FLUSH_INTERVAL, cls._flush_http_sessions
+            )
+            cls._flush_http_sessions_timer.daemon = True
+            cls._flush_http_sessions_timer.start()
+
+    @classmethod
+    def add_http_session(cls, http_session):
+        http_session_cache_entry = HTTPSessionCacheEntry(http_session)
+
+        with cls._lock:
+            cls._http_sessions[http_session_cache_entry.id] = http_session_cache_entry
+
+    @classmethod
+    def is_http_session_valid(cls, http_session_id, client_ip_address, user_agent):
+        current_date_time_in_utc = datetime.now(pytz.utc)
+
+        with cls._lock:
+            http_session = cls._http_sessions.get(http_session_id)
+
+            if http_session is None:
+                return False
+
+            if (
+                current_date_time_in_utc > http_session.expiry_date_time_in_utc
+                or client_ip_address != http_session.client_ip_address
+                or user_agent != http_session.user_agent
+            ):
+                cls._delete_http_session(http_session_id)
+
+                return False
+
+            # The database is only updated by the next flush so that validating
+            # a session never waits on the database write lock
+            http_session.last_access_date_time_in_utc = current_date_time_in_utc
+
+            cls._accessed_http_session_ids.add(http_session_id)
+
+            cls._start_flush_http_sessions_timer()
+
+        return True
+
+    @classmethod
+    def purge(cls):
+        with cls._lock:
+            cls._http_sessions = {}
+
+            cls._accessed_http_session_ids = set()
+            cls._deleted_http_session_ids = set()
+
+    @classmethod
+    def stop(cls):
+        with cls._lock:
+            if cls._flush_http_sessions_timer:
+                cls._flush_http_sessions_timer.cancel()
+
+        cls._flush_http_sessions()
@@ -6,12 +6,21 @@ import logging.config
 import os
 import sys
 import traceback
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from queue import Empty
+from queue import Full
+from queue import Queue
+from threading import Lock
 
 from watchdog.observers import Observer
 
 from iptv_proxy.constants import DEFAULT_LOGGING_CONFIGURATION
+from iptv_proxy.constants import DEFAULT_LOGGING_QUEUE_DROP_POLICY
+from iptv_proxy.constants import DEFAULT_LOGGING_QUEUE_MAXIMUM_SIZE
 from iptv_proxy.constants import LOGGING_CONFIGURATION_FILE_PATH
 from iptv_proxy.constants import TRACE
+from iptv_proxy.enums import LoggingQueueDropPolicy
 from iptv_proxy.utilities import Utility
 from iptv_proxy.watchdog_events import FileSystemEventHandler
 
@@ -23,16 +32,194 @@ def trace(self, msg, *args, **kwargs):
         self._log(TRACE, msg, args, **kwargs)
 
 
+class BoundedQueueHandler(QueueHandler):
+    def __init__(self, queue_, drop_policy):
+        QueueHandler.__init__(self, queue_)
+
+        self._drop_policy = drop_policy
+        self._is_detached = False
+
+    def detach(self):
+        # Records are enqueued while the lock of the handler is held. Once
+        # this returns, nothing is enqueued anymore
+        self.acquire()
+
+        try:
+            self._is_detached = True
+        finally:
+            self.release()
+
+    def enqueue(self, record):
+        # A thread may still be holding on to the handler after it was
+        # removed from its logger
+        if self._is_detached:
+            Logging.increment_number_of_dropped_log_records()
+
+            return
+
+        try:
+            self.queue.put_nowait(record)
+
+            return
+        except Full:
+            pass
+
+        # A full queue means the listener is stalled on its handlers. Records
+        # are dropped rather than blocking the thread that is logging
+        if self._drop_policy == LoggingQueueDropPolicy.DROP_OLDEST:
+            try:
+                self.queue.get_nowait()
+
+                Logging.increment_number_of_dropped_log_records()
+            except Empty:
+                pass
+
+            try:
+                self.queue.put_nowait(record)
+
+                return
+            except Full:
+                pass
+
+        Logging.increment_number_of_dropped_log_records()
+
+
+class BoundedQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The handler feeding the queue is detached before the listener is
+        # stopped. The sentinel therefore waits for the listener to make room
+        # for it rather than being lost to a full queue or dropped to make
+        # room for a newer record
+        self.queue.put(self._sentinel)
+
+
 class Logging(object):
     __slots__ = []
 
     _logging_configuration_file_watchdog_observer = None
     _log_file_path = None
+    _logging_queue_listener = None
+    _logging_queue_listener_lock = Lock()
+    _number_of_dropped_log_records = 0
+    _number_of_dropped_log_records_lock = Lock()
+
+    @classmethod
+    def _apply_logging_configuration(cls, configuration):
+        configuration = copy.copy(configuration)
+        logging_queue_configuration = configuration.pop('queue', {})
+
+        with cls._logging_queue_listener_lock:
+            # The listener is drained into the current handlers before
+            # dictConfig closes them
+            cls._stop_logging_queue_listener()
+
+            logging.config.dictConfig(configuration)
+
+            if logging_queue_configuration.get('enabled', False):
+                cls._start_logging_queue_listener(logging_queue_configuration)
+
+    @classmethod
+    def _start_logging_queue_listener(cls, logging_queue_configuration):
+        try:
+            drop_policy = LoggingQueueDropPolicy(
+                logging_queue_configuration.get(
+                    'drop_policy', DEFAULT_LOGGING_QUEUE_DROP_POLICY
+                )
+            )
+        except ValueError:
+            logger.error(
+                'Invalid logging queue drop policy\n'
+                'Drop policy   => %s\n'
+                'Defaulting to => %s',
+                logging_queue_configuration['drop_policy'],
+                DEFAULT_LOGGING_QUEUE_DROP_POLICY,
+            )
+
+            drop_policy = LoggingQueueDropPolicy(DEFAULT_LOGGING_QUEUE_DROP_POLICY)
+
+        maximum_size = logging_queue_configuration.get(
+            'maximum_size', DEFAULT_LOGGING_QUEUE_MAXIMUM_SIZE
+        )
+
+        if not isinstance(maximum_size, int) or maximum_size <= 0:
+            logger.error(
+                'Invalid logging queue maximum size\n'
+                'Maximum size  => %s\n'
+                'Defaulting to => %s',
+                maximum_size,
+                DEFAULT_LOGGING_QUEUE_MAXIMUM_SIZE,
+            )
+
+            maximum_size = DEFAULT_LOGGING_QUEUE_MAXIMUM_SIZE
+
+        iptv_proxy_logger = logging.getLogger('iptv_proxy')
+        handlers = list(iptv_proxy_logger.handlers)
+        logging_queue = Queue(maximum_size)
+
+        for handler in handlers:
+            iptv_proxy_logger.removeHandler(handler)
+
+        iptv_proxy_logger.addHandler(BoundedQueueHandler(logging_queue, drop_policy))
+
+        cls._logging_queue_listener = BoundedQueueListener(
+            logging_queue, *handlers, respect_handler_level=True
+        )
+        cls._logging_queue_listener.start()
+
+        logger.debug(
+            'Started logging queue listener\n'
+            'Maximum size => %s\n'
+            'Drop policy  => %s',
+            maximum_size,
+            drop_policy.value,
+        )
+
+    @classmethod
+    def _stop_logging_queue_listener(cls):
+        if cls._logging_queue_listener is None:
+            return
+
+        iptv_proxy_logger = logging.getLogger('iptv_proxy')
+
+        for handler in list(iptv_proxy_logger.handlers):
+            if isinstance(handler, BoundedQueueHandler):
+                iptv_proxy_logger.removeHandler(handler)
+
+                handler.detach()
+
+        # Records logged while the listener drains the queue go straight to
+        # the handlers
+        for handler in cls._logging_queue_listener.handlers:
+            iptv_proxy_logger.addHandler(handler)
+
+        cls._logging_queue_listener.stop()
+        cls._logging_queue_listener = None
 
     @classmethod
     def get_log_file_path(cls):
         return cls._log_file_path
 
+    @classmethod
+    def get_statistics(cls):
+        with cls._number_of_dropped_log_records_lock:
+            number_of_dropped_log_records = cls._number_of_dropped_log_records
+
+        with cls._logging_queue_listener_lock:
+            if cls._logging_queue_listener is None:
+                queue_size = 0
+            else:
+                queue_size = cls._logging_queue_listener.queue.qsize()
+
+        return {
+            'number_of_dropped_log_records': number_of_dropped_log_records,
+            'queue_size': queue_size,
+        }
+
+    @classmethod
+    def increment_number_of_dropped_log_records(cls):
+        with cls._number_of_dropped_log_records_lock:
+            cls._number_of_dropped_log_records += 1
+
     @classmethod
     def initialize_logging(cls, log_file_path):
         logging.addLevelName(TRACE, 'TRACE')
@@ -61,7 +248,9 @@ class Logging(object):
                 with open(
                     LOGGING_CONFIGURATION_FILE_PATH, 'r'
                 ) as logging_configuration_file:
-                    logging.config.dictConfig(json.load(logging_configuration_file))
+                    cls._apply_logging_configuration(
+                        json.load(logging_configuration_file)
+                    )
             except FileNotFoundError:
                 raise
             except Exception:
@@ -72,7 +261,7 @@ class Logging(object):
 
                 raise
         else:
-            logging.config.dictConfig(configuration)
+            cls._apply_logging_configuration(configuration)
 
     @classmethod
     def set_log_file_path(cls, log_file_path):
@@ -87,6 +276,11 @@ class Logging(object):
         for handler in iptv_proxy_logger.handlers:
             handler.setLevel(log_level)
 
+        with cls._logging_queue_listener_lock:
+            if cls._logging_queue_listener is not None:
+                for handler in cls._logging_queue_listener.handlers:
+                    handler.setLevel(log_level)
+
     @classmethod
     def start_logging_configuration_file_watchdog_observer(cls):
         logging_configuration_event_handler = LoggingConfigurationEventHandler(
@@ -105,6 +299,11 @@ class Logging(object):
     def stop_logging_configuration_file_watchdog_observer(cls):
         cls._logging_configuration_file_watchdog_observer.stop()
 
+    @classmethod
+    def stop_logging_queue_listener(cls):
+        with cls._logging_queue_listener_lock:
+            cls._stop_logging_queue_listener()
+
 
 class LoggingConfigurationEventHandler(FileSystemEventHandler):
     def __init__(self, logging_configuration_file_path):
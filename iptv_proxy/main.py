@@ -61,3 +61,5 @@ def main():
     except Exception:
         (type_, value_, traceback_) = sys.exc_info()
         logger.error('\n'.join(traceback.format_exception(type_, value_, traceback_)))
+    finally:
+        Logging.stop_logging_queue_listener()
@@ -0,0 +1,436 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from iptv_proxy.constants import METRICS_DURATION_BUCKETS
+from iptv_proxy.constants import METRICS_EPG_REFRESH_DURATION_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    __slots__ = ['_bucket_counts', '_buckets', '_count', '_sum']
+
+    def __init__(self, buckets):
+        self._bucket_counts = [0] * len(buckets)
+        self._buckets = buckets
+        self._count = 0
+        self._sum = 0.0
+
+    def observe(self, value):
+        for (bucket_index, bucket) in enumerate(self._buckets):
+            if value <= bucket:
+                self._bucket_counts[bucket_index] += 1
+
+        self._count += 1
+        self._sum += value
+
+    @property
+    def bucket_counts(self):
+        return self._bucket_counts
+
+    @property
+    def buckets(self):
+        return self._buckets
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+
+class MetricsManager(object):
+    __slots__ = []
+
+    _epg_pipeline_stage_durations = {}
+    _epg_refresh_durations = {}
+    _http_request_durations = {}
+    _http_requests = {}
+    _lock = Lock()
+    _upstream_request_durations = {}
+
+    @classmethod
+    def _format_histograms(cls, metric_name, metric_help, label_names, histograms):
+        metric_lines = [
+            cls._format_metric_header(metric_name, 'histogram', metric_help)
+        ]
+
+        for (label_values, histogram) in sorted(histograms.items()):
+            labels = list(zip(label_names, label_values))
+
+            for (bucket, bucket_count) in zip(
+                histogram.buckets, histogram.bucket_counts
+            ):
+                metric_lines.append(
+                    '{0}_bucket{1} {2}\n'.format(
+                        metric_name,
+                        cls._format_labels(labels + [('le', bucket)]),
+                        bucket_count,
+                    )
+                )
+
+            metric_lines.append(
+                '{0}_bucket{1} {2}\n'.format(
+                    metric_name,
+                    cls._format_labels(labels + [('le', '+Inf')]),
+                    histogram.count,
+                )
+            )
+            metric_lines.append(
+                '{0}_sum{1} {2}\n'.format(
+                    metric_name, cls._format_labels(labels), histogram.sum
+                )
+            )
+            metric_lines.append(
+                '{0}_count{1} {2}\n'.format(
+                    metric_name, cls._format_labels(labels), histogram.count
+                )
+            )
+
+        return ''.join(metric_lines)
+
+    @classmethod
+    def _format_labels(cls, labels):
+        if not labels:
+            return ''
+
+        return '{{{0}}}'.format(
+            ','.join(
+                '{0}="{1}"'.format(
+                    label_name,
+                    '{0}'.format(label_value)
+                    .replace('\\', '\\\\')
+                    .replace('"', '\\"')
+                    .replace('\n', '\\n'),
+                )
+                for (label_name, label_value) in labels
+            )
+        )
+
+    @classmethod
+    def _format_metric_header(cls, metric_name, metric_type, metric_help):
+        return '# HELP {0} {1}\n# TYPE {0} {2}\n'.format(
+            metric_name, metric_help, metric_type
+        )
+
+    @classmethod
+    def _format_samples(cls, metric_name, metric_type, metric_help, samples):
+        metric_lines = [
+            cls._format_metric_header(metric_name, metric_type, metric_help)
+        ]
+
+        for (labels, value) in samples:
+            metric_lines.append(
+                '{0}{1} {2}\n'.format(metric_name, cls._format_labels(labels), value)
+            )
+
+        return ''.join(metric_lines)
+
+    @classmethod
+    def _observe_duration(cls, histograms, key, buckets, duration):
+        with cls._lock:
+            try:
+                histogram = histograms[key]
+            except KeyError:
+                histogram = Histogram(buckets)
+
+                histograms[key] = histogram
+
+            histogram.observe(duration)
+
+    @classmethod
+    def generate_metrics(cls):
+        # pylint: disable=import-outside-toplevel
+        from iptv_proxy.cache import CacheManager
+        from iptv_proxy.connection_pool import ConnectionPoolManager
+        from iptv_proxy.controller import Controller
+        from iptv_proxy.logging import Logging
+        from iptv_proxy.recorder import PVR
+        from iptv_proxy.tuner import TunerManager
+
+        metrics = []
+
+        with cls._lock:
+            metrics.append(
+                cls._format_samples(
+                    'iptv_proxy_http_requests_total',
+                    'counter',
+                    'Number of HTTP requests serviced',
+                    [
+                        (
+                            [
+                                ('method', method),
+                                ('route', route_name),
+                                ('status_code', status_code),
+                            ],
+                            number_of_requests,
+                        )
+                        for (
+                            (method, route_name, status_code),
+                            number_of_requests,
+                        ) in sorted(cls._http_requests.items())
+                    ],
+                )
+            )
+            metrics.append(
+                cls._format_histograms(
+                    'iptv_proxy_http_request_duration_seconds',
+                    'Time taken to service HTTP requests',
+                    ('method', 'route'),
+                    cls._http_request_durations,
+                )
+            )
+            metrics.append(
+                cls._format_histograms(
+                    'iptv_proxy_upstream_request_duration_seconds',
+                    'Time taken by providers to respond to upstream requests',
+                    ('provider', 'operation'),
+                    cls._upstream_request_durations,
+                )
+            )
+            metrics.append(
+                cls._format_histograms(
+                    'iptv_proxy_epg_pipeline_stage_duration_seconds',
+                    'Time spent working by each stage of the EPG ingestion pipeline',
+                    ('provider', 'stage'),
+                    cls._epg_pipeline_stage_durations,
+                )
+            )
+            metrics.append(
+                cls._format_histograms(
+                    'iptv_proxy_epg_refresh_duration_seconds',
+                    'Time taken to refresh the EPG of providers',
+                    ('provider',),
+                    cls._epg_refresh_durations,
+                )
+            )
+
+        cache_statistics = CacheManager.get_statistics()
+
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_cache_responses_total',
+                'counter',
+                'Number of segment cache queries by response type',
+                [
+                    ([('type', 'hard_hit')], cache_statistics['number_of_hard_hits']),
+                    ([('type', 'miss')], cache_statistics['number_of_misses']),
+                    ([('type', 'soft_hit')], cache_statistics['number_of_soft_hits']),
+                ],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_cache_entries',
+                'gauge',
+                'Number of segments held in the cache',
+                [([], cache_statistics['number_of_entries'])],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_cache_size_bytes',
+                'gauge',
+                'Size of the segments held in the cache',
+                [([], cache_statistics['size_in_bytes'])],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_cache_removals_total',
+                'counter',
+                'Number of segments removed from or refused by the cache',
+                [
+                    ([('reason', 'eviction')], cache_statistics['number_of_evictions']),
+                    (
+                        [('reason', 'expiration')],
+                        cache_statistics['number_of_expirations'],
+                    ),
+                    (
+                        [('reason', 'rejection')],
+                        cache_statistics['number_of_rejections'],
+                    ),
+                ],
+            )
+        )
+
+        upstream_connection_statistics = ConnectionPoolManager.get_statistics()
+
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_upstream_connections_total',
+                'counter',
+                'Number of upstream requests by whether a kept-alive connection '
+                'was reused',
+                [
+                    (
+                        [('provider', provider_name), ('reused', reused)],
+                        provider_statistics[statistic_name],
+                    )
+                    for (provider_name, provider_statistics) in sorted(
+                        upstream_connection_statistics.items()
+                    )
+                    for (reused, statistic_name) in (
+                        ('true', 'hits'),
+                        ('false', 'misses'),
+                    )
+                ],
+            )
+        )
+
+        http_server_statistics = Controller.get_http_server_statistics()
+
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_http_server_busy_workers',
+                'gauge',
+                'Number of HTTP server workers servicing a request',
+                [
+                    ([('server', server)], statistics['busy_workers'])
+                    for (server, statistics) in sorted(http_server_statistics.items())
+                ],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_http_server_workers',
+                'gauge',
+                'Number of HTTP server workers',
+                [
+                    ([('server', server)], statistics['maximum_number_of_workers'])
+                    for (server, statistics) in sorted(http_server_statistics.items())
+                ],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_http_server_queued_requests',
+                'gauge',
+                'Number of HTTP requests waiting for a worker',
+                [
+                    ([('server', server), ('lane', lane)], queue_depth)
+                    for (server, statistics) in sorted(http_server_statistics.items())
+                    for (lane, queue_depth) in sorted(
+                        statistics['queue_depths'].items()
+                    )
+                ],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_http_server_rejected_requests_total',
+                'counter',
+                'Number of HTTP requests rejected because the server was saturated',
+                [
+                    ([('server', server), ('lane', lane)], number_of_rejected_requests)
+                    for (server, statistics) in sorted(http_server_statistics.items())
+                    for (lane, number_of_rejected_requests) in sorted(
+                        statistics['rejected_requests'].items()
+                    )
+                ],
+            )
+        )
+
+        logging_statistics = Logging.get_statistics()
+
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_log_records_dropped_total',
+                'counter',
+                'Number of log records dropped because the logging queue was full',
+                [([], logging_statistics['number_of_dropped_log_records'])],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_log_queue_records',
+                'gauge',
+                'Number of log records waiting to be written by the logging queue',
+                [([], logging_statistics['queue_size'])],
+            )
+        )
+
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_live_recordings',
+                'gauge',
+                'Number of recordings in progress',
+                [([], PVR.get_number_of_live_recordings())],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_tuners',
+                'gauge',
+                'Number of channels pulled from providers by a tuner',
+                [([], TunerManager.get_number_of_tuners())],
+            )
+        )
+        metrics.append(
+            cls._format_samples(
+                'iptv_proxy_threads',
+                'gauge',
+                'Number of live threads',
+                [([], threading.active_count())],
+            )
+        )
+
+        return ''.join(metrics)
+
+    @classmethod
+    def observe_epg_pipeline_stage(cls, provider_name, stage, duration):
+        cls._observe_duration(
+            cls._epg_pipeline_stage_durations,
+            (provider_name, stage),
+            METRICS_EPG_REFRESH_DURATION_BUCKETS,
+            duration,
+        )
+
+    @classmethod
+    def observe_http_request(cls, method, route_name, status_code, duration):
+        cls._observe_duration(
+            cls._http_request_durations,
+            (method, route_name),
+            METRICS_DURATION_BUCKETS,
+            duration,
+        )
+
+        with cls._lock:
+            key = (method, route_name, '{0}'.format(status_code))
+
+            cls._http_requests[key] = cls._http_requests.get(key, 0) + 1
+
+    @classmethod
+    @contextmanager
+    def time_epg_refresh(cls, provider_name):
+        start_time = time.monotonic()
+
+        try:
+            yield
+        finally:
+            cls._observe_duration(
+                cls._epg_refresh_durations,
+                (provider_name,),
+                METRICS_EPG_REFRESH_DURATION_BUCKETS,
+                time.monotonic() - start_time,
+            )
+
+    @classmethod
+    @contextmanager
+    def time_upstream_request(cls, provider_name, operation):
+        start_time = time.monotonic()
+
+        try:
+            yield
+        finally:
+            cls._observe_duration(
+                cls._upstream_request_durations,
+                (provider_name, operation),
+                METRICS_DURATION_BUCKETS,
+                time.monotonic() - start_time,
+            )
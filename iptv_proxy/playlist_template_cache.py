@@ -0,0 +1,73 @@
+import logging
+from threading import Lock
+
+from iptv_proxy.single_flight import SingleFlightManager
+
+logger = logging.getLogger(__name__)
+
+
+class PlaylistTemplateCache(object):
+    __slots__ = []
+
+    _generation = 0
+    _lock = Lock()
+    _playlist_templates = {}
+
+    @classmethod
+    def _build_playlist_template(
+        cls, provider_name, playlist_template_variant, build_function
+    ):
+        with cls._lock:
+            generation = cls._generation
+
+        playlist_template = build_function(*playlist_template_variant)
+
+        with cls._lock:
+            # A template built from channels that were migrated in the meantime
+            # is served to the requests waiting on it but is not cached
+            if generation == cls._generation:
+                cls._playlist_templates[
+                    (provider_name, playlist_template_variant)
+                ] = playlist_template
+
+        logger.debug(
+            'Built playlist template\nProvider => %s\nVariant  => %s',
+            provider_name,
+            playlist_template_variant,
+        )
+
+        return playlist_template
+
+    @classmethod
+    def get_playlist_template(
+        cls, provider_name, playlist_template_variant, build_function
+    ):
+        with cls._lock:
+            try:
+                return cls._playlist_templates[
+                    (provider_name, playlist_template_variant)
+                ]
+            except KeyError:
+                pass
+
+        return SingleFlightManager.do_call(
+            ('playlist_template', provider_name, playlist_template_variant),
+            cls._build_playlist_template,
+            provider_name,
+            playlist_template_variant,
+            build_function,
+        )
+
+    @classmethod
+    def invalidate(cls, provider_name=None):
+        with cls._lock:
+            cls._generation += 1
+
+            for playlist_template_key in list(cls._playlist_templates):
+                if provider_name is None or provider_name == playlist_template_key[0]:
+                    del cls._playlist_templates[playlist_template_key]
+
+        logger.debug(
+            'Invalidated playlist templates\nProvider => %s',
+            provider_name if provider_name is not None else 'All',
+        )
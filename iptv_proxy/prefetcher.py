@@ -0,0 +1,225 @@
+import logging
+import re
+import sys
+import traceback
+import urllib.parse
+import uuid
+from queue import Full
+from queue import Queue
+from threading import Lock
+from threading import Thread
+
+from rwlock import RWLock
+
+from iptv_proxy.cache import CacheManager
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import PREFETCH_NUMBER_OF_WORKERS
+from iptv_proxy.constants import PREFETCH_QUEUE_SIZE
+from iptv_proxy.constants import SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
+from iptv_proxy.hls import HLSClient
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.proxy import IPTVProxy
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.timeshift import TimeshiftManager
+
+logger = logging.getLogger(__name__)
+
+
+class SegmentPrefetcher(object):
+    __slots__ = []
+
+    _id = uuid.uuid3(uuid.NAMESPACE_OID, 'IPTVProxySegmentPrefetcher')
+    _lock = RWLock()
+    _number_of_segments_to_prefetch = 3
+    _prefetch_queue = Queue(maxsize=PREFETCH_QUEUE_SIZE)
+    _queued_segments = set()
+    _queued_segments_lock = Lock()
+    _worker_threads = []
+
+    @classmethod
+    def _download_ts_file(
+        cls, hls_client, segment_url, provider_name, channel_number, segment_file_name
+    ):
+        ts_file_content = hls_client.download_ts_file(segment_url)
+
+        CacheManager.update_cache(
+            provider_name, channel_number, segment_file_name, ts_file_content
+        )
+        TimeshiftManager.add_segment(
+            provider_name, channel_number, segment_file_name, ts_file_content
+        )
+
+        logger.debug(
+            'Prefetched segment\n'
+            'Provider          => %s\n'
+            'Channel number    => %s\n'
+            'Segment file name => %s',
+            provider_name,
+            channel_number,
+            segment_file_name,
+        )
+
+        return ts_file_content
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_number_of_segments_to_prefetch(
+                OptionalSettings.get_optional_settings_parameter(
+                    'number_of_segments_to_prefetch'
+                )
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def _prefetch_segment(
+        cls, client_uuid, provider_name, channel_number, segment_file_name, segment_url
+    ):
+        try:
+            last_requested_channel_number = IPTVProxy.get_serviceable_client_parameter(
+                client_uuid, 'last_requested_channel_number'
+            )
+        except KeyError:
+            last_requested_channel_number = None
+
+        # The client switched to another channel since the segment was queued
+        if channel_number != last_requested_channel_number:
+            logger.trace(
+                'Cancelled segment prefetch\n'
+                'Client ID         => %s\n'
+                'Provider          => %s\n'
+                'Channel number    => %s\n'
+                'Segment file name => %s',
+                client_uuid,
+                provider_name,
+                channel_number,
+                segment_file_name,
+            )
+
+            return
+
+        if CacheManager.query_cache(provider_name, channel_number, segment_file_name):
+            return
+
+        SingleFlightManager.do_call(
+            (provider_name, channel_number, segment_file_name),
+            cls._download_ts_file,
+            HLSClient(cls._id, provider_name, channel_number),
+            segment_url,
+            provider_name,
+            channel_number,
+            segment_file_name,
+            wait_timeout=SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT,
+        )
+
+    @classmethod
+    def _process_prefetch_queue(cls):
+        while True:
+            (
+                client_uuid,
+                provider_name,
+                channel_number,
+                segment_file_name,
+                segment_url,
+            ) = cls._prefetch_queue.get()
+
+            try:
+                cls._prefetch_segment(
+                    client_uuid,
+                    provider_name,
+                    channel_number,
+                    segment_file_name,
+                    segment_url,
+                )
+            except Exception:
+                (type_, value_, traceback_) = sys.exc_info()
+                logger.error(
+                    '\n'.join(traceback.format_exception(type_, value_, traceback_))
+                )
+            finally:
+                with cls._queued_segments_lock:
+                    cls._queued_segments.discard(
+                        (provider_name, channel_number, segment_file_name)
+                    )
+
+    @classmethod
+    def _start_worker_threads(cls):
+        while len(cls._worker_threads) < PREFETCH_NUMBER_OF_WORKERS:
+            worker_thread = Thread(target=cls._process_prefetch_queue)
+            worker_thread.daemon = True
+            worker_thread.start()
+
+            cls._worker_threads.append(worker_thread)
+
+    @classmethod
+    def initialize(cls):
+        cls._initialize_class_variables()
+
+    @classmethod
+    def prefetch(cls, client_uuid, provider_name, chunks_m3u8):
+        with cls._lock.reader_lock:
+            number_of_segments_to_prefetch = cls._number_of_segments_to_prefetch
+
+        # Prefetched segments are handed to clients through the cache
+        if (
+            not number_of_segments_to_prefetch
+            or not CacheManager.get_do_cache_downloaded_segments()
+        ):
+            return
+
+        # Clients playing a live playlist request its newest segments next
+        for segment_uri in HLSPlaylist(chunks_m3u8).segment_uris[
+            -number_of_segments_to_prefetch:
+        ]:
+            segment_url = '/live/{0}/{1}'.format(provider_name, segment_uri)
+            segment_url_components = urllib.parse.urlparse(segment_url)
+            segment_file_name = re.sub(
+                r'(/.*)?(/)(.*\.ts)', r'\3', segment_url_components.path
+            ).lower()
+            channel_number = dict(
+                urllib.parse.parse_qsl(segment_url_components.query)
+            ).get('channel_number')
+
+            with cls._queued_segments_lock:
+                if (
+                    provider_name,
+                    channel_number,
+                    segment_file_name,
+                ) in cls._queued_segments:
+                    continue
+
+                try:
+                    cls._prefetch_queue.put_nowait(
+                        (
+                            client_uuid,
+                            provider_name,
+                            channel_number,
+                            segment_file_name,
+                            segment_url,
+                        )
+                    )
+                except Full:
+                    logger.trace(
+                        'Segment prefetch queue is full\n'
+                        'Provider          => %s\n'
+                        'Channel number    => %s\n'
+                        'Segment file name => %s',
+                        provider_name,
+                        channel_number,
+                        segment_file_name,
+                    )
+
+                    break
+
+                cls._queued_segments.add(
+                    (provider_name, channel_number, segment_file_name)
+                )
+
+                if not cls._worker_threads:
+                    cls._start_worker_threads()
+
+    @classmethod
+    def set_number_of_segments_to_prefetch(cls, number_of_segments_to_prefetch):
+        with cls._lock.writer_lock:
+            cls._number_of_segments_to_prefetch = number_of_segments_to_prefetch
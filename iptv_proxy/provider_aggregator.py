@@ -0,0 +1,232 @@
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from threading import Lock
+
+from rwlock import RWLock
+
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import PROVIDER_AGGREGATION_BUFFER_SIZE
+from iptv_proxy.constants import PROVIDER_AGGREGATION_BUFFER_TIMEOUT
+from iptv_proxy.constants import PROVIDER_AGGREGATION_NUMBER_OF_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchedProviderSection(object):
+    __slots__ = [
+        '_is_claimed',
+        '_is_claimed_lock',
+        '_is_closed_event',
+        '_provider_section_generator',
+        '_queue',
+    ]
+
+    def __init__(self, provider_section_generator):
+        self._is_claimed = False
+        self._is_claimed_lock = Lock()
+        self._is_closed_event = Event()
+        self._provider_section_generator = provider_section_generator
+        self._queue = queue.Queue(PROVIDER_AGGREGATION_BUFFER_SIZE)
+
+    def _claim(self):
+        with self._is_claimed_lock:
+            is_claimed = self._is_claimed
+            self._is_claimed = True
+
+        return not is_claimed
+
+    def _put(self, item):
+        while not self._is_closed_event.is_set():
+            try:
+                self._queue.put(item, timeout=PROVIDER_AGGREGATION_BUFFER_TIMEOUT)
+
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def close(self):
+        self._is_closed_event.set()
+
+        if self._claim():
+            self._provider_section_generator.close()
+
+    def generate(self):
+        # A section the pool did not get around to prefetching yet is generated
+        # in place rather than waited on. Waiting could deadlock once every
+        # worker of the pool is blocked on a full buffer
+        if self._claim():
+            yield from self._provider_section_generator
+
+            return
+
+        while True:
+            (provider_section_piece, exception) = self._queue.get()
+
+            if exception is not None:
+                raise exception
+
+            if provider_section_piece is None:
+                break
+
+            yield provider_section_piece
+
+    def prefetch(self):
+        if not self._claim():
+            return
+
+        try:
+            for provider_section_piece in self._provider_section_generator:
+                if not self._put((provider_section_piece, None)):
+                    return
+        except Exception as err:
+            self._put((None, err))
+
+            return
+        finally:
+            self._provider_section_generator.close()
+
+        self._put((None, None))
+
+
+class ProviderAggregator(object):
+    __slots__ = []
+
+    _do_aggregate_providers_concurrently = True
+    _do_aggregate_providers_concurrently_lock = RWLock()
+    _executor = ThreadPoolExecutor(
+        max_workers=PROVIDER_AGGREGATION_NUMBER_OF_WORKERS,
+        thread_name_prefix='ProviderAggregator',
+    )
+    _provider_aggregation_timeout = 5
+    _provider_aggregation_timeout_lock = RWLock()
+
+    @classmethod
+    def _generate_provider_section(
+        cls,
+        provider_name,
+        provider_map_class,
+        generate_provider_section_function,
+        *args,
+        **kwargs
+    ):
+        with cls._provider_aggregation_timeout_lock.reader_lock:
+            provider_aggregation_timeout = cls._provider_aggregation_timeout
+
+        access_lock = provider_map_class.database_class().get_access_lock()
+
+        # The access lock is held exclusively while a provider's EPG is being
+        # migrated. Rather than stalling the whole response the provider is
+        # left out of it
+        if not access_lock.shared_lock.acquire(timeout=provider_aggregation_timeout):
+            logger.warning(
+                'Skipped provider while aggregating providers\n'
+                'Provider => %s\n'
+                'Reason   => Timed out waiting for the EPG to be refreshed',
+                provider_name,
+            )
+
+            return
+
+        try:
+            yield from generate_provider_section_function(
+                provider_name, provider_map_class, *args, **kwargs
+            )
+        finally:
+            access_lock.shared_lock.release()
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_do_aggregate_providers_concurrently(
+                OptionalSettings.get_optional_settings_parameter(
+                    'aggregate_providers_concurrently'
+                )
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_provider_aggregation_timeout(
+                OptionalSettings.get_optional_settings_parameter(
+                    'provider_aggregation_timeout'
+                )
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def aggregate(cls, providers, generate_provider_section_function, *args, **kwargs):
+        with cls._do_aggregate_providers_concurrently_lock.reader_lock:
+            do_aggregate_providers_concurrently = (
+                cls._do_aggregate_providers_concurrently
+            )
+
+        providers = list(providers)
+
+        if not do_aggregate_providers_concurrently or len(providers) < 2:
+            for (provider_name, provider_map_class) in providers:
+                yield from cls._generate_provider_section(
+                    provider_name,
+                    provider_map_class,
+                    generate_provider_section_function,
+                    *args,
+                    **kwargs
+                )
+
+            return
+
+        # The section of the first provider is streamed as it is generated
+        # while those of the other providers are prefetched in the pool, each
+        # into a bounded buffer, and are yielded in the order of the providers
+        prefetched_provider_sections = [
+            PrefetchedProviderSection(
+                cls._generate_provider_section(
+                    provider_name,
+                    provider_map_class,
+                    generate_provider_section_function,
+                    *args,
+                    **kwargs
+                )
+            )
+            for (provider_name, provider_map_class) in providers[1:]
+        ]
+
+        for prefetched_provider_section in prefetched_provider_sections:
+            cls._executor.submit(prefetched_provider_section.prefetch)
+
+        try:
+            yield from cls._generate_provider_section(
+                providers[0][0],
+                providers[0][1],
+                generate_provider_section_function,
+                *args,
+                **kwargs
+            )
+
+            for prefetched_provider_section in prefetched_provider_sections:
+                yield from prefetched_provider_section.generate()
+        finally:
+            for prefetched_provider_section in prefetched_provider_sections:
+                prefetched_provider_section.close()
+
+    @classmethod
+    def initialize(cls):
+        cls._initialize_class_variables()
+
+    @classmethod
+    def set_do_aggregate_providers_concurrently(
+        cls, do_aggregate_providers_concurrently
+    ):
+        with cls._do_aggregate_providers_concurrently_lock.writer_lock:
+            cls._do_aggregate_providers_concurrently = (
+                do_aggregate_providers_concurrently
+            )
+
+    @classmethod
+    def set_provider_aggregation_timeout(cls, provider_aggregation_timeout):
+        with cls._provider_aggregation_timeout_lock.writer_lock:
+            cls._provider_aggregation_timeout = provider_aggregation_timeout
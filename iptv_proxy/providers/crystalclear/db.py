@@ -19,7 +19,9 @@ class CrystalClearDatabase(ProviderDatabase):
     _access_lock = RWLock()
     _database_file_path = None
     _engine = None
+    _program_ids = None
     _provider_name = CrystalClearConstants.PROVIDER_NAME.lower()
+    _retained_program_ids = None
     _session_factory = None
     _temporary_database_file_path = None
     _temporary_engine = None
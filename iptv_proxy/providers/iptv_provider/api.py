@@ -1,3 +1,4 @@
+import functools
 import logging
 import pickle
 import re
@@ -8,13 +9,17 @@ from abc import ABC
 from abc import abstractmethod
 from datetime import datetime
 
-import m3u8
 import pytz
 import requests
 
+from iptv_proxy.chunks_m3u8_cache import ChunksM3U8Cache
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.connection_pool import ConnectionPoolManager
+from iptv_proxy.constants import HTTP_CHUNK_SIZE
 from iptv_proxy.enums import M388PlaylistSortOrder
+from iptv_proxy.formatters import LazyLogMessage
+from iptv_proxy.playlist_template_cache import PlaylistTemplateCache
 from iptv_proxy.providers import ProvidersController
 from iptv_proxy.proxy import IPTVProxy
 from iptv_proxy.security import SecurityManager
@@ -31,69 +36,221 @@ class Provider(ABC):
     _provider_name = None
 
     @classmethod
-    @abstractmethod
-    def _generate_playlist_m3u8_static_track_url(cls, track_information, **kwargs):
-        pass
+    def _calculate_number_of_segments_to_drop(
+        cls, hls_playlist, client_uuid, channel_number, number_of_segments_to_keep=3
+    ):
+        segment_uris = hls_playlist.segment_uris
+
+        try:
+            last_requested_channel_number = IPTVProxy.get_serviceable_client_parameter(
+                client_uuid, 'last_requested_channel_number'
+            )
+
+            if channel_number == last_requested_channel_number:
+                last_requested_ts_file_path = IPTVProxy.get_serviceable_client_parameter(
+                    client_uuid, 'last_requested_ts_file_path'
+                )
+
+                for (segment_index, segment_uri) in enumerate(segment_uris):
+                    if last_requested_ts_file_path in segment_uri:
+                        if segment_index:
+                            return segment_index + 1
+
+                        break
+
+                return 0
+        except KeyError:
+            pass
+
+        return max(len(segment_uris) - number_of_segments_to_keep, 0)
 
     @classmethod
-    @abstractmethod
-    def _initialize(cls, **kwargs):
-        pass
+    def _format_playlist_m3u8_track_url(
+        cls,
+        scheme,
+        server_hostname,
+        server_port,
+        channel_number,
+        client_uuid,
+        http_token,
+        playlist_protocol,
+    ):
+        # The values are expected to be quoted already
+        if playlist_protocol == 'mpegts':
+            return (
+                '{0}://{1}:{2}/live/{3}/stream.ts?'
+                'channel_number={4:02}&'
+                'client_uuid={5}&'
+                'http_token={6}'.format(
+                    scheme,
+                    server_hostname,
+                    server_port,
+                    cls._provider_name,
+                    int(channel_number),
+                    client_uuid,
+                    http_token,
+                )
+            )
+
+        return (
+            '{0}://{1}:{2}/live/{3}/playlist.m3u8?'
+            'channel_number={4:02}&'
+            'client_uuid={5}&'
+            'http_token={6}&'
+            'protocol={7}'.format(
+                scheme,
+                server_hostname,
+                server_port,
+                cls._provider_name,
+                int(channel_number),
+                client_uuid,
+                http_token,
+                playlist_protocol,
+            )
+        )
 
     @classmethod
     @abstractmethod
-    def _initialize_class_variables(cls):
+    def _generate_playlist_m3u8_static_track_url(cls, track_information, **kwargs):
         pass
 
     @classmethod
-    def _reduce_hls_stream_delay(
-        cls, chunks_m3u8, client_uuid, channel_number, number_of_segments_to_keep=3
+    def _generate_playlist_m3u8_tracks_template(
+        cls, playlist_type, playlist_protocol, sort_by
     ):
-        do_reduce_hls_stream_delay = False
-
-        try:
-            last_requested_channel_number = IPTVProxy.get_serviceable_client_parameter(
-                client_uuid, 'last_requested_channel_number'
+        # The values that differ between requests are written as sentinels that
+        # are turned into format fields once the channels' text has been
+        # escaped
+        placeholders = {
+            placeholder_name: '\x00{0}\x00'.format(placeholder_name)
+            for placeholder_name in (
+                'authorization_token',
+                'client_uuid',
+                'http_token',
+                'icon_query_string',
+                's',
+                'server_hostname',
+                'server_port',
             )
+        }
 
-            if channel_number != last_requested_channel_number:
-                do_reduce_hls_stream_delay = True
-            else:
-                last_requested_ts_file_path = IPTVProxy.get_serviceable_client_parameter(
-                    client_uuid, 'last_requested_ts_file_path'
-                )
+        provider_map_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        )
 
-                m3u8_object = m3u8.loads(chunks_m3u8)
+        tracks = {}
 
-                delete_segments_up_to_index = None
+        with provider_map_class.database_class().get_access_lock().shared_lock:
+            db_session = provider_map_class.database_class().create_session()
 
-                for (segment_index, segment) in enumerate(m3u8_object.segments):
-                    if last_requested_ts_file_path in segment.uri:
-                        delete_segments_up_to_index = segment_index
+            try:
+                for (
+                    channel_row
+                ) in provider_map_class.database_access_class().query_channels_pickle(
+                    db_session
+                ):
+                    channel = pickle.loads(channel_row.pickle)
 
-                        break
+                    track_information = [
+                        '#EXTINF:-1 group-title="{0}" '
+                        'tvg-id="{1}" '
+                        'tvg-name="{2}" '
+                        'tvg-logo="{3}" '
+                        'channel-id="{4}",{2}\n'.format(
+                            channel.m3u8_group,
+                            channel.xmltv_id,
+                            channel.display_names[0].text,
+                            channel.icons[0]
+                            .source.format(
+                                placeholders['s'],
+                                placeholders['server_hostname'],
+                                placeholders['server_port'],
+                                placeholders['icon_query_string'],
+                            )
+                            .replace(' ', '%20'),
+                            channel.number,
+                        )
+                    ]
 
-                if delete_segments_up_to_index:
-                    for _ in range(delete_segments_up_to_index + 1):
-                        m3u8_object.segments.pop(0)
+                    if playlist_type == 'dynamic':
+                        track_information.append(
+                            '{0}\n'.format(
+                                cls._format_playlist_m3u8_track_url(
+                                    'http{0}'.format(placeholders['s']),
+                                    placeholders['server_hostname'],
+                                    placeholders['server_port'],
+                                    channel.number,
+                                    placeholders['client_uuid'],
+                                    placeholders['http_token'],
+                                    playlist_protocol,
+                                )
+                            )
+                        )
+                    elif playlist_type == 'static':
+                        cls._generate_playlist_m3u8_static_track_url(
+                            track_information,
+                            channel_number=channel.number,
+                            playlist_protocol=playlist_protocol,
+                            authorization_token=placeholders['authorization_token'],
+                        )
 
-                        m3u8_object.media_sequence += 1
+                    if sort_by == M388PlaylistSortOrder.CHANNEL_NAME.value:
+                        tracks[
+                            '{0} {1} {2}'.format(
+                                channel.m3u8_group,
+                                channel.display_names[0].text,
+                                channel.number,
+                            )
+                        ] = ''.join(track_information)
+                    elif sort_by == M388PlaylistSortOrder.CHANNEL_NUMBER.value:
+                        tracks[channel.number] = ''.join(track_information)
+            finally:
+                db_session.close()
 
-                    chunks_m3u8 = m3u8_object.dumps()
-        except KeyError:
-            do_reduce_hls_stream_delay = True
+        if not sort_by:
+            playlist_m3u8_tracks_template = ''.join(
+                [
+                    tracks[channel_name]
+                    for channel_name in sorted(
+                        tracks, key=lambda channel_name_: channel_name_.lower()
+                    )
+                ]
+            )
+        else:
+            playlist_m3u8_tracks_template = ''.join(
+                [tracks[channel_number] for channel_number in sorted(tracks)]
+            )
 
-        if do_reduce_hls_stream_delay:
-            m3u8_object = m3u8.loads(chunks_m3u8)
+        playlist_m3u8_tracks_template = playlist_m3u8_tracks_template.replace(
+            '{', '{{'
+        ).replace('}', '}}')
 
-            for _ in range(len(m3u8_object.segments) - number_of_segments_to_keep):
-                m3u8_object.segments.pop(0)
+        for (placeholder_name, placeholder) in placeholders.items():
+            playlist_m3u8_tracks_template = playlist_m3u8_tracks_template.replace(
+                placeholder, '{{{0}}}'.format(placeholder_name)
+            )
 
-                m3u8_object.media_sequence += 1
+        return playlist_m3u8_tracks_template
 
-            chunks_m3u8 = m3u8_object.dumps()
+    @classmethod
+    def _generate_response_content_chunks(cls, response):
+        try:
+            for response_content_chunk in response.iter_content(
+                chunk_size=HTTP_CHUNK_SIZE
+            ):
+                yield response_content_chunk
+        finally:
+            response.close()
 
-        return chunks_m3u8
+    @classmethod
+    @abstractmethod
+    def _initialize(cls, **kwargs):
+        pass
+
+    @classmethod
+    @abstractmethod
+    def _initialize_class_variables(cls):
+        pass
 
     @classmethod
     @abstractmethod
@@ -135,6 +292,7 @@ class Provider(ABC):
         client_uuid,
         requested_path,
         requested_query_string_parameters,
+        do_stream=False,
     ):
         pass
 
@@ -210,21 +368,14 @@ class Provider(ABC):
         server_hostname = generate_playlist_m3u8_track_url_mapping['server_hostname']
         server_port = generate_playlist_m3u8_track_url_mapping['server_port']
 
-        return (
-            '{0}://{1}:{2}/live/{3}/playlist.m3u8?'
-            'channel_number={4:02}&'
-            'client_uuid={5}&'
-            'http_token={6}&'
-            'protocol={7}'.format(
-                'https' if is_server_secure else 'http',
-                server_hostname,
-                server_port,
-                cls._provider_name,
-                int(channel_number),
-                client_uuid,
-                urllib.parse.quote(http_token) if http_token else '',
-                playlist_protocol,
-            )
+        return cls._format_playlist_m3u8_track_url(
+            'https' if is_server_secure else 'http',
+            server_hostname,
+            server_port,
+            channel_number,
+            client_uuid,
+            urllib.parse.quote(http_token) if http_token else '',
+            playlist_protocol,
         )
 
     @classmethod
@@ -261,97 +412,34 @@ class Provider(ABC):
                 '{0}_PLAYLIST_TYPE'.format(cls.__name__.upper())
             )
 
-        authorization_token = None
-
-        tracks = {}
-
-        with provider_map_class.database_class().get_access_lock().shared_lock:
-            db_session = provider_map_class.database_class().create_session()
-
-            try:
-                for (
-                    channel_row
-                ) in provider_map_class.database_access_class().query_channels_pickle(
-                    db_session
-                ):
-                    channel = pickle.loads(channel_row.pickle)
-
-                    track_information = [
-                        '#EXTINF:-1 group-title="{0}" '
-                        'tvg-id="{1}" '
-                        'tvg-name="{2}" '
-                        'tvg-logo="{3}" '
-                        'channel-id="{4}",{2}\n'.format(
-                            channel.m3u8_group,
-                            channel.xmltv_id,
-                            channel.display_names[0].text,
-                            channel.icons[0]
-                            .source.format(
-                                's' if is_server_secure else '',
-                                server_hostname,
-                                server_port,
-                                '?http_token={0}'.format(urllib.parse.quote(http_token))
-                                if http_token
-                                else '',
-                            )
-                            .replace(' ', '%20'),
-                            channel.number,
-                        )
-                    ]
-
-                    if playlist_type == 'dynamic':
-                        generate_playlist_m3u8_track_url_mapping = dict(
-                            channel_number=channel.number,
-                            client_uuid=client_uuid,
-                            http_token=http_token,
-                            is_server_secure=is_server_secure,
-                            playlist_protocol=playlist_protocol,
-                            server_hostname=server_hostname,
-                            server_port=server_port,
-                        )
-
-                        track_information.append(
-                            '{0}\n'.format(
-                                cls.generate_playlist_m3u8_track_url(
-                                    generate_playlist_m3u8_track_url_mapping
-                                )
-                            )
-                        )
-                    elif playlist_type == 'static':
-                        if authorization_token is None:
-                            authorization_token = (
-                                cls._retrieve_fresh_authorization_token()
-                            )
-
-                        cls._generate_playlist_m3u8_static_track_url(
-                            track_information,
-                            channel_number=channel.number,
-                            playlist_protocol=playlist_protocol,
-                            authorization_token=authorization_token,
-                        )
+        playlist_m3u8_tracks_template = PlaylistTemplateCache.get_playlist_template(
+            cls._provider_name,
+            (playlist_type, playlist_protocol, sort_by),
+            cls._generate_playlist_m3u8_tracks_template,
+        )
 
-                    if sort_by == M388PlaylistSortOrder.CHANNEL_NAME.value:
-                        tracks[
-                            '{0} {1} {2}'.format(
-                                channel.m3u8_group,
-                                channel.display_names[0].text,
-                                channel.number,
-                            )
-                        ] = ''.join(track_information)
-                    elif sort_by == M388PlaylistSortOrder.CHANNEL_NUMBER.value:
-                        tracks[channel.number] = ''.join(track_information)
-            finally:
-                db_session.close()
+        authorization_token = None
 
-        if not sort_by:
-            return [
-                tracks[channel_name]
-                for channel_name in sorted(
-                    tracks, key=lambda channel_name_: channel_name_.lower()
+        if playlist_type == 'static' and playlist_m3u8_tracks_template:
+            authorization_token = cls._retrieve_fresh_authorization_token()
+
+        return [
+            playlist_m3u8_tracks_template.format_map(
+                dict(
+                    authorization_token=authorization_token,
+                    client_uuid=client_uuid,
+                    http_token=urllib.parse.quote(http_token) if http_token else '',
+                    icon_query_string='?http_token={0}'.format(
+                        urllib.parse.quote(http_token)
+                    )
+                    if http_token
+                    else '',
+                    s='s' if is_server_secure else '',
+                    server_hostname=server_hostname,
+                    server_port=server_port,
                 )
-            ]
-
-        return [tracks[channel_number] for channel_number in sorted(tracks)]
+            )
+        ]
 
     @classmethod
     def get_supported_protocols(cls):
@@ -481,7 +569,7 @@ class XtreamCodesProvider(Provider):
             )
         ).decode()
 
-        requests_session = requests.Session()
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
         target_url = '{0}://{1}{2}/live/{3}/{4}/{5}.m3u8'.format(
             scheme, hostname, port, username, password, channel_number
@@ -513,7 +601,8 @@ class XtreamCodesProvider(Provider):
             authorization_token,
         )
 
-        response = Utility.make_http_request(
+        (response, hls_playlist) = ChunksM3U8Cache.download_chunks_m3u8(
+            cls._provider_name,
             requests_session.get,
             target_url,
             params={'token': authorization_token},
@@ -523,23 +612,30 @@ class XtreamCodesProvider(Provider):
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_text=True, do_print_content=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_text=True,
+                    do_print_content=True,
+                ),
             )
 
             with cls._do_reduce_hls_stream_delay_lock.reader_lock:
                 if cls._do_reduce_hls_stream_delay:
-                    chunks_m3u8 = cls._reduce_hls_stream_delay(
-                        response.text,
+                    number_of_segments_to_drop = cls._calculate_number_of_segments_to_drop(
+                        hls_playlist,
                         client_uuid,
                         channel_number,
                         number_of_segments_to_keep=2,
                     )
                 else:
-                    chunks_m3u8 = response.text
+                    number_of_segments_to_drop = 0
 
-                return re.sub(
+            return hls_playlist.dumps(
+                number_of_segments_to_drop=number_of_segments_to_drop,
+                segment_uri_function=functools.partial(
+                    re.sub,
                     r'/hlsr/(.*)/(.*)/(.*)/(.*)/(.*)/(.*).ts',
                     r'\6.ts?'
                     r'authorization_token=\1&'
@@ -557,8 +653,8 @@ class XtreamCodesProvider(Provider):
                         urllib.parse.quote(port),
                         scheme,
                     ),
-                    chunks_m3u8,
-                )
+                ),
+            )
         else:
             logger.error(Utility.assemble_response_from_log_message(response))
 
@@ -597,7 +693,7 @@ class XtreamCodesProvider(Provider):
         ).decode()
 
         if protocol == 'hls':
-            requests_session = requests.Session()
+            requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
             target_url = '{0}live/{1}/{2}/{3}.m3u8'.format(
                 url, username, password, channel_number
@@ -620,7 +716,8 @@ class XtreamCodesProvider(Provider):
                 target_url,
             )
 
-            response = Utility.make_http_request(
+            (response, hls_playlist) = ChunksM3U8Cache.download_chunks_m3u8(
+                cls._provider_name,
                 requests_session.get,
                 target_url,
                 headers=requests_session.headers,
@@ -629,21 +726,25 @@ class XtreamCodesProvider(Provider):
 
             if response.status_code == requests.codes.OK:
                 logger.trace(
-                    Utility.assemble_response_from_log_message(
-                        response, is_content_text=True, do_print_content=True
-                    )
+                    '%s',
+                    LazyLogMessage(
+                        Utility.assemble_response_from_log_message,
+                        response,
+                        is_content_text=True,
+                        do_print_content=True,
+                    ),
                 )
 
                 with cls._do_reduce_hls_stream_delay_lock.reader_lock:
                     if cls._do_reduce_hls_stream_delay:
-                        chunks_m3u8 = cls._reduce_hls_stream_delay(
-                            response.text,
+                        number_of_segments_to_drop = cls._calculate_number_of_segments_to_drop(
+                            hls_playlist,
                             client_uuid,
                             channel_number,
                             number_of_segments_to_keep=2,
                         )
                     else:
-                        chunks_m3u8 = response.text
+                        number_of_segments_to_drop = 0
 
                 parsed_url = urllib.parse.urlparse(response.request.url)
                 scheme = parsed_url.scheme
@@ -654,31 +755,38 @@ class XtreamCodesProvider(Provider):
                     else ''
                 )
 
-                return re.sub(
-                    r'/hls/(.*)/(.*)/(.*)/(.*)/(.*).ts',
-                    r'\5.ts?'
-                    'authorization_token=&'
-                    'channel_number={0}&'
-                    'client_uuid={1}&'
-                    'hostname={2}&'
-                    'http_token={3}&'
-                    r'leaf_directory=\4&'
-                    'port={4}&'
-                    'scheme={5}'.format(
-                        channel_number,
-                        client_uuid,
-                        urllib.parse.quote(hostname),
-                        urllib.parse.quote(http_token) if http_token else '',
-                        urllib.parse.quote(port),
-                        scheme,
+                return hls_playlist.dumps(
+                    number_of_segments_to_drop=number_of_segments_to_drop,
+                    segment_uri_function=functools.partial(
+                        re.sub,
+                        r'/hls/(.*)/(.*)/(.*)/(.*)/(.*).ts',
+                        r'\5.ts?'
+                        'authorization_token=&'
+                        'channel_number={0}&'
+                        'client_uuid={1}&'
+                        'hostname={2}&'
+                        'http_token={3}&'
+                        r'leaf_directory=\4&'
+                        'port={4}&'
+                        'scheme={5}'.format(
+                            channel_number,
+                            client_uuid,
+                            urllib.parse.quote(hostname),
+                            urllib.parse.quote(http_token) if http_token else '',
+                            urllib.parse.quote(port),
+                            scheme,
+                        ),
                     ),
-                    chunks_m3u8,
                 )
             elif response.status_code == requests.codes.FOUND:
                 logger.trace(
-                    Utility.assemble_response_from_log_message(
-                        response, is_content_text=False, do_print_content=False
-                    )
+                    '%s',
+                    LazyLogMessage(
+                        Utility.assemble_response_from_log_message,
+                        response,
+                        is_content_text=False,
+                        do_print_content=False,
+                    ),
                 )
 
                 parsed_url = urllib.parse.urlparse(response.headers['Location'])
@@ -719,18 +827,21 @@ class XtreamCodesProvider(Provider):
                 cls._provider_name
             )
 
+            # The provider's URL carries the credentials of the account. The
+            # client is pointed at the continuous stream relayed by IPTVProxy
             return (
                 '#EXTM3U\n'
                 '#EXTINF:-1 ,{0}\n'
-                '{1}live/{2}/{3}/{4}.ts'
-                ''.format(
+                'stream.ts?'
+                'channel_number={1}&'
+                'client_uuid={2}&'
+                'http_token={3}'.format(
                     provider_map_class.epg_class().get_channel_name(
                         int(channel_number)
                     ),
-                    url,
-                    username,
-                    password,
                     channel_number,
+                    client_uuid,
+                    urllib.parse.quote(http_token) if http_token else '',
                 )
             )
 
@@ -741,6 +852,7 @@ class XtreamCodesProvider(Provider):
         client_uuid,
         requested_path,
         requested_query_string_parameters,
+        do_stream=False,
     ):
         authorization_token = requested_query_string_parameters.get(
             'authorization_token'
@@ -765,7 +877,7 @@ class XtreamCodesProvider(Provider):
             )
         ).decode()
 
-        requests_session = requests.Session()
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
         target_url = '{0}://{1}{2}/hls{3}{4}/{5}/{6}/{7}/{8}{9}'.format(
             scheme,
@@ -806,13 +918,17 @@ class XtreamCodesProvider(Provider):
             target_url,
             headers=requests_session.headers,
             cookies=requests_session.cookies.get_dict(),
+            stream=do_stream,
         )
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_binary=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_binary=not do_stream,
+                ),
             )
 
             IPTVProxy.set_serviceable_client_parameter(
@@ -821,6 +937,9 @@ class XtreamCodesProvider(Provider):
                 re.sub(r'(/.*)?(/.*\.ts)', r'\2', requested_path)[1:],
             )
 
+            if do_stream:
+                return cls._generate_response_content_chunks(response)
+
             return response.content
 
         logger.error(Utility.assemble_response_from_log_message(response))
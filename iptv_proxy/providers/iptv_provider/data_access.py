@@ -1,3 +1,4 @@
+import hashlib
 import logging
 
 from sqlalchemy import and_
@@ -14,6 +15,24 @@ class ProviderDatabaseAccess:
 
     _provider_name = None
 
+    @classmethod
+    def calculate_row_md5(cls, row):
+        row_md5 = hashlib.md5()
+
+        for column_name in sorted(row):
+            if column_name == 'id':
+                continue
+
+            column_value = row[column_name]
+
+            if not isinstance(column_value, bytes):
+                column_value = '{0}'.format(column_value).encode()
+
+            row_md5.update(column_value)
+            row_md5.update(b'\x00')
+
+        return row_md5.hexdigest()
+
     @classmethod
     def delete_channels(cls, db_session):
         db_session.query(
@@ -22,6 +41,16 @@ class ProviderDatabaseAccess:
             ).channel_class()
         ).delete()
 
+    @classmethod
+    def delete_channels_by_id(cls, db_session, channel_ids):
+        channel_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).channel_class()
+
+        db_session.query(channel_class).filter(
+            channel_class.id.in_(channel_ids)
+        ).delete(synchronize_session=False)
+
     @classmethod
     def delete_programs(cls, db_session):
         program_class = ProvidersController.get_provider_map_class(
@@ -30,10 +59,60 @@ class ProviderDatabaseAccess:
 
         db_session.query(program_class).delete()
 
+    @classmethod
+    def delete_programs_by_id(cls, db_session, program_ids):
+        program_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).program_class()
+
+        db_session.query(program_class).filter(
+            program_class.id.in_(program_ids)
+        ).delete(synchronize_session=False)
+
     @classmethod
     def delete_setting(cls, db_session, setting_name):
         DatabaseAccess.delete_setting(db_session, setting_name)
 
+    @classmethod
+    def insert_channels(cls, db_session, channel_rows):
+        if not channel_rows:
+            return
+
+        channel_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).channel_class()
+
+        # The rows are inserted with a single executemany bypassing the
+        # identity map and unit of work of the session
+        db_session.execute(channel_class.__table__.insert(), channel_rows)
+
+    @classmethod
+    def insert_programs(cls, db_session, program_rows):
+        if not program_rows:
+            return
+
+        provider_map_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        )
+
+        # A program is identified by the MD5 of its content so that it keeps
+        # its id across EPG refreshes for as long as it is unchanged. This is
+        # what allows an incremental EPG refresh to only touch the programs
+        # that changed. Duplicate programs collapse into a single row
+        for program_row in program_rows:
+            if 'id' not in program_row:
+                program_row['id'] = cls.calculate_row_md5(program_row)
+
+        program_rows = provider_map_class.database_class().retain_programs(program_rows)
+
+        if program_rows:
+            db_session.execute(
+                provider_map_class.program_class()
+                .__table__.insert()
+                .prefix_with('OR IGNORE'),
+                program_rows,
+            )
+
     @classmethod
     def query_channel_name_by_channel_number(cls, db_session, channel_number):
         channel_class = ProvidersController.get_provider_map_class(
@@ -46,6 +125,19 @@ class ProviderDatabaseAccess:
             .first()
         )
 
+    @classmethod
+    def query_channel_rows(cls, db_session):
+        channel_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).channel_class()
+
+        return [
+            dict(channel_row)
+            for channel_row in db_session.execute(
+                channel_class.__table__.select()
+            ).mappings()
+        ]
+
     @classmethod
     def query_channels(cls, db_session):
         channel_class = ProvidersController.get_provider_map_class(
@@ -124,6 +216,29 @@ class ProviderDatabaseAccess:
             func.max(channel_class.number).label('maximum_channel_number'),
         ).first()
 
+    @classmethod
+    def query_program_ids(cls, db_session):
+        program_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).program_class()
+
+        return db_session.query(program_class.id).yield_per(1)
+
+    @classmethod
+    def query_program_rows_by_id(cls, db_session, program_ids):
+        program_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).program_class()
+
+        return [
+            dict(program_row)
+            for program_row in db_session.execute(
+                program_class.__table__.select().where(
+                    program_class.__table__.c.id.in_(program_ids)
+                )
+            ).mappings()
+        ]
+
     @classmethod
     def query_programs_pickle_by_channel_xmltv_id_start_stop(
         cls, db_session, channel_xmltv_id, program_start_cutoff, program_stop_cutoff
@@ -145,6 +260,23 @@ class ProviderDatabaseAccess:
             .all()
         )
 
+    @classmethod
+    def query_program_slots_by_id(cls, db_session, program_ids):
+        program_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).program_class()
+
+        return (
+            db_session.query(
+                program_class.id,
+                program_class.channel_xmltv_id,
+                program_class.start,
+                program_class.stop,
+            )
+            .filter(program_class.id.in_(program_ids))
+            .all()
+        )
+
     @classmethod
     def query_programs_complete_xmltv(cls, db_session, program_start_cutoff):
         program_class = ProvidersController.get_provider_map_class(
@@ -10,12 +10,19 @@ try:
     from pysqlite3 import dbapi2 as sqlite3
 except ImportError:
     import sqlite3
+from rwlock import RWLock
 from sqlalchemy import create_engine
 from sqlalchemy import event
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+from iptv_proxy.playlist_template_cache import PlaylistTemplateCache
+from iptv_proxy.providers import ProvidersController
+
 logger = logging.getLogger(__name__)
 Base = declarative_base()
 
@@ -40,18 +47,285 @@ class ProviderDatabase(ABC):
 
     _access_lock = None
     _database_file_path = None
+    _do_refresh_epg_incrementally = True
+    _do_refresh_epg_incrementally_lock = RWLock()
     _engine = None
+    _is_merge_incomplete = False
+    _program_ids = None
+    _provider_name = None
+    _retained_program_ids = None
     _session_factory = None
     _temporary_database_file_path = None
     _temporary_engine = None
     _temporary_session_factory = None
     _write_lock = None
 
+    @classmethod
+    def _begin_transaction(cls, db_session):
+        # Connections are opened in autocommit mode. Statements that must be
+        # applied together are wrapped in an explicit transaction
+        db_session.execute(text('BEGIN'))
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            ProviderDatabase.set_do_refresh_epg_incrementally(
+                OptionalSettings.get_optional_settings_parameter(
+                    'refresh_epg_incrementally'
+                )
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def _merge(cls, old_db_session, new_db_session):
+        database_access_class = ProvidersController.get_provider_map_class(
+            cls._provider_name
+        ).database_access_class()
+
+        # Channels are keyed by their XMLTV id and compared by the MD5 of their
+        # content
+        old_channel_md5s = {
+            channel_row['id']: database_access_class.calculate_row_md5(channel_row)
+            for channel_row in database_access_class.query_channel_rows(old_db_session)
+        }
+        new_channel_rows = database_access_class.query_channel_rows(new_db_session)
+        new_channel_ids = {channel_row['id'] for channel_row in new_channel_rows}
+
+        upserted_channel_rows = [
+            channel_row
+            for channel_row in new_channel_rows
+            if old_channel_md5s.get(channel_row['id'])
+            != database_access_class.calculate_row_md5(channel_row)
+        ]
+        deleted_channel_ids = [
+            channel_id
+            for channel_id in old_channel_md5s
+            if channel_id not in new_channel_ids
+        ]
+
+        # Programs are keyed by the MD5 of their content. A program that changed
+        # is a program that vanished from the EPG and a program that was added
+        # to it. The programs that were already in the EPG were never written
+        # to the temporary database
+        (old_program_ids, retained_program_ids) = (
+            cls._program_ids,
+            cls._retained_program_ids,
+        )
+
+        cls._program_ids = None
+        cls._retained_program_ids = None
+
+        inserted_program_ids = [
+            program_row.id
+            for program_row in database_access_class.query_program_ids(new_db_session)
+        ]
+        deleted_program_ids = list(
+            old_program_ids - retained_program_ids - set(inserted_program_ids)
+        )
+
+        # A program that changed is replaced by the programs of its channel
+        # that air at the same time. Each is deleted in the transaction that
+        # inserts its replacement so that no client sees both or neither
+        deleted_program_slots = {}
+
+        for index in range(
+            0, len(deleted_program_ids), EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+        ):
+            for program_slot in database_access_class.query_program_slots_by_id(
+                old_db_session,
+                deleted_program_ids[index : index + EPG_INCREMENTAL_REFRESH_BATCH_SIZE],
+            ):
+                deleted_program_slots.setdefault(
+                    program_slot.channel_xmltv_id, []
+                ).append(program_slot)
+
+        unreplaced_program_ids = set(deleted_program_ids)
+
+        # Each batch is written in its own short transaction so that clients are
+        # only held back for the duration of a batch
+        with cls._access_lock.exclusive_lock:
+            cls._begin_transaction(old_db_session)
+
+            database_access_class.delete_channels_by_id(
+                old_db_session,
+                deleted_channel_ids
+                + [
+                    channel_row['id']
+                    for channel_row in upserted_channel_rows
+                    if channel_row['id'] in old_channel_md5s
+                ],
+            )
+            database_access_class.insert_channels(old_db_session, upserted_channel_rows)
+
+            old_db_session.commit()
+
+        for index in range(
+            0, len(inserted_program_ids), EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+        ):
+            inserted_program_rows = database_access_class.query_program_rows_by_id(
+                new_db_session,
+                inserted_program_ids[
+                    index : index + EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+                ],
+            )
+
+            replaced_program_ids = {
+                program_slot.id
+                for program_row in inserted_program_rows
+                for program_slot in deleted_program_slots.get(
+                    program_row['channel_xmltv_id'], ()
+                )
+                if program_slot.id in unreplaced_program_ids
+                and program_slot.start < program_row['stop']
+                and program_row['start'] < program_slot.stop
+            }
+
+            unreplaced_program_ids -= replaced_program_ids
+
+            with cls._access_lock.exclusive_lock:
+                cls._begin_transaction(old_db_session)
+
+                database_access_class.insert_programs(
+                    old_db_session, inserted_program_rows
+                )
+                database_access_class.delete_programs_by_id(
+                    old_db_session, list(replaced_program_ids)
+                )
+
+                old_db_session.commit()
+
+        # The programs left are the ones that vanished from the EPG without a
+        # replacement
+        unreplaced_program_ids = list(unreplaced_program_ids)
+
+        for index in range(
+            0, len(unreplaced_program_ids), EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+        ):
+            with cls._access_lock.exclusive_lock:
+                cls._begin_transaction(old_db_session)
+
+                database_access_class.delete_programs_by_id(
+                    old_db_session,
+                    unreplaced_program_ids[
+                        index : index + EPG_INCREMENTAL_REFRESH_BATCH_SIZE
+                    ],
+                )
+
+                old_db_session.commit()
+
+        with cls._access_lock.exclusive_lock:
+            cls._begin_transaction(old_db_session)
+
+            for setting_row in database_access_class.query_settings(new_db_session):
+                old_db_session.merge(setting_row)
+
+            old_db_session.commit()
+
+        logger.debug(
+            'Refreshed %s EPG incrementally\n'
+            'Channels upserted  => %s\n'
+            'Channels deleted   => %s\n'
+            'Programs inserted  => %s\n'
+            'Programs replaced  => %s\n'
+            'Programs deleted   => %s\n'
+            'Programs unchanged => %s',
+            cls._provider_name,
+            len(upserted_channel_rows),
+            len(deleted_channel_ids),
+            len(inserted_program_ids),
+            len(deleted_program_ids) - len(unreplaced_program_ids),
+            len(unreplaced_program_ids),
+            len(retained_program_ids),
+        )
+
     @classmethod
     @abstractmethod
     def _migrate(cls, old_db_session, new_db_session):
         pass
 
+    @classmethod
+    def _migrate_incrementally(cls):
+        old_db_session = cls._session_factory()
+        new_db_session = cls._temporary_session_factory()
+
+        try:
+            with cls._write_lock:
+                cls._merge(old_db_session, new_db_session)
+        except Exception:
+            old_db_session.rollback()
+
+            # The batches committed before the failure are kept. The EPG is
+            # replaced in its entirety on the next refresh rather than diffed
+            # against a partially merged one
+            cls._is_merge_incomplete = True
+
+            (type_, value_, traceback_) = sys.exc_info()
+            logger.error(
+                '\n'.join(traceback.format_exception(type_, value_, traceback_))
+            )
+            logger.error(
+                'Failed to refresh %s EPG incrementally\n'
+                'The EPG may be partially refreshed and will be replaced in its '
+                'entirety on the next refresh',
+                cls._provider_name,
+            )
+
+            raise
+        finally:
+            old_db_session.close()
+            new_db_session.close()
+
+            cls._temporary_engine.dispose()
+
+            try:
+                os.remove(cls._temporary_database_file_path)
+            except OSError:
+                pass
+
+            cls._temporary_database_file_path = None
+            cls._temporary_engine = None
+            cls._temporary_session_factory = None
+
+    @classmethod
+    def _replace(cls):
+        with cls._access_lock.exclusive_lock:
+            old_db_session = cls._session_factory()
+            new_db_session = cls._temporary_session_factory()
+
+            try:
+                cls._migrate(old_db_session, new_db_session)
+
+                new_db_session.commit()
+
+                # Pooled connections would otherwise outlive the database file
+                # they were opened on
+                old_db_session.close()
+                new_db_session.close()
+
+                cls._engine.dispose()
+                cls._temporary_engine.dispose()
+
+                shutil.move(cls._temporary_database_file_path, cls._database_file_path)
+            except Exception:
+                new_db_session.rollback()
+
+                shutil.rmtree(cls._temporary_database_file_path)
+
+                (type_, value_, traceback_) = sys.exc_info()
+                logger.error(
+                    '\n'.join(traceback.format_exception(type_, value_, traceback_))
+                )
+
+                raise
+            finally:
+                old_db_session.close()
+                new_db_session.close()
+
+                cls._temporary_database_file_path = None
+                cls._temporary_engine = None
+                cls._temporary_session_factory = None
+
     @classmethod
     def create_session(cls):
         return cls._session_factory()
@@ -80,6 +354,8 @@ class ProviderDatabase(ABC):
         cls._access_lock.exclusive_lock = cls._access_lock.writer_lock
         cls._access_lock.shared_lock = cls._access_lock.reader_lock
 
+        cls._initialize_class_variables()
+
     @classmethod
     def initialize_temporary(cls):
         try:
@@ -96,33 +372,74 @@ class ProviderDatabase(ABC):
             cls._temporary_engine, autoflush=False, expire_on_commit=False
         )
 
+        with ProviderDatabase._do_refresh_epg_incrementally_lock.reader_lock:
+            do_refresh_epg_incrementally = (
+                ProviderDatabase._do_refresh_epg_incrementally
+            )
+
+        cls._program_ids = None
+        cls._retained_program_ids = None
+
+        if do_refresh_epg_incrementally and not cls._is_merge_incomplete:
+            database_access_class = ProvidersController.get_provider_map_class(
+                cls._provider_name
+            ).database_access_class()
+
+            with cls._access_lock.shared_lock:
+                db_session = cls._session_factory()
+
+                try:
+                    # There is nothing to diff the first EPG of a provider
+                    # against
+                    if (
+                        database_access_class.query_minimum_maximum_channel_numbers(
+                            db_session
+                        ).minimum_channel_number
+                        is not None
+                    ):
+                        cls._program_ids = {
+                            program_row.id
+                            for program_row in database_access_class.query_program_ids(
+                                db_session
+                            )
+                        }
+                        cls._retained_program_ids = set()
+                finally:
+                    db_session.close()
+
     @classmethod
     def migrate(cls):
-        with cls._access_lock.exclusive_lock:
-            old_db_session = cls._session_factory()
-            new_db_session = cls._temporary_session_factory()
+        if cls._program_ids is not None:
+            cls._migrate_incrementally()
+        else:
+            cls._replace()
 
-            try:
-                cls._migrate(old_db_session, new_db_session)
+            cls._is_merge_incomplete = False
 
-                new_db_session.commit()
+        # pylint: disable=import-outside-toplevel
+        from iptv_proxy.epg_artifact_cache import EPGArtifactCache
 
-                shutil.move(cls._temporary_database_file_path, cls._database_file_path)
-            except Exception:
-                new_db_session.rollback()
+        EPGArtifactCache.invalidate(cls._provider_name)
+        PlaylistTemplateCache.invalidate(cls._provider_name)
 
-                shutil.rmtree(cls._temporary_database_file_path)
+    @classmethod
+    def retain_programs(cls, program_rows):
+        if cls._program_ids is None:
+            return program_rows
 
-                (type_, value_, traceback_) = sys.exc_info()
-                logger.error(
-                    '\n'.join(traceback.format_exception(type_, value_, traceback_))
-                )
+        # A program that is already in the current EPG is retained as is rather
+        # than written again
+        unretained_program_rows = []
 
-                raise
-            finally:
-                old_db_session.close()
-                new_db_session.close()
+        for program_row in program_rows:
+            if program_row['id'] in cls._program_ids:
+                cls._retained_program_ids.add(program_row['id'])
+            else:
+                unretained_program_rows.append(program_row)
 
-                cls._temporary_database_file_path = None
-                cls._temporary_engine = None
-                cls._temporary_session_factory = None
+        return unretained_program_rows
+
+    @classmethod
+    def set_do_refresh_epg_incrementally(cls, do_refresh_epg_incrementally):
+        with cls._do_refresh_epg_incrementally_lock.writer_lock:
+            cls._do_refresh_epg_incrementally = do_refresh_epg_incrementally
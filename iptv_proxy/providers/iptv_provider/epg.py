@@ -1,4 +1,5 @@
 import copy
+import functools
 import hashlib
 import html
 import json
@@ -24,9 +25,14 @@ from lxml import etree
 
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.connection_pool import ConnectionPoolManager
 from iptv_proxy.constants import CHANNEL_ICONS_DIRECTORY_PATH
+from iptv_proxy.constants import EPG_BULK_INSERT_BATCH_SIZE
 from iptv_proxy.constants import VERSION
 from iptv_proxy.enums import EPGStyle
+from iptv_proxy.epg_pipeline import EPGPipeline
+from iptv_proxy.formatters import LazyLogMessage
+from iptv_proxy.metrics import MetricsManager
 from iptv_proxy.providers import ProvidersController
 from iptv_proxy.security import SecurityManager
 from iptv_proxy.utilities import Utility
@@ -315,7 +321,8 @@ class ProviderEPG(ABC):
         if cls._do_update_epg(**kwargs):
             logger.debug('Updating EPG')
 
-            cls._update_epg(**kwargs)
+            with MetricsManager.time_epg_refresh(cls._provider_name):
+                cls._update_epg(**kwargs)
         else:
             cls._initialize_refresh_epg_timer()
 
@@ -449,7 +456,8 @@ class ProviderEPG(ABC):
         )
 
         parsed_channel_xmltv_id_to_channel = {}
-        number_of_objects_added_to_db_session = 0
+        channel_rows = []
+        program_rows = []
 
         tv_element = None
 
@@ -507,20 +515,19 @@ class ProviderEPG(ABC):
 
                         parsed_channel_xmltv_id_to_channel[channel_xmltv_id] = channel
 
-                        db_session.add(
-                            provider_map_class.channel_class()(
-                                id_=channel.xmltv_id,
-                                m3u8_group=channel.m3u8_group,
-                                number=channel.number,
-                                name=channel.display_names[0].text,
-                                pickle=pickle.dumps(
+                        channel_rows.append(
+                            {
+                                'id': channel.xmltv_id,
+                                'm3u8_group': channel.m3u8_group,
+                                'number': channel.number,
+                                'name': channel.display_names[0].text,
+                                'pickle': pickle.dumps(
                                     channel, protocol=pickle.HIGHEST_PROTOCOL
                                 ),
-                                complete_xmltv=channel.format(minimal_xmltv=False),
-                                minimal_xmltv=channel.format(),
-                            )
+                                'complete_xmltv': channel.format(minimal_xmltv=False),
+                                'minimal_xmltv': channel.format(),
+                            }
                         )
-                        number_of_objects_added_to_db_session += 1
 
                         element.clear()
                         tv_element.clear()
@@ -895,21 +902,19 @@ class ProviderEPG(ABC):
                             reviews=program_reviews,
                         )
 
-                        db_session.add(
-                            provider_map_class.program_class()(
-                                id_='{0}'.format(uuid.uuid4()),
-                                start=program.start,
-                                stop=program.stop,
-                                channel_xmltv_id=channel.xmltv_id,
-                                channel_number=channel.number,
-                                pickle=pickle.dumps(
+                        program_rows.append(
+                            {
+                                'start': program.start,
+                                'stop': program.stop,
+                                'channel_xmltv_id': channel.xmltv_id,
+                                'channel_number': channel.number,
+                                'pickle': pickle.dumps(
                                     program, protocol=pickle.HIGHEST_PROTOCOL
                                 ),
-                                complete_xmltv=program.format(minimal_xmltv=False),
-                                minimal_xmltv=program.format(),
-                            )
+                                'complete_xmltv': program.format(minimal_xmltv=False),
+                                'minimal_xmltv': program.format(),
+                            }
                         )
-                        number_of_objects_added_to_db_session += 1
 
                         element.clear()
                         tv_element.clear()
@@ -917,13 +922,27 @@ class ProviderEPG(ABC):
                     if element.tag == 'tv':
                         tv_element = element
 
-                if (
-                    number_of_objects_added_to_db_session
-                    and number_of_objects_added_to_db_session % 1000 == 0
-                ):
-                    db_session.flush()
+                if len(channel_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                    provider_map_class.database_access_class().insert_channels(
+                        db_session, channel_rows
+                    )
+
+                    channel_rows = []
+
+                if len(program_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                    provider_map_class.database_access_class().insert_programs(
+                        db_session, program_rows
+                    )
 
-            db_session.flush()
+                    program_rows = []
+
+            provider_map_class.database_access_class().insert_channels(
+                db_session, channel_rows
+            )
+
+            provider_map_class.database_access_class().insert_programs(
+                db_session, program_rows
+            )
 
             logger.debug('Processed external XML XMLTV')
         except Exception:
@@ -959,7 +978,8 @@ class ProviderEPG(ABC):
                 with cls._m3u8_group_map_lock.reader_lock:
                     kwargs['m3u8_group_map'] = copy.deepcopy(cls._m3u8_group_map)
 
-            cls._update_epg(**kwargs)
+            with MetricsManager.time_epg_refresh(cls._provider_name):
+                cls._update_epg(**kwargs)
         except Exception:
             (type_, value_, traceback_) = sys.exc_info()
             logger.error(
@@ -982,15 +1002,21 @@ class ProviderEPG(ABC):
 
         logger.debug('Downloading external XML EPG\nURL => %s', url)
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get, url, headers=requests_session.headers, stream=True
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_xml'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get, url, headers=requests_session.headers, stream=True
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -1282,6 +1308,54 @@ class XStreamCodesProviderEPG(ProviderEPG):
             if re.search(ignored_m3u8_group_regular_expression, channel.m3u8_group):
                 return True
 
+    @classmethod
+    def _format_epg_xml_programme(
+        cls, provider_map_class, parsed_channel_xmltv_id_to_channel, parsed_programme
+    ):
+        (
+            program_channel_xmltv_id,
+            program_start,
+            program_stop,
+            program_attributes,
+        ) = parsed_programme
+
+        program_start = datetime.strptime(program_start, '%Y%m%d%H%M%S %z').astimezone(
+            pytz.utc
+        )
+        program_stop = datetime.strptime(program_stop, '%Y%m%d%H%M%S %z').astimezone(
+            pytz.utc
+        )
+
+        program_rows = []
+
+        try:
+            for channel in parsed_channel_xmltv_id_to_channel[program_channel_xmltv_id]:
+                program = XMLTVProgram(
+                    provider=provider_map_class.constants_class().PROVIDER_NAME,
+                    start=program_start,
+                    stop=program_stop,
+                    channel_xmltv_id=channel.xmltv_id,
+                    **program_attributes
+                )
+
+                program_rows.append(
+                    {
+                        'start': program.start,
+                        'stop': program.stop,
+                        'channel_xmltv_id': channel.xmltv_id,
+                        'channel_number': channel.number,
+                        'pickle': pickle.dumps(
+                            program, protocol=pickle.HIGHEST_PROTOCOL
+                        ),
+                        'complete_xmltv': program.format(minimal_xmltv=False),
+                        'minimal_xmltv': program.format(),
+                    }
+                )
+        except Exception:
+            pass
+
+        return program_rows
+
     @classmethod
     def _parse_categories_json(cls):
         provider_map_class = ProvidersController.get_provider_map_class(
@@ -1364,7 +1438,7 @@ class XStreamCodesProviderEPG(ProviderEPG):
             username,
         )
 
-        number_of_objects_added_to_db_session = 0
+        channel_rows = []
 
         channel_name = None
         channel_number = None
@@ -1441,26 +1515,26 @@ class XStreamCodesProviderEPG(ProviderEPG):
                                 channel
                             ]
 
-                        db_session.add(
-                            provider_map_class.channel_class()(
-                                id_=channel.xmltv_id,
-                                m3u8_group=channel.m3u8_group,
-                                number=channel.number,
-                                name=channel.display_names[0].text,
-                                pickle=pickle.dumps(
+                        channel_rows.append(
+                            {
+                                'id': channel.xmltv_id,
+                                'm3u8_group': channel.m3u8_group,
+                                'number': channel.number,
+                                'name': channel.display_names[0].text,
+                                'pickle': pickle.dumps(
                                     channel, protocol=pickle.HIGHEST_PROTOCOL
                                 ),
-                                complete_xmltv=channel.format(minimal_xmltv=False),
-                                minimal_xmltv=channel.format(),
-                            )
+                                'complete_xmltv': channel.format(minimal_xmltv=False),
+                                'minimal_xmltv': channel.format(),
+                            }
                         )
-                        number_of_objects_added_to_db_session += 1
 
-                        if (
-                            number_of_objects_added_to_db_session
-                            and number_of_objects_added_to_db_session % 1000 == 0
-                        ):
-                            db_session.flush()
+                        if len(channel_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                            provider_map_class.database_access_class().insert_channels(
+                                db_session, channel_rows
+                            )
+
+                            channel_rows = []
 
                     channel_name = None
                     channel_number = None
@@ -1468,7 +1542,9 @@ class XStreamCodesProviderEPG(ProviderEPG):
                     channel_xmltv_id = None
                     channel_m3u8_group = None
 
-            db_session.flush()
+            provider_map_class.database_access_class().insert_channels(
+                db_session, channel_rows
+            )
 
             logger.debug(
                 'Processed %s channels\nFile name => channels_%s.json',
@@ -1528,426 +1604,22 @@ class XStreamCodesProviderEPG(ProviderEPG):
             username,
         )
 
-        number_of_objects_added_to_db_session = 0
-
-        tv_element = None
-
+        # Downloading, parsing, formatting and inserting the programs run
+        # concurrently as stages connected by bounded queues
         try:
-            for (event, element) in etree.iterparse(
+            EPGPipeline(
+                provider_map_class.constants_class().PROVIDER_NAME,
                 epg_xml_stream,
-                events=('start', 'end'),
-                recover=True,
-                tag=('channel', 'programme', 'tv'),
-            ):
-                if event == 'end':
-                    if element.tag == 'channel':
-                        element.clear()
-                        tv_element.clear()
-                    elif element.tag == 'programme':
-                        program_start = datetime.strptime(
-                            element.get('start'), '%Y%m%d%H%M%S %z'
-                        ).astimezone(pytz.utc)
-                        program_stop = datetime.strptime(
-                            element.get('stop'), '%Y%m%d%H%M%S %z'
-                        ).astimezone(pytz.utc)
-                        program_pdc_start = element.get('pdc-start')
-                        program_vps_start = element.get('vps-start')
-                        program_show_view = element.get('showview')
-                        program_video_plus = element.get('videoplus')
-                        program_channel_xmltv_id = element.get('channel')
-                        program_clump_index = element.get('clumpidx')
-                        program_titles = []
-                        program_sub_titles = []
-                        program_descriptions = []
-                        program_credits = None
-                        program_date = None
-                        program_categories = []
-                        program_keywords = []
-                        program_language = None
-                        program_original_language = None
-                        program_length = None
-                        program_icons = []
-                        program_urls = []
-                        program_countries = []
-                        program_episode_numbers = []
-                        program_video = None
-                        program_audio = None
-                        program_previously_shown = None
-                        program_premiere = None
-                        program_last_chance = None
-                        program_new = None
-                        program_subtitles = []
-                        program_ratings = []
-                        program_star_ratings = []
-                        program_reviews = []
-
-                        for sub_element in list(element):
-                            if sub_element.tag == 'title':
-                                program_titles.append(
-                                    XMLTVTitle(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'sub-title':
-                                program_sub_titles.append(
-                                    XMLTVSubTitle(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'desc':
-                                program_descriptions.append(
-                                    XMLTVDescription(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'credits':
-                                credits_actors = []
-                                credits_adapters = []
-                                credits_commentators = []
-                                credits_composers = []
-                                credits_directors = []
-                                credits_editors = []
-                                credits_guests = []
-                                credits_presenters = []
-                                credits_producers = []
-                                credits_writers = []
-
-                                for sub_sub_element in list(sub_element):
-                                    if sub_sub_element.tag == 'actor':
-                                        credits_actors.append(
-                                            XMLTVActor(
-                                                sub_sub_element.get('role'),
-                                                sub_sub_element.text,
-                                            )
-                                        )
-                                    elif sub_sub_element.tag == 'adapter':
-                                        credits_adapters.append(
-                                            XMLTVAdapter(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'commentator':
-                                        credits_commentators.append(
-                                            XMLTVCommentator(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'composer':
-                                        credits_composers.append(
-                                            XMLTVComposer(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'director':
-                                        credits_directors.append(
-                                            XMLTVDirector(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'editor':
-                                        credits_editors.append(
-                                            XMLTVEditor(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'guest':
-                                        credits_guests.append(
-                                            XMLTVGuest(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'presenter':
-                                        credits_presenters.append(
-                                            XMLTVPresenter(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'producer':
-                                        credits_producers.append(
-                                            XMLTVProducer(sub_sub_element.text)
-                                        )
-                                    elif sub_sub_element.tag == 'writer':
-                                        credits_writers.append(
-                                            XMLTVWriter(sub_sub_element.text)
-                                        )
-
-                                program_credits = XMLTVCredits(
-                                    actors=credits_actors,
-                                    adapters=credits_adapters,
-                                    commentators=credits_commentators,
-                                    composers=credits_composers,
-                                    directors=credits_directors,
-                                    editors=credits_editors,
-                                    guests=credits_guests,
-                                    presenters=credits_presenters,
-                                    producers=credits_producers,
-                                    writers=credits_writers,
-                                )
-                            elif sub_element.tag == 'date':
-                                program_date = XMLTVDate(text=sub_element.text)
-                            elif sub_element.tag == 'category':
-                                program_categories.append(
-                                    XMLTVCategory(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'keyword':
-                                program_keywords.append(
-                                    XMLTVKeyword(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'language':
-                                program_language = XMLTVLanguage(
-                                    language=sub_element.get('lang'),
-                                    text=sub_element.text,
-                                )
-                            elif sub_element.tag == 'orig-language':
-                                program_original_language = XMLTVOriginalLanguage(
-                                    language=sub_element.get('lang'),
-                                    text=sub_element.text,
-                                )
-                            elif sub_element.tag == 'length':
-                                program_length = XMLTVLength(
-                                    units=sub_element.get('units'),
-                                    text=sub_element.text,
-                                )
-                            elif sub_element.tag == 'icon':
-                                program_icons.append(
-                                    XMLTVIcon(
-                                        source=sub_element.get('src'),
-                                        width=sub_element.get('width'),
-                                        height=sub_element.get('height'),
-                                    )
-                                )
-                            elif sub_element.tag == 'url':
-                                program_urls.append(XMLTVURL(text=sub_element.text))
-                            elif sub_element.tag == 'country':
-                                program_countries.append(
-                                    XMLTVCountry(
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'episode-num':
-                                program_episode_numbers.append(
-                                    XMLTVEpisodeNumber(
-                                        system=sub_element.get('system'),
-                                        text=sub_element.text,
-                                    )
-                                )
-                            elif sub_element.tag == 'video':
-                                video_present = None
-                                video_colour = None
-                                video_aspect = None
-                                video_quality = None
-
-                                for sub_sub_element in list(sub_element):
-                                    if sub_sub_element.tag == 'present':
-                                        video_present = XMLTVPresent(
-                                            sub_sub_element.text
-                                        )
-                                    elif sub_sub_element.tag == 'colour':
-                                        video_colour = XMLTVColour(sub_sub_element.text)
-                                    elif sub_sub_element.tag == 'aspect':
-                                        video_aspect = XMLTVAspect(sub_sub_element.text)
-                                    elif sub_sub_element.tag == 'quality':
-                                        video_quality = XMLTVQuality(
-                                            sub_sub_element.text
-                                        )
-
-                                if (
-                                    video_present is not None
-                                    or video_colour is not None
-                                    or video_aspect is not None
-                                    or video_quality is not None
-                                ):
-                                    program_video = XMLTVVideo(
-                                        present=video_present,
-                                        colour=video_colour,
-                                        aspect=video_aspect,
-                                        quality=video_quality,
-                                    )
-                            elif sub_element.tag == 'audio':
-                                audio_present = None
-                                audio_stereo = None
-
-                                for sub_sub_element in list(sub_element):
-                                    if sub_sub_element.tag == 'present':
-                                        audio_present = XMLTVPresent(
-                                            sub_sub_element.text
-                                        )
-                                    elif sub_sub_element.tag == 'stereo':
-                                        audio_stereo = XMLTVStereo(sub_sub_element.text)
-
-                                if (
-                                    audio_present is not None
-                                    or audio_stereo is not None
-                                ):
-                                    program_audio = XMLTVAudio(
-                                        present=audio_present, stereo=audio_stereo
-                                    )
-                            elif sub_element.tag == 'previously-shown':
-                                program_previously_shown = XMLTVPreviouslyShown(
-                                    start=sub_element.get('start'),
-                                    channel=sub_element.get('channel'),
-                                )
-                            elif sub_element.tag == 'premiere':
-                                program_premiere = XMLTVPremiere(
-                                    language=sub_element.get('lang'),
-                                    text=sub_element.text,
-                                )
-                            elif sub_element.tag == 'last-chance':
-                                program_last_chance = XMLTVLastChance(
-                                    language=sub_element.get('lang'),
-                                    text=sub_element.text,
-                                )
-                            elif sub_element.tag == 'new':
-                                program_new = XMLTVNew()
-                            elif sub_element.tag == 'subtitles':
-                                subtitles_type = sub_element.get('type')
-                                subtitles_language = None
-
-                                for sub_sub_element in sub_element:
-                                    if sub_sub_element.tag == 'language':
-                                        subtitles_language = XMLTVLanguage(
-                                            language=sub_sub_element.get('lang'),
-                                            text=sub_sub_element.text,
-                                        )
-
-                                program_subtitles.append(
-                                    XMLTVSubtitles(
-                                        type_=subtitles_type,
-                                        language=subtitles_language,
-                                    )
-                                )
-                            elif sub_element.tag == 'rating':
-                                rating_system = sub_element.get('system')
-                                rating_value = None
-                                rating_icons = []
-
-                                for sub_sub_element in sub_element:
-                                    if sub_sub_element.tag == 'value':
-                                        rating_value = XMLTVValue(
-                                            text=sub_sub_element.text
-                                        )
-                                    elif sub_sub_element.tag == 'icon':
-                                        rating_icons.append(
-                                            XMLTVIcon(
-                                                source=sub_sub_element.get('src'),
-                                                width=sub_sub_element.get('width'),
-                                                height=sub_sub_element.get('height'),
-                                            )
-                                        )
-
-                                program_ratings.append(
-                                    XMLTVRating(
-                                        system=rating_system,
-                                        value=rating_value,
-                                        icons=rating_icons,
-                                    )
-                                )
-                            elif sub_element.tag == 'star-rating':
-                                star_rating_system = sub_element.get('system')
-                                star_rating_value = None
-                                star_rating_icons = []
-
-                                for sub_sub_element in sub_element:
-                                    if sub_sub_element.tag == 'value':
-                                        star_rating_value = XMLTVValue(
-                                            text=sub_sub_element.text
-                                        )
-                                    elif sub_sub_element.tag == 'icon':
-                                        star_rating_icons.append(
-                                            XMLTVIcon(
-                                                source=sub_sub_element.get('src'),
-                                                width=sub_sub_element.get('width'),
-                                                height=sub_sub_element.get('height'),
-                                            )
-                                        )
-
-                                program_star_ratings.append(
-                                    XMLTVStarRating(
-                                        system=star_rating_system,
-                                        value=star_rating_value,
-                                        icons=star_rating_icons,
-                                    )
-                                )
-                            elif sub_element.tag == 'review':
-                                program_reviews.append(
-                                    XMLTVReview(
-                                        type_=sub_element.get('type'),
-                                        source=sub_element.get('source'),
-                                        reviewer=sub_element.get('reviewer'),
-                                        language=sub_element.get('lang'),
-                                        text=sub_element.text,
-                                    )
-                                )
-
-                        try:
-                            for channel in parsed_channel_xmltv_id_to_channel[
-                                program_channel_xmltv_id
-                            ]:
-                                program = XMLTVProgram(
-                                    provider=provider_map_class.constants_class().PROVIDER_NAME,
-                                    start=program_start,
-                                    stop=program_stop,
-                                    pdc_start=program_pdc_start,
-                                    vps_start=program_vps_start,
-                                    show_view=program_show_view,
-                                    video_plus=program_video_plus,
-                                    channel_xmltv_id=channel.xmltv_id,
-                                    clump_index=program_clump_index,
-                                    titles=program_titles,
-                                    sub_titles=program_sub_titles,
-                                    descriptions=program_descriptions,
-                                    credits_=program_credits,
-                                    date=program_date,
-                                    categories=program_categories,
-                                    keywords=program_keywords,
-                                    language=program_language,
-                                    original_language=program_original_language,
-                                    length=program_length,
-                                    icons=program_icons,
-                                    urls=program_urls,
-                                    countries=program_countries,
-                                    episode_numbers=program_episode_numbers,
-                                    video=program_video,
-                                    audio=program_audio,
-                                    previously_shown=program_previously_shown,
-                                    premiere=program_premiere,
-                                    last_chance=program_last_chance,
-                                    new=program_new,
-                                    subtitles=program_subtitles,
-                                    ratings=program_ratings,
-                                    star_ratings=program_star_ratings,
-                                    reviews=program_reviews,
-                                )
-
-                                db_session.add(
-                                    provider_map_class.program_class()(
-                                        id_='{0}'.format(uuid.uuid4()),
-                                        start=program.start,
-                                        stop=program.stop,
-                                        channel_xmltv_id=channel.xmltv_id,
-                                        channel_number=channel.number,
-                                        pickle=pickle.dumps(
-                                            program, protocol=pickle.HIGHEST_PROTOCOL
-                                        ),
-                                        complete_xmltv=program.format(
-                                            minimal_xmltv=False
-                                        ),
-                                        minimal_xmltv=program.format(),
-                                    )
-                                )
-                                number_of_objects_added_to_db_session += 1
-                        except Exception:
-                            pass
-
-                        element.clear()
-                        tv_element.clear()
-                elif event == 'start':
-                    if element.tag == 'tv':
-                        tv_element = element
-
-                if (
-                    number_of_objects_added_to_db_session
-                    and number_of_objects_added_to_db_session % 1000 == 0
-                ):
-                    db_session.flush()
-
-            db_session.flush()
+                cls._parse_epg_xml_programmes,
+                functools.partial(
+                    cls._format_epg_xml_programme,
+                    provider_map_class,
+                    parsed_channel_xmltv_id_to_channel,
+                ),
+                functools.partial(
+                    cls._write_epg_xml_programs, db_session, provider_map_class
+                ),
+            ).run()
 
             logger.debug(
                 'Processed %s XML EPG\nFile name => xmltv_%s.xml',
@@ -1963,6 +1635,342 @@ class XStreamCodesProviderEPG(ProviderEPG):
 
             raise
 
+    @classmethod
+    def _parse_epg_xml_programme_element(cls, element):
+        program_pdc_start = element.get('pdc-start')
+        program_vps_start = element.get('vps-start')
+        program_show_view = element.get('showview')
+        program_video_plus = element.get('videoplus')
+        program_clump_index = element.get('clumpidx')
+        program_titles = []
+        program_sub_titles = []
+        program_descriptions = []
+        program_credits = None
+        program_date = None
+        program_categories = []
+        program_keywords = []
+        program_language = None
+        program_original_language = None
+        program_length = None
+        program_icons = []
+        program_urls = []
+        program_countries = []
+        program_episode_numbers = []
+        program_video = None
+        program_audio = None
+        program_previously_shown = None
+        program_premiere = None
+        program_last_chance = None
+        program_new = None
+        program_subtitles = []
+        program_ratings = []
+        program_star_ratings = []
+        program_reviews = []
+
+        for sub_element in list(element):
+            if sub_element.tag == 'title':
+                program_titles.append(
+                    XMLTVTitle(language=sub_element.get('lang'), text=sub_element.text,)
+                )
+            elif sub_element.tag == 'sub-title':
+                program_sub_titles.append(
+                    XMLTVSubTitle(
+                        language=sub_element.get('lang'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'desc':
+                program_descriptions.append(
+                    XMLTVDescription(
+                        language=sub_element.get('lang'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'credits':
+                credits_actors = []
+                credits_adapters = []
+                credits_commentators = []
+                credits_composers = []
+                credits_directors = []
+                credits_editors = []
+                credits_guests = []
+                credits_presenters = []
+                credits_producers = []
+                credits_writers = []
+
+                for sub_sub_element in list(sub_element):
+                    if sub_sub_element.tag == 'actor':
+                        credits_actors.append(
+                            XMLTVActor(
+                                sub_sub_element.get('role'), sub_sub_element.text,
+                            )
+                        )
+                    elif sub_sub_element.tag == 'adapter':
+                        credits_adapters.append(XMLTVAdapter(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'commentator':
+                        credits_commentators.append(
+                            XMLTVCommentator(sub_sub_element.text)
+                        )
+                    elif sub_sub_element.tag == 'composer':
+                        credits_composers.append(XMLTVComposer(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'director':
+                        credits_directors.append(XMLTVDirector(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'editor':
+                        credits_editors.append(XMLTVEditor(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'guest':
+                        credits_guests.append(XMLTVGuest(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'presenter':
+                        credits_presenters.append(XMLTVPresenter(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'producer':
+                        credits_producers.append(XMLTVProducer(sub_sub_element.text))
+                    elif sub_sub_element.tag == 'writer':
+                        credits_writers.append(XMLTVWriter(sub_sub_element.text))
+
+                program_credits = XMLTVCredits(
+                    actors=credits_actors,
+                    adapters=credits_adapters,
+                    commentators=credits_commentators,
+                    composers=credits_composers,
+                    directors=credits_directors,
+                    editors=credits_editors,
+                    guests=credits_guests,
+                    presenters=credits_presenters,
+                    producers=credits_producers,
+                    writers=credits_writers,
+                )
+            elif sub_element.tag == 'date':
+                program_date = XMLTVDate(text=sub_element.text)
+            elif sub_element.tag == 'category':
+                program_categories.append(
+                    XMLTVCategory(
+                        language=sub_element.get('lang'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'keyword':
+                program_keywords.append(
+                    XMLTVKeyword(
+                        language=sub_element.get('lang'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'language':
+                program_language = XMLTVLanguage(
+                    language=sub_element.get('lang'), text=sub_element.text,
+                )
+            elif sub_element.tag == 'orig-language':
+                program_original_language = XMLTVOriginalLanguage(
+                    language=sub_element.get('lang'), text=sub_element.text,
+                )
+            elif sub_element.tag == 'length':
+                program_length = XMLTVLength(
+                    units=sub_element.get('units'), text=sub_element.text,
+                )
+            elif sub_element.tag == 'icon':
+                program_icons.append(
+                    XMLTVIcon(
+                        source=sub_element.get('src'),
+                        width=sub_element.get('width'),
+                        height=sub_element.get('height'),
+                    )
+                )
+            elif sub_element.tag == 'url':
+                program_urls.append(XMLTVURL(text=sub_element.text))
+            elif sub_element.tag == 'country':
+                program_countries.append(
+                    XMLTVCountry(
+                        language=sub_element.get('lang'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'episode-num':
+                program_episode_numbers.append(
+                    XMLTVEpisodeNumber(
+                        system=sub_element.get('system'), text=sub_element.text,
+                    )
+                )
+            elif sub_element.tag == 'video':
+                video_present = None
+                video_colour = None
+                video_aspect = None
+                video_quality = None
+
+                for sub_sub_element in list(sub_element):
+                    if sub_sub_element.tag == 'present':
+                        video_present = XMLTVPresent(sub_sub_element.text)
+                    elif sub_sub_element.tag == 'colour':
+                        video_colour = XMLTVColour(sub_sub_element.text)
+                    elif sub_sub_element.tag == 'aspect':
+                        video_aspect = XMLTVAspect(sub_sub_element.text)
+                    elif sub_sub_element.tag == 'quality':
+                        video_quality = XMLTVQuality(sub_sub_element.text)
+
+                if (
+                    video_present is not None
+                    or video_colour is not None
+                    or video_aspect is not None
+                    or video_quality is not None
+                ):
+                    program_video = XMLTVVideo(
+                        present=video_present,
+                        colour=video_colour,
+                        aspect=video_aspect,
+                        quality=video_quality,
+                    )
+            elif sub_element.tag == 'audio':
+                audio_present = None
+                audio_stereo = None
+
+                for sub_sub_element in list(sub_element):
+                    if sub_sub_element.tag == 'present':
+                        audio_present = XMLTVPresent(sub_sub_element.text)
+                    elif sub_sub_element.tag == 'stereo':
+                        audio_stereo = XMLTVStereo(sub_sub_element.text)
+
+                if audio_present is not None or audio_stereo is not None:
+                    program_audio = XMLTVAudio(
+                        present=audio_present, stereo=audio_stereo
+                    )
+            elif sub_element.tag == 'previously-shown':
+                program_previously_shown = XMLTVPreviouslyShown(
+                    start=sub_element.get('start'), channel=sub_element.get('channel'),
+                )
+            elif sub_element.tag == 'premiere':
+                program_premiere = XMLTVPremiere(
+                    language=sub_element.get('lang'), text=sub_element.text,
+                )
+            elif sub_element.tag == 'last-chance':
+                program_last_chance = XMLTVLastChance(
+                    language=sub_element.get('lang'), text=sub_element.text,
+                )
+            elif sub_element.tag == 'new':
+                program_new = XMLTVNew()
+            elif sub_element.tag == 'subtitles':
+                subtitles_type = sub_element.get('type')
+                subtitles_language = None
+
+                for sub_sub_element in sub_element:
+                    if sub_sub_element.tag == 'language':
+                        subtitles_language = XMLTVLanguage(
+                            language=sub_sub_element.get('lang'),
+                            text=sub_sub_element.text,
+                        )
+
+                program_subtitles.append(
+                    XMLTVSubtitles(type_=subtitles_type, language=subtitles_language,)
+                )
+            elif sub_element.tag == 'rating':
+                rating_system = sub_element.get('system')
+                rating_value = None
+                rating_icons = []
+
+                for sub_sub_element in sub_element:
+                    if sub_sub_element.tag == 'value':
+                        rating_value = XMLTVValue(text=sub_sub_element.text)
+                    elif sub_sub_element.tag == 'icon':
+                        rating_icons.append(
+                            XMLTVIcon(
+                                source=sub_sub_element.get('src'),
+                                width=sub_sub_element.get('width'),
+                                height=sub_sub_element.get('height'),
+                            )
+                        )
+
+                program_ratings.append(
+                    XMLTVRating(
+                        system=rating_system, value=rating_value, icons=rating_icons,
+                    )
+                )
+            elif sub_element.tag == 'star-rating':
+                star_rating_system = sub_element.get('system')
+                star_rating_value = None
+                star_rating_icons = []
+
+                for sub_sub_element in sub_element:
+                    if sub_sub_element.tag == 'value':
+                        star_rating_value = XMLTVValue(text=sub_sub_element.text)
+                    elif sub_sub_element.tag == 'icon':
+                        star_rating_icons.append(
+                            XMLTVIcon(
+                                source=sub_sub_element.get('src'),
+                                width=sub_sub_element.get('width'),
+                                height=sub_sub_element.get('height'),
+                            )
+                        )
+
+                program_star_ratings.append(
+                    XMLTVStarRating(
+                        system=star_rating_system,
+                        value=star_rating_value,
+                        icons=star_rating_icons,
+                    )
+                )
+            elif sub_element.tag == 'review':
+                program_reviews.append(
+                    XMLTVReview(
+                        type_=sub_element.get('type'),
+                        source=sub_element.get('source'),
+                        reviewer=sub_element.get('reviewer'),
+                        language=sub_element.get('lang'),
+                        text=sub_element.text,
+                    )
+                )
+
+        return {
+            'pdc_start': program_pdc_start,
+            'vps_start': program_vps_start,
+            'show_view': program_show_view,
+            'video_plus': program_video_plus,
+            'clump_index': program_clump_index,
+            'titles': program_titles,
+            'sub_titles': program_sub_titles,
+            'descriptions': program_descriptions,
+            'credits_': program_credits,
+            'date': program_date,
+            'categories': program_categories,
+            'keywords': program_keywords,
+            'language': program_language,
+            'original_language': program_original_language,
+            'length': program_length,
+            'icons': program_icons,
+            'urls': program_urls,
+            'countries': program_countries,
+            'episode_numbers': program_episode_numbers,
+            'video': program_video,
+            'audio': program_audio,
+            'previously_shown': program_previously_shown,
+            'premiere': program_premiere,
+            'last_chance': program_last_chance,
+            'new': program_new,
+            'subtitles': program_subtitles,
+            'ratings': program_ratings,
+            'star_ratings': program_star_ratings,
+            'reviews': program_reviews,
+        }
+
+    @classmethod
+    def _parse_epg_xml_programmes(cls, epg_xml_stream):
+        tv_element = None
+
+        for (event, element) in etree.iterparse(
+            epg_xml_stream,
+            events=('start', 'end'),
+            recover=True,
+            tag=('channel', 'programme', 'tv'),
+        ):
+            if event == 'end':
+                if element.tag == 'channel':
+                    element.clear()
+                    tv_element.clear()
+                elif element.tag == 'programme':
+                    yield (
+                        element.get('channel'),
+                        element.get('start'),
+                        element.get('stop'),
+                        cls._parse_epg_xml_programme_element(element),
+                    )
+
+                    element.clear()
+                    tv_element.clear()
+            elif event == 'start':
+                if element.tag == 'tv':
+                    tv_element = element
+
     @classmethod
     def _parse_m3u8_playlist(
         cls,
@@ -1991,7 +1999,7 @@ class XStreamCodesProviderEPG(ProviderEPG):
             username,
         )
 
-        number_of_objects_added_to_db_session = 0
+        channel_rows = []
 
         channel_xmltv_id = None
         channel_name = None
@@ -2103,36 +2111,37 @@ class XStreamCodesProviderEPG(ProviderEPG):
                                         channel_xmltv_id
                                     ] = [channel]
 
-                                db_session.add(
-                                    provider_map_class.channel_class()(
-                                        id_=channel.xmltv_id,
-                                        m3u8_group=channel.m3u8_group,
-                                        number=channel.number,
-                                        name=channel.display_names[0].text,
-                                        pickle=pickle.dumps(
+                                channel_rows.append(
+                                    {
+                                        'id': channel.xmltv_id,
+                                        'm3u8_group': channel.m3u8_group,
+                                        'number': channel.number,
+                                        'name': channel.display_names[0].text,
+                                        'pickle': pickle.dumps(
                                             channel, protocol=pickle.HIGHEST_PROTOCOL
                                         ),
-                                        complete_xmltv=channel.format(
+                                        'complete_xmltv': channel.format(
                                             minimal_xmltv=False
                                         ),
-                                        minimal_xmltv=channel.format(),
-                                    )
+                                        'minimal_xmltv': channel.format(),
+                                    }
                                 )
-                                number_of_objects_added_to_db_session += 1
 
-                                if (
-                                    number_of_objects_added_to_db_session
-                                    and number_of_objects_added_to_db_session % 1000
-                                    == 0
-                                ):
-                                    db_session.flush()
+                                if len(channel_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                                    provider_map_class.database_access_class().insert_channels(
+                                        db_session, channel_rows
+                                    )
+
+                                    channel_rows = []
 
                         channel_xmltv_id = None
                         channel_name = None
                         channel_icon_source = None
                         channel_m3u8_group = None
 
-            db_session.flush()
+            provider_map_class.database_access_class().insert_channels(
+                db_session, channel_rows
+            )
 
             logger.debug(
                 'Processed %s m3u8 playlist\nFile name => tv_channels_%s.m3u',
@@ -2183,20 +2192,26 @@ class XStreamCodesProviderEPG(ProviderEPG):
             action,
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get,
-            target_url,
-            params={'username': username, 'password': password, 'action': action},
-            headers=requests_session.headers,
-            cookies=requests_session.cookies.get_dict(),
-            stream=True,
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_json'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get,
+                target_url,
+                params={'username': username, 'password': password, 'action': action},
+                headers=requests_session.headers,
+                cookies=requests_session.cookies.get_dict(),
+                stream=True,
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -2237,18 +2252,24 @@ class XStreamCodesProviderEPG(ProviderEPG):
             '\u2022' * len(password),
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get,
-            target_url,
-            params={'username': username, 'password': password},
-            headers=requests_session.headers,
-            cookies=requests_session.cookies.get_dict(),
-            stream=True,
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_xml'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get,
+                target_url,
+                params={'username': username, 'password': password},
+                headers=requests_session.headers,
+                cookies=requests_session.cookies.get_dict(),
+                stream=True,
+            )
 
         if response.status_code == requests.codes.OK:
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -2291,23 +2312,29 @@ class XStreamCodesProviderEPG(ProviderEPG):
             '\u2022' * len(password),
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get,
-            target_url,
-            params={
-                'username': username,
-                'password': password,
-                'type': 'm3u_plus',
-                'output': 'hls',
-            },
-            headers=requests_session.headers,
-            cookies=requests_session.cookies.get_dict(),
-            stream=True,
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_m3u8_playlist'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get,
+                target_url,
+                params={
+                    'username': username,
+                    'password': password,
+                    'type': 'm3u_plus',
+                    'output': 'hls',
+                },
+                headers=requests_session.headers,
+                cookies=requests_session.cookies.get_dict(),
+                stream=True,
+            )
 
         if response.status_code == requests.codes.OK:
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -2413,3 +2440,9 @@ class XStreamCodesProviderEPG(ProviderEPG):
                         cls._initialize_refresh_epg_timer(do_set_timer_for_retry=True)
 
                         raise
+
+    @classmethod
+    def _write_epg_xml_programs(cls, db_session, provider_map_class, program_rows):
+        provider_map_class.database_access_class().insert_programs(
+            db_session, program_rows
+        )
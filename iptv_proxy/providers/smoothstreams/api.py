@@ -8,14 +8,17 @@ from datetime import timedelta
 from threading import Timer
 
 import jsonpickle
-import m3u8
 import pytz
 import requests
 import tzlocal
 from rwlock import RWLock
 
+from iptv_proxy.chunks_m3u8_cache import ChunksM3U8Cache
 from iptv_proxy.configuration import Configuration
+from iptv_proxy.connection_pool import ConnectionPoolManager
 from iptv_proxy.enums import M388PlaylistSortOrder
+from iptv_proxy.formatters import LazyLogMessage
+from iptv_proxy.hls_playlist import HLSPlaylist
 from iptv_proxy.providers.iptv_provider.api import Provider
 from iptv_proxy.providers.smoothstreams.constants import SmoothStreamsConstants
 from iptv_proxy.providers.smoothstreams.data_access import SmoothStreamsDatabaseAccess
@@ -183,10 +186,8 @@ class SmoothStreams(Provider):
                         dict(channel_number=channel_number, protocol='hls'),
                     )
 
-                    m3u8_object = m3u8.loads(response_text)
-
                     requested_path_with_query_string = '/{0}'.format(
-                        m3u8_object.data['playlists'][0]['uri']
+                        HLSPlaylist(response_text).playlist_uris[0]
                     )
                     requested_url_components = urllib.parse.urlparse(
                         requested_path_with_query_string
@@ -267,9 +268,13 @@ class SmoothStreams(Provider):
             response.raise_for_status()
 
         logger.trace(
-            Utility.assemble_response_from_log_message(
-                response, is_content_json=True, do_print_content=True
-            )
+            '%s',
+            LazyLogMessage(
+                Utility.assemble_response_from_log_message,
+                response,
+                is_content_json=True,
+                do_print_content=True,
+            ),
         )
 
         authorization_token_response = response.json()
@@ -392,8 +397,9 @@ class SmoothStreams(Provider):
             authorization_token,
         )
 
-        response = Utility.make_http_request(
-            requests_session.get,
+        (response, _) = ChunksM3U8Cache.download_chunks_m3u8(
+            cls._provider_name,
+            ConnectionPoolManager.get_session(cls._provider_name).get,
             target_url,
             params={
                 'nimblesessionid': nimble_session_id,
@@ -405,9 +411,13 @@ class SmoothStreams(Provider):
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_text=True, do_print_content=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_text=True,
+                    do_print_content=True,
+                ),
             )
 
             return response.text.replace(
@@ -477,7 +487,7 @@ class SmoothStreams(Provider):
             )
 
             response = Utility.make_http_request(
-                requests_session.get,
+                ConnectionPoolManager.get_session(cls._provider_name).get,
                 target_url,
                 params={'wmsAuthSign': authorization_token},
                 headers=requests_session.headers,
@@ -486,9 +496,13 @@ class SmoothStreams(Provider):
 
             if response.status_code == requests.codes.OK:
                 logger.trace(
-                    Utility.assemble_response_from_log_message(
-                        response, is_content_text=True, do_print_content=True
-                    )
+                    '%s',
+                    LazyLogMessage(
+                        Utility.assemble_response_from_log_message,
+                        response,
+                        is_content_text=True,
+                        do_print_content=True,
+                    ),
                 )
 
                 return response.text.replace(
@@ -504,18 +518,20 @@ class SmoothStreams(Provider):
 
             response.raise_for_status()
         elif protocol == 'mpegts':
-            authorization_token = cls._get_session_parameter('authorization_token')
-
+            # The provider's URL carries the authorization token of the
+            # account. The client is pointed at the continuous stream relayed
+            # by IPTVProxy
             return (
                 '#EXTM3U\n'
                 '#EXTINF:-1 ,{0}\n'
-                'https://{1}.smoothstreams.tv:443/{2}/ch{3}q1.stream/mpeg.2ts?'
-                'wmsAuthSign={4}'.format(
+                'stream.ts?'
+                'channel_number={1}&'
+                'client_uuid={2}&'
+                'http_token={3}'.format(
                     SmoothStreamsEPG.get_channel_name(int(channel_number)),
-                    Configuration.get_configuration_parameter('SMOOTHSTREAMS_SERVER'),
-                    Configuration.get_configuration_parameter('SMOOTHSTREAMS_SERVICE'),
                     channel_number,
-                    authorization_token,
+                    client_uuid,
+                    urllib.parse.quote(http_token) if http_token else '',
                 )
             )
         elif protocol == 'rtmp':
@@ -541,6 +557,7 @@ class SmoothStreams(Provider):
         client_uuid,
         requested_path,
         requested_query_string_parameters,
+        do_stream=False,
     ):
         authorization_token = requested_query_string_parameters.get('wmsAuthSign')
         channel_number = requested_query_string_parameters.get('channel_number')
@@ -584,7 +601,7 @@ class SmoothStreams(Provider):
         )
 
         response = Utility.make_http_request(
-            requests_session.get,
+            ConnectionPoolManager.get_session(cls._provider_name).get,
             target_url,
             params={
                 'nimblesessionid': nimble_session_id,
@@ -592,15 +609,22 @@ class SmoothStreams(Provider):
             },
             headers=requests_session.headers,
             cookies=requests_session.cookies.get_dict(),
+            stream=do_stream,
         )
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_binary=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_binary=not do_stream,
+                ),
             )
 
+            if do_stream:
+                return cls._generate_response_content_chunks(response)
+
             return response.content
 
         logger.error(Utility.assemble_response_from_log_message(response))
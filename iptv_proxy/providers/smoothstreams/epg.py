@@ -1,7 +1,6 @@
 import html
 import logging
 import pickle
-import uuid
 from collections import OrderedDict
 from datetime import datetime
 from datetime import timedelta
@@ -14,10 +13,13 @@ from lxml import etree
 from rwlock import RWLock
 
 from iptv_proxy.configuration import Configuration
+from iptv_proxy.connection_pool import ConnectionPoolManager
+from iptv_proxy.constants import EPG_BULK_INSERT_BATCH_SIZE
+from iptv_proxy.formatters import LazyLogMessage
+from iptv_proxy.metrics import MetricsManager
 from iptv_proxy.providers.iptv_provider.epg import ProviderEPG
 from iptv_proxy.providers.smoothstreams.constants import SmoothStreamsConstants
-from iptv_proxy.providers.smoothstreams.data_model import SmoothStreamsChannel
-from iptv_proxy.providers.smoothstreams.data_model import SmoothStreamsProgram
+from iptv_proxy.providers.smoothstreams.data_access import SmoothStreamsDatabaseAccess
 from iptv_proxy.providers.smoothstreams.data_model import SmoothStreamsSetting
 from iptv_proxy.providers.smoothstreams.db import SmoothStreamsDatabase
 from iptv_proxy.providers.smoothstreams.enums import SmoothStreamsEPGSource
@@ -97,6 +99,8 @@ class SmoothStreamsEPG(ProviderEPG):
             SmoothStreamsConstants.FOG_CHANNELS_JSON_FILE_NAME,
         )
 
+        channel_rows = []
+
         key = None
 
         channel_number = None
@@ -145,21 +149,21 @@ class SmoothStreamsEPG(ProviderEPG):
 
                     parsed_channel_xmltv_id_to_channel[channel_xmltv_id] = channel
 
-                    db_session.add(
-                        SmoothStreamsChannel(
-                            id_=channel.xmltv_id,
-                            m3u8_group='SmoothStreams',
-                            number=channel.number,
-                            name=channel.display_names[0].text,
-                            pickle=pickle.dumps(
+                    channel_rows.append(
+                        {
+                            'id': channel.xmltv_id,
+                            'm3u8_group': 'SmoothStreams',
+                            'number': channel.number,
+                            'name': channel.display_names[0].text,
+                            'pickle': pickle.dumps(
                                 channel, protocol=pickle.HIGHEST_PROTOCOL
                             ),
-                            complete_xmltv=channel.format(minimal_xmltv=False),
-                            minimal_xmltv=channel.format(),
-                        )
+                            'complete_xmltv': channel.format(minimal_xmltv=False),
+                            'minimal_xmltv': channel.format(),
+                        }
                     )
 
-            db_session.flush()
+            SmoothStreamsDatabaseAccess.insert_channels(db_session, channel_rows)
 
             logger.debug(
                 'Processed Fog JSON channels\nFile name => %s',
@@ -182,7 +186,7 @@ class SmoothStreamsEPG(ProviderEPG):
             SmoothStreamsConstants.FOG_EPG_XML_FILE_NAME,
         )
 
-        number_of_objects_added_to_db_session = 0
+        program_rows = []
 
         tv_element = None
         tv_date = None
@@ -568,21 +572,19 @@ class SmoothStreamsEPG(ProviderEPG):
                             reviews=program_reviews,
                         )
 
-                        db_session.add(
-                            SmoothStreamsProgram(
-                                id_='{0}'.format(uuid.uuid4()),
-                                start=program.start,
-                                stop=program.stop,
-                                channel_xmltv_id=channel.xmltv_id,
-                                channel_number=channel.number,
-                                pickle=pickle.dumps(
+                        program_rows.append(
+                            {
+                                'start': program.start,
+                                'stop': program.stop,
+                                'channel_xmltv_id': channel.xmltv_id,
+                                'channel_number': channel.number,
+                                'pickle': pickle.dumps(
                                     program, protocol=pickle.HIGHEST_PROTOCOL
                                 ),
-                                complete_xmltv=program.format(minimal_xmltv=False),
-                                minimal_xmltv=program.format(),
-                            )
+                                'complete_xmltv': program.format(minimal_xmltv=False),
+                                'minimal_xmltv': program.format(),
+                            }
                         )
-                        number_of_objects_added_to_db_session += 1
 
                         element.clear()
                         tv_element.clear()
@@ -594,13 +596,14 @@ class SmoothStreamsEPG(ProviderEPG):
                             element.get('date'), '%Y%m%d%H%M%S %z'
                         ).replace(tzinfo=pytz.utc)
 
-                if (
-                    number_of_objects_added_to_db_session
-                    and number_of_objects_added_to_db_session % 1000 == 0
-                ):
-                    db_session.flush()
+                if len(program_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                    SmoothStreamsDatabaseAccess.insert_programs(
+                        db_session, program_rows
+                    )
 
-            db_session.flush()
+                    program_rows = []
+
+            SmoothStreamsDatabaseAccess.insert_programs(db_session, program_rows)
 
             logger.debug(
                 'Processed Fog XML EPG\nFile name    => %s\nGenerated on => %s',
@@ -626,7 +629,8 @@ class SmoothStreamsEPG(ProviderEPG):
             SmoothStreamsConstants.EPG_FILE_NAME,
         )
 
-        number_of_objects_added_to_db_session = 0
+        channel_rows = []
+        program_rows = []
 
         data_id = None
         events_id = None
@@ -757,51 +761,50 @@ class SmoothStreamsEPG(ProviderEPG):
                         channel, channel_name_map, not do_use_provider_icons
                     )
 
-                    db_session.add(
-                        SmoothStreamsChannel(
-                            id_=channel.xmltv_id,
-                            m3u8_group='SmoothStreams',
-                            number=channel.number,
-                            name=channel.display_names[0].text,
-                            pickle=pickle.dumps(
+                    channel_rows.append(
+                        {
+                            'id': channel.xmltv_id,
+                            'm3u8_group': 'SmoothStreams',
+                            'number': channel.number,
+                            'name': channel.display_names[0].text,
+                            'pickle': pickle.dumps(
                                 channel, protocol=pickle.HIGHEST_PROTOCOL
                             ),
-                            complete_xmltv=channel.format(minimal_xmltv=False),
-                            minimal_xmltv=channel.format(),
-                        )
+                            'complete_xmltv': channel.format(minimal_xmltv=False),
+                            'minimal_xmltv': channel.format(),
+                        }
                     )
-                    number_of_objects_added_to_db_session += 1
 
-                    if (
-                        number_of_objects_added_to_db_session
-                        and number_of_objects_added_to_db_session % 1000 == 0
-                    ):
-                        db_session.flush()
+                    if len(channel_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                        SmoothStreamsDatabaseAccess.insert_channels(
+                            db_session, channel_rows
+                        )
+
+                        channel_rows = []
 
                     for program in programs:
                         program.channel_xmltv_id = channel.xmltv_id
 
-                        db_session.add(
-                            SmoothStreamsProgram(
-                                id_='{0}'.format(uuid.uuid4()),
-                                start=program.start,
-                                stop=program.stop,
-                                channel_xmltv_id=channel.xmltv_id,
-                                channel_number=channel.number,
-                                pickle=pickle.dumps(
+                        program_rows.append(
+                            {
+                                'start': program.start,
+                                'stop': program.stop,
+                                'channel_xmltv_id': channel.xmltv_id,
+                                'channel_number': channel.number,
+                                'pickle': pickle.dumps(
                                     program, protocol=pickle.HIGHEST_PROTOCOL
                                 ),
-                                complete_xmltv=program.format(minimal_xmltv=False),
-                                minimal_xmltv=program.format(),
-                            )
+                                'complete_xmltv': program.format(minimal_xmltv=False),
+                                'minimal_xmltv': program.format(),
+                            }
                         )
-                        number_of_objects_added_to_db_session += 1
 
-                        if (
-                            number_of_objects_added_to_db_session
-                            and number_of_objects_added_to_db_session % 1000 == 0
-                        ):
-                            db_session.flush()
+                        if len(program_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                            SmoothStreamsDatabaseAccess.insert_programs(
+                                db_session, program_rows
+                            )
+
+                            program_rows = []
 
                     channel_number = None
                     channel_name = None
@@ -809,7 +812,8 @@ class SmoothStreamsEPG(ProviderEPG):
 
                     programs = []
 
-            db_session.flush()
+            SmoothStreamsDatabaseAccess.insert_channels(db_session, channel_rows)
+            SmoothStreamsDatabaseAccess.insert_programs(db_session, program_rows)
 
             logger.debug(
                 'Processed SmoothStreams JSON EPG\n'
@@ -839,15 +843,21 @@ class SmoothStreamsEPG(ProviderEPG):
             url,
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get, url, headers=requests_session.headers, stream=True
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_json'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get, url, headers=requests_session.headers, stream=True
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -868,15 +878,21 @@ class SmoothStreamsEPG(ProviderEPG):
             url,
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get, url, headers=requests_session.headers, stream=True
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_xml'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get, url, headers=requests_session.headers, stream=True
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -894,15 +910,21 @@ class SmoothStreamsEPG(ProviderEPG):
             'Downloading %s\nURL => %s', SmoothStreamsConstants.EPG_FILE_NAME, url
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get, url, headers=requests_session.headers, stream=True
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_json'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get, url, headers=requests_session.headers, stream=True
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -1,4 +1,5 @@
 import base64
+import functools
 import json
 import logging
 import re
@@ -9,8 +10,11 @@ import pytz
 import requests
 from rwlock import RWLock
 
+from iptv_proxy.chunks_m3u8_cache import ChunksM3U8Cache
 from iptv_proxy.configuration import Configuration
 from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.connection_pool import ConnectionPoolManager
+from iptv_proxy.formatters import LazyLogMessage
 from iptv_proxy.providers.iptv_provider.api import Provider
 from iptv_proxy.providers.vaderstreams.constants import VaderStreamsConstants
 from iptv_proxy.providers.vaderstreams.epg import VaderStreamsEPG
@@ -76,6 +80,14 @@ class VaderStreams(Provider):
     def _retrieve_fresh_authorization_token(cls):
         return cls._calculate_token()
 
+    @classmethod
+    def _rewrite_chunks_m3u8_segment_uri(cls, segment_uri_replacement, segment_uri):
+        return re.sub(
+            r'.ts\?token=(.*)',
+            segment_uri_replacement,
+            re.sub('.*/tracks-v1a1/', '', segment_uri).replace('/', '_'),
+        )
+
     @classmethod
     def _terminate(cls, **kwargs):
         pass
@@ -102,7 +114,7 @@ class VaderStreams(Provider):
             client_uuid, 'last_request_date_time_in_utc', datetime.now(pytz.utc)
         )
 
-        requests_session = requests.Session()
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
         target_url = 'http://{0}{1}/{2}/tracks-v1a1/mono.m3u8'.format(
             server
@@ -136,7 +148,8 @@ class VaderStreams(Provider):
             authorization_token,
         )
 
-        response = Utility.make_http_request(
+        (response, hls_playlist) = ChunksM3U8Cache.download_chunks_m3u8(
+            cls._provider_name,
             requests_session.get,
             target_url,
             params={'token': authorization_token},
@@ -146,65 +159,74 @@ class VaderStreams(Provider):
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_text=True, do_print_content=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_text=True,
+                    do_print_content=True,
+                ),
             )
 
             with cls._do_reduce_hls_stream_delay_lock.reader_lock:
                 if cls._do_reduce_hls_stream_delay:
-                    chunks_m3u8 = cls._reduce_hls_stream_delay(
-                        response.text,
+                    number_of_segments_to_drop = cls._calculate_number_of_segments_to_drop(
+                        hls_playlist,
                         client_uuid,
                         channel_number,
                         number_of_segments_to_keep=3,
                     )
                 else:
-                    chunks_m3u8 = response.text
+                    number_of_segments_to_drop = 0
 
             IPTVProxy.set_serviceable_client_parameter(
                 client_uuid, 'last_requested_channel_number', channel_number
             )
 
-            match = re.search(
-                r'http://(.*)\.vaders\.tv(:\d+)?/(.*)/tracks-v1a1/.*', chunks_m3u8
-            )
-            if match is None:
+            try:
+                segment_uri = hls_playlist.segment_uris[number_of_segments_to_drop]
+
                 match = re.search(
-                    r'http://(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(:\d+)?/(.*)/tracks-v1a1/.*',
-                    chunks_m3u8,
-                )
-            if match is not None:
-                server = match.group(1)
-                port = (
-                    match.group(2)
-                    if match.group(2) is not None and len(match.groups()) == 3
-                    else ':80'
-                )
-                channel_name = (
-                    match.group(3) if len(match.groups()) == 3 else match.group(2)
+                    r'http://(.*)\.vaders\.tv(:\d+)?/(.*)/tracks-v1a1/.*', segment_uri
                 )
-
-            chunks_m3u8 = re.sub('.*/tracks-v1a1/', '', chunks_m3u8)
-
-            return re.sub(
-                r'.ts\?token=(.*)',
-                r'.ts?'
-                r'authorization_token=\1&'
-                'channel_name={0}&'
-                'channel_number={1}&'
-                'client_uuid={2}&'
-                'http_token={3}&'
-                'port={4}&'
-                'server={5}'.format(
-                    urllib.parse.quote(channel_name),
-                    channel_number,
-                    client_uuid,
-                    urllib.parse.quote(http_token) if http_token else '',
-                    urllib.parse.quote(port),
-                    urllib.parse.quote(server),
+                if match is None:
+                    match = re.search(
+                        r'http://(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})(:\d+)?/(.*)/tracks-v1a1/.*',
+                        segment_uri,
+                    )
+                if match is not None:
+                    server = match.group(1)
+                    port = (
+                        match.group(2)
+                        if match.group(2) is not None and len(match.groups()) == 3
+                        else ':80'
+                    )
+                    channel_name = (
+                        match.group(3) if len(match.groups()) == 3 else match.group(2)
+                    )
+            except IndexError:
+                pass
+
+            return hls_playlist.dumps(
+                number_of_segments_to_drop=number_of_segments_to_drop,
+                segment_uri_function=functools.partial(
+                    cls._rewrite_chunks_m3u8_segment_uri,
+                    r'.ts?'
+                    r'authorization_token=\1&'
+                    'channel_name={0}&'
+                    'channel_number={1}&'
+                    'client_uuid={2}&'
+                    'http_token={3}&'
+                    'port={4}&'
+                    'server={5}'.format(
+                        urllib.parse.quote(channel_name),
+                        channel_number,
+                        client_uuid,
+                        urllib.parse.quote(http_token) if http_token else '',
+                        urllib.parse.quote(port),
+                        urllib.parse.quote(server),
+                    ),
                 ),
-                chunks_m3u8.replace('/', '_'),
             )
 
         logger.error(Utility.assemble_response_from_log_message(response))
@@ -231,7 +253,7 @@ class VaderStreams(Provider):
         authorization_token = cls._calculate_token()
 
         if protocol == 'hls':
-            requests_session = requests.Session()
+            requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
             target_url = 'http://vapi.vaders.tv/play/{0}.m3u8'.format(channel_number)
 
@@ -265,9 +287,13 @@ class VaderStreams(Provider):
 
             if response.status_code == requests.codes.OK:
                 logger.trace(
-                    Utility.assemble_response_from_log_message(
-                        response, is_content_text=True, do_print_content=True
-                    )
+                    '%s',
+                    LazyLogMessage(
+                        Utility.assemble_response_from_log_message,
+                        response,
+                        is_content_text=True,
+                        do_print_content=True,
+                    ),
                 )
 
                 match = re.search(
@@ -318,14 +344,20 @@ class VaderStreams(Provider):
 
             response.raise_for_status()
         elif protocol == 'mpegts':
+            # The provider's URL carries the authorization token of the
+            # account. The client is pointed at the continuous stream relayed
+            # by IPTVProxy
             return (
                 '#EXTM3U\n'
                 '#EXTINF:-1 ,{0}\n'
-                'http://vapi.vaders.tv/play/{1}.ts?'
-                'token={2}'.format(
+                'stream.ts?'
+                'channel_number={1}&'
+                'client_uuid={2}&'
+                'http_token={3}'.format(
                     VaderStreamsEPG.get_channel_name(int(channel_number)),
                     channel_number,
-                    authorization_token,
+                    client_uuid,
+                    urllib.parse.quote(http_token) if http_token else '',
                 )
             )
 
@@ -336,6 +368,7 @@ class VaderStreams(Provider):
         client_uuid,
         requested_path,
         requested_query_string_parameters,
+        do_stream=False,
     ):
         authorization_token = requested_query_string_parameters.get(
             'authorization_token'
@@ -350,7 +383,7 @@ class VaderStreams(Provider):
             client_uuid, 'last_request_date_time_in_utc', datetime.now(pytz.utc)
         )
 
-        requests_session = requests.Session()
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
 
         target_url = 'http://{0}{1}/{2}{3}'.format(
             server
@@ -391,13 +424,17 @@ class VaderStreams(Provider):
             params={'token': authorization_token},
             headers=requests_session.headers,
             cookies=requests_session.cookies.get_dict(),
+            stream=do_stream,
         )
 
         if response.status_code == requests.codes.OK:
             logger.trace(
-                Utility.assemble_response_from_log_message(
-                    response, is_content_binary=True
-                )
+                '%s',
+                LazyLogMessage(
+                    Utility.assemble_response_from_log_message,
+                    response,
+                    is_content_binary=not do_stream,
+                ),
             )
 
             IPTVProxy.set_serviceable_client_parameter(
@@ -406,6 +443,9 @@ class VaderStreams(Provider):
                 re.sub(r'(/.*)?(/.*\.ts)', r'\2', requested_path).replace('_', '/')[1:],
             )
 
+            if do_stream:
+                return cls._generate_response_content_chunks(response)
+
             return response.content
 
         logger.error(Utility.assemble_response_from_log_message(response))
@@ -1,7 +1,6 @@
 import html
 import logging
 import pickle
-import uuid
 from collections import OrderedDict
 from datetime import datetime
 from gzip import GzipFile
@@ -14,10 +13,13 @@ from lxml import etree
 from rwlock import RWLock
 
 from iptv_proxy.configuration import Configuration
+from iptv_proxy.connection_pool import ConnectionPoolManager
+from iptv_proxy.constants import EPG_BULK_INSERT_BATCH_SIZE
+from iptv_proxy.formatters import LazyLogMessage
+from iptv_proxy.metrics import MetricsManager
 from iptv_proxy.providers.iptv_provider.epg import ProviderEPG
 from iptv_proxy.providers.vaderstreams.constants import VaderStreamsConstants
-from iptv_proxy.providers.vaderstreams.data_model import VaderStreamsChannel
-from iptv_proxy.providers.vaderstreams.data_model import VaderStreamsProgram
+from iptv_proxy.providers.vaderstreams.data_access import VaderStreamsDatabaseAccess
 from iptv_proxy.providers.vaderstreams.data_model import VaderStreamsSetting
 from iptv_proxy.providers.vaderstreams.db import VaderStreamsDatabase
 from iptv_proxy.providers.vaderstreams.enums import VaderStreamsEPGSource
@@ -144,7 +146,7 @@ class VaderStreamsEPG(ProviderEPG):
                 categories_map[category_id],
             )
 
-            number_of_objects_added_to_db_session = 0
+            channel_rows = []
 
             channel_number = None
             channel_icon_source = None
@@ -213,22 +215,21 @@ class VaderStreamsEPG(ProviderEPG):
                                     channel_number
                                 ] = channel
 
-                                db_session.add(
-                                    VaderStreamsChannel(
-                                        id_=channel.xmltv_id,
-                                        m3u8_group=channel.m3u8_group,
-                                        number=channel.number,
-                                        name=channel.display_names[0].text,
-                                        pickle=pickle.dumps(
+                                channel_rows.append(
+                                    {
+                                        'id': channel.xmltv_id,
+                                        'm3u8_group': channel.m3u8_group,
+                                        'number': channel.number,
+                                        'name': channel.display_names[0].text,
+                                        'pickle': pickle.dumps(
                                             channel, protocol=pickle.HIGHEST_PROTOCOL
                                         ),
-                                        complete_xmltv=channel.format(
+                                        'complete_xmltv': channel.format(
                                             minimal_xmltv=False
                                         ),
-                                        minimal_xmltv=channel.format(),
-                                    )
+                                        'minimal_xmltv': channel.format(),
+                                    }
                                 )
-                                number_of_objects_added_to_db_session += 1
                         except KeyError:
                             pass
                         finally:
@@ -237,13 +238,14 @@ class VaderStreamsEPG(ProviderEPG):
                             channel_xmltv_id = None
                             channel_name = None
 
-                    if (
-                        number_of_objects_added_to_db_session
-                        and number_of_objects_added_to_db_session % 1000 == 0
-                    ):
-                        db_session.flush()
+                    if len(channel_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                        VaderStreamsDatabaseAccess.insert_channels(
+                            db_session, channel_rows
+                        )
+
+                        channel_rows = []
 
-                db_session.flush()
+                VaderStreamsDatabaseAccess.insert_channels(db_session, channel_rows)
 
                 logger.debug(
                     'Processed VaderStreams JSON channels\n'
@@ -304,7 +306,7 @@ class VaderStreamsEPG(ProviderEPG):
         )
 
         with GzipFile(fileobj=epg_xml_stream) as input_file:
-            number_of_objects_added_to_db_session = 0
+            program_rows = []
 
             tv_element = None
 
@@ -701,24 +703,22 @@ class VaderStreamsEPG(ProviderEPG):
                                         reviews=program_reviews,
                                     )
 
-                                    db_session.add(
-                                        VaderStreamsProgram(
-                                            id_='{0}'.format(uuid.uuid4()),
-                                            start=program.start,
-                                            stop=program.stop,
-                                            channel_xmltv_id=channel.xmltv_id,
-                                            channel_number=channel.number,
-                                            pickle=pickle.dumps(
+                                    program_rows.append(
+                                        {
+                                            'start': program.start,
+                                            'stop': program.stop,
+                                            'channel_xmltv_id': channel.xmltv_id,
+                                            'channel_number': channel.number,
+                                            'pickle': pickle.dumps(
                                                 program,
                                                 protocol=pickle.HIGHEST_PROTOCOL,
                                             ),
-                                            complete_xmltv=program.format(
+                                            'complete_xmltv': program.format(
                                                 minimal_xmltv=False
                                             ),
-                                            minimal_xmltv=program.format(),
-                                        )
+                                            'minimal_xmltv': program.format(),
+                                        }
                                     )
-                                    number_of_objects_added_to_db_session += 1
                             except KeyError:
                                 pass
 
@@ -728,13 +728,14 @@ class VaderStreamsEPG(ProviderEPG):
                         if element.tag == 'tv':
                             tv_element = element
 
-                    if (
-                        number_of_objects_added_to_db_session
-                        and number_of_objects_added_to_db_session % 1000 == 0
-                    ):
-                        db_session.flush()
+                    if len(program_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                        VaderStreamsDatabaseAccess.insert_programs(
+                            db_session, program_rows
+                        )
+
+                        program_rows = []
 
-                db_session.flush()
+                VaderStreamsDatabaseAccess.insert_programs(db_session, program_rows)
 
                 logger.debug(
                     'Processed VaderStreams XML EPG\nFile name => %s',
@@ -768,7 +769,7 @@ class VaderStreamsEPG(ProviderEPG):
             VaderStreamsConstants.MATCHCENTER_SCHEDULE_JSON_FILE_NAME,
         )
 
-        number_of_objects_added_to_db_session = 0
+        program_rows = []
 
         program_categories = []
         program_descriptions = []
@@ -846,27 +847,28 @@ class VaderStreamsEPG(ProviderEPG):
                                 reviews=[],
                             )
 
-                            db_session.add(
-                                VaderStreamsProgram(
-                                    id_='{0}'.format(uuid.uuid4()),
-                                    start=program.start,
-                                    stop=program.stop,
-                                    channel_xmltv_id=channel.xmltv_id,
-                                    channel_number=channel.number,
-                                    pickle=pickle.dumps(
+                            program_rows.append(
+                                {
+                                    'start': program.start,
+                                    'stop': program.stop,
+                                    'channel_xmltv_id': channel.xmltv_id,
+                                    'channel_number': channel.number,
+                                    'pickle': pickle.dumps(
                                         program, protocol=pickle.HIGHEST_PROTOCOL
                                     ),
-                                    complete_xmltv=program.format(minimal_xmltv=False),
-                                    minimal_xmltv=program.format(),
-                                )
+                                    'complete_xmltv': program.format(
+                                        minimal_xmltv=False
+                                    ),
+                                    'minimal_xmltv': program.format(),
+                                }
                             )
-                            number_of_objects_added_to_db_session += 1
 
-                            if (
-                                number_of_objects_added_to_db_session
-                                and number_of_objects_added_to_db_session % 1000 == 0
-                            ):
-                                db_session.flush()
+                            if len(program_rows) >= EPG_BULK_INSERT_BATCH_SIZE:
+                                VaderStreamsDatabaseAccess.insert_programs(
+                                    db_session, program_rows
+                                )
+
+                                program_rows = []
                         except KeyError:
                             pass
 
@@ -877,7 +879,7 @@ class VaderStreamsEPG(ProviderEPG):
                     program_stop = None
                     program_titles = []
 
-            db_session.flush()
+            VaderStreamsDatabaseAccess.insert_programs(db_session, program_rows)
 
             logger.debug(
                 'Processed VaderStreams JSON matchcenter schedule\nFile name => %s',
@@ -916,20 +918,30 @@ class VaderStreamsEPG(ProviderEPG):
             else '\n    category => {0}'.format(request_parameters['category_id']),
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get,
-            url,
-            params={'username': username, 'password': password, **request_parameters},
-            headers=requests_session.headers,
-            cookies=requests_session.cookies.get_dict(),
-            stream=True,
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_json'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get,
+                url,
+                params={
+                    'username': username,
+                    'password': password,
+                    **request_parameters,
+                },
+                headers=requests_session.headers,
+                cookies=requests_session.cookies.get_dict(),
+                stream=True,
+            )
 
         if response.status_code == requests.codes.OK:
             response.raw.decode_content = True
 
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
@@ -947,13 +959,19 @@ class VaderStreamsEPG(ProviderEPG):
             'Downloading %s\nURL => %s', VaderStreamsConstants.XML_EPG_FILE_NAME, url
         )
 
-        requests_session = requests.Session()
-        response = Utility.make_http_request(
-            requests_session.get, url, headers=requests_session.headers, stream=True
-        )
+        requests_session = ConnectionPoolManager.get_session(cls._provider_name)
+        with MetricsManager.time_upstream_request(
+            cls._provider_name, 'download_epg_xml'
+        ):
+            response = Utility.make_http_request(
+                requests_session.get, url, headers=requests_session.headers, stream=True
+            )
 
         if response.status_code == requests.codes.OK:
-            logger.trace(Utility.assemble_response_from_log_message(response))
+            logger.trace(
+                '%s',
+                LazyLogMessage(Utility.assemble_response_from_log_message, response),
+            )
 
             return response.raw
 
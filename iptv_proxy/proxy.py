@@ -4,6 +4,7 @@ import traceback
 from threading import RLock
 
 from iptv_proxy.configuration import Configuration
+from iptv_proxy.provider_aggregator import ProviderAggregator
 from iptv_proxy.utilities import Utility
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,36 @@ class IPTVProxy(object):
             cls._serviceable_clients[client_uuid] = {}
             cls._serviceable_clients[client_uuid]['ip_address'] = client_ip_address
 
+    @classmethod
+    def _generate_provider_playlist_m3u8_tracks(
+        cls,
+        provider_name,
+        provider_map_class,
+        requested_query_string_parameters,
+        generate_playlist_m3u8_tracks_mapping,
+    ):
+        generate_playlist_m3u8_tracks_mapping = dict(
+            generate_playlist_m3u8_tracks_mapping
+        )
+
+        try:
+            generate_playlist_m3u8_tracks_mapping[
+                'playlist_protocol'
+            ] = requested_query_string_parameters['{0}_protocol'.format(provider_name)]
+        except KeyError:
+            pass
+
+        try:
+            generate_playlist_m3u8_tracks_mapping[
+                'playlist_type'
+            ] = requested_query_string_parameters['{0}_type'.format(provider_name)]
+        except KeyError:
+            pass
+
+        return provider_map_class.api_class().generate_playlist_m3u8_tracks(
+            generate_playlist_m3u8_tracks_mapping
+        )
+
     @classmethod
     def generate_playlist_m3u8(
         cls,
@@ -53,41 +84,22 @@ class IPTVProxy(object):
                 )
             ]
 
-            for (provider_name, provider) in sorted(list(providers.items())):
-                provider_protocol = playlist_protocol
-                provider_type = playlist_type
-
-                try:
-                    provider_protocol = requested_query_string_parameters[
-                        '{0}_protocol'.format(provider_name)
-                    ]
-                except KeyError:
-                    pass
-
-                try:
-                    provider_type = requested_query_string_parameters[
-                        '{0}_type'.format(provider_name)
-                    ]
-                except KeyError:
-                    pass
-
-                generate_playlist_m3u8_tracks_mapping = dict(
-                    client_uuid=client_uuid,
-                    http_token=http_token,
-                    is_server_secure=is_server_secure,
-                    playlist_protocol=provider_protocol,
-                    playlist_type=provider_type,
-                    server_hostname=server_hostname,
-                    server_port=server_port,
-                )
-
-                playlist_m3u8.append(
-                    ''.join(
-                        provider.api_class().generate_playlist_m3u8_tracks(
-                            generate_playlist_m3u8_tracks_mapping
-                        )
-                    )
+            playlist_m3u8.extend(
+                ProviderAggregator.aggregate(
+                    sorted(providers.items()),
+                    cls._generate_provider_playlist_m3u8_tracks,
+                    requested_query_string_parameters,
+                    dict(
+                        client_uuid=client_uuid,
+                        http_token=http_token,
+                        is_server_secure=is_server_secure,
+                        playlist_protocol=playlist_protocol,
+                        playlist_type=playlist_type,
+                        server_hostname=server_hostname,
+                        server_port=server_port,
+                    ),
                 )
+            )
 
             logger.debug('Generated live IPTVProxy playlist.m3u8')
 
@@ -14,15 +14,14 @@ from threading import RLock
 from threading import Thread
 from threading import Timer
 
-import m3u8
 import pytz
 import requests
 import tzlocal
-from m3u8 import M3U8
 from sqlalchemy.exc import IntegrityError
 
 from iptv_proxy.cache import CacheManager
 from iptv_proxy.configuration import Configuration
+from iptv_proxy.constants import SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
 from iptv_proxy.data_access import DatabaseAccess
 from iptv_proxy.data_model import Segment
 from iptv_proxy.db import Database
@@ -33,6 +32,10 @@ from iptv_proxy.exceptions import ProviderNotFoundError
 from iptv_proxy.exceptions import RecordingNotFoundError
 from iptv_proxy.exceptions import SegmentNotFoundError
 from iptv_proxy.hls import HLSClient
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.hls_playlist import HLSSegment
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.tuner import TunerManager
 from iptv_proxy.utilities import Utility
 
 logger = logging.getLogger(__name__)
@@ -344,31 +347,37 @@ class PVR(object):
         db_session = Database.create_session()
 
         try:
-            vod_playlist_m3u8_object = M3U8()
-            vod_playlist_m3u8_object.media_sequence = 0
-            vod_playlist_m3u8_object.version = '3'
-            vod_playlist_m3u8_object.target_duration = 0
-            vod_playlist_m3u8_object.playlist_type = 'VOD'
+            segments_m3u8 = []
+            target_duration = 0
 
             for segment_row in DatabaseAccess.query_segment_pickle(
                 db_session, recording_id
             ):
                 segment = pickle.loads(segment_row.pickle)
 
-                if segment.duration > vod_playlist_m3u8_object.target_duration:
-                    vod_playlist_m3u8_object.target_duration = math.ceil(
-                        segment.duration
-                    )
+                if segment.duration > target_duration:
+                    target_duration = math.ceil(segment.duration)
 
-                vod_playlist_m3u8_object.add_segment(segment)
+                # Segments recorded before their tags were kept are
+                # m3u8.Segment objects which only hold a duration and a title
+                segments_m3u8.extend(getattr(segment, 'tag_lines', ()))
+                segments_m3u8.append(
+                    '#EXTINF:{0},{1}'.format(segment.duration, segment.title or '')
+                )
+                segments_m3u8.append(segment.uri)
 
             return re.sub(
                 r'(\.ts\?)(.*)',
                 r'\1client_uuid={0}&http_token={1}&\2'.format(
                     client_uuid, urllib.parse.quote(http_token) if http_token else ''
                 ),
-                '{0}\n'
-                '{1}'.format(vod_playlist_m3u8_object.dumps(), '#EXT-X-ENDLIST'),
+                '#EXTM3U\n'
+                '#EXT-X-MEDIA-SEQUENCE:0\n'
+                '#EXT-X-VERSION:3\n'
+                '#EXT-X-TARGETDURATION:{0}\n'
+                '#EXT-X-PLAYLIST-TYPE:VOD\n'
+                '{1}\n'
+                '#EXT-X-ENDLIST'.format(target_duration, '\n'.join(segments_m3u8)),
             )
         finally:
             db_session.close()
@@ -392,6 +401,11 @@ class PVR(object):
             urllib.parse.quote(recording_id),
         )
 
+    @classmethod
+    def get_number_of_live_recordings(cls):
+        with cls._live_recordings_to_recording_thread_lock:
+            return len(cls._live_recordings_to_recording_thread)
+
     @classmethod
     def get_recording(cls, db_session, recording_id):
         recording = DatabaseAccess.query_recording(db_session, recording_id)
@@ -564,6 +578,18 @@ class RecordingThread(Thread):
 
         self._recording_directory_path = recording_directory_path
 
+    def _download_ts_file(self, hls_client, segment_url, segment_file_name):
+        ts_file_content = hls_client.download_ts_file(segment_url)
+
+        CacheManager.update_cache(
+            self._recording.provider.lower(),
+            self._recording.channel_number,
+            segment_file_name,
+            ts_file_content,
+        )
+
+        return ts_file_content
+
     def _set_stop_recording_event(self):
         logger.info(
             'Stopping recording\n'
@@ -613,6 +639,8 @@ class RecordingThread(Thread):
 
         self._create_recording_directory_tree()
 
+        tuner = None
+
         try:
             hls_client = HLSClient(
                 self._id,
@@ -620,34 +648,41 @@ class RecordingThread(Thread):
                 self._recording.channel_number,
             )
 
-            playlist_m3u8_object = m3u8.loads(hls_client.download_playlist_m3u8())
-            chunks_m3u8_object = None
+            # The channel stays tuned for the whole recording so that clients
+            # watching it are served the segments the tuner downloaded
+            tuner = TunerManager.acquire_tuner(
+                self._recording.provider.lower(), self._recording.channel_number
+            )
+
+            playlist_hls_playlist = HLSPlaylist(hls_client.download_playlist_m3u8())
+            chunks_hls_playlist = None
 
             try:
                 chunks_url = '/live/{0}/{1}'.format(
                     self._recording.provider.lower(),
-                    playlist_m3u8_object.data['playlists'][0]['uri'],
+                    playlist_hls_playlist.playlist_uris[0],
                 )
             except IndexError:
-                chunks_m3u8_object = playlist_m3u8_object
+                chunks_hls_playlist = playlist_hls_playlist
 
             downloaded_segment_file_names = []
+            recorded_carried_over_tag_lines = []
 
             while not self._stop_recording_event.is_set():
                 try:
-                    chunks_m3u8_object = m3u8.loads(
+                    chunks_hls_playlist = HLSPlaylist(
                         hls_client.download_chunks_m3u8(chunks_url)
                     )
                 except NameError:
-                    if chunks_m3u8_object is None:
-                        chunks_m3u8_object = m3u8.loads(
+                    if chunks_hls_playlist is None:
+                        chunks_hls_playlist = HLSPlaylist(
                             hls_client.download_playlist_m3u8()
                         )
 
                 chunks_m3u8_download_date_time_in_utc = datetime.now(pytz.utc)
                 chunks_m3u8_total_duration = 0
 
-                for segment in chunks_m3u8_object.segments:
+                for segment in chunks_hls_playlist.segments:
                     segment_url = '/live/{0}'.format(segment.uri)
                     segment_url_components = urllib.parse.urlparse(segment_url)
                     segment_file_name = re.sub(
@@ -656,21 +691,29 @@ class RecordingThread(Thread):
 
                     if segment_file_name not in downloaded_segment_file_names:
                         try:
-                            ts_file_content = CacheManager.query_cache(
+                            ts_file_content = TunerManager.query_segment(
                                 self._recording.provider.lower(),
                                 self._recording.channel_number,
                                 segment_file_name.lower(),
                             )
                             if ts_file_content is None:
-                                ts_file_content = hls_client.download_ts_file(
-                                    segment_url
-                                )
-
-                                CacheManager.update_cache(
+                                ts_file_content = CacheManager.query_cache(
                                     self._recording.provider.lower(),
                                     self._recording.channel_number,
                                     segment_file_name.lower(),
-                                    ts_file_content,
+                                )
+                            if ts_file_content is None:
+                                ts_file_content = SingleFlightManager.do_call(
+                                    (
+                                        self._recording.provider.lower(),
+                                        self._recording.channel_number,
+                                        segment_file_name.lower(),
+                                    ),
+                                    self._download_ts_file,
+                                    hls_client,
+                                    segment_url,
+                                    segment_file_name.lower(),
+                                    wait_timeout=SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT,
                                 )
 
                                 logger.debug(
@@ -678,10 +721,6 @@ class RecordingThread(Thread):
                                     segment_file_name,
                                 )
 
-                            segment.uri = '{0}?recording_id={1}'.format(
-                                segment_file_name,
-                                urllib.parse.quote(self._recording.id),
-                            )
                             downloaded_segment_file_names.append(segment_file_name)
 
                             Utility.write_file(
@@ -692,6 +731,22 @@ class RecordingThread(Thread):
                                 in_binary=True,
                             )
 
+                            # The key and the media initialization section of
+                            # a segment may have been declared by a segment
+                            # that came before the recording started. They are
+                            # recorded with the first segment they apply to
+                            segment_tag_lines = [
+                                tag_line
+                                for tag_line in segment.carried_over_tag_lines
+                                if tag_line not in recorded_carried_over_tag_lines
+                                and tag_line not in segment.tag_lines
+                            ]
+                            segment_tag_lines.extend(segment.tag_lines)
+
+                            recorded_carried_over_tag_lines = list(
+                                segment.carried_over_tag_lines
+                            )
+
                             with Database.get_write_lock():
                                 db_session = Database.create_session()
 
@@ -701,7 +756,17 @@ class RecordingThread(Thread):
                                             segment_file_name,
                                             self._recording.id,
                                             pickle.dumps(
-                                                segment,
+                                                HLSSegment(
+                                                    '{0}?recording_id={1}'.format(
+                                                        segment_file_name,
+                                                        urllib.parse.quote(
+                                                            self._recording.id
+                                                        ),
+                                                    ),
+                                                    segment.duration,
+                                                    segment.title,
+                                                    tag_lines=segment_tag_lines,
+                                                ),
                                                 protocol=pickle.HIGHEST_PROTOCOL,
                                             ),
                                             self._recording_directory_path,
@@ -745,7 +810,7 @@ class RecordingThread(Thread):
                 if wait_duration > 0:
                     self._stop_recording_event.wait(wait_duration)
 
-                chunks_m3u8_object = None
+                chunks_hls_playlist = None
 
             self._recording.status = RecordingStatus.PERSISTED.value
 
@@ -818,4 +883,7 @@ class RecordingThread(Thread):
                     ).strftime('%Y-%m-%d %H:%M:%S'),
                 )
         finally:
+            if tuner is not None:
+                TunerManager.release_tuner(tuner)
+
             PVR.cleanup_live_recording(self._recording)
@@ -0,0 +1,114 @@
+import logging
+from threading import Event
+from threading import Lock
+
+from iptv_proxy.exceptions import SingleFlightCallTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightCall(object):
+    __slots__ = ['_completed_event', '_exception', '_number_of_waiters', '_result']
+
+    def __init__(self):
+        self._completed_event = Event()
+        self._exception = None
+        self._number_of_waiters = 0
+        self._result = None
+
+    def complete(self, result=None, exception=None):
+        self._exception = exception
+        self._result = result
+
+        self._completed_event.set()
+
+    @property
+    def number_of_waiters(self):
+        return self._number_of_waiters
+
+    @number_of_waiters.setter
+    def number_of_waiters(self, number_of_waiters):
+        self._number_of_waiters = number_of_waiters
+
+    def wait(self, timeout=None):
+        if not self._completed_event.wait(timeout):
+            raise SingleFlightCallTimeoutError
+
+        if self._exception is not None:
+            raise self._exception
+
+        return self._result
+
+
+class SingleFlightManager(object):
+    __slots__ = []
+
+    _calls = {}
+    _lock = Lock()
+
+    @classmethod
+    def begin_call(cls, key):
+        with cls._lock:
+            try:
+                single_flight_call = cls._calls[key]
+                single_flight_call.number_of_waiters += 1
+
+                logger.trace(
+                    'Joined in-flight call\n'
+                    'Key               => %s\n'
+                    'Number of waiters => %s',
+                    key,
+                    single_flight_call.number_of_waiters,
+                )
+
+                return (single_flight_call, False)
+            except KeyError:
+                single_flight_call = SingleFlightCall()
+
+                cls._calls[key] = single_flight_call
+
+                logger.trace('Started in-flight call\nKey => %s', key)
+
+                return (single_flight_call, True)
+
+    @classmethod
+    def complete_call(cls, key, result=None, exception=None):
+        with cls._lock:
+            single_flight_call = cls._calls.pop(key)
+
+        single_flight_call.complete(result=result, exception=exception)
+
+        logger.trace(
+            'Completed in-flight call\n'
+            'Key               => %s\n'
+            'Number of waiters => %s\n'
+            'Status            => %s',
+            key,
+            single_flight_call.number_of_waiters,
+            'Failed' if exception is not None else 'Succeeded',
+        )
+
+    @classmethod
+    def do_call(cls, key, function, *args, wait_timeout=None, **kwargs):
+        (single_flight_call, is_single_flight_leader) = cls.begin_call(key)
+
+        if not is_single_flight_leader:
+            try:
+                return single_flight_call.wait(wait_timeout)
+            except SingleFlightCallTimeoutError:
+                # The leader may be held up by the client it is relaying to.
+                # Rather than keep waiting, the call is made independently
+                logger.debug('Timed out waiting on in-flight call\nKey => %s', key)
+
+                return function(*args, **kwargs)
+
+        try:
+            result = function(*args, **kwargs)
+        except Exception as err:
+            cls.complete_call(key, exception=err)
+
+            raise
+
+        cls.complete_call(key, result=result)
+
+        return result
@@ -0,0 +1,561 @@
+import itertools
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import time
+import traceback
+import urllib.parse
+from collections import OrderedDict
+from threading import Condition
+from threading import Lock
+
+from rwlock import RWLock
+
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import HLS_DEFAULT_TARGET_DURATION
+from iptv_proxy.constants import TIMESHIFT_BUFFER_IDLE_TIMEOUT
+from iptv_proxy.constants import TIMESHIFT_DIRECTORY_PATH
+from iptv_proxy.constants import TIMESHIFT_MAXIMUM_NUMBER_OF_LISTED_SEGMENTS
+from iptv_proxy.constants import TIMESHIFT_MAXIMUM_NUMBER_OF_OUT_OF_ORDER_SEGMENTS
+from iptv_proxy.constants import TIMESHIFT_NUMBER_OF_SEGMENTS_IN_MEMORY
+from iptv_proxy.hls_playlist import HLSPlaylist
+
+logger = logging.getLogger(__name__)
+
+
+class TimeshiftSegment(object):
+    __slots__ = [
+        '_content',
+        '_duration',
+        '_file_path',
+        '_is_discontinuous',
+        '_segment_file_name',
+    ]
+
+    def __init__(self, segment_file_name, duration, content, is_discontinuous):
+        self._content = content
+        self._duration = duration
+        self._file_path = None
+        self._is_discontinuous = is_discontinuous
+        self._segment_file_name = segment_file_name
+
+    @property
+    def content(self):
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+
+    @property
+    def duration(self):
+        return self._duration
+
+    @property
+    def file_path(self):
+        return self._file_path
+
+    @file_path.setter
+    def file_path(self, file_path):
+        self._file_path = file_path
+
+    @property
+    def is_discontinuous(self):
+        return self._is_discontinuous
+
+    @property
+    def segment_file_name(self):
+        return self._segment_file_name
+
+
+class TimeshiftBuffer(object):
+    __slots__ = [
+        '_directory_path',
+        '_discontinuity_sequence',
+        '_duration',
+        '_expected_sequence_number',
+        '_last_access_time',
+        '_listed_segments',
+        '_lock',
+        '_media_sequence',
+        '_out_of_order_segments',
+        '_segment_added_condition',
+        '_segments',
+        '_sequence_number',
+    ]
+
+    def __init__(self, provider_name, channel_number):
+        self._directory_path = os.path.realpath(
+            os.path.join(
+                TIMESHIFT_DIRECTORY_PATH,
+                provider_name,
+                '{0}'.format(int(channel_number)),
+            )
+        )
+
+        # The directory is removed along with the buffer
+        if not self._directory_path.startswith(
+            os.path.join(os.path.realpath(TIMESHIFT_DIRECTORY_PATH), '')
+        ):
+            raise ValueError(
+                'Timeshift directory {0} is outside of {1}'.format(
+                    self._directory_path, TIMESHIFT_DIRECTORY_PATH
+                )
+            )
+
+        self._discontinuity_sequence = 0
+        self._duration = 0.0
+        self._expected_sequence_number = None
+        self._last_access_time = time.monotonic()
+        self._listed_segments = OrderedDict()
+        self._lock = Lock()
+        self._media_sequence = 0
+        self._out_of_order_segments = {}
+        self._segment_added_condition = Condition(self._lock)
+        self._segments = OrderedDict()
+        self._sequence_number = 0
+
+    def _append_segment(
+        self,
+        segment_file_name,
+        duration,
+        content,
+        is_discontinuous,
+        timeshift_window,
+        spilled_timeshift_segments,
+        evicted_timeshift_segments,
+    ):
+        self._segments[segment_file_name] = TimeshiftSegment(
+            segment_file_name, duration, content, is_discontinuous
+        )
+        self._duration += duration
+
+        # The newest segments are the ones most likely to be requested and
+        # are kept in memory. Each segment falling out of that tier is moved
+        # to disk where it stays until it falls out of the window
+        spilled_timeshift_segment = next(
+            itertools.islice(
+                reversed(self._segments.values()),
+                TIMESHIFT_NUMBER_OF_SEGMENTS_IN_MEMORY,
+                None,
+            ),
+            None,
+        )
+
+        if (
+            spilled_timeshift_segment is not None
+            and spilled_timeshift_segment.content is not None
+        ):
+            spilled_timeshift_segments.append(
+                (spilled_timeshift_segment, spilled_timeshift_segment.content)
+            )
+
+        while len(self._segments) > 1 and self._duration > timeshift_window:
+            (_, evicted_timeshift_segment) = self._segments.popitem(last=False)
+
+            self._duration -= evicted_timeshift_segment.duration
+            self._media_sequence += 1
+
+            if evicted_timeshift_segment.is_discontinuous:
+                self._discontinuity_sequence += 1
+
+            evicted_timeshift_segments.append(evicted_timeshift_segment)
+
+    def _spill_segment(self, timeshift_segment, content):
+        file_path = os.path.join(
+            self._directory_path, timeshift_segment.segment_file_name
+        )
+
+        try:
+            os.makedirs(self._directory_path, exist_ok=True)
+
+            with open(file_path, 'wb') as segment_file:
+                segment_file.write(content)
+        except OSError:
+            (type_, value_, traceback_) = sys.exc_info()
+            logger.error(
+                '\n'.join(traceback.format_exception(type_, value_, traceback_))
+            )
+
+            return
+
+        with self._lock:
+            # The segment may have fallen out of the window while it was being
+            # written
+            if self._segments.get(timeshift_segment.segment_file_name) is (
+                timeshift_segment
+            ):
+                timeshift_segment.file_path = file_path
+                timeshift_segment.content = None
+
+                return
+
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def add_segment(self, segment_file_name, content, timeshift_window):
+        evicted_timeshift_segments = []
+        spilled_timeshift_segments = []
+
+        with self._lock:
+            # Only the segments listed in a chunks.m3u8 served for the channel
+            # are added since the playlist is what tells their duration and
+            # their order
+            try:
+                (sequence_number, duration) = self._listed_segments[segment_file_name]
+            except KeyError:
+                return
+
+            # The window starts with the first segment downloaded after the
+            # channel was tuned
+            if self._expected_sequence_number is None:
+                self._expected_sequence_number = sequence_number
+
+            if (
+                sequence_number < self._expected_sequence_number
+                or sequence_number in self._out_of_order_segments
+            ):
+                return
+
+            self._out_of_order_segments[sequence_number] = (
+                segment_file_name,
+                duration,
+                content,
+            )
+
+            # Segments downloaded concurrently may complete out of order. They
+            # are held back until the ones preceding them are added, unless
+            # too many of them pile up waiting for a segment that may never be
+            # downloaded. That segment is then skipped
+            is_discontinuous = False
+
+            while self._out_of_order_segments:
+                if self._expected_sequence_number not in self._out_of_order_segments:
+                    if (
+                        len(self._out_of_order_segments)
+                        <= TIMESHIFT_MAXIMUM_NUMBER_OF_OUT_OF_ORDER_SEGMENTS
+                    ):
+                        break
+
+                    self._expected_sequence_number = min(self._out_of_order_segments)
+
+                    is_discontinuous = True
+
+                self._append_segment(
+                    *self._out_of_order_segments.pop(self._expected_sequence_number),
+                    is_discontinuous,
+                    timeshift_window,
+                    spilled_timeshift_segments,
+                    evicted_timeshift_segments,
+                )
+
+                self._expected_sequence_number += 1
+
+                is_discontinuous = False
+
+            self._segment_added_condition.notify_all()
+
+        for (spilled_timeshift_segment, spilled_content) in spilled_timeshift_segments:
+            self._spill_segment(spilled_timeshift_segment, spilled_content)
+
+        for evicted_timeshift_segment in evicted_timeshift_segments:
+            if evicted_timeshift_segment.file_path is not None:
+                try:
+                    os.remove(evicted_timeshift_segment.file_path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._listed_segments.clear()
+            self._out_of_order_segments.clear()
+            self._segments.clear()
+            self._duration = 0.0
+
+        shutil.rmtree(self._directory_path, ignore_errors=True)
+
+    def generate_timeshift_m3u8(self, playlist_type, segment_uri_query_string):
+        with self._lock:
+            self._last_access_time = time.monotonic()
+
+            # No segment of a channel that was just tuned has been downloaded
+            # yet
+            if not self._segment_added_condition.wait_for(
+                lambda: self._segments, timeout=HLS_DEFAULT_TARGET_DURATION
+            ):
+                return None
+
+            timeshift_segments = list(self._segments.values())
+            discontinuity_sequence = self._discontinuity_sequence
+            media_sequence = self._media_sequence
+
+        playlist_m3u8 = [
+            '#EXTM3U\n',
+            '#EXT-X-VERSION:3\n',
+            '#EXT-X-TARGETDURATION:{0}\n'.format(
+                math.ceil(
+                    max(
+                        timeshift_segment.duration
+                        for timeshift_segment in timeshift_segments
+                    )
+                )
+            ),
+            '#EXT-X-MEDIA-SEQUENCE:{0}\n'.format(media_sequence),
+        ]
+
+        if discontinuity_sequence:
+            playlist_m3u8.append(
+                '#EXT-X-DISCONTINUITY-SEQUENCE:{0}\n'.format(discontinuity_sequence)
+            )
+
+        # Segments can't be removed from an EVENT playlist. A playlist is
+        # therefore only declared as such while the window still holds every
+        # segment since the channel was tuned. Once the window starts to slide
+        # the playlist is served as a sliding window playlist
+        if playlist_type == 'event' and not media_sequence:
+            playlist_m3u8.append('#EXT-X-PLAYLIST-TYPE:EVENT\n')
+
+        for timeshift_segment in timeshift_segments:
+            if timeshift_segment.is_discontinuous:
+                playlist_m3u8.append('#EXT-X-DISCONTINUITY\n')
+
+            playlist_m3u8.append(
+                '#EXTINF:{0:.3f},\n'
+                'timeshift/{1}?{2}\n'.format(
+                    timeshift_segment.duration,
+                    timeshift_segment.segment_file_name,
+                    segment_uri_query_string,
+                )
+            )
+
+        return ''.join(playlist_m3u8)
+
+    def list_segments(self, listed_segments):
+        with self._lock:
+            self._last_access_time = time.monotonic()
+
+            for (segment_file_name, duration) in listed_segments:
+                if segment_file_name not in self._listed_segments:
+                    self._sequence_number += 1
+
+                    self._listed_segments[segment_file_name] = (
+                        self._sequence_number,
+                        duration,
+                    )
+
+            while (
+                len(self._listed_segments) > TIMESHIFT_MAXIMUM_NUMBER_OF_LISTED_SEGMENTS
+            ):
+                self._listed_segments.popitem(last=False)
+
+    def query_segment(self, segment_file_name):
+        with self._lock:
+            timeshift_segment = self._segments.get(segment_file_name)
+
+            if timeshift_segment is None:
+                return None
+
+            if timeshift_segment.content is not None:
+                return timeshift_segment.content
+
+            file_path = timeshift_segment.file_path
+
+        try:
+            with open(file_path, 'rb') as segment_file:
+                return segment_file.read()
+        except OSError:
+            # The segment fell out of the window while it was being read
+            return None
+
+    @property
+    def last_access_time(self):
+        with self._lock:
+            return self._last_access_time
+
+
+class TimeshiftManager(object):
+    __slots__ = []
+
+    _do_use_timeshift = False
+    _do_use_timeshift_lock = RWLock()
+    _lock = Lock()
+    _timeshift_buffers = {}
+    _timeshift_window = 3600
+    _timeshift_window_lock = RWLock()
+
+    @classmethod
+    def _get_timeshift_buffer(cls, provider_name, channel_number):
+        cls._remove_idle_timeshift_buffers()
+
+        with cls._lock:
+            try:
+                timeshift_buffer = cls._timeshift_buffers[
+                    (provider_name, channel_number)
+                ]
+            except KeyError:
+                timeshift_buffer = TimeshiftBuffer(provider_name, channel_number)
+
+                cls._timeshift_buffers[
+                    (provider_name, channel_number)
+                ] = timeshift_buffer
+
+        return timeshift_buffer
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_do_use_timeshift(
+                OptionalSettings.get_optional_settings_parameter('use_timeshift')
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_timeshift_window(
+                OptionalSettings.get_optional_settings_parameter('timeshift_window')
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def _remove_idle_timeshift_buffers(cls):
+        current_time = time.monotonic()
+
+        with cls._lock:
+            idle_timeshift_buffer_keys = [
+                timeshift_buffer_key
+                for (
+                    timeshift_buffer_key,
+                    timeshift_buffer,
+                ) in cls._timeshift_buffers.items()
+                if current_time - timeshift_buffer.last_access_time
+                > TIMESHIFT_BUFFER_IDLE_TIMEOUT
+            ]
+
+        for (provider_name, channel_number) in idle_timeshift_buffer_keys:
+            cls.remove_timeshift_buffer(provider_name, channel_number)
+
+    @classmethod
+    def add_segment(cls, provider_name, channel_number, segment_file_name, content):
+        with cls._do_use_timeshift_lock.reader_lock:
+            if not cls._do_use_timeshift:
+                return
+
+        with cls._timeshift_window_lock.reader_lock:
+            timeshift_window = cls._timeshift_window
+
+        # A buffer is only kept for the channels whose chunks.m3u8 is being
+        # served
+        with cls._lock:
+            timeshift_buffer = cls._timeshift_buffers.get(
+                (provider_name, channel_number)
+            )
+
+        if timeshift_buffer is not None:
+            timeshift_buffer.add_segment(segment_file_name, content, timeshift_window)
+
+    @classmethod
+    def generate_timeshift_m3u8(
+        cls, client_uuid, provider_name, channel_number, http_token, playlist_type
+    ):
+        with cls._do_use_timeshift_lock.reader_lock:
+            if not cls._do_use_timeshift:
+                return None
+
+        timeshift_buffer = cls._get_timeshift_buffer(provider_name, channel_number)
+
+        return timeshift_buffer.generate_timeshift_m3u8(
+            playlist_type,
+            'channel_number={0}&client_uuid={1}&http_token={2}'.format(
+                channel_number,
+                client_uuid,
+                urllib.parse.quote(http_token) if http_token else '',
+            ),
+        )
+
+    @classmethod
+    def initialize(cls):
+        # Segments left behind by a previous run belong to no buffer
+        shutil.rmtree(TIMESHIFT_DIRECTORY_PATH, ignore_errors=True)
+
+        cls._initialize_class_variables()
+
+    @classmethod
+    def list_segments(cls, provider_name, channel_number, chunks_m3u8):
+        with cls._do_use_timeshift_lock.reader_lock:
+            if not cls._do_use_timeshift:
+                return
+
+        listed_segments = []
+
+        for hls_segment in HLSPlaylist(chunks_m3u8).segments:
+            segment_url_components = urllib.parse.urlparse(
+                '/live/{0}/{1}'.format(provider_name, hls_segment.uri)
+            )
+
+            listed_segments.append(
+                (
+                    re.sub(
+                        r'(/.*)?(/)(.*\.ts)', r'\3', segment_url_components.path
+                    ).lower(),
+                    hls_segment.duration,
+                )
+            )
+
+        timeshift_buffer = cls._get_timeshift_buffer(provider_name, channel_number)
+
+        timeshift_buffer.list_segments(listed_segments)
+
+    @classmethod
+    def query_segment(cls, provider_name, channel_number, segment_file_name):
+        with cls._lock:
+            timeshift_buffer = cls._timeshift_buffers.get(
+                (provider_name, channel_number)
+            )
+
+        if timeshift_buffer is None:
+            return None
+
+        return timeshift_buffer.query_segment(segment_file_name)
+
+    @classmethod
+    def remove_timeshift_buffer(cls, provider_name, channel_number):
+        with cls._lock:
+            timeshift_buffer = cls._timeshift_buffers.pop(
+                (provider_name, channel_number), None
+            )
+
+        if timeshift_buffer is not None:
+            timeshift_buffer.clear()
+
+            logger.debug(
+                'Removed timeshift buffer\n'
+                'Provider       => %s\n'
+                'Channel number => %s',
+                provider_name,
+                channel_number,
+            )
+
+    @classmethod
+    def set_do_use_timeshift(cls, do_use_timeshift):
+        with cls._do_use_timeshift_lock.writer_lock:
+            cls._do_use_timeshift = do_use_timeshift
+
+        if not do_use_timeshift:
+            with cls._lock:
+                timeshift_buffers = list(cls._timeshift_buffers.values())
+
+                cls._timeshift_buffers.clear()
+
+            for timeshift_buffer in timeshift_buffers:
+                timeshift_buffer.clear()
+
+    @classmethod
+    def set_timeshift_window(cls, timeshift_window):
+        with cls._timeshift_window_lock.writer_lock:
+            cls._timeshift_window = timeshift_window
@@ -0,0 +1,518 @@
+import logging
+import re
+import sys
+import traceback
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from threading import Condition
+from threading import Event
+from threading import Lock
+from threading import Thread
+from threading import Timer
+
+import requests
+from rwlock import RWLock
+
+from iptv_proxy.cache import CacheManager
+from iptv_proxy.configuration import OptionalSettings
+from iptv_proxy.constants import HLS_DEFAULT_TARGET_DURATION
+from iptv_proxy.constants import HLS_POLLING_INTERVAL_RATIO
+from iptv_proxy.constants import SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT
+from iptv_proxy.constants import TUNER_RING_BUFFER_SIZE
+from iptv_proxy.constants import TUNER_WAIT_TIMEOUT
+from iptv_proxy.exceptions import HLSPlaylistDownloadError
+from iptv_proxy.exceptions import ProviderNotFoundError
+from iptv_proxy.hls import HLSClient
+from iptv_proxy.hls_playlist import HLSPlaylist
+from iptv_proxy.single_flight import SingleFlightManager
+from iptv_proxy.timeshift import TimeshiftManager
+
+logger = logging.getLogger(__name__)
+
+
+class Tuner(Thread):
+    def __init__(self, provider_name, channel_number):
+        Thread.__init__(self)
+
+        self._channel_number = channel_number
+        self._chunks_m3u8 = None
+        self._id = uuid.uuid3(
+            uuid.NAMESPACE_OID,
+            'IPTVProxyTuner{0}{1}'.format(provider_name, channel_number),
+        )
+        self._idle_timer = None
+        self._pending_segment_file_names = set()
+        self._number_of_references = 0
+        self._playlist_m3u8 = None
+        self._provider_name = provider_name
+        self._segment_sequence_number = 0
+        self._segments = OrderedDict()
+        self._segments_condition = Condition()
+
+        self._stop_tuner_event = Event()
+
+        self.daemon = True
+
+    def _buffer_segment(self, hls_client, hls_segment):
+        segment_url = '/live/{0}/{1}'.format(self._provider_name, hls_segment.uri)
+        segment_file_name = self._determine_segment_file_name(hls_segment)
+
+        with self._segments_condition:
+            if segment_file_name in self._segments:
+                return
+
+        # A segment a client already downloaded is picked up from the cache.
+        # Otherwise the tuner downloads it, and clients requesting the segment
+        # in the meantime join that download
+        ts_file_content = CacheManager.query_cache(
+            self._provider_name, self._channel_number, segment_file_name
+        )
+
+        if ts_file_content is None:
+            ts_file_content = SingleFlightManager.do_call(
+                (self._provider_name, self._channel_number, segment_file_name),
+                hls_client.download_ts_file,
+                segment_url,
+                wait_timeout=SINGLE_FLIGHT_SEGMENT_WAIT_TIMEOUT,
+            )
+
+            logger.debug(
+                'Tuner downloaded segment\n'
+                'Provider          => %s\n'
+                'Channel number    => %s\n'
+                'Segment file name => %s',
+                self._provider_name,
+                self._channel_number,
+                segment_file_name,
+            )
+
+        with self._segments_condition:
+            self._segment_sequence_number += 1
+            self._segments[segment_file_name] = (
+                self._segment_sequence_number,
+                ts_file_content,
+            )
+
+            while len(self._segments) > TUNER_RING_BUFFER_SIZE:
+                self._segments.popitem(last=False)
+
+            self._segments_condition.notify_all()
+
+        TimeshiftManager.add_segment(
+            self._provider_name,
+            self._channel_number,
+            segment_file_name,
+            ts_file_content,
+        )
+
+    def _determine_segment_file_name(self, hls_segment):
+        segment_url_components = urllib.parse.urlparse(
+            '/live/{0}/{1}'.format(self._provider_name, hls_segment.uri)
+        )
+
+        return re.sub(r'(/.*)?(/)(.*\.ts)', r'\3', segment_url_components.path).lower()
+
+    def _publish_chunks_m3u8(self, chunks_m3u8, chunks_hls_playlist):
+        with self._segments_condition:
+            self._chunks_m3u8 = chunks_m3u8
+            self._pending_segment_file_names = {
+                self._determine_segment_file_name(hls_segment)
+                for hls_segment in chunks_hls_playlist.segments
+            } - set(self._segments)
+
+            self._segments_condition.notify_all()
+
+        TimeshiftManager.list_segments(
+            self._provider_name, self._channel_number, chunks_m3u8
+        )
+
+    def _rewrite_m3u8(self, m3u8, client_uuid, http_token):
+        # The URIs listed in the playlists of the tuner carry its upstream
+        # session along with its own client UUID and an empty HTTP token. Only
+        # the latter two are swapped for those of the client
+        m3u8 = re.sub(
+            r'([?&])client_uuid={0}(?=&|$)'.format(re.escape(str(self._id))),
+            lambda match: '{0}client_uuid={1}'.format(match.group(1), client_uuid),
+            m3u8,
+            flags=re.MULTILINE,
+        )
+
+        return re.sub(
+            r'([?&])http_token=(?=&|$)',
+            lambda match: '{0}http_token={1}'.format(
+                match.group(1), urllib.parse.quote(http_token) if http_token else ''
+            ),
+            m3u8,
+            flags=re.MULTILINE,
+        )
+
+    def generate_chunks_m3u8(self, client_uuid, http_token, timeout):
+        with self._segments_condition:
+            self._segments_condition.wait_for(
+                lambda: self._stop_tuner_event.is_set()
+                or self._chunks_m3u8 is not None,
+                timeout,
+            )
+
+            if self._stop_tuner_event.is_set():
+                return None
+
+            chunks_m3u8 = self._chunks_m3u8
+
+        if chunks_m3u8 is None:
+            return None
+
+        return self._rewrite_m3u8(chunks_m3u8, client_uuid, http_token)
+
+    def generate_playlist_m3u8(self, client_uuid, http_token, timeout):
+        with self._segments_condition:
+            self._segments_condition.wait_for(
+                lambda: self._stop_tuner_event.is_set()
+                or self._chunks_m3u8 is not None,
+                timeout,
+            )
+
+            if self._stop_tuner_event.is_set():
+                return None
+
+            # The playlist.m3u8 of some providers already lists the segments
+            # of the channel in which case it is polled in lieu of a
+            # chunks.m3u8
+            playlist_m3u8 = self._playlist_m3u8 or self._chunks_m3u8
+
+        if playlist_m3u8 is None:
+            return None
+
+        return self._rewrite_m3u8(playlist_m3u8, client_uuid, http_token)
+
+    def query_segment(self, segment_file_name, timeout=0):
+        # A segment listed in the chunks.m3u8 handed out by the tuner is
+        # waited for while the tuner has yet to buffer it
+        with self._segments_condition:
+            self._segments_condition.wait_for(
+                lambda: self._stop_tuner_event.is_set()
+                or segment_file_name not in self._pending_segment_file_names,
+                timeout,
+            )
+
+            try:
+                return self._segments[segment_file_name][1]
+            except KeyError:
+                return None
+
+    def run(self):
+        logger.info(
+            'Started tuner\nProvider       => %s\nChannel number => %s',
+            self._provider_name,
+            self._channel_number,
+        )
+
+        try:
+            hls_client = HLSClient(self._id, self._provider_name, self._channel_number)
+
+            playlist_m3u8 = hls_client.download_playlist_m3u8()
+            playlist_hls_playlist = HLSPlaylist(playlist_m3u8)
+
+            try:
+                chunks_url = '/live/{0}/{1}'.format(
+                    self._provider_name, playlist_hls_playlist.playlist_uris[0]
+                )
+
+                with self._segments_condition:
+                    self._playlist_m3u8 = playlist_m3u8
+            except IndexError:
+                chunks_url = None
+
+            chunks_m3u8 = playlist_m3u8
+            chunks_hls_playlist = playlist_hls_playlist
+
+            while not self._stop_tuner_event.is_set():
+                if chunks_url is not None:
+                    chunks_m3u8 = hls_client.download_chunks_m3u8(chunks_url)
+                    chunks_hls_playlist = HLSPlaylist(chunks_m3u8)
+                elif chunks_hls_playlist is None:
+                    chunks_m3u8 = hls_client.download_playlist_m3u8()
+                    chunks_hls_playlist = HLSPlaylist(chunks_m3u8)
+
+                # Clients are handed the playlist of the tuner as soon as it
+                # is downloaded. The segments it lists are served from the
+                # ring buffer as soon as the tuner has buffered them
+                self._publish_chunks_m3u8(chunks_m3u8, chunks_hls_playlist)
+
+                for hls_segment in chunks_hls_playlist.segments:
+                    if self._stop_tuner_event.is_set():
+                        break
+
+                    try:
+                        self._buffer_segment(hls_client, hls_segment)
+                    except requests.exceptions.HTTPError:
+                        logger.error(
+                            'Tuner failed to download segment\nSegment => %s',
+                            hls_segment.uri,
+                        )
+                    finally:
+                        with self._segments_condition:
+                            self._pending_segment_file_names.discard(
+                                self._determine_segment_file_name(hls_segment)
+                            )
+
+                            self._segments_condition.notify_all()
+
+                # The provider refreshes a live media playlist every target
+                # duration
+                self._stop_tuner_event.wait(
+                    (chunks_hls_playlist.target_duration or HLS_DEFAULT_TARGET_DURATION)
+                    * HLS_POLLING_INTERVAL_RATIO
+                )
+
+                chunks_hls_playlist = None
+        except (HLSPlaylistDownloadError, ProviderNotFoundError):
+            logger.error(
+                'Tuner failed to download playlist.m3u8\n'
+                'Provider       => %s\n'
+                'Channel number => %s',
+                self._provider_name,
+                self._channel_number,
+            )
+        except Exception:
+            (type_, value_, traceback_) = sys.exc_info()
+            logger.error(
+                '\n'.join(traceback.format_exception(type_, value_, traceback_))
+            )
+        finally:
+            TunerManager.remove_tuner(self)
+
+            self.stop()
+
+            logger.info(
+                'Stopped tuner\nProvider       => %s\nChannel number => %s',
+                self._provider_name,
+                self._channel_number,
+            )
+
+    def stop(self):
+        self._stop_tuner_event.set()
+
+        with self._segments_condition:
+            self._segments_condition.notify_all()
+
+    def wait_for_segments(self, segment_sequence_number, timeout):
+        # Returns the segments buffered after the one with the given sequence
+        # number along with the sequence number of the last of them. Segments
+        # that were already dropped from the ring buffer are skipped. None is
+        # returned once the tuner is stopped
+        with self._segments_condition:
+            self._segments_condition.wait_for(
+                lambda: self._stop_tuner_event.is_set()
+                or self._segment_sequence_number > segment_sequence_number,
+                timeout,
+            )
+
+            if self._stop_tuner_event.is_set():
+                return None
+
+            return (
+                self._segment_sequence_number,
+                [
+                    ts_file_content
+                    for (
+                        buffered_segment_sequence_number,
+                        ts_file_content,
+                    ) in self._segments.values()
+                    if buffered_segment_sequence_number > segment_sequence_number
+                ],
+            )
+
+    @property
+    def channel_number(self):
+        return self._channel_number
+
+    @property
+    def idle_timer(self):
+        return self._idle_timer
+
+    @idle_timer.setter
+    def idle_timer(self, idle_timer):
+        self._idle_timer = idle_timer
+
+    @property
+    def number_of_references(self):
+        return self._number_of_references
+
+    @number_of_references.setter
+    def number_of_references(self, number_of_references):
+        self._number_of_references = number_of_references
+
+    @property
+    def provider_name(self):
+        return self._provider_name
+
+
+class TunerManager(object):
+    __slots__ = []
+
+    _do_use_tuners = True
+    _do_use_tuners_lock = RWLock()
+    _lock = Lock()
+    _tuner_idle_timeout = 30
+    _tuner_idle_timeout_lock = RWLock()
+    _tuners = {}
+
+    @classmethod
+    def _initialize_class_variables(cls):
+        try:
+            cls.set_do_use_tuners(
+                OptionalSettings.get_optional_settings_parameter('use_tuners')
+            )
+        except KeyError:
+            pass
+
+        try:
+            cls.set_tuner_idle_timeout(
+                OptionalSettings.get_optional_settings_parameter('tuner_idle_timeout')
+            )
+        except KeyError:
+            pass
+
+    @classmethod
+    def _stop_idle_tuner(cls, tuner):
+        with cls._lock:
+            if tuner.number_of_references:
+                return
+
+            if cls._tuners.get((tuner.provider_name, tuner.channel_number)) is tuner:
+                del cls._tuners[(tuner.provider_name, tuner.channel_number)]
+
+        tuner.stop()
+
+    @classmethod
+    def acquire_tuner(cls, provider_name, channel_number):
+        with cls._do_use_tuners_lock.reader_lock:
+            if not cls._do_use_tuners:
+                return None
+
+        with cls._lock:
+            try:
+                tuner = cls._tuners[(provider_name, channel_number)]
+            except KeyError:
+                tuner = Tuner(provider_name, channel_number)
+                tuner.start()
+
+                cls._tuners[(provider_name, channel_number)] = tuner
+
+            tuner.number_of_references += 1
+
+            if tuner.idle_timer is not None:
+                tuner.idle_timer.cancel()
+                tuner.idle_timer = None
+
+        return tuner
+
+    @classmethod
+    def generate_chunks_m3u8(
+        cls, provider_name, channel_number, client_uuid, http_token
+    ):
+        tuner = cls.acquire_tuner(provider_name, channel_number)
+
+        if tuner is None:
+            return None
+
+        try:
+            return tuner.generate_chunks_m3u8(
+                client_uuid, http_token, TUNER_WAIT_TIMEOUT
+            )
+        finally:
+            cls.release_tuner(tuner)
+
+    @classmethod
+    def generate_playlist_m3u8(
+        cls, provider_name, channel_number, client_uuid, http_token
+    ):
+        tuner = cls.acquire_tuner(provider_name, channel_number)
+
+        if tuner is None:
+            return None
+
+        try:
+            return tuner.generate_playlist_m3u8(
+                client_uuid, http_token, TUNER_WAIT_TIMEOUT
+            )
+        finally:
+            cls.release_tuner(tuner)
+
+    @classmethod
+    def get_number_of_tuners(cls):
+        with cls._lock:
+            return len(cls._tuners)
+
+    @classmethod
+    def initialize(cls):
+        cls._initialize_class_variables()
+
+    @classmethod
+    def query_segment(cls, provider_name, channel_number, segment_file_name):
+        with cls._lock:
+            tuner = cls._tuners.get((provider_name, channel_number))
+
+        if tuner is None:
+            return None
+
+        return tuner.query_segment(segment_file_name, TUNER_WAIT_TIMEOUT)
+
+    @classmethod
+    def release_tuner(cls, tuner):
+        with cls._tuner_idle_timeout_lock.reader_lock:
+            tuner_idle_timeout = cls._tuner_idle_timeout
+
+        with cls._lock:
+            tuner.number_of_references -= 1
+
+            # The upstream session outlives its last reference by the idle
+            # timeout so that clients polling the channel keep it tuned
+            if not tuner.number_of_references:
+                tuner.idle_timer = Timer(
+                    tuner_idle_timeout, cls._stop_idle_tuner, (tuner,)
+                )
+                tuner.idle_timer.daemon = True
+                tuner.idle_timer.start()
+
+    @classmethod
+    def remove_tuner(cls, tuner):
+        with cls._lock:
+            if cls._tuners.get((tuner.provider_name, tuner.channel_number)) is tuner:
+                del cls._tuners[(tuner.provider_name, tuner.channel_number)]
+
+            if tuner.idle_timer is not None:
+                tuner.idle_timer.cancel()
+                tuner.idle_timer = None
+
+    @classmethod
+    def set_do_use_tuners(cls, do_use_tuners):
+        with cls._do_use_tuners_lock.writer_lock:
+            cls._do_use_tuners = do_use_tuners
+
+        if not do_use_tuners:
+            with cls._lock:
+                tuners = list(cls._tuners.values())
+
+                cls._tuners.clear()
+
+            for tuner in tuners:
+                tuner.stop()
+
+    @classmethod
+    def set_tuner_idle_timeout(cls, tuner_idle_timeout):
+        with cls._tuner_idle_timeout_lock.writer_lock:
+            cls._tuner_idle_timeout = tuner_idle_timeout
+
+    @classmethod
+    def touch_tuner(cls, provider_name, channel_number):
+        tuner = cls.acquire_tuner(provider_name, channel_number)
+
+        if tuner is None:
+            return False
+
+        cls.release_tuner(tuner)
+
+        return True
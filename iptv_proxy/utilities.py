@@ -24,6 +24,7 @@ from iptv_proxy.constants import DEFAULT_RECORDINGS_DIRECTORY_PATH
 from iptv_proxy.constants import DEFAULT_SSL_CERTIFICATE_FILE_PATH
 from iptv_proxy.constants import DEFAULT_SSL_KEY_FILE_PATH
 from iptv_proxy.enums import IPAddressType
+from iptv_proxy.formatters import LazyLogMessage
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,69 @@ logger = logging.getLogger(__name__)
 class Utility(object):
     __slots__ = []
 
+    @classmethod
+    def assemble_request_to_log_message(
+        cls,
+        requests_http_method,
+        url,
+        params=None,
+        headers=None,
+        cookies=None,
+        json_=None,
+    ):
+        return (
+            'Request\n'
+            '[Method]\n'
+            '========\n{0}\n\n'
+            '[URL]\n'
+            '=====\n{1}\n'
+            '{2}{3}{4}{5}'.format(
+                requests_http_method.__name__.upper(),
+                url,
+                '\n'
+                '[Query Parameters]\n'
+                '==================\n{0}\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(key, params[key])
+                            for key in sorted(params)
+                        ]
+                    )
+                )
+                if params
+                else '',
+                '\n'
+                '[Headers]\n'
+                '=========\n{0}\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(header, headers[header])
+                            for header in sorted(headers)
+                        ]
+                    )
+                )
+                if headers
+                else '',
+                '\n'
+                '[Cookies]\n'
+                '=========\n{0}\n'.format(
+                    '\n'.join(
+                        [
+                            '{0:32} => {1!s}'.format(cookie, cookies[cookie])
+                            for cookie in sorted(cookies)
+                        ]
+                    )
+                )
+                if cookies
+                else '',
+                '\n'
+                '[JSON]\n'
+                '======\n{0}\n'.format(json.dumps(json_, sort_keys=True, indent=2))
+                if json_
+                else '',
+            )
+        ).strip()
+
     @classmethod
     def assemble_response_from_log_message(
         cls,
@@ -268,59 +332,14 @@ class Utility(object):
         try:
             logger.trace(
                 '%s',
-                '{0}'.format(
-                    'Request\n'
-                    '[Method]\n'
-                    '========\n{0}\n\n'
-                    '[URL]\n'
-                    '=====\n{1}\n'
-                    '{2}{3}{4}{5}'.format(
-                        requests_http_method.__name__.upper(),
-                        url,
-                        '\n'
-                        '[Query Parameters]\n'
-                        '==================\n{0}\n'.format(
-                            '\n'.join(
-                                [
-                                    '{0:32} => {1!s}'.format(key, params[key])
-                                    for key in sorted(params)
-                                ]
-                            )
-                        )
-                        if params
-                        else '',
-                        '\n'
-                        '[Headers]\n'
-                        '=========\n{0}\n'.format(
-                            '\n'.join(
-                                [
-                                    '{0:32} => {1!s}'.format(header, headers[header])
-                                    for header in sorted(headers)
-                                ]
-                            )
-                        )
-                        if headers
-                        else '',
-                        '\n'
-                        '[Cookies]\n'
-                        '=========\n{0}\n'.format(
-                            '\n'.join(
-                                [
-                                    '{0:32} => {1!s}'.format(cookie, cookies[cookie])
-                                    for cookie in sorted(cookies)
-                                ]
-                            )
-                        )
-                        if cookies
-                        else '',
-                        '\n'
-                        '[JSON]\n'
-                        '======\n{0}\n'.format(
-                            json.dumps(json_, sort_keys=True, indent=2)
-                        )
-                        if json_
-                        else '',
-                    ).strip()
+                LazyLogMessage(
+                    cls.assemble_request_to_log_message,
+                    requests_http_method,
+                    url,
+                    params=params,
+                    headers=headers,
+                    cookies=cookies,
+                    json_=json_,
                 ),
             )
 